@@ -0,0 +1,537 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+模拟的Ollama服务器，用于在没有GPU的机器上测试和评估生成流程的性能
+
+实现 /api/generate 和 /api/chat（流式和非流式）以及 /api/tags、/api/ps、/api/version。
+按配置的提示词处理速度和生成速度模拟耗时，支持并发槽位（对应 OLLAMA_NUM_PARALLEL）、
+槽位内的提示词前缀缓存、num_ctx 变化时重新加载模型以及故障注入。
+响应内容由提示词的哈希值决定，评分、反馈、分析等响应的格式与真实模型的输出一致。
+
+仅依赖标准库，可单独运行：python benchmarks/mock_ollama.py --port 11435
+"""
+
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from os.path import commonprefix
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List, Optional, Tuple
+
+# 默认的模拟参数
+DEFAULT_PROFILE = {
+    'model': 'mock',
+    'prompt_eval_rate': 2000.0,   # 提示词处理速度（token/秒）
+    'eval_rate': 500.0,           # 单个请求的生成速度（token/秒）
+    'model_speedup': {},          # 其他模型相对于上面速度的倍数，如 {'mock-small': 3}，模拟较小的模型
+    'contention': 0.3,            # 每多一个同时生成的请求，生成速度下降的比例
+    'slots': 1,                   # 并发槽位数，对应 OLLAMA_NUM_PARALLEL
+    'load_time': 0.5,             # 加载模型（或 num_ctx 变化后重新加载）的耗时（秒）
+    'response_tokens': 600,       # 正文类响应的token数（不超过请求的 num_predict）
+    'chars_per_token': 1.4,       # 每token对应的中文字符数
+    'chunk_tokens': 4,            # 流式输出时每段的token数
+    'fault_rate': 0.0,            # 直接返回503错误的概率
+    'drop_rate': 0.0,             # 流式输出中途断开连接的概率
+    'stall_rate': 0.0,            # 流式输出中途停顿的概率
+    'stall_time': 5.0,            # 停顿的时长（秒）
+    'malformed_rate': 0.0,        # 评分和反馈响应被截断（无法解析）的概率
+    'seed': 0                     # 故障注入的随机种子
+}
+
+_SUBJECTS = ['她', '他', '林夏', '周远', '老陈', '母亲', '那个少年', '班主任', '邻居家的女孩', '陌生人']
+_ACTIONS = ['站在窗前', '推开了门', '低头看着手里的信', '沉默了很久', '笑了一下', '回头望向走廊',
+            '把伞递了过去', '攥紧了衣角', '在雨里跑了起来', '轻轻叹了口气']
+_SCENES = ['窗外的梧桐叶落了一地', '教室里只剩下钟表的声音', '街灯一盏一盏亮了起来', '空气里有雨后泥土的味道',
+           '走廊尽头传来了脚步声', '天色一点点暗了下去', '远处的操场上有人在喊', '桌上的茶早已凉了']
+_THOUGHTS = ['心里像压着一块石头', '忽然想起了很多年前的那个夏天', '不知道该说些什么', '觉得一切都不一样了',
+             '第一次明白了那句话的意思', '决定不再逃避', '想把这件事永远藏在心里', '终于鼓起了勇气']
+
+_FEEDBACK_POINTS = {
+    '优点': ['人物动机清晰', '开篇的氛围营造到位', '对话自然，符合人物身份', '情节推进有节奏感', '细节描写生动'],
+    '需要改进': ['中段节奏偏慢', '次要人物的作用不够明确', '部分场景描写重复', '冲突的铺垫不够充分', '结尾略显仓促'],
+    '修改建议': ['压缩中段的环境描写', '为次要人物增加一个关键行动', '在前文埋下与结局呼应的细节',
+                 '用一场对话代替大段心理独白', '让主要冲突提前出现'],
+    '深化建议': ['强化主题与人物成长的联系', '增加一个有象征意义的意象', '让配角的选择折射主题']
+}
+
+def _estimate_tokens(text: str, chars_per_token: float) -> int:
+    cjk = sum(1 for ch in text if ord(ch) > 0x2e80)
+    return int(cjk / chars_per_token + (len(text) - cjk) / 3.5) + 1
+
+class _Seeded:
+    """由提示词的哈希值决定的确定性随机数"""
+    def __init__(self, text: str, seed: Any = None):
+        digest = hashlib.sha256(f"{seed}|{text}".encode('utf-8')).digest()
+        self.random = random.Random(int.from_bytes(digest[:8], 'big'))
+
+    def pick(self, items: List[str]) -> str:
+        return self.random.choice(items)
+
+    def sample(self, items: List[str], low: int, high: int) -> List[str]:
+        return self.random.sample(items, self.random.randint(low, min(high, len(items))))
+
+    def score(self, low: int, high: int) -> int:
+        return self.random.randint(low, high)
+
+def classify(prompt: str) -> str:
+    """
+    根据提示词判断请求类型
+
+    Args:
+        prompt: 完整提示词（系统和用户提示词拼接）
+
+    Returns:
+        请求类型：rating/locate/segment/analysis/feedback/summary/state/fix/characters/outline/content
+    """
+    if '总分：x/100' in prompt or '"总分": x' in prompt:
+        return 'rating'
+    if '"片段": [' in prompt:
+        return 'locate'
+    if '【待修改片段】' in prompt:
+        return 'segment'
+    if '分析结果对小说进行重写' in prompt:
+        return 'fix'
+    if '请对小说进行全面分析' in prompt:
+        # 本地检测没有发现重复时分析提示词不含重复问题部分，按两种提示词共有的开头判断
+        return 'analysis'
+    if '进行分析并提供修改建议' in prompt or '"优点": [' in prompt:
+        return 'feedback'
+    if '撰写情节摘要' in prompt:
+        return 'summary'
+    if '更新主要人物的当前状态' in prompt:
+        return 'state'
+    if '创建主要人物设定' in prompt:
+        return 'characters'
+    if '创作大纲' in prompt:
+        return 'outline'
+    return 'content'
+
+def _prose(rng: _Seeded, chars: int) -> str:
+    """生成指定长度左右的中文正文"""
+    paragraphs = []
+    length = 0
+    while length < chars:
+        sentences = []
+        for _ in range(rng.score(2, 4)):
+            sentences.append(f"{rng.pick(_SUBJECTS)}{rng.pick(_ACTIONS)}，{rng.pick(_SCENES)}，"
+                             f"{rng.pick(_SUBJECTS)}{rng.pick(_THOUGHTS)}。")
+        paragraph = ''.join(sentences)
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+    return '\n\n'.join(paragraphs)
+
+def _outline(rng: _Seeded) -> str:
+    names = rng.sample(_SUBJECTS[2:], 2, 4)
+    return f"""## 主要人物
+""" + '\n'.join(f"- {name}：{rng.pick(_THOUGHTS)}" for name in names) + f"""
+
+## 故事大纲
+1. 开篇：{names[0]}{rng.pick(_ACTIONS)}，{rng.pick(_SCENES)}。
+2. 发展：{names[1]}{rng.pick(_ACTIONS)}，两人之间产生了误会。
+3. 高潮：{names[0]}{rng.pick(_THOUGHTS)}。
+4. 结局：{rng.pick(_SCENES)}，{names[-1]}{rng.pick(_THOUGHTS)}。
+
+## 人物关系
+{names[0]}与{names[1]}是多年的朋友。"""
+
+def _characters(rng: _Seeded) -> str:
+    return '\n\n'.join(
+        f"""## {name}
+- 基本信息：{rng.score(16, 60)}岁
+- 性格特点：{rng.pick(_THOUGHTS)}
+- 行为习惯：常常{rng.pick(_ACTIONS)}
+- 人物成长轨迹：从逃避到{rng.pick(_THOUGHTS)}"""
+        for name in rng.sample(_SUBJECTS[2:], 2, 4)
+    )
+
+def _rating(rng: _Seeded, as_json: bool) -> str:
+    plot, theme = rng.score(11, 19), rng.score(11, 19)
+    character = [rng.score(5, 10), rng.score(5, 10), rng.score(2, 5), rng.score(2, 5)]
+    technique = rng.score(16, 29)
+    total = plot + sum(character) + theme + technique
+    if as_json:
+        return json.dumps({
+            '情节发展': plot,
+            '人物性格一致性': character[0],
+            '人物行为合理性': character[1],
+            '人物对话特色': character[2],
+            '人物成长体现': character[3],
+            '主题表达': theme,
+            '写作技巧': technique,
+            '总分': total
+        }, ensure_ascii=False)
+    return f"""## 情节发展（{plot}/20分）
+故事结构完整，{rng.pick(_FEEDBACK_POINTS['需要改进'])}。
+
+## 人物塑造（{sum(character)}/30分）
+1. 人物性格一致性（{character[0]}/10分）：主要人物的性格前后一致。
+2. 人物行为合理性（{character[1]}/10分）：{rng.pick(_FEEDBACK_POINTS['优点'])}。
+3. 人物对话特色（{character[2]}/5分）：对话基本体现了人物特点。
+4. 人物成长体现（{character[3]}/5分）：主角有一定的成长。
+
+## 主题表达（{theme}/20分）
+主题明确，{rng.pick(_FEEDBACK_POINTS['深化建议'])}会更好。
+
+## 写作技巧（{technique}/30分）
+{rng.pick(_FEEDBACK_POINTS['优点'])}，{rng.pick(_FEEDBACK_POINTS['需要改进'])}。
+
+总分：{total}/100"""
+
+def _feedback(rng: _Seeded, as_json: bool) -> str:
+    sections = {name: rng.sample(points, 1, 5) for name, points in _FEEDBACK_POINTS.items()}
+    if as_json:
+        return json.dumps(sections, ensure_ascii=False)
+    return '\n\n'.join(
+        f"## {name}\n" + '\n'.join(f"- {point}" for point in points)
+        for name, points in sections.items()
+    )
+
+def _analysis(rng: _Seeded, repetitions: bool) -> str:
+    # 分析结果按反馈的部分名称（优点/需要改进/修改建议/深化建议）组织，
+    # 与生成器评估分析质量的方式一致（见 scoring.FEEDBACK_SECTIONS），质量分数不低于0.5，最终重写照常进行
+    points = {name: rng.sample(items, 3, 5) for name, items in _FEEDBACK_POINTS.items()}
+    return f"""## 内容评价
+情节完整，人物关系清楚。
+
+## 优点
+""" + '\n'.join(f"- {point}" for point in points['优点']) + f"""
+
+## 需要改进
+""" + '\n'.join(f"- {point}" for point in points['需要改进']) + f"""
+
+## 风格评估
+叙事视角统一，语言风格基本一致。
+
+""" + (f"""## 重复问题
+- “{rng.pick(_SCENES)}”出现了{rng.score(2, 4)}次
+
+""" if repetitions else "") + """## 修改建议
+""" + '\n'.join(f"- {point}" for point in points['修改建议']) + """
+
+## 深化建议
+""" + '\n'.join(f"- {point}" for point in points['深化建议'])
+
+def _locate(rng: _Seeded, prompt: str) -> str:
+    numbers = [int(n) for n in re.findall(r'^\[(\d+)\] ', prompt, re.M)]
+    segments = []
+    for start in sorted(rng.sample(numbers, 1, 3)) if numbers else []:
+        end = min(start + rng.score(0, 1), max(numbers))
+        segments.append({'开始段落': start, '结束段落': end, '问题': rng.pick(_FEEDBACK_POINTS['修改建议'])})
+    return json.dumps({'片段': segments}, ensure_ascii=False)
+
+def make_response(prompt: str, num_predict: int, profile: Dict[str, Any],
+                  seed: Any = None, as_json: bool = False, malformed: bool = False) -> str:
+    """
+    生成与真实模型输出格式一致的确定性响应
+
+    Args:
+        prompt: 完整提示词
+        num_predict: 请求的最大生成token数
+        profile: 模拟参数
+        seed: 请求选项中的随机种子（可选）
+        as_json: 是否要求JSON格式输出
+        malformed: 是否截断评分和反馈响应，模拟模型输出格式错误
+
+    Returns:
+        响应内容
+    """
+    rng = _Seeded(prompt, seed)
+    kind = classify(prompt)
+    if kind == 'rating':
+        text = _rating(rng, as_json)
+    elif kind == 'feedback':
+        text = _feedback(rng, as_json)
+    elif kind == 'analysis':
+        text = _analysis(rng, '## 重复问题' in prompt)
+    elif kind == 'locate':
+        text = _locate(rng, prompt)
+    elif kind == 'outline':
+        text = _outline(rng)
+    elif kind == 'characters':
+        text = _characters(rng)
+    elif kind in ('summary', 'state'):
+        text = _prose(rng, 200)
+    elif kind in ('fix', 'segment'):
+        # 重写的篇幅与原文相近（仍受 num_predict 限制）
+        start, end = ('原文：\n', '\n\n分析结果：') if kind == 'fix' else ('【待修改片段】\n', '\n\n【')
+        original = prompt.split(start, 1)[-1].split(end, 1)[0]
+        text = _prose(rng, len(original))
+    else:
+        target = re.search(r'篇幅约(\d+)字', prompt)
+        if target:
+            # 按要求的篇幅生成，实际字数有一定偏差
+            text = _prose(rng, int(int(target.group(1)) * rng.random.uniform(0.8, 1.4)))
+        else:
+            tokens = min(profile['response_tokens'], num_predict if num_predict > 0 else profile['response_tokens'])
+            text = _prose(rng, int(tokens * profile['chars_per_token']))
+    if malformed and kind in ('rating', 'feedback'):
+        text = text[:len(text) // 2]
+    if num_predict > 0:
+        text = text[:int(num_predict * profile['chars_per_token'])]
+    return text
+
+class MockOllama:
+    def __init__(self, profile: Optional[Dict[str, Any]] = None, host: str = '127.0.0.1', port: int = 0):
+        """
+        初始化模拟服务器
+
+        Args:
+            profile: 模拟参数（可选），未设置的项使用 DEFAULT_PROFILE
+            host: 监听地址
+            port: 监听端口，0表示自动选择
+        """
+        self.profile = dict(DEFAULT_PROFILE, **(profile or {}))
+        self._random = random.Random(self.profile['seed'])
+        self._cond = threading.Condition()
+        self._free_slots = list(range(max(1, int(self.profile['slots']))))
+        self._slot_prompts = [''] * len(self._free_slots)
+        self._active = 0
+        self._loaded_ctx = None
+        self._prompt_counts = {}  # 提示词哈希 -> 出现次数，相同提示词的重复请求返回不同内容
+        self._load_lock = threading.Lock()
+        self._stats = {
+            'requests': 0, 'faults': 0, 'drops': 0, 'stalls': 0, 'malformed': 0, 'loads': 0,
+            'prompt_tokens': 0, 'cached_tokens': 0, 'eval_tokens': 0,
+            'queue_depth': 0, 'max_queue_depth': 0
+        }
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MockOllama':
+        """在后台线程中启动服务器"""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务器"""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取服务器端统计
+
+        Returns:
+            请求数、注入的故障数、模型加载次数、处理和缓存的提示词token数、生成的token数、最大排队数
+        """
+        with self._cond:
+            return dict(self._stats)
+
+    def _chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._cond:
+            return self._random.random() < rate
+
+    def _acquire_slot(self, prompt: str) -> Tuple[int, int]:
+        """等待空闲槽位，优先选择缓存了最长公共前缀的槽位，返回(槽位, 可复用的字符数)"""
+        with self._cond:
+            self._stats['queue_depth'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._stats['queue_depth'])
+            while not self._free_slots:
+                self._cond.wait()
+            slot = max(self._free_slots, key=lambda i: len(commonprefix([self._slot_prompts[i], prompt])))
+            self._free_slots.remove(slot)
+            self._stats['queue_depth'] -= 1
+            self._active += 1
+            return slot, len(commonprefix([self._slot_prompts[slot], prompt]))
+
+    def _release_slot(self, slot: int, prompt: str):
+        with self._cond:
+            self._slot_prompts[slot] = prompt
+            self._free_slots.append(slot)
+            self._active -= 1
+            self._cond.notify()
+
+    def _ensure_loaded(self, num_ctx: int) -> float:
+        """num_ctx 与已加载的不同时模拟重新加载模型，返回加载耗时"""
+        with self._load_lock:
+            if self._loaded_ctx == num_ctx:
+                return 0.0
+            time.sleep(self.profile['load_time'])
+            with self._cond:
+                self._loaded_ctx = num_ctx
+                self._slot_prompts = [''] * len(self._slot_prompts)
+                self._stats['loads'] += 1
+            return self.profile['load_time']
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, data: Dict[str, Any]):
+                body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_chunk(self, data: Dict[str, Any]):
+                body = (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+                self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                model = {'name': mock.profile['model'], 'model': mock.profile['model']}
+                if self.path == '/api/tags':
+                    self._send_json(200, {'models': [model]})
+                elif self.path == '/api/ps':
+                    self._send_json(200, {'models': [model] if mock._loaded_ctx else []})
+                elif self.path == '/api/version':
+                    self._send_json(200, {'version': '0.0.0-mock'})
+                elif self.path == '/mock/stats':
+                    self._send_json(200, mock.stats())
+                else:
+                    self._send_json(404, {'error': 'not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                data = json.loads(self.rfile.read(length) or b'{}')
+                if self.path not in ('/api/generate', '/api/chat'):
+                    self._send_json(404, {'error': 'not found'})
+                    return
+                with mock._cond:
+                    mock._stats['requests'] += 1
+                if mock._chance(mock.profile['fault_rate']):
+                    with mock._cond:
+                        mock._stats['faults'] += 1
+                    self._send_json(503, {'error': 'server busy (injected fault)'})
+                    return
+                mock._serve(self, data)
+
+        return Handler
+
+    def _serve(self, handler: BaseHTTPRequestHandler, data: Dict[str, Any]):
+        """处理一次生成请求"""
+        chat = handler.path == '/api/chat'
+        if chat:
+            prompt = '\n\n'.join(message.get('content', '') for message in data.get('messages', []))
+        else:
+            prompt = data.get('prompt', '')
+        options = data.get('options', {})
+        num_predict = int(options.get('num_predict', -1))
+        num_ctx = int(options.get('num_ctx', 2048))
+        profile = self.profile
+        speedup = float((profile.get('model_speedup') or {}).get(data.get('model'), 1.0))
+
+        start = time.monotonic()
+        load_time = self._ensure_loaded(num_ctx)
+        slot, cached_chars = self._acquire_slot(prompt)
+        try:
+            prompt_tokens = _estimate_tokens(prompt, profile['chars_per_token'])
+            cached_tokens = min(prompt_tokens - 1, _estimate_tokens(prompt[:cached_chars], profile['chars_per_token']) - 1)
+            evaluated = prompt_tokens - max(0, cached_tokens)
+            prompt_time = evaluated / (profile['prompt_eval_rate'] * speedup)
+            time.sleep(prompt_time)
+
+            seed = options.get('seed')
+            if seed is None:
+                # 与真实模型一样，未指定种子时相同提示词的每次请求结果不同（但整体可复现）
+                key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+                with self._cond:
+                    seed = f"n{self._prompt_counts.get(key, 0)}"
+                    self._prompt_counts[key] = self._prompt_counts.get(key, 0) + 1
+            malformed = classify(prompt) in ('rating', 'feedback') and self._chance(profile['malformed_rate'])
+            if malformed:
+                with self._cond:
+                    self._stats['malformed'] += 1
+            text = make_response(prompt, num_predict, profile, seed, data.get('format') is not None, malformed)
+            eval_tokens = _estimate_tokens(text, profile['chars_per_token'])
+            with self._cond:
+                rate = profile['eval_rate'] * speedup / (1 + profile['contention'] * (self._active - 1))
+                self._stats['prompt_tokens'] += prompt_tokens
+                self._stats['cached_tokens'] += max(0, cached_tokens)
+                self._stats['eval_tokens'] += eval_tokens
+            eval_time = eval_tokens / rate
+
+            def message(content: str) -> Dict[str, Any]:
+                if chat:
+                    return {'model': profile['model'], 'message': {'role': 'assistant', 'content': content}}
+                return {'model': profile['model'], 'response': content}
+
+            def final() -> Dict[str, Any]:
+                result = message('')
+                result.update({
+                    'done': True,
+                    'done_reason': 'stop',
+                    'total_duration': int((time.monotonic() - start) * 1e9),
+                    'load_duration': int(load_time * 1e9),
+                    'prompt_eval_count': evaluated,
+                    'prompt_eval_duration': int(prompt_time * 1e9),
+                    'eval_count': eval_tokens,
+                    'eval_duration': int(eval_time * 1e9)
+                })
+                return result
+
+            if not data.get('stream', True):
+                time.sleep(eval_time)
+                result = final()
+                result.update(message(text))
+                handler._send_json(200, result)
+                return
+
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'application/x-ndjson')
+            handler.send_header('Transfer-Encoding', 'chunked')
+            handler.end_headers()
+            step = max(1, int(profile['chunk_tokens'] * profile['chars_per_token']))
+            chunks = [text[i:i + step] for i in range(0, len(text), step)]
+            interrupt_at = len(chunks) // 2
+            drop = self._chance(profile['drop_rate'])
+            stall = self._chance(profile['stall_rate'])
+            for index, chunk in enumerate(chunks):
+                if index == interrupt_at and drop:
+                    with self._cond:
+                        self._stats['drops'] += 1
+                    handler.close_connection = True
+                    return
+                if index == interrupt_at and stall:
+                    with self._cond:
+                        self._stats['stalls'] += 1
+                    time.sleep(profile['stall_time'])
+                time.sleep(eval_time / len(chunks))
+                handler._send_chunk(dict(message(chunk), done=False))
+            handler._send_chunk(final())
+            handler.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            handler.close_connection = True
+        finally:
+            self._release_slot(slot, prompt)
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟的Ollama服务器')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=11435, help='监听端口')
+    for name, value in DEFAULT_PROFILE.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    profile = {name: getattr(args, name) for name in DEFAULT_PROFILE}
+    mock = MockOllama(profile, args.host, args.port)
+    print(f"模拟Ollama服务器已启动：{mock.url}（槽位数 {profile['slots']}）")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+端到端吞吐量基准测试
+
+对每个参考配置启动一个模拟的Ollama服务器，完整运行 NovelGenerator，
+统计每小时生成的小说数、每篇小说的调用次数以及各阶段的耗时分布。
+
+用法：
+    python benchmarks/run_benchmark.py                      # 运行 configs 目录中的全部配置
+    python benchmarks/run_benchmark.py sequential parallel  # 只运行指定的配置
+    python benchmarks/run_benchmark.py -o results.json      # 保存结果
+    python benchmarks/run_benchmark.py --baseline results.json --tolerance 0.1  # 与之前的结果比较
+"""
+
+import os
+import sys
+import json
+import copy
+import time
+import shutil
+import argparse
+import tempfile
+from typing import Dict, Any, List
+
+import yaml
+from loguru import logger
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_DIR = os.path.join(BENCHMARK_DIR, 'configs')
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from novel_generator import NovelGenerator
+from novel_generator.utils.checkpoint_utils import RunManifest
+from mock_ollama import MockOllama
+
+def deep_merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    递归合并配置，override 中的项覆盖 base 中的同名项
+
+    Args:
+        base: 基础配置
+        override: 覆盖的配置
+
+    Returns:
+        合并后的新配置
+    """
+    result = copy.deepcopy(base)
+    for key, value in (override or {}).items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = deep_merge(result[key], value)
+        else:
+            result[key] = copy.deepcopy(value)
+    return result
+
+def load_benchmark_config(name: str) -> Dict[str, Any]:
+    """
+    读取基础配置并合并指定的参考配置
+
+    Args:
+        name: 配置名称（configs 目录中不含扩展名的文件名）或配置文件路径
+
+    Returns:
+        合并后的配置（包含 mock 部分）
+    """
+    path = name if os.path.exists(name) else os.path.join(CONFIG_DIR, f"{name}.yaml")
+    with open(os.path.join(CONFIG_DIR, 'base.yaml'), 'r', encoding='utf-8') as f:
+        base = yaml.safe_load(f)
+    with open(path, 'r', encoding='utf-8') as f:
+        override = yaml.safe_load(f) or {}
+    return deep_merge(base, override)
+
+def percentile(values: List[float], q: float) -> float:
+    """计算分位数（线性插值）"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    position = (len(values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+def stage_breakdown(metrics_path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    根据调用统计文件计算各阶段的耗时分布
+
+    Args:
+        metrics_path: metrics.jsonl 路径
+
+    Returns:
+        阶段名称到（调用次数、失败次数、总耗时、平均/中位数/P95耗时、生成速度）的映射
+    """
+    calls = {}
+    if os.path.exists(metrics_path):
+        with open(metrics_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                calls.setdefault(record['stage'], []).append(record)
+
+    breakdown = {}
+    for stage, records in calls.items():
+        wall_times = [record['wall_time'] for record in records]
+        eval_count = sum(record['eval_count'] for record in records)
+        eval_duration = sum(record['eval_duration'] for record in records)
+        breakdown[stage] = {
+            'calls': len(records),
+            'errors': sum(1 for record in records if 'error' in record),
+            'total': sum(wall_times),
+            'mean': sum(wall_times) / len(wall_times),
+            'p50': percentile(wall_times, 0.5),
+            'p95': percentile(wall_times, 0.95),
+            'tokens_per_sec': eval_count / eval_duration if eval_duration > 0 else 0.0
+        }
+    return breakdown
+
+def run_benchmark(name: str, keep_output: bool = False) -> Dict[str, Any]:
+    """
+    使用模拟服务器完整运行一次生成流程
+
+    Args:
+        name: 配置名称或配置文件路径
+        keep_output: 是否保留生成的输出目录
+
+    Returns:
+        基准结果（吞吐量、调用次数、各阶段耗时分布、服务器端统计）
+    """
+    config = load_benchmark_config(name)
+    mock = MockOllama(config.pop('mock', {})).start()
+    output_dir = tempfile.mkdtemp(prefix=f"benchmark_{os.path.splitext(os.path.basename(name))[0]}_")
+    try:
+        host, port = mock.server.server_address[:2]
+        config['ai_settings'].update({'host': f"http://{host}", 'port': port})
+        config['output_settings']['output_dir'] = output_dir
+        config['metrics_settings'] = {'enabled': True}
+        config['cache_settings'] = {'enabled': False}
+        config['checkpoint_settings'] = {'enabled': True}  # 完成的小说和评分从运行清单中读取
+
+        start = time.monotonic()
+        generator = NovelGenerator(config)
+        generator.generate()
+        generator.api_client.close()
+        wall_time = time.monotonic() - start
+
+        novel_count = config['output_settings'].get('novel_count', 1)
+        manifest = RunManifest.read(output_dir)
+        completed = sum(1 for novel in manifest['novels'].values() if novel.get('result'))
+        scores = [novel['result']['score'] for novel in manifest['novels'].values() if novel.get('result')]
+        stages = stage_breakdown(os.path.join(output_dir, 'metrics.jsonl'))
+        total_calls = sum(stage['calls'] for stage in stages.values())
+        return {
+            'name': os.path.splitext(os.path.basename(name))[0],
+            'novels': completed,
+            'planned_novels': novel_count,
+            'wall_time': wall_time,
+            'novels_per_hour': completed / wall_time * 3600 if wall_time > 0 else 0.0,
+            'calls': total_calls,
+            'calls_per_novel': total_calls / max(1, completed),
+            'errors': sum(stage['errors'] for stage in stages.values()),
+            'mean_score': sum(scores) / len(scores) if scores else 0.0,
+            'stages': stages,
+            'server': mock.stats()
+        }
+    finally:
+        mock.stop()
+        if keep_output:
+            print(f"输出目录：{output_dir}")
+        else:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+def format_table(header: List[str], rows: List[List[str]]) -> str:
+    """生成右对齐的文本表格"""
+    def width(text):
+        return sum(2 if ord(ch) > 0x2e80 else 1 for ch in text)
+    widths = [max(width(row[i]) for row in [header] + rows) for i in range(len(header))]
+    return '\n'.join(
+        '  '.join(' ' * (w - width(cell)) + cell for cell, w in zip(row, widths))
+        for row in [header] + rows
+    )
+
+def print_results(results: List[Dict[str, Any]]):
+    """输出汇总表和各配置的阶段耗时分布"""
+    print(format_table(
+        ['配置', '完成', '耗时s', '篇/小时', '调用', '调用/篇', '失败', '平均评分', '模型加载', '缓存token%'],
+        [[
+            result['name'],
+            f"{result['novels']}/{result['planned_novels']}",
+            f"{result['wall_time']:.1f}",
+            f"{result['novels_per_hour']:.1f}",
+            str(result['calls']),
+            f"{result['calls_per_novel']:.1f}",
+            str(result['errors']),
+            f"{result['mean_score']:.1f}",
+            str(result['server']['loads']),
+            f"{100 * result['server']['cached_tokens'] / max(1, result['server']['prompt_tokens']):.0f}"
+        ] for result in results]
+    ))
+    for result in results:
+        total = sum(stage['total'] for stage in result['stages'].values()) or 1.0
+        print(f"\n[{result['name']}] 各阶段耗时")
+        print(format_table(
+            ['阶段', '调用', '失败', '总耗时s', '占比%', '平均s', 'P50s', 'P95s', 'tok/s'],
+            [[
+                stage,
+                str(item['calls']),
+                str(item['errors']),
+                f"{item['total']:.1f}",
+                f"{100 * item['total'] / total:.0f}",
+                f"{item['mean']:.2f}",
+                f"{item['p50']:.2f}",
+                f"{item['p95']:.2f}",
+                f"{item['tokens_per_sec']:.0f}"
+            ] for stage, item in sorted(result['stages'].items(), key=lambda x: -x[1]['total'])]
+        ))
+
+def compare_with_baseline(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> bool:
+    """
+    与之前保存的结果比较吞吐量
+
+    Args:
+        results: 本次结果
+        baseline_path: 之前保存的结果文件
+        tolerance: 允许的吞吐量下降比例
+
+    Returns:
+        没有超出允许范围的下降时返回True
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {result['name']: result for result in json.load(f)['results']}
+
+    ok = True
+    print(f"\n与基线比较（{baseline_path}，允许下降 {tolerance:.0%}）")
+    for result in results:
+        previous = baseline.get(result['name'])
+        if previous is None or previous['novels_per_hour'] <= 0:
+            print(f"  {result['name']}: 基线中没有该配置")
+            continue
+        change = result['novels_per_hour'] / previous['novels_per_hour'] - 1
+        regressed = change < -tolerance
+        ok = ok and not regressed
+        print(f"  {result['name']}: {previous['novels_per_hour']:.1f} -> {result['novels_per_hour']:.1f} 篇/小时"
+              f"（{change:+.1%}）{'  性能下降' if regressed else ''}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='小说生成流程的吞吐量基准测试')
+    parser.add_argument('configs', nargs='*', help='配置名称或配置文件路径，默认运行 configs 目录中的全部配置')
+    parser.add_argument('-o', '--output', help='将结果保存为JSON文件')
+    parser.add_argument('--baseline', help='与之前保存的结果比较，吞吐量下降超过允许范围时返回非零状态')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='允许的吞吐量下降比例（默认0.1）')
+    parser.add_argument('--log-level', default='WARNING', help='生成器的日志级别（默认WARNING）')
+    parser.add_argument('--keep-output', action='store_true', help='保留生成的输出目录')
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    names = args.configs or sorted(
+        os.path.splitext(name)[0] for name in os.listdir(CONFIG_DIR)
+        if name.endswith('.yaml') and name != 'base.yaml'
+    )
+    results = []
+    for name in names:
+        print(f"运行基准配置：{name} ...", flush=True)
+        results.append(run_benchmark(name, args.keep_output))
+    print()
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存至: {args.output}")
+
+    if args.baseline and not compare_with_baseline(results, args.baseline, args.tolerance):
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,24 +1,93 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
 import argparse
 import yaml
 from loguru import logger
 from novel_generator import NovelGenerator
+from novel_generator.utils.checkpoint_utils import RunManifest
+from novel_generator.utils.job_queue import JobQueue
+from novel_generator.utils.artifact_store import ArtifactStore, ARTIFACT_DB_NAME
+from novel_generator.core.batch import enqueue_jobs, run_workers, format_status
 
 def main():
     # 解析命令行参数
     parser = argparse.ArgumentParser(description='小说生成器')
-    parser.add_argument('-c', '--config', required=True, help='配置文件路径')
+    parser.add_argument('-c', '--config', help='配置文件路径')
+    parser.add_argument('--resume', metavar='RUN_DIR', help='从运行目录中的运行清单恢复中断的任务')
+    parser.add_argument('--force', action='store_true', help='覆盖输出目录中未完成的运行，或在配置与运行清单不一致时仍然恢复')
+    parser.add_argument('--export', metavar='RUN_DIR', help='将运行目录中产物库被选用的版本导出为markdown文件')
+    parser.add_argument('--all-versions', action='store_true', help='与 --export 一起使用，同时导出所有版本及其反馈和评分')
+    batch = parser.add_argument_group('批量任务')
+    batch.add_argument('--jobs', metavar='FILE', help='将任务文件（CSV/JSONL，每行覆盖基础配置中的 novel_settings）加入队列，需要 -c 指定基础配置')
+    batch.add_argument('--queue', default='batch_queue.db', help='任务队列数据库路径（默认 batch_queue.db）')
+    batch.add_argument('--work', action='store_true', help='执行队列中的任务，直到全部完成或失败')
+    batch.add_argument('--workers', type=int, default=1, help='执行任务的进程数（默认1）')
+    batch.add_argument('--max-attempts', type=int, default=3, help='每个任务最多执行的次数（默认3）')
+    batch.add_argument('--retry-delay', type=float, default=60, help='任务失败后第一次重试前的等待时间（秒，默认60），之后每次加倍')
+    batch.add_argument('--status', action='store_true', help='显示任务队列的状态')
+    batch.add_argument('--requeue-dead', action='store_true', help='将重试次数已用完的任务重新放回队列')
     args = parser.parse_args()
+    batch_mode = args.jobs or args.work or args.status or args.requeue_dead
+    if args.jobs and not args.config:
+        parser.error('--jobs 需要 -c/--config 指定基础配置')
+    if not batch_mode and not args.config and not args.resume and not args.export:
+        parser.error('需要指定 -c/--config、--resume 或 --export')
     
+    if args.export:
+        try:
+            config = RunManifest.read(args.export)['config']
+            path = os.path.join(args.export, config.get('artifact_settings', {}).get('path', ARTIFACT_DB_NAME))
+            if not os.path.exists(path):
+                logger.error(f"运行目录中没有产物库：{path}")
+                return 1
+            store = ArtifactStore(path)
+            paths = store.export(os.path.join(args.export, 'novels'), config['novel_settings']['title'],
+                                 versions=args.all_versions)
+            logger.success(f"已导出{len(paths)}个文件")
+        except Exception as e:
+            logger.error(f"导出出错: {str(e)}")
+            logger.exception("详细错误信息：")
+            return 1
+        return 0
+    
+    if batch_mode:
+        try:
+            queue = JobQueue(args.queue, retry_delay=args.retry_delay)
+            if args.jobs:
+                with open(args.config, 'r', encoding='utf-8') as f:
+                    enqueue_jobs(queue, yaml.safe_load(f), args.jobs, args.max_attempts)
+            if args.requeue_dead:
+                logger.info(f"{queue.requeue_dead()}个任务重新放回队列")
+            if args.work:
+                run_workers(queue, args.workers)
+            if args.status or args.work:
+                print(format_status(queue))
+        except KeyboardInterrupt:
+            logger.warning("已停止，未完成的任务已放回队列")
+            return 130
+        except Exception as e:
+            logger.error(f"批量任务出错: {str(e)}")
+            logger.exception("详细错误信息：")
+            return 1
+        return 0
+        
     try:
-        # 读取配置文件
-        with open(args.config, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
+        if args.config:
+            # 读取配置文件
+            with open(args.config, 'r', encoding='utf-8') as f:
+                config = yaml.safe_load(f)
+        else:
+            # 使用运行清单中保存的配置
+            config = RunManifest.read(args.resume)['config']
+            
+        if args.resume:
+            config['output_settings']['output_dir'] = args.resume
+            logger.info(f"恢复运行：{args.resume}")
             
         # 初始化生成器
-        generator = NovelGenerator(config)
+        generator = NovelGenerator(config, resume=bool(args.resume), force=args.force)
         
         # 生成小说
         generator.generate()
@@ -5,12 +5,14 @@
 from .core.generator import NovelGenerator
 from .core.writer import NovelWriter
 from .utils.api_utils import OllamaAPI
+from .utils.async_api_utils import AsyncOllamaAPI
 from .utils.file_utils import ensure_dir, save_content, delete_file, get_unique_filename
 
 __all__ = [
     'NovelGenerator',
     'NovelWriter',
     'OllamaAPI',
+    'AsyncOllamaAPI',
     'ensure_dir',
     'save_content',
     'delete_file',
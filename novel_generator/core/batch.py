@@ -0,0 +1,282 @@
+import os
+import re
+import csv
+import copy
+import json
+import time
+import socket
+import threading
+import multiprocessing
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+import yaml
+from loguru import logger
+from ..utils.job_queue import JobQueue, PENDING, RUNNING, DONE, DEAD
+from ..utils.checkpoint_utils import MANIFEST_NAME
+from .generator import NovelGenerator
+
+def _parse_value(value: Any) -> Any:
+    """将CSV中的文本转为YAML中的类型（数字、布尔值、列表等），无法解析时保留原文"""
+    if not isinstance(value, str):
+        return value
+    try:
+        return yaml.safe_load(value)
+    except yaml.YAMLError:
+        return value
+
+def load_jobs(path: str) -> List[Dict[str, Any]]:
+    """
+    读取批量任务文件
+    
+    CSV文件的第一行为列名，JSONL文件每行一个JSON对象，每行（每个对象）是一个任务。
+    列名（键）为 novel_settings 中的项，如 title、theme、word_count；
+    也可以用 "部分.项" 的形式覆盖其他部分，如 output_settings.novel_count；
+    JSONL中值为对象的键按整个部分合并，如 {"rewrite_settings": {"final_rewrites": 0}}。
+    
+    Args:
+        path: 任务文件路径（.csv 或 .jsonl）
+        
+    Returns:
+        每个任务对基础配置的覆盖项
+    """
+    rows = []
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        if path.lower().endswith('.csv'):
+            for row in csv.DictReader(f):
+                rows.append({key.strip(): _parse_value(value) for key, value in row.items()
+                             if key and value not in (None, '')})
+        else:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except ValueError as e:
+                    raise ValueError(f"任务文件第{number}行不是有效的JSON: {str(e)}")
+    return rows
+
+def _merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """递归合并配置，override 中的项覆盖 base 中的同名项"""
+    result = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = _merge(result[key], value)
+        else:
+            result[key] = copy.deepcopy(value)
+    return result
+
+def job_config(base_config: Dict[str, Any], overrides: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    由基础配置和一个任务的覆盖项得到任务的完整配置
+    
+    每个任务输出到基础输出目录下 batch/<任务键>_<标题> 目录，重试时从其中的运行清单继续。
+    
+    Args:
+        base_config: 基础配置
+        overrides: 任务的覆盖项（见 load_jobs）
+        
+    Returns:
+        （任务键, 完整配置）
+    """
+    nested = {}
+    for key, value in overrides.items():
+        if '.' in key:
+            section, _, name = key.partition('.')
+            nested.setdefault(section, {})[name] = value
+        elif isinstance(value, dict):
+            nested.setdefault(key, {}).update(value)
+        else:
+            nested.setdefault('novel_settings', {})[key] = value
+    config = _merge(base_config, nested)
+    key = JobQueue.make_key(config)
+    title = re.sub(r'[\\/:*?"<>|\s]+', '_', str(config['novel_settings'].get('title', '')))[:40]
+    config['output_settings']['output_dir'] = os.path.join(
+        base_config['output_settings']['output_dir'], 'batch', f"{key}_{title}" if title else key
+    )
+    return key, config
+
+def enqueue_jobs(queue: JobQueue, base_config: Dict[str, Any], path: str, max_attempts: int = 3) -> Tuple[int, int]:
+    """
+    将任务文件中的任务加入队列，已在队列中的相同任务跳过
+    
+    Args:
+        queue: 任务队列
+        base_config: 基础配置
+        path: 任务文件路径
+        max_attempts: 每个任务最多执行的次数
+        
+    Returns:
+        （新加入的任务数, 跳过的任务数）
+    """
+    added = skipped = 0
+    for overrides in load_jobs(path):
+        key, config = job_config(base_config, overrides)
+        if queue.add(str(config['novel_settings'].get('title', key)), config, max_attempts, key):
+            added += 1
+        else:
+            skipped += 1
+    logger.info(f"从 {path} 加入{added}个任务" + (f"，{skipped}个任务已在队列中" if skipped else ""))
+    return added, skipped
+
+class BatchWorker:
+    def __init__(self, queue: JobQueue, worker_id: str = None, poll_interval: float = 5):
+        """
+        初始化批量任务的工作进程
+        
+        循环领取任务并用 NovelGenerator 生成，直到队列中没有等待执行或执行中的任务。
+        执行期间后台线程定期续约；任务失败时按队列的设置等待重试，重试时从该任务的运行清单继续。
+        
+        Args:
+            queue: 任务队列
+            worker_id: 工作进程的标识（可选），默认为"主机名:进程号"
+            poll_interval: 暂时没有可领取的任务时的等待间隔（秒）
+        """
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_interval = poll_interval
+        
+    def _keep_alive(self, job: Dict[str, Any], stop: threading.Event):
+        """后台线程：定期延长任务的租约"""
+        interval = max(1.0, self.queue.lease_seconds / 3)
+        while not stop.wait(interval):
+            try:
+                if not self.queue.heartbeat(job['id'], self.worker_id):
+                    logger.warning(f"任务 {job['name']} 已被其他工作进程领取，本进程的结果不会被记录")
+                    return
+            except Exception as e:
+                logger.warning(f"任务 {job['name']} 续约失败: {str(e)}")
+                
+    def _run_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        执行一个任务
+        
+        Args:
+            job: 领取的任务
+            
+        Returns:
+            任务结果：生成的小说数、最高评分和最佳小说的路径
+        """
+        config = job['config']
+        output_dir = config['output_settings']['output_dir']
+        resume = os.path.exists(os.path.join(output_dir, MANIFEST_NAME))
+        if resume:
+            logger.info(f"任务 {job['name']} 第{job['attempts']}次执行，从运行清单继续：{output_dir}")
+        novels = NovelGenerator(config, resume=resume).generate()
+        if not novels:
+            raise RuntimeError("没有生成任何小说")
+        best = max(novels, key=lambda novel: novel['score'])
+        return {'novels': len(novels), 'best_score': best['score'], 'best_path': best['path']}
+        
+    def run(self) -> int:
+        """
+        执行任务直到队列中没有未完成的任务
+        
+        Returns:
+            本进程完成的任务数
+        """
+        completed = 0
+        logger.info(f"工作进程 {self.worker_id} 开始领取任务：{self.queue.path}")
+        while True:
+            job = self.queue.claim(self.worker_id)
+            if job is None:
+                if not self.queue.has_unfinished():
+                    break
+                # 其他进程正在执行，或失败的任务还没到重试时间
+                time.sleep(self.poll_interval)
+                continue
+                
+            logger.info(f"开始任务 {job['name']}（第{job['attempts']}/{job['max_attempts']}次）")
+            stop = threading.Event()
+            keeper = threading.Thread(target=self._keep_alive, args=(job, stop), name='job-lease', daemon=True)
+            keeper.start()
+            try:
+                result = self._run_job(job)
+            except KeyboardInterrupt:
+                self.queue.release(job['id'], self.worker_id)
+                logger.warning(f"已停止，任务 {job['name']} 放回队列")
+                raise
+            except Exception as e:
+                state = self.queue.fail(job['id'], self.worker_id, str(e))
+                if state is None:
+                    logger.warning(f"任务 {job['name']} 失败，但租约已过期、任务已由其他进程领取: {str(e)}")
+                elif state == DEAD:
+                    logger.error(f"任务 {job['name']} 失败，重试次数已用完: {str(e)}")
+                else:
+                    logger.warning(f"任务 {job['name']} 失败，稍后重试: {str(e)}")
+                continue
+            finally:
+                stop.set()
+                keeper.join()
+            self.queue.complete(job['id'], self.worker_id, result)
+            completed += 1
+            logger.success(f"任务 {job['name']} 完成：{result['novels']}篇小说，最高评分{result['best_score']:.2f}")
+            
+        logger.info(f"工作进程 {self.worker_id} 结束，完成{completed}个任务")
+        return completed
+
+def _worker_main(queue_path: str, lease_seconds: float, retry_delay: float):
+    """工作进程入口"""
+    try:
+        BatchWorker(JobQueue(queue_path, lease_seconds, retry_delay)).run()
+    except KeyboardInterrupt:
+        pass
+
+def run_workers(queue: JobQueue, workers: int = 1):
+    """
+    启动工作进程执行队列中的任务，全部结束后返回
+    
+    Args:
+        queue: 任务队列
+        workers: 工作进程数，为1时在当前进程中执行
+    """
+    if workers <= 1:
+        BatchWorker(queue).run()
+        return
+    processes = [
+        multiprocessing.Process(target=_worker_main, args=(queue.path, queue.lease_seconds, queue.retry_delay),
+                                name=f'batch-worker-{i}')
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"已启动{workers}个工作进程")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # 子进程同样收到中断信号，各自放回正在执行的任务
+        for process in processes:
+            process.join()
+        raise
+
+def format_status(queue: JobQueue, max_items: int = 20) -> str:
+    """
+    生成任务队列的状态
+    
+    Args:
+        queue: 任务队列
+        max_items: 执行中和失败的任务最多列出的个数
+        
+    Returns:
+        各状态的任务数，以及执行中、等待重试和重试次数用完的任务
+    """
+    counts = queue.counts()
+    lines = [
+        f"任务队列：{queue.path}",
+        f"等待{counts[PENDING]}，执行中{counts[RUNNING]}，完成{counts[DONE]}，失败{counts[DEAD]}，共{sum(counts.values())}个"
+    ]
+    for state, title in ((RUNNING, '执行中'), (PENDING, '等待重试'), (DEAD, '重试次数已用完')):
+        jobs = [job for job in queue.jobs(state) if state != PENDING or job['error']]
+        if not jobs:
+            continue
+        lines.append(f"\n{title}：")
+        for job in jobs[:max_items]:
+            updated = datetime.fromtimestamp(job['updated_at']).strftime('%m-%d %H:%M:%S')
+            line = f"  [{job['id']}] {job['name']}（第{job['attempts']}/{job['max_attempts']}次，{updated}"
+            line += f"，{job['worker']}）" if state == RUNNING else "）"
+            if job['error']:
+                line += f"：{job['error']}"
+            lines.append(line)
+        if len(jobs) > max_items:
+            lines.append(f"  另有{len(jobs) - max_items}个未列出")
+    return '\n'.join(lines)
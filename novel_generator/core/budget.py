@@ -0,0 +1,127 @@
+import time
+import threading
+from typing import Dict, Any, List, Optional
+from loguru import logger
+
+class RewriteBudget:
+    def __init__(self, config: Dict[str, Any]):
+        """
+        初始化单篇小说的重写预算
+        
+        控制各阶段重写循环的提前结束：评分达到目标、连续多次重写没有提升、
+        或整篇小说的耗时/生成token数超出预算。开启 carry_over 时，提前结束的阶段
+        未用完的重写次数会转给后续阶段（大纲 → 人物设定 → 各部分内容 → 最终重写）。
+        
+        Args:
+            config: 配置字典
+        """
+        settings = config.get('rewrite_settings', {})
+        self.target_score = settings.get('target_score', 0)              # 反馈评分（0~1）的目标
+        self.final_target_score = settings.get('final_target_score', 0)  # 最终评分（0~100）的目标
+        self.patience = settings.get('patience', 0)
+        self.carry_over = settings.get('carry_over', False)
+        self.max_carry_over = settings.get('max_carry_over', 2)
+        self.time_budget = settings.get('novel_time_budget', 0)
+        self.token_budget = settings.get('novel_token_budget', 0)
+        self._lock = threading.Lock()
+        self._start_time = None
+        self._tokens = 0
+        self._carried = 0
+        
+    def _elapsed(self) -> float:
+        # 从第一次使用开始计时，调度模式下排队等待的时间不计入预算
+        if self._start_time is None:
+            self._start_time = time.monotonic()
+        return time.monotonic() - self._start_time
+        
+    def add_tokens(self, count: int):
+        """
+        累计本篇小说生成的token数
+        
+        Args:
+            count: 一次调用生成的token数
+        """
+        with self._lock:
+            self._elapsed()
+            self._tokens += count
+            
+    def exhausted(self) -> Optional[str]:
+        """
+        检查整篇小说的预算是否已用完
+        
+        Returns:
+            已用完时返回原因，否则返回None
+        """
+        with self._lock:
+            elapsed = self._elapsed()
+            if self.time_budget and elapsed >= self.time_budget:
+                return f"已用时{elapsed:.0f}秒，超出单篇预算{self.time_budget}秒"
+            if self.token_budget and self._tokens >= self.token_budget:
+                return f"已生成{self._tokens}个token，超出单篇预算{self.token_budget}个"
+            return None
+            
+    def allowance(self, configured: int, label: str) -> int:
+        """
+        获取一个阶段可用的重写次数
+        
+        Args:
+            configured: 配置的重写次数
+            label: 日志中使用的阶段名称
+            
+        Returns:
+            可用的重写次数：预算用完时为0，否则为配置值加上前面阶段转来的次数
+        """
+        reason = self.exhausted()
+        if reason and configured > 0:
+            logger.info(f"{label}：{reason}，不再重写")
+            return 0
+        with self._lock:
+            if not self.carry_over or configured <= 0 or self._carried <= 0:
+                return configured
+            extra = min(self._carried, self.max_carry_over)
+            self._carried -= extra
+        logger.info(f"{label}：使用前面阶段节省的{extra}次重写，共{configured + extra}次")
+        return configured + extra
+        
+    def refund(self, unused: int, label: str):
+        """
+        归还提前结束的阶段未用完的重写次数
+        
+        Args:
+            unused: 未用完的重写次数
+            label: 日志中使用的阶段名称
+        """
+        if not self.carry_over or unused <= 0 or self.exhausted():
+            return
+        with self._lock:
+            self._carried += unused
+        logger.info(f"{label}提前结束，{unused}次重写转给后续阶段")
+        
+    def stop_reason(self, scores: List[float], target: float, baseline: Optional[float] = None) -> Optional[str]:
+        """
+        判断重写循环是否应提前结束
+        
+        Args:
+            scores: 到目前为止各版本的评分（按生成顺序）
+            target: 目标评分，0表示不设目标
+            baseline: 第一个版本之前的最佳评分（可选）
+            
+        Returns:
+            应结束时返回原因，否则返回None
+        """
+        if target and scores and max(scores) >= target:
+            return f"评分{max(scores):.2f}已达到目标{target}"
+            
+        if self.patience:
+            best = baseline
+            stale = 0
+            for score in scores:
+                if best is None or score > best:
+                    best = score
+                    stale = 0
+                else:
+                    stale += 1
+            if stale >= self.patience:
+                return f"连续{stale}次重写没有提升"
+                
+        return self.exhausted()
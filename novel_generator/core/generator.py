@@ -1,17 +1,33 @@
 import os
-from typing import Dict, Any, List
+import copy
+import asyncio
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Tuple, Callable
 from loguru import logger
 from ..utils.api_utils import OllamaAPI
-from ..utils.file_utils import ensure_dir, save_content, delete_file
+from ..utils.async_api_utils import AsyncOllamaAPI
+from ..utils.file_utils import ensure_dir, save_content
+from ..utils.checkpoint_utils import RunManifest
+from ..utils.artifact_store import ArtifactStore
+from ..utils.journal import JournalWriter
+from ..utils.text_similarity import SimilarityIndex
 from .writer import NovelWriter
+from .length import LengthPlanner
+from .pipeline import Speculator
+from .steps import Steps
+from .scheduler import StageScheduler, JobSkipped
 
 class NovelGenerator:
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], resume: bool = False, force: bool = False):
         """
         初始化小说生成器
         
         Args:
             config: 配置字典
+            resume: 为True时读取输出目录中的运行清单，从第一个未完成的阶段继续
+            force: 为True时覆盖输出目录中未完成的运行，或在配置与运行清单不一致时仍然恢复
         """
         self.config = config
         
@@ -25,93 +41,541 @@ class NovelGenerator:
         logger.info(f"输出根目录: {self.output_dir}")
         logger.info(f"小说存放目录: {self.novels_dir}")
         
+        # 运行清单，记录每篇小说已完成的阶段以便中断后恢复（关闭检查点时不创建，恢复运行时总是读取）
+        self.checkpoint = None
+        run_id = datetime.now().isoformat(timespec='seconds')
+        if resume or self.config.get('checkpoint_settings', {}).get('enabled', False):
+            self.checkpoint = RunManifest(self.output_dir, self.config, resume=resume, force=force)
+            run_id = self.checkpoint.data['created_at']
+        
+        # 大纲和各部分内容的相似度索引（可选），用于放弃与其他小说雷同的小说
+        self.similarity_index = SimilarityIndex.from_config(self.config, run_id)
+        
+        # 运行产物库（可选），记录所有版本及其反馈和评分，运行结束时导出为markdown
+        self.artifact_store = ArtifactStore.from_config(self.config, self.output_dir)
+        
+        # 生成中小说的临时文件写入器，所有小说共用一个后台写入线程
+        self.journal = JournalWriter.from_config(self.config)
+        
+        # 篇幅规划（可选），所有小说共用每token字数的校准结果和篇幅统计
+        self.length_planner = LengthPlanner.from_config(self.config)
+        
         # 更新配置中的路径
         self.config['output_settings']['save_path'] = self.novels_dir
         
         # 初始化API客户端
         self.api_client = OllamaAPI(config)
         
-        # 初始化写作器
-        self.writer = NovelWriter(config, self.api_client)
+        # 异步模式（可选）：所有小说在一个事件循环中生成，调用通过异步客户端的连接池并发发送
+        self.async_mode = self.config['ai_settings'].get('async_mode', False)
+        self.async_api_client = None
+        
+        # 流水线（可选）：获取反馈的同时推测生成下一版本，所有小说共用推测调用的线程
+        self.speculator = None
+        if self.async_mode:
+            if self.config.get('pipeline_settings', {}).get('enabled', False):
+                logger.warning("异步模式不使用流水线的推测生成")
+            if self.config['ai_settings'].get('stream', False):
+                logger.warning("异步模式不使用流式输出，临时文件在每个部分完成时写入")
+        else:
+            self.speculator = Speculator.from_config(self.config, self.api_client.max_concurrency)
+        
+    def _create_writer(self, novel_dir: str, index: int) -> NovelWriter:
+        """
+        为单篇小说创建独立的写作器
+        
+        每篇小说使用独立的配置副本，保存路径指向该小说自己的目录，
+        因此多篇小说可以同时生成而互不影响。
+        
+        Args:
+            novel_dir: 当前小说的目录
+            index: 小说序号（从0开始）
+            
+        Returns:
+            写作器
+        """
+        novel_config = copy.deepcopy(self.config)
+        novel_config['output_settings']['save_path'] = novel_dir
+        return NovelWriter(novel_config, self.api_client, novel_index=index, checkpoint=self.checkpoint,
+                           similarity_index=self.similarity_index, length_planner=self.length_planner,
+                           artifact_store=self.artifact_store, journal=self.journal, speculator=self.speculator,
+                           async_api_client=self.async_api_client)
+        
+    def _load_finished(self, index: int, novel_count: int) -> Optional[Dict[str, Any]]:
+        """
+        读取检查点中已完成的小说
+        
+        Args:
+            index: 小说序号（从0开始）
+            novel_count: 小说总数
+            
+        Returns:
+            小说信息（目录、路径、评分、内容），未完成时返回None
+        """
+        if self.checkpoint is None:
+            return None
+        finished = self.checkpoint.get_result(index)
+        if finished is not None:
+            logger.info(f"第{index+1}/{novel_count}篇小说已完成（评分：{finished['score']}），跳过")
+            artifact = finished.pop('artifact', None)
+            if artifact is not None and self.artifact_store is not None:
+                finished['content'] = self.artifact_store.get(artifact)['content']
+            else:
+                with open(finished['path'], 'r', encoding='utf-8') as f:
+                    finished['content'] = f.read()
+        return finished
+        
+    def _is_dropped(self, index: int, novel_count: int) -> bool:
+        """
+        检查小说是否已因大纲雷同被放弃
+        
+        Args:
+            index: 小说序号（从0开始）
+            novel_count: 小说总数
+            
+        Returns:
+            已放弃时返回True
+        """
+        if self.checkpoint is None:
+            return False
+        dropped = self.checkpoint.get_stage(index, 'dropped')
+        if dropped is not None:
+            logger.info(f"第{index+1}/{novel_count}篇小说的大纲与{dropped['similar_to']}雷同，已放弃，跳过")
+        return dropped is not None
+        
+    def _unique_outline(self, index: int, writer: NovelWriter) -> Steps[Optional[str]]:
+        """
+        生成大纲，并检查是否与其他小说（包括之前运行生成的小说）的大纲雷同
+        
+        雷同时要求避开该大纲重新生成，最多 dedup_settings.max_regenerations 次，仍然雷同则放弃这篇小说。
+        一篇小说的大部分开销在大纲之后，此时放弃可以省下绝大部分计算。
+        
+        Args:
+            index: 小说序号（从0开始）
+            writer: 写作器
+            
+        Returns:
+            阶段逻辑，结果为大纲，放弃这篇小说时为None
+        """
+        outline = yield from writer.outline_steps()
+        if self.similarity_index is None:
+            return outline
+            
+        max_regenerations = self.config.get('dedup_settings', {}).get('max_regenerations', 1)
+        rejected = []
+        while True:
+            match = self.similarity_index.check_and_add('outline', index, outline)
+            if match is None:
+                return outline
+            entry, similarity = match
+            similar_to = self.similarity_index.describe(entry)
+            logger.warning(f"第{index+1}篇小说的大纲与{similar_to}雷同（相似度：{similarity:.2f}）")
+            rejected.append(outline)
+            if len(rejected) > max_regenerations:
+                logger.warning(f"第{index+1}篇小说的大纲重新生成{max_regenerations}次后仍然雷同，放弃这篇小说")
+                if self.checkpoint is not None:
+                    self.checkpoint.record_stage(index, 'dropped', {'similar_to': similar_to, 'similarity': similarity})
+                return None
+            logger.info(f"重新生成第{index+1}篇小说的大纲（{len(rejected)}/{max_regenerations}）...")
+            outline = yield from writer.outline_steps(avoid=rejected)
+            
+    def _prepare_novel(self, index: int, novel_count: int) -> Tuple[str, NovelWriter]:
+        """
+        创建单篇小说的目录和写作器
+        
+        Args:
+            index: 小说序号（从0开始）
+            novel_count: 小说总数
+            
+        Returns:
+            (小说目录, 写作器)
+        """
+        title = self.config["novel_settings"]["title"]
+        logger.info(f"开始生成第{index+1}/{novel_count}篇小说...")
+        
+        # 为当前小说创建单独的文件夹
+        current_novel_dir = os.path.join(self.novels_dir, f'{title}_{index+1}')
+        ensure_dir(current_novel_dir)
+        logger.info(f"创建小说目录: {current_novel_dir}")
+        
+        return current_novel_dir, self._create_writer(current_novel_dir, index)
+        
+    def _finish_novel(self, index: int, current_novel_dir: str, content: str, score: float) -> Dict[str, Any]:
+        """
+        保存完成的小说并记录到检查点
+        
+        Args:
+            index: 小说序号（从0开始）
+            current_novel_dir: 小说目录
+            content: 最终内容
+            score: 评分
+            
+        Returns:
+            小说信息（目录、路径、评分、内容）
+        """
+        title = self.config["novel_settings"]["title"]
+        
+        # 保存小说内容，启用产物库时保存到产物库，运行结束时导出
+        novel_path = os.path.join(current_novel_dir, f'{title}.md')
+        result = {
+            'dir': current_novel_dir,
+            'path': novel_path,
+            'score': score
+        }
+        if self.artifact_store is not None:
+            result['artifact'] = self.artifact_store.add(index, 'novel', content, score=score,
+                                                         provenance={'model': self.api_client.model_for('content')},
+                                                         selected=True)
+        else:
+            save_content(content, novel_path)
+        
+        logger.info(f"第{index+1}篇小说生成完成，评分：{score}")
+        
+        # 删除临时文件（在尚未执行的追加之后）
+        self.journal.delete(os.path.join(current_novel_dir, f'{title}_temp.md'))
+        
+        if self.checkpoint is not None:
+            self.checkpoint.record_result(index, result)
+        
+        return {
+            'dir': current_novel_dir,
+            'path': novel_path,
+            'score': score,
+            'content': content
+        }
+        
+    def _generate_novel(self, index: int, novel_count: int,
+                        on_content_done: Optional[Callable[[], None]] = None) -> Optional[Dict[str, Any]]:
+        """
+        生成单篇小说
+        
+        Args:
+            index: 小说序号（从0开始）
+            novel_count: 小说总数
+            on_content_done: 小说内容生成完成、开始最终重写之前的回调（可选）
+            
+        Returns:
+            小说信息（目录、路径、评分、内容），因大纲雷同被放弃时返回None
+        """
+        finished = self._load_finished(index, novel_count)
+        if finished is not None:
+            return finished
+        if self._is_dropped(index, novel_count):
+            return None
+            
+        current_novel_dir, writer = self._prepare_novel(index, novel_count)
+        return writer.run(self._novel_steps(index, current_novel_dir, writer, on_content_done))
+        
+    async def _agenerate_novel(self, index: int, novel_count: int) -> Optional[Dict[str, Any]]:
+        """在事件循环中生成单篇小说，见 _generate_novel"""
+        finished = self._load_finished(index, novel_count)
+        if finished is not None:
+            return finished
+        if self._is_dropped(index, novel_count):
+            return None
+            
+        current_novel_dir, writer = self._prepare_novel(index, novel_count)
+        return await writer.arun(self._novel_steps(index, current_novel_dir, writer))
+        
+    def _novel_steps(self, index: int, current_novel_dir: str, writer: NovelWriter,
+                     on_content_done: Optional[Callable[[], None]] = None) -> Steps[Optional[Dict[str, Any]]]:
+        """单篇小说从大纲到保存的阶段逻辑，由 writer.run 或 writer.arun 执行"""
+        # 生成大纲，与其他小说雷同时重新生成或放弃
+        outline = yield from self._unique_outline(index, writer)
+        if outline is None:
+            return None
+        
+        # 生成人物设定，传入大纲
+        characters = yield from writer.characters_steps(outline)
+        
+        # 生成小说内容
+        content = yield from writer.content_steps(outline, characters)
+        if on_content_done is not None:
+            on_content_done()
+        
+        # 最终重写（包含去重和评分）
+        content, score = yield from writer.final_rewrite_steps(outline, characters, content)
+        
+        return self._finish_novel(index, current_novel_dir, content, score)
+        
+    def _schedule_novel(self, scheduler: StageScheduler, index: int, novel_count: int) -> Any:
+        """
+        将单篇小说的各阶段加入调度器
+        
+        依赖关系：大纲 → 人物设定 → 第1~4部分 → 最终重写 → 保存。因大纲雷同被放弃的小说，
+        其大纲任务和下游任务均标记为跳过。
         
-    def generate(self):
-        """生成完整的小说"""
+        Args:
+            scheduler: 调度器
+            index: 小说序号（从0开始）
+            novel_count: 小说总数
+            
+        Returns:
+            最后一个任务，其结果为小说信息
+        """
+        finished = self._load_finished(index, novel_count)
+        if finished is not None:
+            return scheduler.add(f"第{index+1}篇-已完成", lambda: finished, novel=index)
+        if self._is_dropped(index, novel_count):
+            return scheduler.add(f"第{index+1}篇-已放弃", lambda: None, novel=index)
+            
+        current_novel_dir, writer = self._prepare_novel(index, novel_count)
+        name = f"第{index+1}篇"
+        
+        def generate_outline():
+            outline = writer.run(self._unique_outline(index, writer))
+            if outline is None:
+                raise JobSkipped("大纲与其他小说雷同")
+            return outline
+            
+        outline = scheduler.add(f"{name}-大纲", generate_outline, novel=index)
+        characters = scheduler.add(
+            f"{name}-人物设定",
+            lambda: writer.generate_characters(outline.result),
+            [outline], novel=index
+        )
+        
+        previous = None
+        for part_index, part_name in enumerate(writer.CONTENT_PARTS, 1):
+            def generate_part(part_index=part_index, previous=previous):
+                progress = previous.result if previous is not None else writer.new_content_progress()
+                return writer.generate_part(outline.result, characters.result, part_index, progress)
+            previous = scheduler.add(
+                f"{name}-{part_name}",
+                generate_part,
+                [characters] + ([previous] if previous is not None else []),
+                novel=index
+            )
+        content = previous
+        
+        final = scheduler.add(
+            f"{name}-最终重写",
+            lambda: writer.final_rewrite(outline.result, characters.result, content.result['content']),
+            [content], novel=index
+        )
+        return scheduler.add(
+            f"{name}-保存",
+            lambda: self._finish_novel(index, current_novel_dir, *final.result),
+            [final], novel=index
+        )
+        
+    def _generate_scheduled(self, novel_count: int) -> List[Dict[str, Any]]:
+        """
+        按依赖关系调度所有小说的各个阶段
+        
+        不同小说的阶段交错执行，同时进行的阶段数由 scheduler_settings.max_in_flight 限制，
+        使推理服务器始终有请求可处理。
+        
+        Args:
+            novel_count: 小说总数
+            
+        Returns:
+            成功生成的小说信息列表（按序号排列）
+        """
+        scheduler_settings = self.config.get('scheduler_settings', {})
+        scheduler = StageScheduler(
+            scheduler_settings.get('max_in_flight') or self.api_client.max_concurrency,
+            scheduler_settings.get('status_interval', 30)
+        )
+        finals = [self._schedule_novel(scheduler, i, novel_count) for i in range(novel_count)]
+        scheduler.run()
+        return [job.result for job in finals if job.state == job.DONE and job.result is not None]
+        
+    def _generate_parallel(self, novel_count: int, parallel_novels: int) -> List[Dict[str, Any]]:
+        """
+        使用线程池同时生成多篇小说
+        
+        Args:
+            novel_count: 小说总数
+            parallel_novels: 同时生成的小说数
+            
+        Returns:
+            成功生成的小说信息列表（按序号排列）
+        """
+        if self.api_client.max_concurrency < parallel_novels:
+            logger.warning(
+                f"ai_settings.max_concurrency（{self.api_client.max_concurrency}）"
+                f"小于同时生成的小说数（{parallel_novels}），请求仍会排队执行"
+            )
+        
+        results = {}
+        with ThreadPoolExecutor(max_workers=parallel_novels, thread_name_prefix='novel') as executor:
+            futures = {
+                executor.submit(self._generate_novel, i, novel_count): i
+                for i in range(novel_count)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    result = future.result()
+                    if result is not None:
+                        results[i] = result
+                except Exception as e:
+                    logger.error(f"第{i+1}篇小说生成失败: {str(e)}")
+                    logger.exception("详细错误信息：")
+        
+        return [results[i] for i in sorted(results)]
+        
+    async def _generate_async(self, novel_count: int, parallel_novels: int) -> List[Dict[str, Any]]:
+        """
+        在一个事件循环中同时生成多篇小说
+        
+        同时进行的请求数由异步客户端限制为 ai_settings.max_concurrency 乘以服务器数量，
+        同时生成的小说数由 output_settings.parallel_novels 限制；广度模式的候选版本和片段重写同样并发发送。
+        
+        Args:
+            novel_count: 小说总数
+            parallel_novels: 同时生成的小说数
+            
+        Returns:
+            成功生成的小说信息列表（按序号排列）
+        """
+        slots = asyncio.Semaphore(parallel_novels)
+        
+        async def run(index):
+            async with slots:
+                return await self._agenerate_novel(index, novel_count)
+                
+        async with AsyncOllamaAPI(self.config, self.api_client) as client:
+            self.async_api_client = client
+            try:
+                outcomes = await asyncio.gather(*(run(i) for i in range(novel_count)), return_exceptions=True)
+            finally:
+                self.async_api_client = None
+                
+        results = []
+        for i, outcome in enumerate(outcomes):
+            if isinstance(outcome, Exception):
+                logger.opt(exception=outcome).error(f"第{i+1}篇小说生成失败: {str(outcome)}")
+            elif outcome is not None:
+                results.append(outcome)
+        return results
+        
+    def _generate_pipelined(self, novel_count: int) -> List[Dict[str, Any]]:
+        """
+        逐篇生成小说，一篇小说进行最终重写和评分时开始生成下一篇的大纲
+        
+        同时进行的小说最多两篇，下一篇在上一篇的内容生成完成后才开始，
+        因此大纲的相似度检查与逐篇生成时相同。
+        
+        Args:
+            novel_count: 小说总数
+            
+        Returns:
+            成功生成的小说信息列表（按序号排列）
+        """
+        def run(index, ready):
+            try:
+                return self._generate_novel(index, novel_count, ready.set)
+            finally:
+                ready.set()
+                
+        results = {}
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix='novel') as executor:
+            futures = {}
+            for i in range(novel_count):
+                ready = threading.Event()
+                futures[i] = executor.submit(run, i, ready)
+                ready.wait()
+            for i, future in futures.items():
+                try:
+                    result = future.result()
+                    if result is not None:
+                        results[i] = result
+                except Exception as e:
+                    logger.error(f"第{i+1}篇小说生成失败: {str(e)}")
+                    logger.exception("详细错误信息：")
+        
+        return [results[i] for i in sorted(results)]
+        
+    def generate(self) -> List[Dict[str, Any]]:
+        """
+        生成完整的小说
+        
+        Returns:
+            生成的小说（内容、评分、保存路径等），生成过程出错时可能为空
+        """
+        novels = []
         logger.info(f"开始生成小说：{self.config['novel_settings']['title']}")
         logger.info(f"类型：{self.config['novel_settings']['genre']}")
         logger.info(f"主题：{self.config['novel_settings']['theme']}")
         logger.info(f"目标字数：{self.config['novel_settings']['word_count']}")
         
         try:
-            # 记录所有生成的小说及其评分
-            novels = []
-            
             # 生成指定数量的小说
             novel_count = self.config['output_settings'].get('novel_count', 1)
+            parallel_novels = max(1, self.config['output_settings'].get('parallel_novels', 1))
             logger.info(f"计划生成{novel_count}篇小说...")
             
-            for i in range(novel_count):
-                logger.info(f"开始生成第{i+1}/{novel_count}篇小说...")
-                
-                # 为当前小说创建单独的文件夹
-                current_novel_dir = os.path.join(
-                    self.config['output_settings']['save_path'],
-                    f'{self.config["novel_settings"]["title"]}_{i+1}'
-                )
-                ensure_dir(current_novel_dir)
-                logger.info(f"创建小说目录: {current_novel_dir}")
-                
-                # 临时修改save_path为当前小说的目录
-                original_save_path = self.config['output_settings']['save_path']
-                self.config['output_settings']['save_path'] = current_novel_dir
-                
-                # 生成大纲
-                outline = self.writer.generate_outline()
-                
-                # 生成人物设定，传入大纲
-                characters = self.writer.generate_characters(outline)
-                
-                # 生成小说内容
-                content = self.writer.generate_content(outline, characters)
-                
-                # 最终重写（包含去重和评分）
-                content, score = self.writer.final_rewrite(outline, characters, content)
-                
-                # 保存小说内容
-                novel_path = os.path.join(current_novel_dir, f'{self.config["novel_settings"]["title"]}.md')
-                save_content(content, novel_path)
-                
-                # 记录小说信息
-                novels.append({
-                    'dir': current_novel_dir,
-                    'path': novel_path,
-                    'score': score,
-                    'content': content
-                })
-                
-                logger.info(f"第{i+1}篇小说生成完成，评分：{score}")
-                
-                # 删除临时文件
-                temp_file = os.path.join(current_novel_dir, f'{self.config["novel_settings"]["title"]}_temp.md')
-                delete_file(temp_file)
-                
-                # 恢复原始save_path
-                self.config['output_settings']['save_path'] = original_save_path
+            # 记录所有生成的小说及其评分
+            if self.async_mode:
+                logger.info(f"异步模式：同时生成{min(parallel_novels, novel_count)}篇小说，"
+                            f"最多{self.api_client.max_concurrency}个并发请求")
+                novels = asyncio.run(self._generate_async(novel_count, parallel_novels))
+            elif self.config.get('scheduler_settings', {}).get('enabled', False):
+                logger.info("调度模式：按依赖关系交错执行各篇小说的阶段")
+                novels = self._generate_scheduled(novel_count)
+            elif parallel_novels > 1 and novel_count > 1:
+                logger.info(f"并行模式：同时生成{min(parallel_novels, novel_count)}篇小说")
+                novels = self._generate_parallel(novel_count, min(parallel_novels, novel_count))
+            elif (self.speculator is not None and novel_count > 1
+                  and self.config.get('pipeline_settings', {}).get('overlap_novels', True)):
+                logger.info("流水线模式：一篇小说最终重写时开始生成下一篇")
+                novels = self._generate_pipelined(novel_count)
+            else:
+                novels = [self._generate_novel(i, novel_count) for i in range(novel_count)]
+                novels = [novel for novel in novels if novel is not None]
             
             # 找出评分最高的小说
             if novels:
                 best_novel = max(novels, key=lambda x: x['score'])
                 logger.info(f"评分最高的小说：{best_novel['score']}分")
                 
-                # 将最佳小说拷贝到输出目录根目录
+                # 将最佳小说拷贝到输出目录根目录（启用产物库时在导出时保存）
                 best_novel_path = os.path.join(
-                    self.config['output_settings']['save_path'],
+                    self.novels_dir,
                     f'{self.config["novel_settings"]["title"]}_best.md'
                 )
-                save_content(best_novel['content'], best_novel_path)
-                logger.success(f"已将最佳小说保存至: {best_novel_path}")
+                if self.artifact_store is None:
+                    save_content(best_novel['content'], best_novel_path)
+                    logger.success(f"已将最佳小说保存至: {best_novel_path}")
+            
+            artifact_settings = self.config.get('artifact_settings', {})
+            if self.artifact_store is not None and artifact_settings.get('export_markdown', True):
+                paths = self.artifact_store.export(self.novels_dir, self.config['novel_settings']['title'],
+                                                   versions=artifact_settings.get('export_versions', False))
+                logger.success(f"已从产物库导出{len(paths)}个文件至: {self.novels_dir}")
             
             logger.success(f"所有小说生成完成！共生成{len(novels)}篇")
+            if self.checkpoint is not None and not self.checkpoint.mark_finished(novel_count):
+                logger.warning(f"部分小说没有完成，可使用 --resume {self.output_dir} 继续")
+            
+            if self.api_client.cache is not None:
+                stats = self.api_client.cache.stats()
+                logger.info(
+                    f"响应缓存：命中{stats['hits']}次，未命中{stats['misses']}次，"
+                    f"共{stats['entries']}条记录（{stats['size_mb']:.1f}MB）"
+                )
             
         except Exception as e:
             logger.error(f"生成过程中发生错误: {str(e)}")
-            logger.exception("详细错误信息：") 
\ No newline at end of file
+            logger.exception("详细错误信息：")
+            
+        # 等待临时文件的写入全部完成
+        self.journal.flush()
+        if self.speculator is not None:
+            self.speculator.close()
+            logger.info(self.speculator.format_stats())
+        
+        # 即使生成中途失败，也输出已完成调用的统计
+        if self.api_client.metrics is not None:
+            table = self.api_client.metrics.format_summary()
+            if table:
+                logger.info(f"各阶段调用统计：\n{table}")
+        if self.api_client.latency.hedged:
+            logger.info(self.api_client.latency.format_stats())
+        if self.length_planner is not None:
+            summary = self.length_planner.format_summary()
+            if summary:
+                logger.info(f"篇幅控制统计：\n{summary}")
+        return novels
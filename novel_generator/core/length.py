@@ -0,0 +1,235 @@
+import re
+import threading
+from typing import Dict, Any, Optional
+from loguru import logger
+from ..utils.token_utils import TokenEstimator, model_chars_per_token
+
+# 各部分占目标字数的默认比例
+DEFAULT_PART_WEIGHTS = {'开篇': 0.2, '发展': 0.3, '高潮': 0.3, '结局': 0.2}
+# 输出较短的阶段默认的生成上限（token），未列出的阶段使用 ai_settings.num_predict
+DEFAULT_STAGE_NUM_PREDICT = {
+    'rating': 600,
+    'feedback': 1000,
+    'analysis': 1500,
+    'summary': 500,
+    'state': 500,
+    'locate': 500
+}
+# 输出为小说正文的阶段，用于校准每token字数，达到生成上限时截去末尾不完整的句子
+PROSE_STAGES = ('content', 'fix', 'segment')
+
+# 句末标点（包括其后的引号）
+_SENTENCE_END = re.compile(r'[。！？!?…]+[”’"」』]?')
+
+def count_chars(text: str) -> int:
+    """统计字数（不含空白）"""
+    return len(re.sub(r'\s', '', text))
+
+def trim_incomplete(text: str) -> str:
+    """
+    截去末尾不完整的句子，用于达到生成上限而被截断的正文
+    
+    Args:
+        text: 正文
+        
+    Returns:
+        截至最后一个句末标点的内容，找不到句末标点时返回原文
+    """
+    ends = list(_SENTENCE_END.finditer(text))
+    if not ends:
+        return text
+    return text[:ends[-1].end()]
+
+class LengthPlanner:
+    def __init__(self, config: Dict[str, Any], estimator: Optional[TokenEstimator] = None):
+        """
+        初始化篇幅规划
+        
+        将 novel_settings.word_count 按比例分配给各部分，按每token字数换算为各次调用的生成上限
+        （num_predict），并为评分、反馈等输出较短的阶段设置较小的上限。每token字数按模型分别从实际生成的
+        正文中校准（各阶段可能使用不同的模型，见 ai_settings.stage_models），同一次运行的所有小说共用。
+        记录各部分的目标字数和实际字数，用于统计篇幅控制的准确度。
+        
+        Args:
+            config: 配置字典
+            estimator: ai_settings.model 的token估算器（可选），不传时按配置创建；该模型的校准结果直接更新该估算器
+        """
+        settings = config.get('length_settings', {})
+        self.word_count = config['novel_settings'].get('word_count', 0)
+        weights = settings.get('part_weights') or DEFAULT_PART_WEIGHTS
+        total = sum(weights.values())
+        self.part_weights = {name: weight / total for name, weight in weights.items()}
+        self.headroom = settings.get('headroom', 1.3)
+        self.tolerance = settings.get('tolerance', 0.25)
+        self.stage_num_predict = {**DEFAULT_STAGE_NUM_PREDICT, **settings.get('stage_num_predict', {})}
+        self.calibrate = settings.get('calibrate', True)
+        self.min_calibration_tokens = settings.get('min_calibration_tokens', 200)
+        self.calibration_alpha = settings.get('calibration_alpha', 0.3)
+        self.model = config['ai_settings']['model']
+        self.estimator = estimator or TokenEstimator.for_config(config)
+        self._estimators = {self.model: self.estimator}  # 模型 -> token估算器
+        self._initial = {self.model: self.estimator.chars_per_token}
+        self._lock = threading.Lock()
+        self._samples = {}  # 模型 -> 校准次数
+        self._records = []  # (名称, 目标字数, 实际字数)
+        
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], estimator: Optional[TokenEstimator] = None) -> Optional['LengthPlanner']:
+        """
+        根据配置创建篇幅规划
+        
+        Args:
+            config: 配置字典
+            estimator: token估算器（可选）
+            
+        Returns:
+            篇幅规划，未启用 length_settings 时返回None
+        """
+        if not config.get('length_settings', {}).get('enabled', False):
+            return None
+        return cls(config, estimator)
+        
+    def part_target(self, part_name: str) -> int:
+        """
+        获取一个部分的目标字数
+        
+        Args:
+            part_name: 部分名称（开篇/发展/高潮/结局）
+            
+        Returns:
+            目标字数，未设置 word_count 时为0
+        """
+        return int(self.word_count * self.part_weights.get(part_name, 0))
+        
+    def estimator_for(self, model: Optional[str] = None) -> TokenEstimator:
+        """
+        获取一个模型的token估算器，首次使用时按模型名称创建
+        
+        Args:
+            model: 模型名称（可选），不传时为 ai_settings.model
+            
+        Returns:
+            token估算器
+        """
+        if model is None:
+            return self.estimator
+        with self._lock:
+            estimator = self._estimators.get(model)
+            if estimator is None:
+                estimator = self._estimators[model] = TokenEstimator(model_chars_per_token(model))
+                self._initial[model] = estimator.chars_per_token
+            return estimator
+            
+    def tokens_for(self, chars: int, model: Optional[str] = None) -> int:
+        """
+        按当前的每token字数计算生成指定字数所需的生成上限（含余量）
+        
+        Args:
+            chars: 字数
+            model: 生成所用的模型（可选），不传时为 ai_settings.model
+            
+        Returns:
+            生成上限（token）
+        """
+        return int(chars / self.estimator_for(model).chars_per_token * self.headroom) + 1
+        
+    def num_predict(self, stage: str, target_chars: Optional[int] = None, model: Optional[str] = None) -> Optional[int]:
+        """
+        获取一次调用的生成上限
+        
+        Args:
+            stage: 调用所属的阶段
+            target_chars: 本次调用的目标字数（可选）
+            model: 调用所用的模型（可选），不传时为 ai_settings.model
+            
+        Returns:
+            生成上限（token）；没有目标字数也没有为该阶段设置上限时返回None，使用 ai_settings.num_predict
+        """
+        if target_chars:
+            return self.tokens_for(target_chars, model)
+        if stage == 'fix' and self.word_count:
+            return self.tokens_for(self.word_count, model)
+        return self.stage_num_predict.get(stage)
+        
+    def observe(self, stage: str, text: str, tokens: int, model: Optional[str] = None):
+        """
+        根据一次正文调用的实际token数校准该模型的每token字数（指数滑动平均）
+        
+        Args:
+            stage: 调用所属的阶段，只使用正文阶段的输出
+            text: 生成的内容
+            tokens: 模型报告的生成token数
+            model: 调用所用的模型（可选），不传时为 ai_settings.model
+        """
+        if not self.calibrate or stage not in PROSE_STAGES or tokens < self.min_calibration_tokens:
+            return
+        estimator = self.estimator_for(model)
+        measured = estimator.measure(text, tokens)
+        if measured is None:
+            return
+        model = model or self.model
+        with self._lock:
+            samples = self._samples.get(model, 0)
+            if samples:
+                measured = self.calibration_alpha * measured + (1 - self.calibration_alpha) * estimator.chars_per_token
+            estimator.chars_per_token = measured
+            self._samples[model] = samples = samples + 1
+        logger.debug(f"{model}的每token字数校准为{measured:.2f}（第{samples}次，本次{stage}调用）")
+        
+    def record(self, name: str, target: int, text: str) -> Optional[float]:
+        """
+        记录一次篇幅控制的结果
+        
+        Args:
+            name: 名称，如部分名称或"全文"
+            target: 目标字数
+            text: 实际生成的内容
+            
+        Returns:
+            相对偏差（实际/目标-1），没有目标字数时返回None
+        """
+        if not target:
+            return None
+        actual = count_chars(text)
+        deviation = actual / target - 1
+        with self._lock:
+            self._records.append((name, target, actual))
+        message = f"{name}篇幅：目标{target}字，实际{actual}字（{deviation:+.0%}）"
+        if abs(deviation) > self.tolerance:
+            logger.warning(f"{message}，超出允许偏差±{self.tolerance:.0%}")
+        else:
+            logger.info(message)
+        return deviation
+        
+    def format_summary(self) -> str:
+        """
+        生成篇幅控制的统计
+        
+        Returns:
+            每行一项（各部分和全文）：次数、平均目标字数、平均实际字数、平均绝对偏差和超出允许偏差的次数，
+            以及各模型每token字数的校准结果；没有记录时返回空字符串
+        """
+        with self._lock:
+            records = list(self._records)
+            samples = dict(self._samples)
+        if not records:
+            return ""
+        names = []
+        for name, _, _ in records:
+            if name not in names:
+                names.append(name)
+        lines = []
+        for name in names:
+            items = [(target, actual) for n, target, actual in records if n == name]
+            deviations = [actual / target - 1 for target, actual in items]
+            outside = sum(1 for d in deviations if abs(d) > self.tolerance)
+            lines.append(
+                f"{name}：{len(items)}次，目标平均{sum(t for t, _ in items) / len(items):.0f}字，"
+                f"实际平均{sum(a for _, a in items) / len(items):.0f}字，"
+                f"平均偏差{sum(abs(d) for d in deviations) / len(deviations):.0%}，"
+                f"超出±{self.tolerance:.0%}的{outside}次"
+            )
+        for model, count in samples.items():
+            lines.append(f"每token字数（{model}）：{self._initial[model]:.2f} → "
+                         f"{self._estimators[model].chars_per_token:.2f}（校准{count}次）")
+        return '\n'.join(lines)
@@ -0,0 +1,136 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, Callable, Optional, Tuple
+from loguru import logger
+
+# 随篇幅校准变化的生成选项，不计入推测调用的键
+CALIBRATED_OPTIONS = ('num_predict', 'num_ctx')
+
+class Speculator:
+    def __init__(self, max_workers: int = 1):
+        """
+        初始化推测执行器
+        
+        在等待其他调用（如获取反馈）的同时，按当前最可能的提示词提前发起生成。推测结果以
+        （阶段, 系统提示词, 用户提示词, 生成选项）为键保存，之后实际需要的提示词与之完全相同时直接使用，
+        否则丢弃。提示词不同说明它所依赖的最佳版本或反馈已经改变，因此推测不会改变版本的选择结果。
+        随篇幅校准变化的生成上限不计入键，由使用方在取出时核对。
+        
+        Args:
+            max_workers: 同时进行的推测调用数
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='speculative')
+        self._lock = threading.Lock()
+        self._pending = {}  # 键 -> (范围, Future)
+        self.launched = 0
+        self.adopted = 0
+        self.discarded = 0
+        
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], max_concurrency: int) -> Optional['Speculator']:
+        """
+        根据配置创建推测执行器
+        
+        Args:
+            config: 配置字典
+            max_concurrency: 所有服务器的总并发请求数
+            
+        Returns:
+            推测执行器；未启用 pipeline_settings 或总并发数不足2时返回None
+        """
+        settings = config.get('pipeline_settings', {})
+        if not settings.get('enabled', False):
+            return None
+        if max_concurrency < 2:
+            # 只有一个并发槽位时，推测调用和重叠执行的调用都会占用实际调用的槽位
+            logger.warning("总并发请求数小于2，不启用流水线")
+            return None
+        return cls(settings.get('max_speculative', 1))
+        
+    @staticmethod
+    def make_key(stage: str, system_prompt: str, user_prompt: str, options: Optional[Dict[str, Any]]) -> Tuple:
+        """
+        计算一次调用的键，提示词和生成选项（生成上限和由其决定的上下文窗口除外）相同的调用键相同
+        
+        Args:
+            stage: 调用所属的阶段
+            system_prompt: 系统提示词
+            user_prompt: 用户提示词
+            options: 生成选项
+            
+        Returns:
+            键
+        """
+        options = {k: v for k, v in (options or {}).items() if k not in CALIBRATED_OPTIONS}
+        return stage, system_prompt, user_prompt, json.dumps(options, sort_keys=True)
+        
+    def launch(self, scope: str, key: Tuple, func: Callable[[], str]) -> bool:
+        """
+        发起一次推测调用
+        
+        Args:
+            scope: 推测所属的范围，如 "outline"、"content:2"，用于整体丢弃
+            key: 调用的键（见 make_key）
+            func: 执行调用的函数
+            
+        Returns:
+            发起时返回True；相同的调用已在进行时返回False
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending[key] = (scope, self._executor.submit(func))
+            self.launched += 1
+        return True
+        
+    def take(self, key: Tuple) -> Optional[Future]:
+        """
+        取出与实际调用相同的推测调用
+        
+        Args:
+            key: 实际调用的键
+            
+        Returns:
+            推测调用的Future，没有时返回None
+        """
+        with self._lock:
+            item = self._pending.pop(key, None)
+            if item is None:
+                return None
+            self.adopted += 1
+        return item[1]
+        
+    def reject(self):
+        """记录一次取出后未被使用的推测调用（推测失败或结果不符合实际调用的要求）"""
+        with self._lock:
+            self.adopted -= 1
+            self.discarded += 1
+            
+    def discard(self, scope: Optional[str] = None) -> int:
+        """
+        丢弃未被使用的推测调用：尚未开始的取消，进行中的结果不再使用
+        
+        Args:
+            scope: 只丢弃该范围的推测调用（可选），不传时丢弃全部
+            
+        Returns:
+            丢弃的推测调用数
+        """
+        with self._lock:
+            keys = [key for key, (s, _) in self._pending.items() if scope is None or s == scope]
+            for key in keys:
+                self._pending.pop(key)[1].cancel()
+            self.discarded += len(keys)
+        if keys:
+            logger.debug(f"丢弃{len(keys)}个未使用的推测生成" + (f"（{scope}）" if scope else ""))
+        return len(keys)
+        
+    def format_stats(self) -> str:
+        """推测调用的统计：发起、使用和丢弃的次数"""
+        return f"推测生成{self.launched}次，使用{self.adopted}次，丢弃{self.discarded}次"
+        
+    def close(self):
+        """丢弃所有未使用的推测调用并关闭线程池，不等待进行中的调用"""
+        self.discard()
+        self._executor.shutdown(wait=False)
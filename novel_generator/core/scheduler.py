@@ -0,0 +1,181 @@
+import time
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Callable, Optional, Iterable
+from loguru import logger
+
+class JobSkipped(Exception):
+    """任务函数抛出此异常时，任务及其下游任务标记为跳过而不是失败"""
+
+class Job:
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+    
+    def __init__(self, name: str, func: Callable[[], Any], deps: Iterable['Job'] = (), novel: Optional[int] = None):
+        """
+        初始化一个调度任务
+        
+        Args:
+            name: 任务名称，用于日志
+            func: 任务函数，不接受参数；依赖任务的结果可通过其 result 属性读取
+            deps: 依赖的任务，全部完成后才会执行
+            novel: 所属小说的序号（可选），优先级相同时序号小的先执行
+        """
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.novel = novel
+        self.children = []
+        self.state = Job.PENDING
+        self.result = None
+        self.error = None
+        self.waiting = len(self.deps)  # 尚未完成的依赖数
+        self.priority = 0              # 下游任务数
+        
+    def __repr__(self) -> str:
+        return f"Job({self.name}, {self.state})"
+
+class StageScheduler:
+    def __init__(self, max_in_flight: int, status_interval: float = 30):
+        """
+        初始化按依赖关系调度生成任务的调度器
+        
+        任务组成一个有向无环图，依赖全部完成的任务进入就绪队列。同时执行的任务数不超过
+        max_in_flight，就绪任务中下游任务最多的优先执行，使推理服务器始终有请求可处理。
+        
+        Args:
+            max_in_flight: 同时执行的最大任务数
+            status_interval: 输出队列状态的间隔（秒）
+        """
+        self.max_in_flight = max(1, max_in_flight)
+        self.status_interval = status_interval
+        self.jobs = []
+        self._order = itertools.count()
+        
+    def add(self, name: str, func: Callable[[], Any], deps: Iterable[Job] = (), novel: Optional[int] = None) -> Job:
+        """
+        添加任务
+        
+        Args:
+            name: 任务名称
+            func: 任务函数
+            deps: 依赖的任务
+            novel: 所属小说的序号（可选）
+            
+        Returns:
+            新任务
+        """
+        job = Job(name, func, deps, novel)
+        for dep in job.deps:
+            dep.children.append(job)
+        self.jobs.append(job)
+        return job
+        
+    def _compute_priorities(self):
+        """计算每个任务的下游任务数（所有直接和间接依赖它的任务）"""
+        descendants = {}
+        
+        def collect(job: Job) -> set:
+            if id(job) not in descendants:
+                result = set()
+                for child in job.children:
+                    result.add(id(child))
+                    result |= collect(child)
+                descendants[id(job)] = result
+            return descendants[id(job)]
+            
+        for job in self.jobs:
+            job.priority = len(collect(job))
+            
+    def _push(self, ready: List, job: Job):
+        # 下游任务多的优先，其次小说序号小的优先，最后按添加顺序
+        novel = job.novel if job.novel is not None else -1
+        heapq.heappush(ready, (-job.priority, novel, next(self._order), job))
+        
+    def _skip_descendants(self, job: Job, log: Callable[[str], None] = logger.warning):
+        """依赖的任务失败或跳过时，跳过所有下游任务"""
+        for child in job.children:
+            if child.state == Job.PENDING:
+                child.state = Job.SKIPPED
+                log(f"任务 {child.name} 的依赖 {job.name} 未完成，跳过")
+                self._skip_descendants(child, log)
+                
+    def counts(self) -> Dict[str, int]:
+        """
+        获取各状态的任务数
+        
+        Returns:
+            就绪、执行中、等待依赖、已完成、失败、跳过的任务数
+        """
+        counts = {'ready': 0, 'running': 0, 'blocked': 0, 'done': 0, 'failed': 0, 'skipped': 0}
+        for job in self.jobs:
+            if job.state == Job.PENDING:
+                counts['ready' if job.waiting == 0 else 'blocked'] += 1
+            else:
+                counts[job.state] += 1
+        return counts
+        
+    def _log_status(self):
+        counts = self.counts()
+        logger.info(
+            f"调度队列：执行中{counts['running']}，就绪{counts['ready']}，等待依赖{counts['blocked']}，"
+            f"已完成{counts['done']}/{len(self.jobs)}"
+            + (f"，失败{counts['failed']}，跳过{counts['skipped']}" if counts['failed'] or counts['skipped'] else "")
+        )
+        
+    def run(self):
+        """执行所有任务，直到全部完成、失败或被跳过"""
+        self._compute_priorities()
+        ready = []
+        for job in self.jobs:
+            if job.waiting == 0:
+                self._push(ready, job)
+                
+        logger.info(f"开始调度{len(self.jobs)}个任务，最多同时执行{self.max_in_flight}个")
+        running = {}
+        last_status = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='job') as executor:
+            while ready or running:
+                while ready and len(running) < self.max_in_flight:
+                    job = heapq.heappop(ready)[-1]
+                    if job.state != Job.PENDING:
+                        continue
+                    job.state = Job.RUNNING
+                    logger.debug(f"开始任务 {job.name}（下游任务{job.priority}个）")
+                    running[executor.submit(job.func)] = job
+                    
+                if not running:
+                    break
+                if time.monotonic() - last_status >= self.status_interval:
+                    self._log_status()
+                    last_status = time.monotonic()
+                    
+                done, _ = wait(running, timeout=self.status_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        job.result = future.result()
+                        job.state = Job.DONE
+                        logger.debug(f"任务 {job.name} 完成")
+                    except JobSkipped as e:
+                        job.state = Job.SKIPPED
+                        logger.info(f"任务 {job.name} 跳过: {str(e)}")
+                        self._skip_descendants(job, logger.debug)
+                        continue
+                    except Exception as e:
+                        job.error = e
+                        job.state = Job.FAILED
+                        logger.error(f"任务 {job.name} 失败: {str(e)}")
+                        logger.exception("详细错误信息：")
+                        self._skip_descendants(job)
+                        continue
+                    for child in job.children:
+                        child.waiting -= 1
+                        if child.waiting == 0 and child.state == Job.PENDING:
+                            self._push(ready, child)
+                            
+        self._log_status()
@@ -0,0 +1,215 @@
+import re
+import json
+from typing import Dict, Any, List, Optional, NamedTuple
+
+# 评分维度及满分，与评分提示词一致
+RATING_DIMENSIONS = {
+    '情节发展': 20,
+    '人物性格一致性': 10,
+    '人物行为合理性': 10,
+    '人物对话特色': 5,
+    '人物成长体现': 5,
+    '主题表达': 20,
+    '写作技巧': 30
+}
+
+# 反馈各部分的权重
+FEEDBACK_SECTIONS = {
+    '优点': 0.3,
+    '需要改进': 0.3,
+    '修改建议': 0.3,
+    '深化建议': 0.1
+}
+
+# 结构化输出使用的 JSON Schema（Ollama 的 format 参数）
+RATING_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        **{name: {'type': 'number', 'minimum': 0, 'maximum': full} for name, full in RATING_DIMENSIONS.items()},
+        '总分': {'type': 'number', 'minimum': 0, 'maximum': 100}
+    },
+    'required': [*RATING_DIMENSIONS, '总分']
+}
+
+FEEDBACK_SCHEMA = {
+    'type': 'object',
+    'properties': {name: {'type': 'array', 'items': {'type': 'string'}} for name in FEEDBACK_SECTIONS},
+    'required': list(FEEDBACK_SECTIONS)
+}
+
+_NUMBER = r'(\d+(?:\.\d+)?)'
+_DIMENSION_PATTERN = re.compile(rf"({'|'.join(RATING_DIMENSIONS)})[（(]\s*{_NUMBER}\s*/")
+
+class Rating(NamedTuple):
+    """评分结果"""
+    total: float                  # 总分（0~100）
+    dimensions: Dict[str, float]  # 各维度得分，模型未给出的维度不包含在内
+
+def _clamp(value: float, upper: float) -> float:
+    return min(max(value, 0.0), float(upper))
+
+def _number(value: Any) -> Optional[float]:
+    """将JSON中的分数转为数字，兼容 "15"、"15/20" 这样的字符串"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = re.match(rf"\s*{_NUMBER}", value)
+        if match:
+            return float(match.group(1))
+    return None
+
+def _rating(dimensions: Dict[str, float], total: Optional[float]) -> Optional[Rating]:
+    """
+    由结构化输出的各维度得分和模型给出的总分得到评分结果
+    
+    所有维度都有得分时以各维度之和为总分，避免模型算错总分导致版本之间无法比较；
+    否则使用模型给出的总分。两者都没有时返回None。
+    """
+    if len(dimensions) == len(RATING_DIMENSIONS):
+        total = sum(dimensions.values())
+    if total is None:
+        return None
+    return Rating(_clamp(total, 100), dimensions)
+
+def load_json(text: str) -> Optional[Dict[str, Any]]:
+    """
+    解析模型输出的JSON对象
+    
+    直接解析失败时做简单修复：去掉对象前后的多余文字（如代码块标记）和末尾多余的逗号。
+    
+    Args:
+        text: 模型输出
+        
+    Returns:
+        JSON对象，无法解析时返回None
+    """
+    candidates = [text]
+    start, end = text.find('{'), text.rfind('}')
+    if 0 <= start < end:
+        candidates.append(text[start:end + 1])
+        candidates.append(re.sub(r',\s*([}\]])', r'\1', text[start:end + 1]))
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+def parse_rating_json(text: str) -> Optional[Rating]:
+    """
+    解析JSON格式的评分结果
+    
+    Args:
+        text: 模型输出
+        
+    Returns:
+        评分结果，无法解析时返回None
+    """
+    data = load_json(text)
+    if data is None:
+        return None
+    dimensions = {}
+    for name, full in RATING_DIMENSIONS.items():
+        value = _number(data.get(name))
+        if value is not None:
+            dimensions[name] = _clamp(value, full)
+    return _rating(dimensions, _number(data.get('总分')))
+
+def parse_rating_text(text: str) -> Optional[Rating]:
+    """
+    解析文本格式的评分结果（"## 情节发展（x/20分）……总分：x/100"）
+    
+    总分取"总分："与其后"/"之间的数字，与模型给出的总分一致；各维度得分只用于记录。
+    
+    Args:
+        text: 模型输出
+        
+    Returns:
+        评分结果，无法解析时返回None
+    """
+    try:
+        total = float(text.split('总分：')[1].split('/')[0])
+    except (IndexError, ValueError):
+        return None
+    dimensions = {}
+    for name, value in _DIMENSION_PATTERN.findall(text):
+        dimensions.setdefault(name, _clamp(float(value), RATING_DIMENSIONS[name]))
+    return Rating(total, dimensions)
+
+def parse_feedback_json(text: str) -> Optional[Dict[str, List[str]]]:
+    """
+    解析JSON格式的重写反馈
+    
+    Args:
+        text: 模型输出
+        
+    Returns:
+        部分名称到意见列表的映射，无法解析或不包含任何部分时返回None
+    """
+    data = load_json(text)
+    if data is None:
+        return None
+    sections = {}
+    for name in FEEDBACK_SECTIONS:
+        items = data.get(name)
+        if isinstance(items, str):
+            items = items.split('\n')
+        if isinstance(items, list):
+            sections[name] = [str(item).strip() for item in items if str(item).strip()]
+    return sections or None
+
+def parse_feedback_text(text: str) -> Dict[str, List[str]]:
+    """
+    解析文本格式的重写反馈
+    
+    与原有的反馈评估方式一致：每个部分取部分名称第一次出现之后、下一个"##"之前的内容，
+    其中的非空行（包括部分名称所在行的剩余文字）都算作该部分的意见。
+    
+    Args:
+        text: 模型输出
+        
+    Returns:
+        部分名称到意见列表的映射，只包含出现过的部分
+    """
+    sections = {}
+    for name in FEEDBACK_SECTIONS:
+        if name in text:
+            content = text.split(name, 1)[1].split('##')[0].strip()
+            sections[name] = [line.strip() for line in content.split('\n') if line.strip()]
+    return sections
+
+def feedback_score(sections: Dict[str, List[str]]) -> float:
+    """
+    根据各部分意见的条数计算反馈质量分数（0~1）
+    
+    每条意见0.2分，每部分最高1分，再按部分权重加权。
+    
+    Args:
+        sections: 部分名称到意见列表的映射
+        
+    Returns:
+        反馈质量分数
+    """
+    return sum(
+        min(len(sections.get(name, [])) * 0.2, 1.0) * weight
+        for name, weight in FEEDBACK_SECTIONS.items()
+    )
+
+def format_feedback(sections: Dict[str, List[str]]) -> str:
+    """
+    将结构化的反馈转为文本，用于重写提示词
+    
+    Args:
+        sections: 部分名称到意见列表的映射
+        
+    Returns:
+        "## 部分名称" 加意见列表的文本
+    """
+    return '\n\n'.join(
+        f"## {name}\n" + '\n'.join(f"- {item}" for item in items)
+        for name, items in sections.items() if items
+    )
@@ -0,0 +1,283 @@
+import re
+import difflib
+from typing import List, Tuple, Optional, NamedTuple
+from ..utils.text_similarity import RepetitionReport, normalize
+from .scoring import load_json
+
+# 定位结果使用的 JSON Schema（Ollama 的 format 参数）
+SEGMENTS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        '片段': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    '开始段落': {'type': 'integer', 'minimum': 1},
+                    '结束段落': {'type': 'integer', 'minimum': 1},
+                    '问题': {'type': 'string'}
+                },
+                'required': ['开始段落', '结束段落', '问题']
+            }
+        }
+    },
+    'required': ['片段']
+}
+
+# 文本格式的定位结果："第3段：……" 或 "第3-5段：……"
+_SEGMENT_LINE = re.compile(r'第\s*(\d+)\s*段?\s*(?:[-~～－—至到]\s*第?\s*(\d+)\s*)?段\s*[：:]\s*(.*)')
+
+class Segment(NamedTuple):
+    """需要重写的一段连续段落"""
+    start: int          # 第一个段落的序号（从0开始）
+    end: int            # 最后一个段落的下一个序号
+    issues: List[str]   # 需要解决的问题
+
+def paragraph_spans(text: str) -> List[Tuple[int, int]]:
+    """
+    找出文本中各段落的位置
+    
+    段落的划分与重复检测一致：每个非空且不以 # 开头的行为一段，位置不含行首尾的空白。
+    
+    Args:
+        text: 小说内容
+        
+    Returns:
+        各段落的（起始位置, 结束位置）
+    """
+    spans = []
+    offset = 0
+    for line in text.split('\n'):
+        stripped = line.strip()
+        if stripped and not stripped.startswith('#'):
+            start = offset + line.index(stripped)
+            spans.append((start, start + len(stripped)))
+        offset += len(line) + 1
+    return spans
+
+def numbered_text(text: str) -> str:
+    """
+    为各段落加上序号（从1开始），用于请模型定位问题所在的段落
+    
+    Args:
+        text: 小说内容
+        
+    Returns:
+        每段以 "[序号] " 开头的文本，标题行保持不变
+    """
+    lines = []
+    number = 0
+    for line in text.split('\n'):
+        stripped = line.strip()
+        if stripped and not stripped.startswith('#'):
+            number += 1
+            lines.append(f"[{number}] {stripped}")
+        elif stripped:
+            lines.append(stripped)
+    return '\n\n'.join(lines)
+
+def _segment(start: int, end: int, issue: str, count: int) -> Optional[Segment]:
+    """由从1开始的段落范围得到片段，超出范围的部分去掉，完全无效时返回None"""
+    start, end = max(start, 1), min(max(start, end), count)
+    if start > count or end < 1:
+        return None
+    return Segment(start - 1, end, [issue.strip()] if issue.strip() else [])
+
+def parse_segments_json(text: str, count: int) -> Optional[List[Segment]]:
+    """
+    解析JSON格式的定位结果
+    
+    Args:
+        text: 模型输出
+        count: 原文的段落数
+        
+    Returns:
+        片段列表（可能为空），无法解析时返回None
+    """
+    data = load_json(text)
+    if data is None or not isinstance(data.get('片段'), list):
+        return None
+    segments = []
+    for item in data['片段']:
+        if not isinstance(item, dict):
+            continue
+        try:
+            start = int(item.get('开始段落'))
+            end = int(item.get('结束段落', start))
+        except (TypeError, ValueError):
+            continue
+        segment = _segment(start, end, str(item.get('问题', '')), count)
+        if segment is not None:
+            segments.append(segment)
+    return segments
+
+def parse_segments_text(text: str, count: int) -> Optional[List[Segment]]:
+    """
+    解析文本格式的定位结果（每行 "第x段：问题" 或 "第x-y段：问题"）
+    
+    Args:
+        text: 模型输出
+        count: 原文的段落数
+        
+    Returns:
+        片段列表，没有找到任何片段时返回None
+    """
+    segments = []
+    for line in text.split('\n'):
+        match = _SEGMENT_LINE.search(line)
+        if match is None:
+            continue
+        start = int(match.group(1))
+        segment = _segment(start, int(match.group(2) or start), match.group(3), count)
+        if segment is not None:
+            segments.append(segment)
+    return segments or None
+
+def repetition_segments(report: RepetitionReport) -> List[Segment]:
+    """
+    将本地检测到的重复内容转为片段：第一次出现的保留，之后出现的段落需要删除或改写
+    
+    Args:
+        report: 重复检测结果
+        
+    Returns:
+        片段列表
+    """
+    segments = []
+    for repetition in report.repetitions:
+        first = repetition.positions[0]
+        quote = repetition.text if len(repetition.text) <= 30 else repetition.text[:30] + '……'
+        for position in sorted(set(repetition.positions[1:])):
+            if position == first:
+                continue
+            if repetition.kind == 'paragraph':
+                issue = f"本段与第{first}段重复，请删除或改写为推进情节的新内容"
+            else:
+                issue = f"“{quote}”在第{first}段已出现，请删除或换一种写法"
+            segments.append(Segment(position - 1, position, [issue]))
+    return segments
+
+def merge_segments(text: str, spans: List[Tuple[int, int]], segments: List[Segment], gap: int = 1) -> List[Segment]:
+    """
+    合并重叠或相距很近的片段
+    
+    片段不跨越标题行：跨越标题的片段在标题处拆开，标题两侧的片段也不合并，
+    保证拼接时标题原样保留。
+    
+    Args:
+        text: 小说内容
+        spans: 各段落的位置（见 paragraph_spans）
+        segments: 片段列表
+        gap: 间隔不超过该段落数的片段合并为一个
+        
+    Returns:
+        按位置排序的片段列表
+    """
+    # 标题行之后的第一个段落序号
+    breaks = {i for i in range(1, len(spans)) if text[spans[i - 1][1]:spans[i][0]].strip()}
+    pieces = []
+    for segment in segments:
+        start = segment.start
+        for i in range(segment.start + 1, segment.end):
+            if i in breaks:
+                pieces.append(Segment(start, i, segment.issues))
+                start = i
+        pieces.append(Segment(start, segment.end, segment.issues))
+        
+    merged = []
+    for segment in sorted(pieces):
+        if merged:
+            last = merged[-1]
+            crosses = any(last.end <= i <= segment.start for i in breaks)
+            if segment.start <= last.end + gap and not crosses:
+                issues = last.issues + [issue for issue in segment.issues if issue not in last.issues]
+                merged[-1] = Segment(last.start, max(last.end, segment.end), issues)
+                continue
+        merged.append(segment)
+    return merged
+
+def anchor_rewrite(original: List[str], rewritten: str, before: List[str] = (), after: List[str] = ()) -> List[str]:
+    """
+    将重写后的片段与原片段对齐
+    
+    去掉模型照抄的上下文段落；与原文相同（忽略标点和空白）的段落使用原文，
+    保证未修改的内容逐字不变。
+    
+    Args:
+        original: 原片段的各段落
+        rewritten: 模型输出的重写结果
+        before: 片段之前的上下文段落
+        after: 片段之后的上下文段落
+        
+    Returns:
+        重写后的各段落
+    """
+    paragraphs = [line.strip() for line in rewritten.split('\n')
+                  if line.strip() and not line.strip().startswith(('#', '【'))]
+    keys = [normalize(p) for p in paragraphs]
+    context_before = {normalize(p) for p in before}
+    context_after = {normalize(p) for p in after}
+    while keys and keys[0] in context_before:
+        keys.pop(0)
+        paragraphs.pop(0)
+    while keys and keys[-1] in context_after:
+        keys.pop()
+        paragraphs.pop()
+        
+    matcher = difflib.SequenceMatcher(None, [normalize(p) for p in original], keys, autojunk=False)
+    result = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        result.extend(original[i1:i2] if tag == 'equal' else paragraphs[j1:j2])
+    return result
+
+def _gap(text: str, spans: List[Tuple[int, int]], index: int) -> Optional[Tuple[int, int]]:
+    """第 index-1 段与第 index 段之间分隔的位置，序号超出范围或中间有标题行时返回None"""
+    if index <= 0 or index >= len(spans):
+        return None
+    start, end = spans[index - 1][1], spans[index][0]
+    return (start, end) if not text[start:end].strip() else None
+
+def splice(text: str, spans: List[Tuple[int, int]], replacements: List[Tuple[Segment, List[str]]]) -> str:
+    """
+    将重写后的片段拼回原文
+    
+    只替换各片段第一段开头到最后一段结尾之间的文字，片段以外的内容逐字保留。
+    片段内各段落之间使用原文的分隔（如空行、段首缩进）。
+    
+    Args:
+        text: 小说内容
+        spans: 各段落的位置（见 paragraph_spans）
+        replacements: （片段, 重写后的各段落）的列表，片段之间不能重叠；段落列表为空表示删除该片段
+        
+    Returns:
+        拼接后的内容
+    """
+    for segment, paragraphs in sorted(replacements, key=lambda item: item[0].start, reverse=True):
+        start, end = spans[segment.start][0], spans[segment.end - 1][1]
+        gaps = [_gap(text, spans, i) for i in (segment.start + 1, segment.end, segment.start)]
+        separator = next((text[a:b] for a, b in filter(None, gaps)), '\n\n')
+        if not paragraphs:
+            # 删除整个片段时连同一侧的分隔一起删除
+            if gaps[1] is not None:
+                end = gaps[1][1]
+            elif gaps[2] is not None:
+                start = gaps[2][0]
+        text = text[:start] + separator.join(paragraphs) + text[end:]
+    return text
+
+def coverage(spans: List[Tuple[int, int]], segments: List[Segment]) -> float:
+    """
+    片段占全文的比例（按字符数）
+    
+    Args:
+        spans: 各段落的位置
+        segments: 片段列表
+        
+    Returns:
+        0~1之间的比例
+    """
+    total = sum(end - start for start, end in spans)
+    if not total:
+        return 0.0
+    covered = sum(spans[i][1] - spans[i][0] for segment in segments for i in range(segment.start, segment.end))
+    return covered / total
@@ -0,0 +1,73 @@
+from typing import Dict, Any, List, Callable, Awaitable, Generator, NamedTuple, Optional, TypeVar, Union
+
+# 写作器的阶段逻辑写成生成器：需要调用模型时产出 Call 并收到生成的内容，需要并发执行几段逻辑时
+# 产出 Parallel 并收到各段逻辑的结果列表，调用失败时异常在产出处抛出。
+# 同一段逻辑既可以由 run 在线程中执行，也可以由 arun 在事件循环中执行，重写、选择和评分的逻辑只有一份。
+
+T = TypeVar('T')
+
+class Call(NamedTuple):
+    """一次模型调用，参数与 NovelWriter._generate 相同"""
+    stage: str
+    system_prompt: str
+    user_prompt: str = ""
+    options: Optional[Dict[str, Any]] = None
+    response_format: Optional[Any] = None
+    labels: Dict[str, Any] = {}
+
+class Parallel(NamedTuple):
+    """并发执行的几段阶段逻辑"""
+    tasks: List['Steps']
+    max_workers: int  # 使用线程执行时的最大线程数
+    name: str         # 线程名前缀
+
+Steps = Generator[Union[Call, Parallel], Any, T]
+
+def run(task: Steps[T], call: Callable[[Call], str], parallel: Callable[[Parallel], List[Any]]) -> T:
+    """
+    在当前线程中执行一段阶段逻辑
+    
+    Args:
+        task: 阶段逻辑
+        call: 执行一次模型调用的函数
+        parallel: 并发执行几段阶段逻辑的函数
+    
+    Returns:
+        阶段逻辑的结果
+    """
+    value, error = None, None
+    while True:
+        try:
+            step = task.throw(error) if error is not None else task.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value, error = None, None
+        try:
+            value = parallel(step) if isinstance(step, Parallel) else call(step)
+        except Exception as e:
+            error = e
+
+async def arun(task: Steps[T], call: Callable[[Call], Awaitable[str]],
+               parallel: Callable[[Parallel], Awaitable[List[Any]]]) -> T:
+    """
+    在事件循环中执行一段阶段逻辑，见 run
+    
+    Args:
+        task: 阶段逻辑
+        call: 执行一次模型调用的协程函数
+        parallel: 并发执行几段阶段逻辑的协程函数
+    
+    Returns:
+        阶段逻辑的结果
+    """
+    value, error = None, None
+    while True:
+        try:
+            step = task.throw(error) if error is not None else task.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value, error = None, None
+        try:
+            value = await (parallel(step) if isinstance(step, Parallel) else call(step))
+        except Exception as e:
+            error = e
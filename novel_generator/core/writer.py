@@ -1,246 +1,1381 @@
-from typing import Dict, Any, Tuple
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple, Callable, Optional, TypeVar
 from loguru import logger
 from ..utils.api_utils import OllamaAPI
+from ..utils.async_api_utils import AsyncOllamaAPI
+from ..utils.checkpoint_utils import RunManifest
+from ..utils.token_utils import PromptAssembler, PromptBudgetError, PromptSection, TokenEstimator
 from ..utils.file_utils import save_content, get_unique_filename
+from ..utils.artifact_store import ArtifactStore
+from ..utils.journal import JournalWriter
+from ..utils.text_similarity import RepetitionDetector, RepetitionReport, SimilarityIndex
 from .. import prompts
+from .budget import RewriteBudget
+from .length import LengthPlanner, PROSE_STAGES, trim_incomplete
+from .pipeline import Speculator
+from .steps import Call, Parallel, Steps
+from . import scoring
+from . import segments
+from . import steps
+
+T = TypeVar('T')
 
 class NovelWriter:
-    def __init__(self, config: Dict[str, Any], api_client: OllamaAPI):
+    # 小说内容分四个部分生成
+    CONTENT_PARTS = ['开篇', '发展', '高潮', '结局']
+    
+    def __init__(self, config: Dict[str, Any], api_client: OllamaAPI, novel_index: int = 0,
+                 checkpoint: Optional[RunManifest] = None, similarity_index: Optional[SimilarityIndex] = None,
+                 length_planner: Optional[LengthPlanner] = None, artifact_store: Optional[ArtifactStore] = None,
+                 journal: Optional[JournalWriter] = None, speculator: Optional[Speculator] = None,
+                 async_api_client: Optional[AsyncOllamaAPI] = None):
         """
         初始化小说写作器
         
         Args:
             config: 配置字典
             api_client: API客户端
+            novel_index: 当前小说的序号（从0开始）
+            checkpoint: 运行清单（可选），用于记录已完成的阶段并在恢复运行时跳过
+            similarity_index: 相似度索引（可选），用于记录各部分内容并提示与其他小说雷同的部分
+            length_planner: 篇幅规划（可选），多篇小说共用以共享每token字数的校准结果；
+                不传时按配置创建
+            artifact_store: 运行产物库（可选），启用时记录每个版本及其反馈和评分，
+                大纲和人物设定不再直接写入文件，由产物库在运行结束时导出
+            journal: 临时文件的写入器（可选），多篇小说共用一个后台写入线程；不传时按配置创建
+            speculator: 推测执行器（可选），由生成器按 pipeline_settings 创建，多篇小说共用
+            async_api_client: 异步API客户端（可选），在事件循环中执行阶段逻辑（arun、agenerate_*）时使用
         """
         self.config = config
         self.api_client = api_client
+        self.async_api_client = async_api_client
+        self.novel_index = novel_index
+        self.checkpoint = checkpoint
+        self.similarity_index = similarity_index
+        self.artifact_store = artifact_store
+        self.journal = journal if journal is not None else JournalWriter.from_config(config)
+        
+        # 流水线（可选）：获取反馈的同时推测生成下一版本，最后一次重写的同时起草下一部分
+        self.speculator = speculator
+        pipeline_settings = config.get('pipeline_settings', {})
+        self.speculate_versions = pipeline_settings.get('speculate_versions', True)
+        self.speculate_parts = pipeline_settings.get('speculate_parts', True)
+        self.budget = RewriteBudget(config)
+        self.length_planner = length_planner if length_planner is not None else LengthPlanner.from_config(config)
+        
+        # 评分和反馈的结构化输出（可选）：要求模型按JSON输出，解析失败时请模型整理为JSON
+        scoring_settings = config.get('scoring_settings', {})
+        self.structured_output = scoring_settings.get('structured_output', False)
+        self.json_schema = scoring_settings.get('json_schema', True)
+        self.repair_retries = scoring_settings.get('repair_retries', 1)
+        
+        # 本地重复检测（可选）：结果传给最终重写的分析，文本没有重复时分析不再查找重复
+        self.repetition_detector = RepetitionDetector.from_config(config)
+        repetition_settings = config.get('repetition_settings', {})
+        self.skip_clean_repetitions = repetition_settings.get('skip_clean', True)
+        self.repetition_max_items = repetition_settings.get('max_items', 20)
+        
+        # 片段重写（可选）：最终重写只重写分析结果指出问题的段落，其余内容原样保留
+        segment_settings = config.get('segment_rewrite_settings', {})
+        self.segment_rewrite = segment_settings.get('enabled', False)
+        self.segment_context = segment_settings.get('context_paragraphs', 1)
+        self.segment_merge_gap = segment_settings.get('merge_gap', 1)
+        self.max_segments = segment_settings.get('max_segments', 8)
+        self.max_segment_coverage = segment_settings.get('max_coverage', 0.5)
+        self.segment_length_ratio = segment_settings.get('length_ratio', 1.5)
+        self.segment_workers = segment_settings.get('max_workers') or api_client.max_concurrency
+        if self.length_planner is not None:
+            self.estimator = self.length_planner.estimator
+        else:
+            self.estimator = TokenEstimator.for_config(config)
+        
+        # 按token预算组装提示词（可选），保证提示词和生成内容不超出上下文窗口
+        self.assembler = None
+        if config.get('prompt_budget', {}).get('enabled', False):
+            self.assembler = PromptAssembler(config, self.estimator)
+        
+    def _load_stage(self, stage: str) -> Optional[Dict[str, Any]]:
+        """读取检查点中已完成的阶段结果，未启用检查点或未记录时返回None"""
+        if self.checkpoint is None:
+            return None
+        return self.checkpoint.get_stage(self.novel_index, stage)
+        
+    def _save_stage(self, stage: str, result: Dict[str, Any]):
+        """将阶段结果写入检查点"""
+        if self.checkpoint is not None:
+            self.checkpoint.record_stage(self.novel_index, stage, result)
+        
+    def _record_version(self, kind: str, content: str, feedback: Optional[str] = None,
+                        score: Optional[float] = None, **labels) -> Optional[int]:
+        """
+        将一个版本记录到产物库，未启用产物库时不做任何事
+        
+        Args:
+            kind: 内容类型（outline/characters/content/final）
+            content: 内容
+            feedback: 反馈或分析（可选）
+            score: 评分（可选）
+            **labels: 调用标签，part 作为部分序号，其余记为来源信息
+            
+        Returns:
+            版本的id，未启用产物库时返回None
+        """
+        if self.artifact_store is None:
+            return None
+        return self.artifact_store.add(
+            self.novel_index, kind, content, part=labels.get('part', 0), feedback=feedback, score=score,
+            provenance={'model': self._model_for(kind, labels.get('mode')), **labels}
+        )
+        
+    def _select_version(self, kind: str, content: str, **labels):
+        """在产物库中将该内容标记为被选用的版本，未启用产物库时不做任何事"""
+        if self.artifact_store is not None:
+            self.artifact_store.select(self.novel_index, kind, content, part=labels.get('part', 0),
+                                       provenance={'model': self._model_for(kind, labels.get('mode')), **labels})
+                                       
+    def _model_for(self, kind: str, mode: Optional[str] = None) -> str:
+        """生成一类内容的模型（见 ai_settings.stage_models），最终重写按片段重写或整篇重写的阶段确定"""
+        if kind == 'final':
+            return self.api_client.model_for('segment' if mode == 'segments' else 'fix')
+        return self.api_client.model_for(kind)
+        
+    def _generate(self, stage: str, system_prompt: str, user_prompt: str = "",
+                  options: Optional[Dict[str, Any]] = None, response_format: Optional[Any] = None,
+                  **labels) -> str:
+        """
+        调用API生成内容，并附带阶段和调用标签
+        
+        Args:
+            stage: 调用所属的阶段
+            system_prompt: 系统提示词
+            user_prompt: 用户提示词（可选）
+            options: 覆盖默认生成选项的参数（可选）
+            response_format: 输出格式（可选），"json" 或 JSON Schema
+            **labels: 调用标签，如重写轮次、候选序号；on_token、on_restart 会作为流式回调传入
+            
+        Returns:
+            生成的内容
+        """
+        on_token = labels.pop('on_token', None)
+        on_restart = labels.pop('on_restart', None)
+        options, trim, untrimmed = self._prepare_call(stage, options)
+        response = self.api_client.generate(
+            system_prompt,
+            user_prompt,
+            on_token=on_token,
+            stage=stage,
+            labels={'novel': self.novel_index, **labels},
+            options=options,
+            response_format=response_format,
+            on_restart=on_restart,
+            on_truncated=trim
+        )
+        self._finish_call(stage, response, untrimmed, self.api_client.last_call(), labels)
+        return response
         
-    def _get_rewrite_feedback(self, content_type: str, content: str) -> str:
+    def _prepare_call(self, stage: str, options: Optional[Dict[str, Any]]
+                      ) -> Tuple[Optional[Dict[str, Any]], Optional[Callable[[str], str]], List[str]]:
+        """
+        准备一次调用：按篇幅规划设置生成上限，正文阶段达到上限时截去不完整的句子
+        
+        Returns:
+            （生成选项, 达到上限时处理结果的函数, 截去之前的原文列表）
+        """
+        if self.length_planner is not None and 'num_predict' not in (options or {}):
+            num_predict = self.length_planner.num_predict(stage, model=self.api_client.model_for(stage))
+            if num_predict:
+                options = {**(options or {}), 'num_predict': num_predict}
+                
+        untrimmed = []
+        def trim(text: str) -> str:
+            # 在写入响应缓存之前截去，命中缓存时得到相同的结果
+            untrimmed.append(text)
+            trimmed = trim_incomplete(text)
+            logger.warning(f"{stage}达到生成上限（{options['num_predict']}个token），"
+                           f"截去末尾不完整的句子（{len(text) - len(trimmed)}字符）")
+            return trimmed
+            
+        return options, trim if self.length_planner is not None and stage in PROSE_STAGES else None, untrimmed
+        
+    def _finish_call(self, stage: str, response: str, untrimmed: List[str], record: Optional[Dict[str, Any]],
+                     labels: Dict[str, Any]):
+        """按调用的统计记录计入重写预算并校准每token字数"""
+        if record is not None and not labels.get('speculative'):
+            # 推测生成在被使用时才计入重写预算（见 _take_speculative）
+            self.budget.add_tokens(record['eval_count'])
+        if self.length_planner is not None and record is not None and not record['cached']:
+            # 按实际生成的全部文本校准该模型的每token字数
+            self.length_planner.observe(stage, untrimmed[0] if untrimmed else response, record['eval_count'],
+                                        model=record['model'])
+        
+    @staticmethod
+    def _call(stage: str, system_prompt: str, user_prompt: str = "", options: Optional[Dict[str, Any]] = None,
+              response_format: Optional[Any] = None, **labels) -> Call:
+        """阶段逻辑中的一次模型调用，参数见 _generate"""
+        return Call(stage, system_prompt, user_prompt, options, response_format, labels)
+        
+    def run(self, task: Steps[T]) -> T:
+        """
+        在当前线程中执行一段阶段逻辑（如 outline_steps），调用通过 api_client 发送，并发部分使用线程池
+        
+        Args:
+            task: 阶段逻辑
+            
+        Returns:
+            阶段逻辑的结果
+        """
+        return steps.run(task, self._perform, self._perform_parallel)
+        
+    def _perform(self, call: Call) -> str:
+        return self._generate(call.stage, call.system_prompt, call.user_prompt, options=call.options,
+                              response_format=call.response_format, **call.labels)
+                              
+    def _perform_parallel(self, parallel: Parallel) -> List[Any]:
+        workers = max(1, min(parallel.max_workers, len(parallel.tasks)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=parallel.name) as executor:
+            return list(executor.map(self.run, parallel.tasks))
+            
+    async def arun(self, task: Steps[T]) -> T:
+        """
+        在事件循环中执行一段阶段逻辑，调用通过 async_api_client 发送，并发部分使用 asyncio.gather
+        
+        不使用流式输出和推测生成：流式回调被忽略，临时文件只在各部分完成时写入。
+        
+        Args:
+            task: 阶段逻辑
+            
+        Returns:
+            阶段逻辑的结果
+        """
+        return await steps.arun(task, self._aperform, self._aperform_parallel)
+        
+    async def _aperform(self, call: Call) -> str:
+        labels = {k: v for k, v in call.labels.items() if k not in ('on_token', 'on_restart')}
+        return await self._agenerate(call.stage, call.system_prompt, call.user_prompt, options=call.options,
+                                     response_format=call.response_format, **labels)
+                                     
+    async def _aperform_parallel(self, parallel: Parallel) -> List[Any]:
+        return list(await asyncio.gather(*(self.arun(task) for task in parallel.tasks)))
+        
+    async def _agenerate(self, stage: str, system_prompt: str, user_prompt: str = "",
+                         options: Optional[Dict[str, Any]] = None, response_format: Optional[Any] = None,
+                         **labels) -> str:
+        """通过异步客户端调用API生成内容，见 _generate"""
+        if self.async_api_client is None:
+            raise RuntimeError("在事件循环中执行需要 async_api_client")
+        options, trim, untrimmed = self._prepare_call(stage, options)
+        response = await self.async_api_client.generate(
+            system_prompt,
+            user_prompt,
+            stage=stage,
+            labels={'novel': self.novel_index, **labels},
+            options=options,
+            response_format=response_format,
+            on_truncated=trim
+        )
+        self._finish_call(stage, response, untrimmed, self.async_api_client.last_call(), labels)
+        return response
+        
+    def _speculate(self, content_type: str, system_prompt: str, user_prompt: str, options: Dict[str, Any],
+                   **labels):
+        """
+        按给定的提示词提前发起生成，之后实际需要完全相同的提示词时使用其结果
+        
+        Args:
+            content_type: 内容类型（outline/characters/content）
+            system_prompt: 系统提示词
+            user_prompt: 用户提示词
+            options: 生成选项
+            **labels: 调用标签，part 同时用于确定推测所属的范围
+        """
+        def draft() -> Dict[str, Any]:
+            text = self._generate(content_type, system_prompt, user_prompt, options=options, speculative=True,
+                                  **labels)
+            record = self.api_client.last_call()
+            return {'text': text, 'eval_count': record['eval_count'] if record is not None else 0,
+                    'num_predict': (options or {}).get('num_predict')}
+            
+        key = Speculator.make_key(content_type, system_prompt, user_prompt, options)
+        scope = f"{self.novel_index}:{content_type}:{labels.get('part', 0)}"
+        launched = self.speculator.launch(scope, key, draft)
+        if launched:
+            logger.debug(f"推测生成{content_type}（{', '.join(f'{k}={v}' for k, v in labels.items())}）")
+            
+    def _take_speculative(self, content_type: str, system_prompt: str, user_prompt: str,
+                          options: Dict[str, Any]) -> Optional[str]:
+        """
+        取出与实际提示词完全相同的推测生成结果
+        
+        推测后篇幅校准可能改变了生成上限：推测结果超出当前的上限，或因较小的旧上限被截断时重新生成。
+        使用的推测结果在此时计入重写预算。
+        
+        Returns:
+            推测生成的内容，没有相同的推测、推测失败或篇幅不符合当前的生成上限时返回None
+        """
+        if self.speculator is None:
+            return None
+        future = self.speculator.take(Speculator.make_key(content_type, system_prompt, user_prompt, options))
+        if future is None:
+            return None
+        try:
+            draft = future.result()
+        except Exception as e:
+            logger.warning(f"推测生成失败，重新生成: {str(e)}")
+            self.speculator.reject()
+            return None
+        limit = (options or {}).get('num_predict')
+        drafted_limit = draft['num_predict']
+        if limit != drafted_limit:
+            truncated = drafted_limit and draft['eval_count'] >= drafted_limit
+            if (limit and draft['eval_count'] > limit) or (truncated and (not limit or limit > drafted_limit)):
+                logger.info(f"推测生成的篇幅（{draft['eval_count']}个token）不符合当前的生成上限（{limit}个token），重新生成")
+                self.speculator.reject()
+                return None
+        self.budget.add_tokens(draft['eval_count'])
+        logger.info("使用推测生成的版本（提示词与推测时相同）")
+        return draft['text']
+        
+    def _assemble(self, stage: str, builder: Callable[..., Tuple[str, str]], sections: List[PromptSection],
+                  feedback: Optional[str] = None, num_predict: Optional[int] = None) -> Tuple[str, str, Dict[str, Any]]:
+        """
+        组装提示词，启用 prompt_budget 时保证其不超出上下文窗口
+        
+        Args:
+            stage: 调用所属的阶段
+            builder: 以各段内容为关键字参数，返回（系统提示词, 用户提示词）的函数
+            sections: 可变内容列表
+            feedback: 需要加入提示词的修改建议（可选）
+            num_predict: 本次调用的生成上限（可选），不传时使用篇幅规划中该阶段的上限或 ai_settings.num_predict
+            
+        Returns:
+            （系统提示词, 用户提示词, 生成选项）
+        """
+        if feedback is not None:
+            sections = list(sections) + [PromptSection('feedback', feedback, weight=0.5)]
+            
+        def build(texts: Dict[str, str]) -> Tuple[str, str]:
+            texts = dict(texts)
+            suggestion = texts.pop('feedback', None)
+            system_prompt, user_prompt = builder(**texts)
+            if suggestion is not None:
+                system_prompt, user_prompt = self._with_feedback(system_prompt, user_prompt, suggestion)
+            return system_prompt, user_prompt
+            
+        model = self.api_client.model_for(stage)
+        if num_predict is None and self.length_planner is not None:
+            num_predict = self.length_planner.num_predict(stage, model=model)
+        options = {'num_predict': num_predict} if num_predict else {}
+        if self.assembler is None:
+            return (*build({s.name: s.text for s in sections}), options)
+            
+        # 按该阶段实际使用的模型估算token数（见 ai_settings.stage_models）
+        estimator = self.length_planner.estimator_for(model) if self.length_planner is not None else None
+        num_predict = num_predict or self.config['ai_settings']['num_predict']
+        overhead = "".join(build({s.name: "" for s in sections}))
+        system_prompt, user_prompt = build(self.assembler.fit(sections, overhead, num_predict, stage, estimator))
+        if self.assembler.adaptive_num_ctx:
+            options['num_ctx'] = self.assembler.pick_num_ctx(system_prompt + user_prompt, num_predict, estimator)
+        return system_prompt, user_prompt, options
+        
+    def _response_format(self, schema: Dict[str, Any]) -> Optional[Any]:
+        """结构化输出时请求的 format 参数：JSON Schema 或 "json"，未启用时为None"""
+        if not self.structured_output:
+            return None
+        return schema if self.json_schema else 'json'
+        
+    def _parse_with_repair(self, stage: str, text: str, parse: Callable[[str], Any], parse_json: Callable[[str], Any],
+                           schema: Dict[str, Any], json_format: str, **labels) -> Steps[Any]:
+        """
+        解析模型输出，失败时请模型将原输出整理为JSON再解析
+        
+        整理只需要原输出而不需要原文，比重新评分或重新获取反馈的开销小得多。
+        
+        Args:
+            stage: 调用所属的阶段
+            text: 模型输出
+            parse: 解析原输出的函数，失败时返回None
+            parse_json: 解析整理后JSON的函数，失败时返回None
+            schema: 整理时使用的 JSON Schema
+            json_format: 提示词中的JSON格式说明
+            **labels: 调用标签
+            
+        Returns:
+            解析结果，整理后仍无法解析时返回None
+        """
+        result = parse(text)
+        for attempt in range(1, self.repair_retries + 1):
+            if result is not None:
+                break
+            logger.warning(f"解析{stage}结果失败，第{attempt}次请模型整理为JSON...")
+            try:
+                text = yield self._call(
+                    stage,
+                    prompts.base.get_json_repair_prompt(json_format),
+                    prompts.base.get_json_repair_user_prompt(text),
+                    response_format=schema if self.json_schema else 'json',
+                    repair=attempt,
+                    **labels
+                )
+            except Exception as e:
+                logger.error(f"整理{stage}结果时发生错误: {str(e)}")
+                break
+            result = parse_json(text)
+        return result
+        
+    def _get_rating(self, content: str, truncate: bool = False, **labels) -> Steps[scoring.Rating]:
+        """
+        获取对小说内容的评分
+        
+        Args:
+            content: 待评分的内容
+            truncate: 超出上下文窗口时是否截断内容（只对开头部分评分），否则抛出 PromptBudgetError
+            **labels: 调用标签，如重写轮次
+            
+        Returns:
+            评分结果（总分0~100和各维度得分），无法解析时总分为0
+        """
+        get_prompt = prompts.base.get_rating_json_prompt if self.structured_output else prompts.base.get_rating_prompt
+        system_prompt, user_prompt, options = self._assemble(
+            'rating',
+            lambda content: (get_prompt(), prompts.base.get_rating_user_prompt(content)),
+            [PromptSection('content', content, required=not truncate)]
+        )
+        result = yield self._call('rating', system_prompt, user_prompt, options=options,
+                                  response_format=self._response_format(scoring.RATING_SCHEMA), **labels)
+        if self.structured_output:
+            rating = yield from self._parse_with_repair(
+                'rating', result,
+                scoring.parse_rating_json,
+                scoring.parse_rating_json,
+                scoring.RATING_SCHEMA,
+                prompts.base.get_rating_json_format(),
+                **labels
+            )
+        else:
+            rating = scoring.parse_rating_text(result)
+        if rating is None:
+            logger.warning("解析评分失败，设置为0分")
+            return scoring.Rating(0.0, {})
+        logger.debug(f"各维度评分：{rating.dimensions}")
+        return rating
+        
+    def _feedback_prompt(self, content_type: str, content: str) -> Tuple[str, str, Dict[str, Any]]:
+        """构建获取重写反馈的提示词（系统提示词, 用户提示词, 生成选项）"""
+        if self.structured_output:
+            get_prompt = prompts.rewrite.get_rewrite_feedback_json_prompt
+        else:
+            get_prompt = prompts.rewrite.get_rewrite_feedback_prompt
+        return self._assemble(
+            'feedback',
+            lambda content: (
+                get_prompt(content_type),
+                prompts.rewrite.get_rewrite_user_prompt(content_type, content)
+            ),
+            [PromptSection('content', content, required=True)]
+        )
+        
+    def _get_rewrite_feedback(self, content_type: str, content: str, **labels) -> Steps[str]:
         """
         获取重写反馈
         
+        结构化输出时反馈按JSON解析后转为"## 部分名称"加意见列表的文本，与文本格式的反馈一致。
+        
         Args:
             content_type: 内容类型（outline/characters/content）
             content: 需要获取反馈的内容
+            **labels: 调用标签，如重写轮次、部分序号
             
         Returns:
             反馈内容
         """
         try:
             logger.info(f"正在获取{content_type}的重写反馈...")
-            system_prompt = prompts.rewrite.get_rewrite_feedback_prompt(content_type)
-            user_prompt = prompts.rewrite.get_rewrite_user_prompt(content_type, content)
-            feedback = self.api_client.generate(system_prompt, user_prompt)
-            return feedback
+            system_prompt, user_prompt, options = self._feedback_prompt(content_type, content)
+            feedback = yield self._call('feedback', system_prompt, user_prompt, options=options,
+                                        response_format=self._response_format(scoring.FEEDBACK_SCHEMA), **labels)
+            if not self.structured_output:
+                return feedback
+                
+            sections = yield from self._parse_with_repair(
+                'feedback', feedback,
+                scoring.parse_feedback_json,
+                scoring.parse_feedback_json,
+                scoring.FEEDBACK_SCHEMA,
+                prompts.rewrite.get_feedback_json_format(),
+                **labels
+            )
+            if sections is None:
+                logger.warning("解析重写反馈失败，使用原始反馈")
+                return feedback
+            return scoring.format_feedback(sections)
         except Exception as e:
             logger.error(f"获取重写反馈时发生错误: {str(e)}")
             return ""
-
+    
     def _evaluate_feedback(self, feedback: str) -> float:
         """评估反馈的质量分数"""
-        try:
-            # 分析反馈中的关键部分
-            sections = {
-                "优点": 0.3,      # 权重0.3
-                "需要改进": 0.3,  # 权重0.3
-                "修改建议": 0.3,  # 权重0.3
-                "深化建议": 0.1   # 权重0.1
-            }
-            
-            score = 0.0
-            for section, weight in sections.items():
-                if section in feedback:
-                    # 计算该部分的有效内容（去除标题和空行）
-                    section_content = feedback.split(section)[1].split("##")[0].strip()
-                    content_lines = [line.strip() for line in section_content.split('\n') if line.strip()]
-                    
-                    # 根据内容的具体性和深度评分
-                    content_score = min(len(content_lines) * 0.2, 1.0)  # 每点0.2分，最高1分
-                    score += content_score * weight
+        score = scoring.feedback_score(scoring.parse_feedback_text(feedback))
+        logger.debug(f"反馈质量评分：{score:.2f}")
+        return score
             
-            logger.debug(f"反馈质量评分：{score:.2f}")
-            return score
+    def _stable_prefix(self) -> bool:
+        """是否使用固定前缀布局（chat模式下固定内容放在系统消息，变化内容放在用户消息）"""
+        return self.config['ai_settings'].get('api_mode', 'generate') == 'chat'
+        
+    def _with_feedback(self, system_prompt: str, user_prompt: str, feedback: str) -> Tuple[str, str]:
+        """
+        在提示词中加入修改建议
+        
+        固定前缀布局下追加到用户提示词末尾，保持系统提示词不变以便复用缓存；
+        否则按原有方式追加到系统提示词。
+        """
+        suggestion = f"参考以下修改建议：\n{feedback}"
+        if self._stable_prefix():
+            return system_prompt, f"{user_prompt}\n\n{suggestion}" if user_prompt else suggestion
+        return system_prompt + f"\n\n{suggestion}", user_prompt
+        
+    def _temp_path(self) -> str:
+        """生成中小说的临时文件路径"""
+        return os.path.join(self.config['output_settings']['save_path'], f'{self.config["novel_settings"]["title"]}_temp.md')
+        
+    def _journal_base(self, temp_path: str, content: str) -> int:
+        """
+        确保临时文件的内容为已确定的前文，之后只需在其后追加
+        
+        Args:
+            temp_path: 临时文件路径
+            content: 已确定的前文内容，为空时清空上次运行残留的临时文件
             
-        except Exception as e:
-            logger.error(f"评估反馈质量时发生错误: {str(e)}")
-            return 0.0
+        Returns:
+            已确定内容的字节数，放弃流式版本时截断到该长度
+        """
+        committed = len(content.encode('utf-8'))
+        if not content or self.journal.size(temp_path) != committed:
+            self.journal.write(temp_path, content)
+        return committed
+        
+    def _streaming_call(self, system_prompt: str, user_prompt: str, committed: int, temp_path: str,
+                        **labels) -> Call:
+        """
+        流式生成一个部分的调用，收到的文本实时追加到临时文件
+        
+        临时文件先截断到已确定的内容，再在其后追加当前版本，
+        这样进程中断时只会丢失尚未收到的部分。流式输出中途中断、从头重新生成时同样先截断。
+        
+        Args:
+            system_prompt: 系统提示词
+            user_prompt: 用户提示词
+            committed: 已确定内容的字节数（见 _journal_base）
+            temp_path: 临时文件路径
+            **labels: 调用标签
             
-    def generate_outline(self) -> str:
-        """生成故事大纲"""
-        logger.info("开始生成故事大纲...")
+        Returns:
+            调用，结果为当前部分的完整内容
+        """
+        self.journal.truncate(temp_path, committed)
+        return self._call('content', system_prompt, user_prompt,
+                          on_token=lambda token: self.journal.append(temp_path, token),
+                          on_restart=lambda: self.journal.truncate(temp_path, committed), **labels)
+            
+    @staticmethod
+    def _recent_paragraphs(content: str, count: int) -> str:
+        """取前文最后几个段落的原文"""
+        paragraphs = [p for p in content.split('\n') if p.strip()]
+        return '\n\n'.join(paragraphs[-count:]) if count > 0 else ""
+        
+    def _summary_prompt(self, part_name: str, part: str) -> Tuple[str, str, Dict[str, Any]]:
+        """构建生成一个部分摘要的提示词（系统提示词, 用户提示词, 生成选项）"""
+        return self._assemble(
+            'summary',
+            lambda part: (
+                prompts.summary.get_part_summary_prompt(),
+                prompts.summary.get_part_summary_user_prompt(part_name, part)
+            ),
+            [PromptSection('part', part, required=True)]
+        )
+        
+    def _state_prompt(self, character_state: str, part: str) -> Tuple[str, str, Dict[str, Any]]:
+        """构建更新人物状态的提示词（系统提示词, 用户提示词, 生成选项）"""
+        return self._assemble(
+            'state',
+            lambda previous_state, part: (
+                prompts.summary.get_character_state_prompt(),
+                prompts.summary.get_character_state_user_prompt(previous_state, part)
+            ),
+            [PromptSection('previous_state', character_state, required=True),
+             PromptSection('part', part, required=True)]
+        )
+        
+    def _summarize_part(self, part_index: int, part_name: str, part: str, character_state: str) -> Steps[Dict[str, str]]:
+        """
+        生成一个部分的摘要，并更新人物状态
+        
+        Args:
+            part_index: 部分序号
+            part_name: 部分名称
+            part: 该部分的内容
+            character_state: 该部分之前的人物状态
+            
+        Returns:
+            包含摘要（summary）和更新后人物状态（character_state）的字典
+        """
+        logger.info(f"正在生成{part_name}的摘要和人物状态...")
+        try:
+            system_prompt, user_prompt, options = self._summary_prompt(part_name, part)
+            summary = yield self._call('summary', system_prompt, user_prompt, options=options, part=part_index)
+        except Exception as e:
+            logger.error(f"生成{part_name}摘要时发生错误，使用原文代替: {str(e)}")
+            summary = part
+        try:
+            system_prompt, user_prompt, options = self._state_prompt(character_state, part)
+            character_state = yield self._call('state', system_prompt, user_prompt, options=options, part=part_index)
+        except Exception as e:
+            logger.error(f"更新人物状态时发生错误，沿用之前的状态: {str(e)}")
+        logger.info(f"{part_name}摘要长度: {len(summary)} 字符，人物状态长度: {len(character_state)} 字符")
+        return {'summary': summary, 'character_state': character_state}
         
-        best_outline = ""
+    def _rewrite_loop(self, content_type: str, label: str, build_prompt: Callable[..., Tuple[str, str, Dict]],
+                      max_rewrites: int, generate: Callable[..., Call], keep_last: bool,
+                      on_settled: Optional[Callable[[str], None]] = None, **labels) -> Steps[str]:
+        """
+        按"生成 → 获取反馈 → 评分"的循环逐版重写
+        
+        启用流水线时，获取第i版反馈的同时按当前最佳版本的反馈推测生成第i+1版；
+        第i版成为新的最佳版本时第i+1版的提示词随之改变，推测结果不会被使用。
+        
+        Args:
+            content_type: 内容类型（outline/characters/content），用于获取反馈
+            label: 日志中使用的名称
+            build_prompt: 构建基础提示词（系统提示词, 用户提示词）的函数
+            max_rewrites: 重写次数
+            generate: 根据提示词和调用标签构建生成调用的函数
+            keep_last: 为True时使用最后一个版本（提前结束重写时仍使用评分最高的版本），否则使用评分最高的版本
+            on_settled: 使用评分最高的版本时，剩余的版本已不可能被选中（只剩不获取反馈的最后一版）时
+                以最佳版本调用（可选），用于提前开始依赖最终版本的工作
+            **labels: 获取反馈时使用的调用标签
+            
+        Returns:
+            最终版本
+        """
+        best_version = ""
         best_feedback = ""
         best_score = 0.0
-        max_rewrites = self.config.get('rewrite_settings', {}).get('outline_rewrites', 0)
-        logger.info(f"大纲重写次数设置为：{max_rewrites}次")
+        all_versions = []  # 存储所有生成的版本
+        max_rewrites = self.budget.allowance(max_rewrites, label)
         
         for i in range(max_rewrites + 1):
             if i == 0:
-                logger.info("生成初始版本大纲...")
+                logger.info(f"生成初始版本{label}...")
             else:
-                logger.info(f"开始第{i}/{max_rewrites}次重写大纲...")
+                logger.info(f"开始第{i}/{max_rewrites}次重写{label}...")
                 logger.info("上一版本反馈：")
                 for line in best_feedback.split('\n'):
                     logger.info(f"  {line}")
             
-            system_prompt = prompts.story.get_outline_prompt(self.config)
-            if i > 0:  # 在提示词中加入上一次的反馈
-                system_prompt += f"\n\n参考以下修改建议：\n{best_feedback}"
+            # 在提示词中加入上一次的反馈
+            system_prompt, user_prompt, options = build_prompt(best_feedback if i > 0 else None)
             
-            outline = self.api_client.generate(system_prompt, "")
-            logger.info(f"第{i if i > 0 else '初始'}版本大纲生成完成，长度: {len(outline)} 字符")
+            current = self._take_speculative(content_type, system_prompt, user_prompt, options)
+            if current is None:
+                current = yield generate(system_prompt, user_prompt, options=options, iteration=i)
+            logger.info(f"第{i if i > 0 else '初始'}版本{label}生成完成，长度: {len(current)} 字符")
             
-            if i < max_rewrites:  # 获取反馈用于下一次重写
-                feedback = self._get_rewrite_feedback('outline', outline)
+            # 存储当前版本
+            all_versions.append({
+                'content': current,
+                'feedback': '',
+                'score': 0.0
+            })
+            
+            stop_reason = self.budget.exhausted() if i < max_rewrites else None
+            if i < max_rewrites and not stop_reason:  # 获取反馈用于下一次重写
+                if self.speculator is not None and self.speculate_versions and best_version:
+                    # 假设当前版本不会成为最佳版本，按现有的最佳反馈推测生成下一版
+                    self._speculate(content_type, *build_prompt(best_feedback), iteration=i + 1, **labels)
+                feedback = yield from self._get_rewrite_feedback(content_type, current, iteration=i, **labels)
                 current_score = self._evaluate_feedback(feedback)
+                all_versions[-1]['feedback'] = feedback
+                all_versions[-1]['score'] = current_score
                 
-                if not best_outline or current_score > best_score:
-                    logger.info(f"发现更好的版本（评分：{current_score:.2f} > {best_score:.2f}），更新最佳大纲...")
-                    best_outline = outline
+                if not best_version or current_score > best_score:
+                    logger.info(f"发现更好的{label}版本（评分：{current_score:.2f} > {best_score:.2f}），更新...")
+                    best_version = current
                     best_feedback = feedback
                     best_score = current_score
                 else:
-                    logger.info(f"当前版本评分（{current_score:.2f}）未超过最佳版本（{best_score:.2f}），保留之前的最佳版本")
-            else:
-                best_outline = outline
+                    logger.info(f"当前{label}版本评分（{current_score:.2f}）未超过最佳版本（{best_score:.2f}），保留之前的最佳版本")
+                    
+                stop_reason = self.budget.stop_reason([v['score'] for v in all_versions], self.budget.target_score)
+                if on_settled is not None and not keep_last and not stop_reason and i + 1 == max_rewrites:
+                    on_settled(best_version)
+                
+            self._record_version(content_type, current, all_versions[-1]['feedback'] or None,
+                                 all_versions[-1]['score'] if all_versions[-1]['feedback'] else None,
+                                 iteration=i, **labels)
+            if stop_reason:
+                logger.info(f"{label}提前结束重写：{stop_reason}")
+                self.budget.refund(max_rewrites - i, label)
+                if keep_last:
+                    # 提前结束时最后一版不一定更好（如评分停滞），使用评分最高的版本；
+                    # 初始版本之后预算即耗尽时还没有评分，使用初始版本
+                    if best_version:
+                        logger.info(f"使用评分最高的{label}版本（评分：{best_score:.2f}）作为最终版本")
+                    best_version = best_version or current
+                break
+            if i == max_rewrites and keep_last:
+                best_version = current
                 logger.info("完成所有重写，使用最终版本")
         
-        # 获取不重复的大纲文件路径
-        outline_base_path = os.path.join(self.config['output_settings']['save_path'], 'outline.md')
-        outline_path = get_unique_filename(outline_base_path)
+        if self.speculator is not None:
+            self.speculator.discard(f"{self.novel_index}:{content_type}:{labels.get('part', 0)}")
+        if keep_last:
+            return best_version
+            
+        # 从所有版本中选择最佳的
+        selected = max(all_versions, key=lambda x: x['score'])
+        logger.info(f"选择评分最高的{label}版本（评分：{selected['score']:.2f}）作为最终版本")
+        return selected['content']
+        
+    def _generate_candidate(self, content_type: str, system_prompt: str, user_prompt: str,
+                            options: Optional[Dict[str, Any]] = None, **labels) -> Steps[Dict[str, Any]]:
+        """
+        生成一个候选版本并获取其反馈
+        
+        Args:
+            content_type: 内容类型（outline/characters/content）
+            system_prompt: 系统提示词
+            user_prompt: 用户提示词
+            options: 覆盖默认生成选项的参数（可选）
+            **labels: 调用标签
+            
+        Returns:
+            候选版本（内容、反馈、评分）
+        """
+        candidate = yield self._call(content_type, system_prompt, user_prompt, options=options, **labels)
+        feedback = yield from self._get_rewrite_feedback(content_type, candidate, **labels)
+        score = self._evaluate_feedback(feedback)
+        self._record_version(content_type, candidate, feedback, score, **labels)
+        return {
+            'content': candidate,
+            'feedback': feedback,
+            'score': score
+        }
+        
+    def _generate_wave(self, content_type: str, system_prompt: str, user_prompt: str, count: int,
+                       **labels) -> Steps[Dict[str, Any]]:
+        """
+        并发生成一批候选版本并选出评分最高的一个
+        
+        每个候选版本生成后立即获取反馈，不必等待同批其他版本。
+        
+        Args:
+            content_type: 内容类型（outline/characters/content）
+            system_prompt: 系统提示词
+            user_prompt: 用户提示词
+            count: 候选版本数量
+            **labels: 调用标签
+            
+        Returns:
+            评分最高的候选版本（评分相同时取序号较小者）
+        """
+        candidates = yield Parallel([
+            self._generate_candidate(content_type, system_prompt, user_prompt, candidate=index, **labels)
+            for index in range(count)
+        ], count, 'candidate')
+        for index, candidate in enumerate(candidates, 1):
+            logger.info(f"候选版本{index}/{count}：长度 {len(candidate['content'])} 字符，评分 {candidate['score']:.2f}")
+        return max(candidates, key=lambda x: x['score'])
+        
+    def _breadth_search(self, content_type: str, label: str, build_prompt: Callable[..., Tuple[str, str, Dict]],
+                        candidates: int, **labels) -> Steps[str]:
+        """
+        广度模式：并发生成多个候选版本，按反馈评分选出最佳版本
+        
+        开启 rewrite_settings.breadth_refine 时，再以最佳版本的反馈为参考
+        进行一轮同样规模的改进，并在两轮中选择评分最高的版本。
         
-        # 保存最终版本
-        save_content(best_outline, outline_path)
+        Args:
+            content_type: 内容类型（outline/characters/content）
+            label: 日志中使用的名称
+            build_prompt: 构建基础提示词（系统提示词, 用户提示词）的函数
+            candidates: 每轮的候选版本数量
+            **labels: 调用标签
+            
+        Returns:
+            最终版本
+        """
+        logger.info(f"广度模式：并发生成{candidates}个{label}候选版本...")
+        system_prompt, user_prompt, options = build_prompt(None)
+        best = yield from self._generate_wave(content_type, system_prompt, user_prompt, candidates,
+                                              options=options, wave=0, **labels)
+        logger.info(f"第一轮最佳{label}版本评分：{best['score']:.2f}")
+        
+        if self.config.get('rewrite_settings', {}).get('breadth_refine', False) and best['feedback']:
+            logger.info(f"参考最佳版本的反馈，进行一轮{label}改进...")
+            system_prompt, user_prompt, options = build_prompt(best['feedback'])
+            refined = yield from self._generate_wave(
+                content_type,
+                system_prompt,
+                user_prompt,
+                candidates,
+                options=options,
+                wave=1,
+                **labels
+            )
+            if refined['score'] > best['score']:
+                logger.info(f"改进后的{label}版本更好（评分：{refined['score']:.2f} > {best['score']:.2f}），更新...")
+                best = refined
+            else:
+                logger.info(f"改进后的{label}版本（{refined['score']:.2f}）未超过第一轮最佳版本（{best['score']:.2f}），保留之前的最佳版本")
+        
+        return best['content']
+        
+    def _run_stage(self, content_type: str, label: str, build_prompt: Callable[..., Tuple[str, str, Dict]],
+                   max_rewrites: int, generate: Callable[..., Call], keep_last: bool,
+                   on_settled: Optional[Callable[[str], None]] = None, **labels) -> Steps[str]:
+        """
+        按配置选择逐版重写或广度模式生成一个阶段的内容
+        
+        Args:
+            content_type: 内容类型（outline/characters/content）
+            label: 日志中使用的名称
+            build_prompt: 构建基础提示词（系统提示词, 用户提示词）的函数
+            max_rewrites: 重写次数
+            generate: 逐版重写时根据提示词构建生成调用的函数
+            keep_last: 逐版重写时是否使用最后一个版本
+            on_settled: 逐版重写时最终版本确定后的回调（可选），见 _rewrite_loop
+            **labels: 调用标签
+            
+        Returns:
+            最终版本
+        """
+        rewrite_settings = self.config.get('rewrite_settings', {})
+        candidates = 0
+        if rewrite_settings.get('breadth_mode', False):
+            candidates = rewrite_settings.get('breadth_candidates') or max_rewrites + 1
+        if candidates > 1:
+            result = yield from self._breadth_search(content_type, label, build_prompt, candidates, **labels)
+        else:
+            result = yield from self._rewrite_loop(content_type, label, build_prompt, max_rewrites, generate,
+                                                   keep_last, on_settled, **labels)
+        self._select_version(content_type, result, **labels)
+        return result
+        
+    def generate_outline(self, avoid: Optional[List[str]] = None) -> str:
+        """
+        生成故事大纲
+        
+        Args:
+            avoid: 需要避开的大纲（可选），如与其他小说雷同而被放弃的大纲；指定时不从检查点恢复
+            
+        Returns:
+            故事大纲
+        """
+        return self.run(self.outline_steps(avoid))
+        
+    def outline_steps(self, avoid: Optional[List[str]] = None) -> Steps[str]:
+        """生成故事大纲的阶段逻辑，见 generate_outline"""
+        logger.info("开始生成故事大纲...")
+        
+        saved = self._load_stage('outline') if not avoid else None
+        if saved is not None:
+            logger.info(f"从检查点恢复大纲：{saved['path']}")
+            return saved['content']
+        
+        max_rewrites = self.config.get('rewrite_settings', {}).get('outline_rewrites', 0)
+        logger.info(f"大纲重写次数设置为：{max_rewrites}次")
+        
+        best_outline = yield from self._run_stage(
+            'outline', '大纲',
+            lambda feedback: self._outline_prompt(avoid, feedback),
+            max_rewrites,
+            lambda system_prompt, user_prompt, **labels: self._call('outline', system_prompt, user_prompt, **labels),
+            keep_last=True
+        )
+        return self._save_outline(best_outline)
+        
+    def _outline_prompt(self, avoid: Optional[List[str]], feedback: Optional[str]) -> Tuple[str, str, Dict[str, Any]]:
+        """构建生成大纲的提示词（系统提示词, 用户提示词, 生成选项）"""
+        return self._assemble(
+            'outline',
+            lambda avoid: (
+                prompts.story.get_outline_prompt(self.config) + prompts.story.get_outline_avoid_prompt(avoid),
+                ""
+            ),
+            [PromptSection('avoid', "\n\n".join(avoid or []), weight=0.5)],
+            feedback
+        )
+        
+    def _save_outline(self, best_outline: str) -> str:
+        """保存大纲的最终版本并记录检查点，启用产物库时由产物库在运行结束时导出"""
+        outline_path = os.path.join(self.config['output_settings']['save_path'], 'outline.md')
+        if self.artifact_store is None:
+            # 获取不重复的大纲文件路径
+            outline_path = get_unique_filename(outline_path)
+            save_content(best_outline, outline_path)
+        self._save_stage('outline', {'content': best_outline, 'path': outline_path})
         
         return best_outline
         
     def generate_characters(self, outline: str) -> str:
         """生成人物设定"""
+        return self.run(self.characters_steps(outline))
+        
+    def characters_steps(self, outline: str) -> Steps[str]:
+        """生成人物设定的阶段逻辑，见 generate_characters"""
         logger.info("开始生成人物设定...")
         
-        best_characters = ""
-        best_feedback = ""
-        best_score = 0.0
+        saved = self._load_stage('characters')
+        if saved is not None:
+            logger.info(f"从检查点恢复人物设定：{saved['path']}")
+            return saved['content']
+        
         max_rewrites = self.config.get('rewrite_settings', {}).get('character_rewrites', 0)
         logger.info(f"人物设定重写次数设置为：{max_rewrites}次")
         
-        for i in range(max_rewrites + 1):
-            if i == 0:
-                logger.info("生成初始版本人物设定...")
-            else:
-                logger.info(f"开始第{i}/{max_rewrites}次重写人物设定...")
-                logger.info("上一版本反馈：")
-                for line in best_feedback.split('\n'):
-                    logger.info(f"  {line}")
+        best_characters = yield from self._run_stage(
+            'characters', '人物设定',
+            lambda feedback: self._characters_prompt(outline, feedback),
+            max_rewrites,
+            lambda system_prompt, user_prompt, **labels: self._call('characters', system_prompt, user_prompt, **labels),
+            keep_last=True
+        )
+        return self._save_characters(best_characters)
+        
+    def _characters_prompt(self, outline: str, feedback: Optional[str]) -> Tuple[str, str, Dict[str, Any]]:
+        """构建生成人物设定的提示词（系统提示词, 用户提示词, 生成选项）"""
+        return self._assemble(
+            'characters',
+            lambda outline: (prompts.character.get_character_prompt(self.config, outline), ""),
+            [PromptSection('outline', outline)],
+            feedback
+        )
+        
+    def _save_characters(self, best_characters: str) -> str:
+        """保存人物设定的最终版本并记录检查点，启用产物库时由产物库在运行结束时导出"""
+        characters_path = os.path.join(self.config['output_settings']['save_path'], 'characters.md')
+        if self.artifact_store is None:
+            # 获取不重复的人物设定文件路径
+            characters_path = get_unique_filename(characters_path)
+            save_content(best_characters, characters_path)
+        self._save_stage('characters', {'content': best_characters, 'path': characters_path})
+        
+        return best_characters
+        
+    def new_content_progress(self) -> Dict[str, Any]:
+        """
+        创建小说内容的生成进度
+        
+        Returns:
+            进度：已生成的内容、已完成部分的摘要和人物状态
+        """
+        return {'content': "", 'summaries': [], 'character_state': ""}
+        
+    def _part_target(self, part_name: str) -> int:
+        """一个部分的目标字数，未启用篇幅规划时为0"""
+        return self.length_planner.part_target(part_name) if self.length_planner is not None else 0
+        
+    def _part_prompt(self, outline: str, characters: str, part_index: int, context: str,
+                     feedback: Optional[str] = None) -> Tuple[str, str, Dict[str, Any]]:
+        """
+        构建生成一个部分的提示词，包含已生成的内容作为上下文
+        
+        Args:
+            outline: 故事大纲
+            characters: 人物设定
+            part_index: 部分序号（从1开始）
+            context: 前文（完整前文或摘要模式下压缩后的前文）
+            feedback: 修改建议（可选）
             
-            system_prompt = prompts.character.get_character_prompt(self.config, outline)
-            if i > 0:  # 在提示词中加入上一次的反馈
-                system_prompt += f"\n\n参考以下修改建议：\n{best_feedback}"
+        Returns:
+            （系统提示词, 用户提示词, 生成选项）
+        """
+        part_name = self.CONTENT_PARTS[part_index - 1]
+        target_chars = self._part_target(part_name)
+        num_predict = None
+        if target_chars:
+            num_predict = self.length_planner.num_predict('content', target_chars, self.api_client.model_for('content'))
+        
+        def build_content_prompt(outline, characters, context):
+            if self._stable_prefix():
+                # 固定内容在前、变化内容在后，各部分和各次重写共享同一系统提示词
+                return (
+                    prompts.story.get_content_system_prompt(self.config, outline, characters),
+                    prompts.story.get_content_user_prompt(context if context else None, part_name, target_chars)
+                )
+            return prompts.story.get_content_prompt(
+                self.config,
+                outline,
+                characters,
+                context if context else None,  # 传递已生成的内容作为上下文
+                part_name,  # 传递当前部分名称
+                target_chars
+            ), ""
             
-            characters = self.api_client.generate(system_prompt, "")
-            logger.info(f"第{i if i > 0 else '初始'}版本人物设定生成完成，长度: {len(characters)} 字符")
+        return self._assemble('content', build_content_prompt, [
+            PromptSection('outline', outline),
+            PromptSection('characters', characters),
+            PromptSection('context', context, weight=2.0, keep='tail')
+        ], feedback, num_predict)
+        
+    def _summarize_parts(self, part_index: int) -> bool:
+        """该部分之后是否需要摘要和人物状态（摘要模式下除最后一部分外）"""
+        context_settings = self.config.get('context_settings', {})
+        return context_settings.get('mode', 'full') == 'summary' and part_index < len(self.CONTENT_PARTS)
+        
+    def _part_context(self, part_index: int, progress: Dict[str, Any]) -> str:
+        """
+        开始生成一个部分：计算作为上下文的前文
+        
+        摘要模式下，前文以各部分摘要、人物状态和最后几段原文代替。
+        
+        Args:
+            part_index: 部分序号（从1开始）
+            progress: 之前各部分的生成进度
             
-            if i < max_rewrites:  # 获取反馈用于下一次重写
-                feedback = self._get_rewrite_feedback('characters', characters)
-                current_score = self._evaluate_feedback(feedback)
-                
-                if not best_characters or current_score > best_score:
-                    logger.info(f"发现更好的版本（评分：{current_score:.2f} > {best_score:.2f}），更新最佳人物设定...")
-                    best_characters = characters
-                    best_feedback = feedback
-                    best_score = current_score
-                else:
-                    logger.info(f"当前版本评分（{current_score:.2f}）未超过最佳版本（{best_score:.2f}），保留之前的最佳版本")
-            else:
-                best_characters = characters
-                logger.info("完成所有重写，使用最终版本")
+        Returns:
+            前文
+        """
+        part_name = self.CONTENT_PARTS[part_index - 1]
+        content = progress['content']
+        logger.info(f"正在生成第{part_index}/4部分：{part_name}...")
+        
+        context_settings = self.config.get('context_settings', {})
+        if context_settings.get('mode', 'full') == 'summary' and content:
+            context = prompts.summary.get_compact_context(
+                progress['summaries'],
+                progress['character_state'],
+                self._recent_paragraphs(content, context_settings.get('recent_paragraphs', 3))
+            )
+            logger.debug(f"压缩后的前文长度: {len(context)} 字符（完整前文 {len(content)} 字符）")
+        else:
+            context = content
+            
+        # 篇幅规划：本部分的目标字数和对应的生成上限
+        target_chars = self._part_target(part_name)
+        if target_chars:
+            num_predict = self.length_planner.num_predict('content', target_chars, self.api_client.model_for('content'))
+            logger.info(f"{part_name}目标篇幅：{target_chars}字（生成上限{num_predict}个token）")
+        return context
         
-        # 获取不重复的人物设定文件路径
-        characters_base_path = os.path.join(self.config['output_settings']['save_path'], 'characters.md')
-        characters_path = get_unique_filename(characters_base_path)
+    def _restore_part(self, part_index: int, saved: Dict[str, Any], progress: Dict[str, Any],
+                      temp_path: str) -> Dict[str, Any]:
+        """
+        使用检查点中记录的部分（摘要模式下应已包含摘要和人物状态）
         
-        # 保存最终版本
-        save_content(best_characters, characters_path)
+        Returns:
+            包含本部分的新进度
+        """
+        part_name = self.CONTENT_PARTS[part_index - 1]
+        logger.info(f"从检查点恢复第{part_index}/4部分：{part_name}")
+        summaries = list(progress['summaries'])
+        character_state = progress['character_state']
+        self.journal.append(temp_path, saved['content'] + "\n\n")
+        if self._summarize_parts(part_index):
+            summaries.append((part_name, saved['summary']))
+            character_state = saved['character_state']
+        return {'content': progress['content'] + saved['content'] + "\n\n", 'summaries': summaries,
+                'character_state': character_state}
         
-        return best_characters
+    def _finish_part(self, part_index: int, best_part: str, summary: Optional[Dict[str, str]],
+                     progress: Dict[str, Any], committed: int, temp_path: str) -> Dict[str, Any]:
+        """
+        记录一个部分的最终版本：检查雷同、记录篇幅、写入检查点和临时文件
         
-    def generate_content(self, outline: str, characters: str) -> str:
-        """生成小说内容"""
-        logger.info("开始生成小说内容...")
+        Args:
+            part_index: 部分序号（从1开始）
+            best_part: 最终版本
+            summary: 摘要和更新后的人物状态（摘要模式下），不需要时为None
+            progress: 之前各部分的生成进度
+            committed: 已确定内容的字节数（见 _journal_base）
+            temp_path: 临时文件路径
+            
+        Returns:
+            包含本部分的新进度
+        """
+        part_name = self.CONTENT_PARTS[part_index - 1]
+        summaries = list(progress['summaries'])
+        character_state = progress['character_state']
+        if self.similarity_index is not None:
+            match = self.similarity_index.check_and_add('part', self.novel_index, best_part, part=part_index,
+                                                        keep_similar=True)
+            if match is not None:
+                logger.warning(f"{part_name}与{self.similarity_index.describe(match[0])}的内容相似（相似度：{match[1]:.2f}）")
+        content = progress['content'] + best_part + "\n\n"
+        target_chars = self._part_target(part_name)
+        if target_chars:
+            self.length_planner.record(part_name, target_chars, best_part)
+            if part_index == len(self.CONTENT_PARTS):
+                self.length_planner.record('全文', self.length_planner.word_count, content)
+        part_record = {'content': best_part}
+        if summary is not None:
+            part_record.update(summary)
+            summaries.append((part_name, part_record['summary']))
+            character_state = part_record['character_state']
+        self._save_stage(f'part_{part_index}', part_record)
         
-        # 分四个部分生成
-        parts = ['开篇', '发展', '高潮', '结局']
-        content = ""
-        temp_path = os.path.join(self.config['output_settings']['save_path'], f'{self.config["novel_settings"]["title"]}_temp.md')
+        # 临时文件：去掉流式输出的未选用版本，追加选用的版本
+        self.journal.truncate(temp_path, committed)
+        self.journal.append(temp_path, best_part + "\n\n")
+        
+        return {'content': content, 'summaries': summaries, 'character_state': character_state}
+        
+    def generate_part(self, outline: str, characters: str, part_index: int,
+                      progress: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        生成小说内容的一个部分
+        
+        Args:
+            outline: 故事大纲
+            characters: 人物设定
+            part_index: 部分序号（从1开始）
+            progress: 之前各部分的生成进度
+            
+        Returns:
+            包含本部分的新进度
+        """
+        return self.run(self.part_steps(outline, characters, part_index, progress))
+        
+    def part_steps(self, outline: str, characters: str, part_index: int,
+                   progress: Dict[str, Any]) -> Steps[Dict[str, Any]]:
+        """生成小说内容一个部分的阶段逻辑，见 generate_part"""
+        parts = self.CONTENT_PARTS
+        part_name = parts[part_index - 1]
+        content = progress['content']
+        temp_path = self._temp_path()
         max_rewrites = self.config.get('rewrite_settings', {}).get('content_rewrites', 0)
-        logger.info(f"内容重写次数设置为：{max_rewrites}次")
+        stream = self.config['ai_settings'].get('stream', False)
+        use_summary = self.config.get('context_settings', {}).get('mode', 'full') == 'summary'
+        
+        # 临时文件只追加本部分的内容
+        committed = self._journal_base(temp_path, content)
         
-        for part_index, part_name in enumerate(parts, 1):
-            logger.info(f"正在生成第{part_index}/4部分：{part_name}...")
+        saved = self._load_stage(f'part_{part_index}')
+        if saved is not None:
+            if self._summarize_parts(part_index) and 'summary' not in saved:
+                saved.update((yield from self._summarize_part(part_index, part_name, saved['content'],
+                                                              progress['character_state'])))
+                self._save_stage(f'part_{part_index}', saved)
+            return self._restore_part(part_index, saved, progress, temp_path)
             
-            best_part = ""
-            best_feedback = ""
-            best_score = 0.0
-            all_versions = []  # 存储所有生成的版本
+        context = self._part_context(part_index, progress)
+        
+        def build_prompt(feedback):
+            return self._part_prompt(outline, characters, part_index, context, feedback)
             
-            for i in range(max_rewrites + 1):
-                if i == 0:
-                    logger.info(f"生成初始版本{part_name}...")
-                else:
-                    logger.info(f"开始第{i}/{max_rewrites}次重写{part_name}...")
-                    logger.info("上一版本反馈：")
-                    for line in best_feedback.split('\n'):
-                        logger.info(f"  {line}")
+        # 流水线：本部分的最终版本确定后，在最后一次重写的同时起草下一部分（摘要模式下需要先生成摘要，不适用）
+        on_settled = None
+        if self.speculator is not None and self.speculate_parts and not use_summary and part_index < len(parts):
+            def on_settled(best):
+                self._speculate('content', *self._part_prompt(outline, characters, part_index + 1,
+                                                              content + best + "\n\n"),
+                                part=part_index + 1, iteration=0)
                 
-                # 构建提示词，包含已生成的内容作为上下文
-                system_prompt = prompts.story.get_content_prompt(
-                    self.config,
-                    outline,
-                    characters,
-                    content if content else None,  # 传递已生成的内容作为上下文
-                    part_name  # 传递当前部分名称
-                )
-                if i > 0:  # 在提示词中加入上一次的反馈
-                    system_prompt += f"\n\n参考以下修改建议：\n{best_feedback}"
-                
-                current_part = self.api_client.generate(system_prompt, "")
-                logger.info(f"第{i if i > 0 else '初始'}版本{part_name}生成完成，长度: {len(current_part)} 字符")
-                
-                # 存储当前版本
-                all_versions.append({
-                    'content': current_part,
-                    'feedback': '',
-                    'score': 0.0
-                })
-                
-                if i < max_rewrites:  # 获取反馈用于下一次重写
-                    feedback = self._get_rewrite_feedback('content', current_part)
-                    current_score = self._evaluate_feedback(feedback)
-                    all_versions[-1]['feedback'] = feedback
-                    all_versions[-1]['score'] = current_score
-                    
-                    if not best_part or current_score > best_score:
-                        logger.info(f"发现更好的{part_name}版本（评分：{current_score:.2f} > {best_score:.2f}），更新...")
-                        best_part = current_part
-                        best_feedback = feedback
-                        best_score = current_score
-                    else:
-                        logger.info(f"当前{part_name}版本评分（{current_score:.2f}）未超过最佳版本（{best_score:.2f}），保留之前的最佳版本")
-            
-            # 从所有版本中选择最佳的
-            best_version = max(all_versions, key=lambda x: x['score'])
-            logger.info(f"选择评分最高的{part_name}版本（评分：{best_version['score']:.2f}）作为最终版本")
-            content += best_version['content'] + "\n\n"
-            
-            # 保存临时文件
-            save_content(content, temp_path)
+        def generate(system_prompt, user_prompt, **labels):
+            if stream:
+                return self._streaming_call(system_prompt, user_prompt, committed, temp_path,
+                                            part=part_index, **labels)
+            return self._call('content', system_prompt, user_prompt, part=part_index, **labels)
+        
+        best_part = yield from self._run_stage('content', part_name, build_prompt, max_rewrites, generate,
+                                               keep_last=False, on_settled=on_settled, part=part_index)
+        summary = None
+        if self._summarize_parts(part_index):
+            summary = yield from self._summarize_part(part_index, part_name, best_part, progress['character_state'])
+        return self._finish_part(part_index, best_part, summary, progress, committed, temp_path)
+        
+    def generate_content(self, outline: str, characters: str) -> str:
+        """生成小说内容"""
+        return self.run(self.content_steps(outline, characters))
+        
+    def content_steps(self, outline: str, characters: str) -> Steps[str]:
+        """生成小说内容的阶段逻辑，见 generate_content"""
+        logger.info("开始生成小说内容...")
+        max_rewrites = self.config.get('rewrite_settings', {}).get('content_rewrites', 0)
+        logger.info(f"内容重写次数设置为：{max_rewrites}次")
+        
+        # 分四个部分生成
+        progress = self.new_content_progress()
+        for part_index in range(1, len(self.CONTENT_PARTS) + 1):
+            progress = yield from self.part_steps(outline, characters, part_index, progress)
+        content = progress['content']
         
         logger.success(f"小说内容生成完成！总长度: {len(content)} 字符")
         
         return content
         
+    def _fix_full(self, content: str, analysis: str, **labels) -> Steps[str]:
+        """
+        根据分析结果重写全文
+        
+        Args:
+            content: 小说内容
+            analysis: 分析结果
+            **labels: 调用标签
+            
+        Returns:
+            重写后的内容
+        """
+        def build_fix_prompt(content, analysis):
+            if self._stable_prefix():
+                return (
+                    prompts.rewrite.get_final_rewrite_fix_system_prompt(),
+                    prompts.rewrite.get_final_rewrite_fix_user_prompt(content, analysis)
+                )
+            return prompts.rewrite.get_final_rewrite_fix_prompt(content, analysis), ""
+            
+        system_prompt, user_prompt, options = self._assemble('fix', build_fix_prompt, [
+            PromptSection('content', content, required=True),
+            PromptSection('analysis', analysis)
+        ])
+        return (yield self._call('fix', system_prompt, user_prompt, options=options, **labels))
+        
+    def _locate_segments(self, content: str, analysis: str, count: int,
+                         **labels) -> Steps[Optional[List[segments.Segment]]]:
+        """
+        请模型将分析结果中的问题对应到原文的具体段落
+        
+        Args:
+            content: 小说内容
+            analysis: 分析结果
+            count: 段落数
+            **labels: 调用标签
+            
+        Returns:
+            片段列表，无法解析时返回None
+        """
+        def parse(text):
+            located = segments.parse_segments_json(text, count)
+            return located if located is not None else segments.parse_segments_text(text, count)
+            
+        system_prompt, user_prompt, options = self._assemble(
+            'locate',
+            lambda content, analysis: (
+                prompts.rewrite.get_segment_locate_prompt(),
+                prompts.rewrite.get_segment_locate_user_prompt(content, analysis)
+            ),
+            [PromptSection('content', segments.numbered_text(content), required=True),
+             PromptSection('analysis', analysis, required=True)]
+        )
+        result = yield self._call('locate', system_prompt, user_prompt, options=options,
+                                  response_format=self._response_format(segments.SEGMENTS_SCHEMA), **labels)
+        return (yield from self._parse_with_repair(
+            'locate', result, parse,
+            lambda text: segments.parse_segments_json(text, count),
+            segments.SEGMENTS_SCHEMA,
+            prompts.rewrite.get_segment_locate_format(),
+            **labels
+        ))
+        
+    def _rewrite_segment(self, characters: str, paragraphs: List[str], target: segments.Segment,
+                         **labels) -> Steps[Optional[List[str]]]:
+        """
+        重写一个片段，提示词只包含片段及其前后的几段作为上下文
+        
+        生成上限按片段长度设置，输出的token数与问题的多少成正比，而不是与全文长度成正比。
+        
+        Args:
+            characters: 人物设定
+            paragraphs: 全文的各段落
+            target: 需要重写的片段
+            **labels: 调用标签
+            
+        Returns:
+            重写后的各段落（空列表表示删除该片段），失败时返回None
+        """
+        before = paragraphs[max(0, target.start - self.segment_context):target.start]
+        original = paragraphs[target.start:target.end]
+        after = paragraphs[target.end:target.end + self.segment_context]
+        label = f"第{target.start + 1}-{target.end}段" if target.end - target.start > 1 else f"第{target.end}段"
+        
+        system_prompt, user_prompt, options = self._assemble(
+            'segment',
+            lambda characters, before, original, after, issues: (
+                prompts.rewrite.get_segment_rewrite_prompt(),
+                prompts.rewrite.get_segment_rewrite_user_prompt(characters, before, original, after, issues)
+            ),
+            [PromptSection('characters', characters, weight=0.5),
+             PromptSection('before', '\n\n'.join(before), keep='tail'),
+             PromptSection('original', '\n\n'.join(original), required=True),
+             PromptSection('after', '\n\n'.join(after)),
+             PromptSection('issues', '\n'.join(f"- {issue}" for issue in target.issues), required=True)]
+        )
+        estimator = self.estimator
+        if self.length_planner is not None:
+            # 按片段重写所用模型的每token字数估算原片段的长度
+            estimator = self.length_planner.estimator_for(self.api_client.model_for('segment'))
+        num_predict = int(estimator.estimate('\n\n'.join(original)) * self.segment_length_ratio) + 64
+        configured = self.config['ai_settings'].get('num_predict', -1)
+        options = {**options, 'num_predict': min(num_predict, configured) if configured > 0 else num_predict}
+        
+        try:
+            result = yield self._call('segment', system_prompt, user_prompt, options=options, **labels)
+        except Exception as e:
+            logger.error(f"重写{label}时发生错误: {str(e)}")
+            return None
+        if not result.strip():
+            logger.info(f"{label}：模型输出为空，删除该片段")
+            return []
+        rewritten = segments.anchor_rewrite(original, result, before, after)
+        if not rewritten:
+            logger.warning(f"{label}：重写结果只包含上下文，保留原文")
+            return None
+        logger.debug(f"{label}：{len(''.join(original))} 字符 → {len(''.join(rewritten))} 字符")
+        return rewritten
+        
+    def _fix_segments(self, characters: str, content: str, analysis: str,
+                      report: Optional[RepetitionReport], **labels) -> Steps[Optional[str]]:
+        """
+        片段模式的最终重写：定位分析结果指出的问题所在的段落，并发重写这些片段后拼回原文
+        
+        片段以外的内容逐字保留。本地检测到的重复段落不需要模型定位，直接加入待重写的片段。
+        
+        Args:
+            characters: 人物设定
+            content: 小说内容
+            analysis: 分析结果
+            report: 本地重复检测结果（可选）
+            **labels: 调用标签
+            
+        Returns:
+            重写后的内容；无法定位问题、问题涉及的内容过多或所有片段都重写失败时返回None，由调用方改为整篇重写
+        """
+        spans = segments.paragraph_spans(content)
+        if not spans:
+            return None
+        paragraphs = [content[start:end] for start, end in spans]
+        
+        located = yield from self._locate_segments(content, analysis, len(spans), **labels)
+        if located is None:
+            logger.warning("解析问题定位结果失败，改为整篇重写")
+            return None
+        if report is not None:
+            located += segments.repetition_segments(report)
+        plan = segments.merge_segments(content, spans, located, self.segment_merge_gap)
+        if not plan:
+            logger.info("分析结果没有对应到具体段落，改为整篇重写")
+            return None
+        if len(plan) > self.max_segments:
+            logger.info(f"共{len(plan)}个片段需要修改，只重写问题最多的{self.max_segments}个")
+            plan = sorted(sorted(plan, key=lambda segment: -len(segment.issues))[:self.max_segments])
+        covered = segments.coverage(spans, plan)
+        if covered > self.max_segment_coverage:
+            logger.info(f"需要修改的段落占全文{covered:.0%}，超过{self.max_segment_coverage:.0%}，改为整篇重写")
+            return None
+        logger.info(f"定位到{len(plan)}个需要修改的片段，共{sum(s.end - s.start for s in plan)}/{len(spans)}段（{covered:.0%}）")
+        
+        results = yield Parallel([
+            self._rewrite_segment(characters, paragraphs, target, segment=index, **labels)
+            for index, target in enumerate(plan)
+        ], self.segment_workers, 'segment')
+        replacements = [(segment, result) for segment, result in zip(plan, results) if result is not None]
+        logger.info(f"完成{len(replacements)}/{len(plan)}个片段的重写")
+        if not replacements:
+            return None
+        return segments.splice(content, spans, replacements)
+        
     def final_rewrite(self, outline: str, characters: str, content: str) -> Tuple[str, float]:
         """
         最终重写并评分
@@ -248,37 +1383,83 @@ class NovelWriter:
         Returns:
             tuple: (最终内容, 评分)
         """
+        return self.run(self.final_rewrite_steps(outline, characters, content))
+        
+    def final_rewrite_steps(self, outline: str, characters: str, content: str) -> Steps[Tuple[str, float]]:
+        """最终重写并评分的阶段逻辑，见 final_rewrite"""
         try:
             logger.info("开始进行最终重写分析...")
             max_rewrites = self.config.get('rewrite_settings', {}).get('final_rewrites', 0)
             min_score = self.config.get('rewrite_settings', {}).get('final_rewrite_min_score', 0.8)
             
+            state = self._load_stage('final_rewrite') or {}
+            if state.get('done'):
+                logger.info(f"从检查点恢复最终重写结果（评分：{state['score']:.2f}）")
+                return state['content'], state['score']
+            
             if max_rewrites == 0:
                 logger.info("未配置最终重写，直接进行评分...")
                 # 对原文进行评分
-                system_prompt = prompts.base.get_rating_prompt()
-                user_prompt = prompts.base.get_rating_user_prompt(content)
-                rating_result = self.api_client.generate(system_prompt, user_prompt)
-                try:
-                    score = float(rating_result.split('总分：')[1].split('/')[0])
-                except:
-                    score = 0
-                    logger.warning("解析评分失败，设置为0分")
+                score = (yield from self._get_rating(content)).total
+                self._save_stage('final_rewrite', {'done': True, 'content': content, 'score': score})
                 return content, score
             
             logger.info(f"最终重写次数设置为：{max_rewrites}次，最低评分要求：{min_score}")
+            max_rewrites = self.budget.allowance(max_rewrites, "最终重写")
             
-            best_content = content
-            best_score = 0.0
-            best_analysis = ""
+            best_content = state.get('best_content', content)
+            best_score = state.get('best_score', 0.0)
+            best_analysis = state.get('best_analysis', "")
+            iterations = state.get('iterations', [])
+            if iterations:
+                logger.info(f"从检查点恢复最终重写：已完成{len(iterations)}/{max_rewrites}轮，当前最佳评分：{best_score:.2f}")
             
-            for i in range(max_rewrites):
+            def save_progress():
+                self._save_stage('final_rewrite', {
+                    'done': False,
+                    'iterations': iterations,
+                    'best_content': best_content,
+                    'best_score': best_score,
+                    'best_analysis': best_analysis
+                })
+                
+            def should_stop(i):
+                # 跳过的轮次视为没有提升
+                scores = [it.get('score', 0.0) for it in iterations]
+                reason = self.budget.stop_reason(scores, self.budget.final_target_score, baseline=0.0)
+                if reason and i + 1 < max_rewrites:
+                    logger.info(f"最终重写提前结束：{reason}")
+                    return True
+                return False
+            
+            for i in range(len(iterations), max_rewrites):
                 logger.info(f"开始第{i+1}/{max_rewrites}次最终重写...")
                 
+                # 本地检测重复内容，没有重复时分析不再要求模型查找重复，其余分析和重写照常进行
+                repetitions = ""
+                report = None
+                check_repetitions = True
+                if self.repetition_detector is not None:
+                    report = self.repetition_detector.analyze(best_content)
+                    logger.info(f"本地重复检测：{report.summary()}")
+                    if report.is_clean() and self.skip_clean_repetitions:
+                        logger.info("未检测到重复内容，跳过重复问题的分析")
+                        check_repetitions = False
+                    repetitions = report.format(self.repetition_max_items)
+                
                 # 获取分析结果
-                system_prompt = prompts.rewrite.get_final_rewrite_prompt()
-                user_prompt = prompts.rewrite.get_final_rewrite_user_prompt(outline, characters, best_content)
-                analysis = self.api_client.generate(system_prompt, user_prompt)
+                system_prompt, user_prompt, options = self._assemble(
+                    'analysis',
+                    lambda outline, characters, content, repetitions: (
+                        prompts.rewrite.get_final_rewrite_prompt(check_repetitions),
+                        prompts.rewrite.get_final_rewrite_user_prompt(outline, characters, content, repetitions)
+                    ),
+                    [PromptSection('outline', outline),
+                     PromptSection('characters', characters),
+                     PromptSection('content', best_content, required=True),
+                     PromptSection('repetitions', repetitions)]
+                )
+                analysis = yield self._call('analysis', system_prompt, user_prompt, options=options, iteration=i)
                 
                 logger.info("获取到的分析结果：")
                 for line in analysis.split('\n'):
@@ -290,117 +1471,83 @@ class NovelWriter:
                 
                 if current_score < min_score:
                     logger.info(f"分析质量（{current_score:.2f}）未达到最低要求（{min_score}），跳过本次重写")
+                    iterations.append({'iteration': i, 'analysis_score': current_score, 'skipped': True})
+                    save_progress()
+                    if should_stop(i):
+                        break
                     continue
                     
-                # 根据分析结果重写
-                logger.info("开始根据分析结果重写...")
-                system_prompt = prompts.rewrite.get_final_rewrite_fix_prompt(best_content, analysis)
-                new_content = self.api_client.generate(system_prompt, "")
+                # 根据分析结果重写：片段模式下只重写有问题的段落，无法定位时改为整篇重写
+                new_content = None
+                mode = 'segments'
+                if self.segment_rewrite:
+                    logger.info("开始根据分析结果重写有问题的片段...")
+                    new_content = yield from self._fix_segments(characters, best_content, analysis, report, iteration=i)
+                if new_content is None:
+                    logger.info("开始根据分析结果重写...")
+                    new_content = yield from self._fix_full(best_content, analysis, iteration=i)
+                    mode = 'full'
                 
                 # 对重写结果进行评分
-                system_prompt = prompts.base.get_rating_prompt()
-                user_prompt = prompts.base.get_rating_user_prompt(new_content)
-                rating_result = self.api_client.generate(system_prompt, user_prompt)
-                try:
-                    new_score = float(rating_result.split('总分：')[1].split('/')[0])
-                except:
-                    new_score = 0
-                    logger.warning("解析评分失败，设置为0分")
+                rating = yield from self._get_rating(new_content, iteration=i)
+                new_score = rating.total
                 
                 logger.info(f"重写后的评分：{new_score:.2f}")
+                self._record_version('final', new_content, analysis, new_score, iteration=i, mode=mode)
                 
                 if new_score > best_score:
                     logger.info(f"发现更好的版本（评分：{new_score:.2f} > {best_score:.2f}），更新...")
                     best_content = new_content
                     best_score = new_score
                     best_analysis = analysis
+                    # 最佳版本在后台写入临时文件，不必等到最终重写结束
+                    self.journal.write(self._temp_path(), best_content)
                 else:
                     logger.info(f"当前版本（{new_score:.2f}）未超过最佳版本（{best_score:.2f}），保持不变")
+                    
+                iterations.append({'iteration': i, 'analysis_score': current_score, 'skipped': False,
+                                   'score': new_score, 'dimensions': rating.dimensions})
+                save_progress()
+                if should_stop(i):
+                    break
             
             if best_score > 0:
                 logger.success(f"最终重写完成，最终评分：{best_score:.2f}")
+                self._save_stage('final_rewrite', {'done': True, 'content': best_content, 'score': best_score})
                 return best_content, best_score
             else:
                 # 如果没有找到更好的版本，对原文进行评分
-                system_prompt = prompts.base.get_rating_prompt()
-                user_prompt = prompts.base.get_rating_user_prompt(content)
-                rating_result = self.api_client.generate(system_prompt, user_prompt)
-                try:
-                    score = float(rating_result.split('总分：')[1].split('/')[0])
-                except:
-                    score = 0
-                    logger.warning("解析评分失败，设置为0分")
+                score = (yield from self._get_rating(content)).total
                 logger.warning(f"未能生成更好的版本，使用原文（评分：{score:.2f}）")
+                self._save_stage('final_rewrite', {'done': True, 'content': content, 'score': score})
                 return content, score
             
+        except PromptBudgetError as e:
+            # 原文本身超出上下文窗口，完整评分同样会失败：截断原文后评分，仍然超出时直接抛出
+            logger.error(f"最终重写的提示词超出上下文窗口: {str(e)}")
+            score = (yield from self._get_rating(content, truncate=True)).total
+            logger.warning(f"使用原文，评分只针对截断后的内容（评分：{score:.2f}）")
+            return content, score
         except Exception as e:
             logger.error(f"最终重写过程中发生错误: {str(e)}")
             logger.exception("详细错误信息：")
             # 发生错误时对原文进行评分
             try:
-                system_prompt = prompts.base.get_rating_prompt()
-                user_prompt = prompts.base.get_rating_user_prompt(content)
-                rating_result = self.api_client.generate(system_prompt, user_prompt)
-                score = float(rating_result.split('总分：')[1].split('/')[0])
-            except:
+                score = (yield from self._get_rating(content)).total
+            except Exception as e:
                 score = 0
-                logger.warning("解析评分失败，设置为0分")
-            return content, score 
-
-    def _parse_rating(self, rating_result: str) -> float:
-        """
-        解析评分结果
-        
-        Args:
-            rating_result: 评分结果文本
-            
-        Returns:
-            总分（0-1之间的浮点数）
-        """
-        try:
-            # 解析总分
-            total_score = 0.0
-            
-            # 解析情节发展分数
-            if '情节发展（' in rating_result:
-                plot_score = float(rating_result.split('情节发展（')[1].split('/')[0])
-                total_score += plot_score
-                
-            # 解析人物塑造分数
-            if '人物塑造（' in rating_result:
-                character_section = rating_result.split('人物塑造（')[1].split('##')[0]
-                
-                # 解析各个子项分数
-                if '人物性格一致性（' in character_section:
-                    consistency_score = float(character_section.split('人物性格一致性（')[1].split('/')[0])
-                    total_score += consistency_score
-                    
-                if '人物行为合理性（' in character_section:
-                    behavior_score = float(character_section.split('人物行为合理性（')[1].split('/')[0])
-                    total_score += behavior_score
-                    
-                if '人物对话特色（' in character_section:
-                    dialogue_score = float(character_section.split('人物对话特色（')[1].split('/')[0])
-                    total_score += dialogue_score
-                    
-                if '人物成长体现（' in character_section:
-                    growth_score = float(character_section.split('人物成长体现（')[1].split('/')[0])
-                    total_score += growth_score
-                
-            # 解析主题表达分数
-            if '主题表达（' in rating_result:
-                theme_score = float(rating_result.split('主题表达（')[1].split('/')[0])
-                total_score += theme_score
-                
-            # 解析写作技巧分数
-            if '写作技巧（' in rating_result:
-                technique_score = float(rating_result.split('写作技巧（')[1].split('/')[0])
-                total_score += technique_score
-                
-            # 返回归一化的分数（0-1之间）
-            return total_score / 100.0
+                logger.warning(f"对原文评分时发生错误，设置为0分: {str(e)}")
+            return content, score
             
-        except Exception as e:
-            logger.error(f"解析评分结果失败: {str(e)}")
-            logger.error(f"评分结果内容: {rating_result}")
-            return 0.0 
\ No newline at end of file
+    async def agenerate_outline(self, avoid: Optional[List[str]] = None) -> str:
+        """在事件循环中生成故事大纲，见 generate_outline"""
+        return await self.arun(self.outline_steps(avoid))
+        
+    async def agenerate_characters(self, outline: str) -> str:
+        """在事件循环中生成人物设定，见 generate_characters"""
+        return await self.arun(self.characters_steps(outline))
+        
+    async def agenerate_part(self, outline: str, characters: str, part_index: int,
+                             progress: Dict[str, Any]) -> Dict[str, Any]:
+        """在事件循环中生成小说内容的一个部分，见 generate_part"""
+        return await self.arun(self.part_steps(outline, characters, part_index, progress))
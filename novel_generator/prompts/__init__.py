@@ -2,10 +2,12 @@ from . import base
 from . import story
 from . import character
 from . import rewrite
+from . import summary
 
 __all__ = [
     'base',
     'story',
     'character',
-    'rewrite'
+    'rewrite',
+    'summary'
 ] 
\ No newline at end of file
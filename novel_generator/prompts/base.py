@@ -62,11 +62,7 @@ def get_system_prompt(config: Dict[str, Any]) -> str:
 """
     return prompt
 
-def get_rating_prompt() -> str:
-    """
-    生成评分提示词
-    """
-    return """请对小说进行全面评分，评分标准如下：
+_RATING_CRITERIA = """请对小说进行全面评分，评分标准如下：
 
 1. 情节发展（20分）：
    - 故事结构的完整性
@@ -92,7 +88,13 @@ def get_rating_prompt() -> str:
    - 语言风格的统一
    - 细节刻画的精准
 
-请按以下格式输出评分和分析：
+"""
+
+def get_rating_prompt() -> str:
+    """
+    生成评分提示词
+    """
+    return _RATING_CRITERIA + """请按以下格式输出评分和分析：
 
 ## 情节发展（x/20分）
 [详细分析]
@@ -111,6 +113,22 @@ def get_rating_prompt() -> str:
 
 总分：x/100"""
 
+def get_rating_json_format() -> str:
+    """
+    生成评分的JSON输出格式说明
+    """
+    return """请只输出一个JSON对象，不要输出其他内容，格式如下：
+{"情节发展": x, "人物性格一致性": x, "人物行为合理性": x, "人物对话特色": x, "人物成长体现": x, "主题表达": x, "写作技巧": x, "总分": x}
+
+其中 x 为数字：情节发展满分20，人物性格一致性满分10，人物行为合理性满分10，人物对话特色满分5，
+人物成长体现满分5，主题表达满分20，写作技巧满分30，总分为各项之和（满分100）。"""
+
+def get_rating_json_prompt() -> str:
+    """
+    生成要求JSON格式输出的评分提示词
+    """
+    return _RATING_CRITERIA + get_rating_json_format()
+
 def get_rating_user_prompt(content: str) -> str:
     """
     生成评分用户提示词
@@ -123,4 +141,32 @@ def get_rating_user_prompt(content: str) -> str:
     """
     return f"""请对以下小说内容进行评分：
 
-{content}""" 
\ No newline at end of file
+{content}""" 
+
+def get_json_repair_prompt(json_format: str) -> str:
+    """
+    生成将模型输出整理为JSON的提示词
+    
+    Args:
+        json_format: 要求的JSON格式说明
+        
+    Returns:
+        JSON修复提示词
+    """
+    return f"""下面是一段评审意见，但它不是有效的JSON。请将其中的内容整理为JSON，不要添加原文中没有的评价。
+
+{json_format}"""
+
+def get_json_repair_user_prompt(text: str) -> str:
+    """
+    生成JSON修复用户提示词
+    
+    Args:
+        text: 解析失败的模型输出
+        
+    Returns:
+        JSON修复用户提示词
+    """
+    return f"""请整理以下评审意见：
+
+{text}"""
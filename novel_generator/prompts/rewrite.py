@@ -91,6 +91,27 @@ def get_rewrite_feedback_prompt(content_type: str) -> str:
 
 请按以上四个方面详细分析并给出具体的修改建议。"""
 
+def get_feedback_json_format() -> str:
+    """
+    生成重写反馈的JSON输出格式说明
+    """
+    return """请只输出一个JSON对象，不要输出其他内容，格式如下：
+{"优点": ["..."], "需要改进": ["..."], "修改建议": ["..."], "深化建议": ["..."]}
+
+每个字段是字符串列表，每一项为一条具体的意见。"""
+
+def get_rewrite_feedback_json_prompt(content_type: str) -> str:
+    """
+    生成要求JSON格式输出的重写反馈提示词
+    
+    Args:
+        content_type: 内容类型（outline/characters/content）
+        
+    Returns:
+        重写反馈提示词
+    """
+    return f"{get_rewrite_feedback_prompt(content_type)}\n\n{get_feedback_json_format()}"
+
 def get_rewrite_user_prompt(content_type: str, content: str) -> str:
     """
     生成重写用户提示词
@@ -109,60 +130,58 @@ def get_rewrite_user_prompt(content_type: str, content: str) -> str:
     }
     return f"请对以下{type_desc[content_type]}进行分析并提供修改建议：\n\n{content}"
 
-def get_final_rewrite_prompt() -> str:
+def get_final_rewrite_prompt(check_repetitions: bool = True) -> str:
     """
     生成最终重写提示词
     
+    Args:
+        check_repetitions: 是否要求分析重复内容，本地重复检测确认没有重复时为False
+        
     Returns:
         最终重写提示词
     """
-    prompt = """你是一位资深的文学编辑，请对小说进行全面分析，重点关注以下方面：
-
-1. 内容分析：
+    aspects = [
+        """内容分析：
    - 情节的完整性和连贯性
    - 人物塑造的丰满度
    - 主题表达的深度
    - 细节描写的生动性
-   - 对话的真实性
-
-2. 写作风格：
+   - 对话的真实性""",
+        """写作风格：
    - 叙事视角的一致性
    - 写作手法的运用
    - 语言风格的统一
    - 情感表达的深度
-   - 意象和隐喻的使用
-
-3. 重复内容：
+   - 意象和隐喻的使用""",
+        """重复内容：
    - 重复的情节
    - 重复的描写
    - 重复的对话
-   - 重复的意象
-
-4. 作者风格：
+   - 重复的意象""",
+        """作者风格：
    - 是否符合作者的写作偏好
    - 是否体现作者的特色手法
    - 是否达到预期的写作效果
-   - 是否保持风格的一致性
-
-请按照以下格式输出分析结果：
-
-## 内容评价
-[详细分析情节、人物、主题等方面]
-
-## 风格评估
-[分析写作风格、手法运用等]
-
-## 重复问题
-[指出需要去重的内容]
-
-## 改进建议
-[具体的修改和优化建议]
-
-## 深化方向
-[可以进一步加强的方面]"""
+   - 是否保持风格的一致性"""
+    ]
+    sections = [
+        "## 内容评价\n[详细分析情节、人物、主题等方面]",
+        "## 风格评估\n[分析写作风格、手法运用等]",
+        "## 重复问题\n[指出需要去重的内容]",
+        "## 改进建议\n[具体的修改和优化建议]",
+        "## 深化方向\n[可以进一步加强的方面]"
+    ]
+    if not check_repetitions:
+        aspects = [aspect for aspect in aspects if not aspect.startswith("重复内容")]
+        sections = [section for section in sections if not section.startswith("## 重复问题")]
+        
+    prompt = "你是一位资深的文学编辑，请对小说进行全面分析，重点关注以下方面：\n\n"
+    prompt += "\n\n".join(f"{i}. {aspect}" for i, aspect in enumerate(aspects, 1))
+    prompt += "\n\n请按照以下格式输出分析结果：\n\n"
+    prompt += "\n\n".join(sections)
     return prompt
 
-def get_final_rewrite_user_prompt(outline: str, characters: str, content: str) -> str:
+def get_final_rewrite_user_prompt(outline: str, characters: str, content: str, repetitions: str = "") -> str:
     """
     生成最终重写用户提示词
     
@@ -170,11 +189,12 @@ def get_final_rewrite_user_prompt(outline: str, characters: str, content: str) -
         outline: 故事大纲
         characters: 人物设定
         content: 小说内容
+        repetitions: 本地检测到的重复内容列表（可选）
         
     Returns:
         最终重写用户提示词
     """
-    return f"""请根据以下信息对小说进行分析：
+    prompt = f"""请根据以下信息对小说进行分析：
 
 【故事大纲】
 {outline}
@@ -184,27 +204,15 @@ def get_final_rewrite_user_prompt(outline: str, characters: str, content: str) -
 
 【小说内容】
 {content}"""
+    if repetitions:
+        prompt += f"""
 
-def get_final_rewrite_fix_prompt(content: str, analysis: str) -> str:
-    """
-    生成最终重写修复提示词
-    
-    Args:
-        content: 原始内容
-        analysis: 分析结果
-        
-    Returns:
-        最终重写修复提示词
-    """
-    prompt = f"""请根据以下分析结果对小说进行重写：
-
-原文：
-{content}
-
-分析结果：
-{analysis}
+【重复检测结果】
+以下重复内容已由程序检测出（段落序号从1开始，不含标题行），请在“重复问题”中逐条给出删除或改写的方式：
+{repetitions}"""
+    return prompt
 
-重写要求：
+_FINAL_REWRITE_FIX_REQUIREMENTS = """重写要求：
 1. 保持故事的核心情节和主题不变
 2. 调整不符合大纲的内容
 3. 修正人物性格的不一致
@@ -229,4 +237,142 @@ def get_final_rewrite_fix_prompt(content: str, analysis: str) -> str:
     - 注重重点描写内容
 
 请直接输出重写后的完整内容。"""
-    return prompt 
\ No newline at end of file
+
+def get_final_rewrite_fix_prompt(content: str, analysis: str) -> str:
+    """
+    生成最终重写修复提示词
+    
+    Args:
+        content: 原始内容
+        analysis: 分析结果
+        
+    Returns:
+        最终重写修复提示词
+    """
+    prompt = f"""请根据以下分析结果对小说进行重写：
+
+原文：
+{content}
+
+分析结果：
+{analysis}
+
+{_FINAL_REWRITE_FIX_REQUIREMENTS}"""
+    return prompt
+
+def get_final_rewrite_fix_system_prompt() -> str:
+    """
+    生成最终重写修复系统提示词（固定前缀布局）
+    
+    Returns:
+        最终重写修复系统提示词
+    """
+    return f"""请根据用户提供的分析结果对小说进行重写。
+
+{_FINAL_REWRITE_FIX_REQUIREMENTS}"""
+
+def get_final_rewrite_fix_user_prompt(content: str, analysis: str) -> str:
+    """
+    生成最终重写修复用户提示词（固定前缀布局）
+    
+    Args:
+        content: 原始内容
+        analysis: 分析结果
+        
+    Returns:
+        最终重写修复用户提示词
+    """
+    return f"""原文：
+{content}
+
+分析结果：
+{analysis}"""
+
+def get_segment_locate_format() -> str:
+    """
+    生成问题定位的JSON输出格式说明
+    """
+    return """请只输出一个JSON对象，不要输出其他内容，格式如下：
+{"片段": [{"开始段落": 3, "结束段落": 5, "问题": "..."}]}
+
+段落序号为原文中方括号内的数字，开始段落和结束段落都包含在内；每个片段的问题写明需要如何修改。
+没有需要修改的段落时输出 {"片段": []}。"""
+
+def get_segment_locate_prompt() -> str:
+    """
+    生成问题定位提示词：将分析结果中的问题对应到原文的具体段落
+    
+    Returns:
+        问题定位提示词
+    """
+    return f"""你是一位资深的文学编辑。用户会提供一篇带段落序号的小说和对它的分析结果，
+请找出分析结果中每个问题所在的段落，以便只修改这些段落。
+
+要求：
+1. 只列出确实需要修改的段落，不需要修改的段落不要列出
+2. 问题涉及连续的几段时合并为一个片段，每个片段尽量短
+3. 同一个问题出现在多处时分别列出
+4. 涉及全文的问题（如整体节奏、主题）对应到最能体现该问题的段落
+
+{get_segment_locate_format()}"""
+
+def get_segment_locate_user_prompt(content: str, analysis: str) -> str:
+    """
+    生成问题定位用户提示词
+    
+    Args:
+        content: 带段落序号的小说内容
+        analysis: 分析结果
+        
+    Returns:
+        问题定位用户提示词
+    """
+    return f"""【小说内容】
+{content}
+
+【分析结果】
+{analysis}"""
+
+def get_segment_rewrite_prompt() -> str:
+    """
+    生成片段重写提示词
+    
+    Returns:
+        片段重写提示词
+    """
+    return """你是一位资深的文学编辑，请根据修改要求重写小说中的一个片段。
+
+重写要求：
+1. 只重写【待修改片段】，不要输出【上文】和【下文】
+2. 解决修改要求中指出的每个问题，没有问题的句子尽量保持原样
+3. 重写后的片段要与上文和下文自然衔接，不要重复上文和下文已有的内容
+4. 保持人物性格、叙事视角、时态和语言风格与原文一致
+5. 篇幅与原片段相近；要求删除的重复内容可以直接删去
+6. 每段单独一行，段落之间空一行
+
+请直接输出重写后的片段，不要输出任何说明。"""
+
+def get_segment_rewrite_user_prompt(characters: str, before: str, segment: str, after: str, issues: str) -> str:
+    """
+    生成片段重写用户提示词
+    
+    Args:
+        characters: 人物设定
+        before: 片段之前的上下文
+        segment: 待修改的片段
+        after: 片段之后的上下文
+        issues: 修改要求
+        
+    Returns:
+        片段重写用户提示词
+    """
+    prompt = ""
+    if characters:
+        prompt += f"【人物设定】\n{characters}\n\n"
+    if before:
+        prompt += f"【上文】\n{before}\n\n"
+    prompt += f"【待修改片段】\n{segment}\n\n"
+    if after:
+        prompt += f"【下文】\n{after}\n\n"
+    prompt += f"【修改要求】\n{issues}"
+    return prompt
@@ -47,21 +47,27 @@ def get_outline_prompt(config: Dict[str, Any]) -> str:
 """
     return prompt
 
-def get_content_prompt(config: dict, outline: str, characters: str, context: str = None, current_part: str = None) -> str:
+def get_outline_avoid_prompt(outlines: str) -> str:
     """
-    生成内容提示词
+    生成要求避开已有大纲的提示词
     
     Args:
-        config: 配置信息
-        outline: 故事大纲
-        characters: 人物设定
-        context: 已生成的内容（可选）
-        current_part: 当前要生成的部分（开篇/发展/高潮/结局）
+        outlines: 与其他小说雷同而被放弃的大纲
         
     Returns:
-        内容提示词
+        追加在大纲提示词之后的要求，没有需要避开的大纲时返回空字符串
     """
-    prompt = f"""你是一位{config['author_profile']['role']}，请根据以下信息创作小说内容：
+    if not outlines:
+        return ""
+    return f"""
+以下大纲与已有的小说雷同，已被放弃。请创作一个在主要人物、核心冲突和结局上都明显不同的新大纲：
+
+{outlines}
+"""
+
+def _get_content_header(config: dict, outline: str, characters: str) -> str:
+    """生成内容提示词中与当前部分无关的固定部分（作者、设定、大纲、人物）"""
+    return f"""你是一位{config['author_profile']['role']}，请根据以下信息创作小说内容：
 
 标题：{config['novel_settings']['title']}
 类型：{config['novel_settings']['genre']}
@@ -82,10 +88,9 @@ def get_content_prompt(config: dict, outline: str, characters: str, context: str
 人物设定：
 {characters}"""
 
-    if context:
-        prompt += f"""
-
-【前情提要】
+def _get_context_section(context: str) -> str:
+    """生成前情提要部分"""
+    return f"""【前情提要】
 {context}
 
 【人物表现分析】
@@ -104,11 +109,10 @@ def get_content_prompt(config: dict, outline: str, characters: str, context: str
 3. 展现人物的新面向
 4. 深化人物的情感变化
 5. 通过细节凸显人物特点"""
-        
-    if current_part:
-        prompt += f"""
 
-【当前任务】
+def _get_task_section(current_part: str, target_chars: int = None) -> str:
+    """生成当前任务部分"""
+    task = f"""【当前任务】
 请创作"{current_part}"部分的内容。要求：
 1. 确保内容与前文自然衔接
 2. 聚焦于当前部分的核心情节
@@ -120,10 +124,13 @@ def get_content_prompt(config: dict, outline: str, characters: str, context: str
 8. 在对话和行为中体现人物性格
 9. 通过人物互动推动情节发展
 10. 展现人物在当前阶段的心理变化"""
+    if target_chars:
+        task += f"\n11. 本部分篇幅约{target_chars}字，不要明显超出或不足，在篇幅内完整收束本部分的情节"
+    return task
 
-    prompt += """
-
-请确保：
+def _get_checklist_section() -> str:
+    """生成内容提示词末尾的检查要求"""
+    return """请确保：
 1. 情节发展符合大纲设定
 2. 人物性格符合设定
 3. 叙事流畅自然
@@ -135,4 +142,68 @@ def get_content_prompt(config: dict, outline: str, characters: str, context: str
 9. 人物行为有合理动机
 10. 性格特征在细节中体现"""
 
-    return prompt 
\ No newline at end of file
+def get_content_prompt(config: dict, outline: str, characters: str, context: str = None, current_part: str = None,
+                       target_chars: int = None) -> str:
+    """
+    生成内容提示词
+    
+    Args:
+        config: 配置信息
+        outline: 故事大纲
+        characters: 人物设定
+        context: 已生成的内容（可选）
+        current_part: 当前要生成的部分（开篇/发展/高潮/结局）
+        target_chars: 当前部分的目标字数（可选）
+        
+    Returns:
+        内容提示词
+    """
+    prompt = _get_content_header(config, outline, characters)
+
+    if context:
+        prompt += "\n\n" + _get_context_section(context)
+        
+    if current_part:
+        prompt += "\n\n" + _get_task_section(current_part, target_chars)
+
+    prompt += "\n\n" + _get_checklist_section()
+
+    return prompt
+
+def get_content_system_prompt(config: dict, outline: str, characters: str) -> str:
+    """
+    生成内容系统提示词（固定前缀布局）
+    
+    只包含同一篇小说各部分、各次重写都相同的内容，
+    配合 /api/chat 和 keep_alive 可以让Ollama复用已缓存的提示词前缀。
+    
+    Args:
+        config: 配置信息
+        outline: 故事大纲
+        characters: 人物设定
+        
+    Returns:
+        内容系统提示词
+    """
+    return _get_content_header(config, outline, characters) + "\n\n" + _get_checklist_section()
+
+def get_content_user_prompt(context: str = None, current_part: str = None, target_chars: int = None) -> str:
+    """
+    生成内容用户提示词（固定前缀布局）
+    
+    包含随部分变化的前情提要和当前任务，放在系统提示词之后。
+    
+    Args:
+        context: 已生成的内容（可选）
+        current_part: 当前要生成的部分（开篇/发展/高潮/结局）
+        target_chars: 当前部分的目标字数（可选）
+        
+    Returns:
+        内容用户提示词
+    """
+    sections = []
+    if context:
+        sections.append(_get_context_section(context))
+    if current_part:
+        sections.append(_get_task_section(current_part, target_chars))
+    return "\n\n".join(sections)
@@ -0,0 +1,89 @@
+from typing import List, Tuple
+
+def get_part_summary_prompt() -> str:
+    """
+    生成部分摘要提示词
+    
+    Returns:
+        部分摘要提示词
+    """
+    return """请为小说的一个部分撰写情节摘要，要求：
+
+1. 按时间顺序概括发生的主要事件
+2. 写明每个事件涉及的人物
+3. 保留对后续情节有影响的伏笔、线索和未解决的冲突
+4. 保留关键对话的要点
+5. 不做评价，不补充原文没有的内容
+6. 控制在300字以内
+
+请直接输出摘要。"""
+
+def get_part_summary_user_prompt(part_name: str, content: str) -> str:
+    """
+    生成部分摘要用户提示词
+    
+    Args:
+        part_name: 部分名称（开篇/发展/高潮/结局）
+        content: 该部分的内容
+        
+    Returns:
+        部分摘要用户提示词
+    """
+    return f"""请为以下"{part_name}"部分撰写摘要：
+
+{content}"""
+
+def get_character_state_prompt() -> str:
+    """
+    生成人物状态提示词
+    
+    Returns:
+        人物状态提示词
+    """
+    return """请根据已有的人物状态和新写完的小说片段，更新主要人物的当前状态，要求：
+
+1. 每个人物一行，格式为"人物名：当前处境；情绪状态；与其他人物的关系变化；已知的关键信息"
+2. 只记录截至新片段结尾时的状态
+3. 新片段中没有出现的人物保留原有状态
+4. 控制在200字以内
+
+请直接输出更新后的人物状态。"""
+
+def get_character_state_user_prompt(previous_state: str, content: str) -> str:
+    """
+    生成人物状态用户提示词
+    
+    Args:
+        previous_state: 已有的人物状态（可为空）
+        content: 新写完的小说片段
+        
+    Returns:
+        人物状态用户提示词
+    """
+    return f"""【已有的人物状态】
+{previous_state or '（暂无）'}
+
+【新写完的片段】
+{content}"""
+
+def get_compact_context(summaries: List[Tuple[str, str]], character_state: str, recent_text: str) -> str:
+    """
+    生成压缩后的前文内容，用于代替完整前文
+    
+    Args:
+        summaries: 已完成部分的(部分名称, 摘要)列表
+        character_state: 人物状态
+        recent_text: 前文最后几段原文
+        
+    Returns:
+        压缩后的前文内容
+    """
+    summary_text = "\n\n".join(f"{part_name}：{summary}" for part_name, summary in summaries)
+    return f"""【前文摘要】
+{summary_text}
+
+【人物当前状态】
+{character_state or '（暂无）'}
+
+【前文结尾原文】
+{recent_text}"""
@@ -1,8 +1,16 @@
+import os
+import json
+import time
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from loguru import logger
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Iterator, Optional, Tuple
+from .cache_utils import ResponseCache
+from .metrics_utils import MetricsRecorder, call_record
+from .host_utils import Host, HostPool, Slot
+from .latency_utils import LatencyTracker
 
 class OllamaAPI:
     def __init__(self, config: Dict[str, Any]):
@@ -13,65 +21,556 @@ class OllamaAPI:
             config: 配置字典
         """
         self.config = config
-        self.base_url = f"{config['ai_settings']['host']}:{config['ai_settings']['port']}"
         
-        # 创建带有重试机制的会话
+        # 服务器池：配置了 ai_settings.hosts 时在多台服务器间负载均衡
+        # 每台服务器同时进行的最大请求数应与其 OLLAMA_NUM_PARALLEL 保持一致
+        self.hosts = HostPool.from_config(config)
+        self.base_url = self.hosts.hosts[0].url
+        self.max_concurrency = self.hosts.max_concurrency * len(self.hosts.hosts)
+        
+        # 创建会话，连接池保持长连接以便并发请求复用
+        # 重试由 _failover 和 _backoff 处理（改用其他服务器或等待后重试），连接池本身不重试
         self.session = requests.Session()
-        retries = Retry(
-            total=3,  # 最大重试次数
-            backoff_factor=1,  # 重试间隔
-            status_forcelist=[500, 502, 503, 504]  # 需要重试的HTTP状态码
+        adapter = HTTPAdapter(
+            max_retries=0,
+            pool_connections=len(self.hosts.hosts),
+            pool_maxsize=self.hosts.max_concurrency
         )
-        self.session.mount('http://', HTTPAdapter(max_retries=retries))
-        logger.debug("已配置重试机制：最大重试3次，间隔1秒")
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        logger.debug(f"Ollama服务器：{', '.join(h.url for h in self.hosts.hosts)}，最大并发请求数：{self.max_concurrency}")
+        
+        # 请求超时、服务器失败时的重试和对冲请求（见 request_settings）
+        request_settings = config.get('request_settings', {})
+        self.latency = LatencyTracker.from_config(config)
+        self.max_retries = request_settings.get('max_retries', 3)
+        self.retry_backoff = request_settings.get('retry_backoff', 1)
+        logger.debug(f"已配置重试机制：最多重试{self.max_retries}次，间隔{self.retry_backoff}秒起按2倍递增")
+        self._hedge_executor = None
+        if self.latency.hedge and len(self.hosts.hosts) > 1:
+            # 每个请求在占用服务器槽位后才提交，同时进行的请求数不超过总槽位数
+            self._hedge_executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='ollama-hedge')
+        
+        # generate：调用 /api/generate；chat：调用 /api/chat，系统和用户提示词作为独立消息发送
+        self.api_mode = config['ai_settings'].get('api_mode', 'generate')
+        if self.api_mode not in ('generate', 'chat'):
+            raise ValueError(f"不支持的api_mode：{self.api_mode}")
+        self.api_path = f"/api/{self.api_mode}"
+        
+        # 按阶段使用不同的模型和生成选项（可选），如反馈和评分使用较小的模型
+        self.stage_models = config['ai_settings'].get('stage_models') or {}
+        self.stage_options = config['ai_settings'].get('stage_options') or {}
+        for stage, model in self.stage_models.items():
+            logger.info(f"阶段 {stage} 使用模型：{model}")
+        
+        # 响应缓存（可选）
+        cache_settings = config.get('cache_settings', {})
+        self.cache = None
+        self.cache_disabled_stages = set(cache_settings.get('disabled_stages', []))
+        if cache_settings.get('enabled', False):
+            self.cache = ResponseCache(
+                cache_settings.get('cache_dir', './.cache/ollama'),
+                cache_settings.get('max_size_mb', 512)
+            )
+            
+        # 调用统计（可选），文件默认保存在输出根目录
+        metrics_settings = config.get('metrics_settings', {})
+        self.metrics = None
+        if metrics_settings.get('enabled', False):
+            output_dir = config.get('output_settings', {}).get('output_dir', '.')
+            prometheus_file = metrics_settings.get('prometheus_file')
+            self.metrics = MetricsRecorder(
+                os.path.join(output_dir, metrics_settings.get('jsonl_file', 'metrics.jsonl')),
+                os.path.join(output_dir, prometheus_file) if prometheus_file else None
+            )
+            
+        # 每个线程最近一次调用的统计记录
+        self._local = threading.local()
+        
+    def model_for(self, stage: Optional[str] = None) -> str:
+        """
+        获取一个阶段使用的模型
         
-    def generate(self, system_prompt: str, user_prompt: str = "") -> str:
+        Args:
+            stage: 调用所属的阶段（可选）
+            
+        Returns:
+            ai_settings.stage_models 中该阶段的模型，未设置时为 ai_settings.model
+        """
+        return self.stage_models.get(stage) or self.config['ai_settings']['model']
+        
+    def _build_request(self, system_prompt: str, user_prompt: str, stream: bool,
+                       options: Optional[Dict[str, Any]] = None,
+                       response_format: Optional[Any] = None,
+                       stage: Optional[str] = None) -> Dict[str, Any]:
+        """
+        构建请求数据
+        
+        生成选项依次由默认设置、ai_settings.stage_options 中该阶段的设置和本次调用的 options 覆盖。
+        
+        Args:
+            system_prompt: 系统提示词
+            user_prompt: 用户提示词
+            stream: 是否使用流式输出
+            options: 覆盖默认生成选项的参数（可选），如 num_ctx、num_predict
+            response_format: 输出格式（可选），"json" 或 JSON Schema
+            stage: 调用所属的阶段（可选），用于选择模型和阶段的生成选项
+            
+        Returns:
+            请求数据
+        """
+        request_options = {
+            "temperature": self.config['ai_settings']['temperature'],
+            "num_ctx": self.config['ai_settings']['context_size'],
+            "num_predict": self.config['ai_settings']['num_predict']
+        }
+        if 'seed' in self.config['ai_settings']:
+            request_options['seed'] = self.config['ai_settings']['seed']
+        request_options.update(self.stage_options.get(stage) or {})
+        if options:
+            request_options.update(options)
+        
+        data = {
+            "model": self.model_for(stage),
+            "stream": stream,
+            "options": request_options
+        }
+        if 'keep_alive' in self.config['ai_settings']:
+            data['keep_alive'] = self.config['ai_settings']['keep_alive']
+        if response_format is not None:
+            data['format'] = response_format
+        
+        if self.api_mode == 'chat':
+            messages = [{"role": "system", "content": system_prompt}]
+            if user_prompt:
+                messages.append({"role": "user", "content": user_prompt})
+            data['messages'] = messages
+            logger.debug(f"提示词长度: 系统 {len(system_prompt)} 字符，用户 {len(user_prompt)} 字符")
+        else:
+            # 构建完整的提示词
+            data['prompt'] = f"{system_prompt}\n\n{user_prompt}"
+            logger.debug(f"提示词长度: {len(data['prompt'])} 字符")
+        return data
+        
+    def _response_text(self, result: Dict[str, Any]) -> str:
+        """从响应（或流式响应的一段）中取出生成的文本"""
+        if self.api_mode == 'chat':
+            return result.get('message', {}).get('content', '')
+        return result.get('response', '')
+        
+    def _cache_key(self, system_prompt: str, user_prompt: str, stage: Optional[str],
+                   labels: Optional[Dict[str, Any]], options: Optional[Dict[str, Any]],
+                   response_format: Optional[Any] = None) -> Optional[str]:
+        """
+        计算缓存键，未启用缓存或该阶段不使用缓存时返回None
+        
+        缓存键由模型、生成选项、完整提示词和调用标签共同决定，
+        标签（小说序号、重写轮次等）用于区分提示词相同但需要不同结果的调用。
+        """
+        if self.cache is None or stage in self.cache_disabled_stages:
+            return None
+        data = self._build_request(system_prompt, user_prompt, stream=False, options=options,
+                                   response_format=response_format, stage=stage)
+        payload = {k: v for k, v in data.items() if k not in ('stream', 'keep_alive')}
+        payload['labels'] = labels or {}
+        return ResponseCache.make_key(payload)
+        
+    def generate(self, system_prompt: str, user_prompt: str = "",
+                 on_token: Optional[Callable[[str], None]] = None,
+                 stage: Optional[str] = None,
+                 labels: Optional[Dict[str, Any]] = None,
+                 options: Optional[Dict[str, Any]] = None,
+                 response_format: Optional[Any] = None,
+                 on_restart: Optional[Callable[[], None]] = None,
+                 on_truncated: Optional[Callable[[str], str]] = None) -> str:
         """
         调用Ollama API生成内容
         
         Args:
             system_prompt: 系统提示词
             user_prompt: 用户提示词（可选）
+            on_token: 流式输出回调，每收到一段文本调用一次（可选）。
+                传入回调或配置 ai_settings.stream 为 true 时使用流式接口
+            stage: 调用所属的阶段（outline/characters/content/feedback/analysis/fix/rating）
+            labels: 调用标签，如小说序号、重写轮次（可选）
+            options: 覆盖默认生成选项的参数（可选），如 num_ctx、num_predict
+            response_format: 输出格式（可选），"json" 或 JSON Schema，用于要求结构化输出
+            on_restart: 流式输出中途中断、从头重新生成之前的回调（可选），回调方应丢弃已收到的文本。
+                传入 on_token 而不传入该回调时，已输出部分内容的流式调用中断后不重试
+            on_truncated: 生成达到 options 中 num_predict 上限时处理结果的函数（可选），如截去不完整的句子。
+                缓存中保存处理后的结果，命中缓存时与首次生成的结果相同
             
         Returns:
             API响应内容
         """
+        start_time = time.monotonic()
+        cache_key = self._cache_key(system_prompt, user_prompt, stage, labels, options, response_format)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.debug(f"命中响应缓存（{stage}），响应长度: {len(cached)} 字符")
+                self._record(stage, labels, start_time, cached=True)
+                if on_token is not None:
+                    on_token(cached)
+                return cached
+        
         try:
-            # 构建完整的提示词
-            full_prompt = f"{system_prompt}\n\n{user_prompt}"
-            prompt_length = len(full_prompt)
-            logger.debug(f"提示词长度: {prompt_length} 字符")
+            response, stats = self._request(system_prompt, user_prompt, on_token, options, response_format,
+                                            stage, on_restart)
+        except Exception as e:
+            self._record(stage, labels, start_time, error=str(e))
+            raise
+        self._record(stage, labels, start_time, stats)
+        limit = (options or {}).get('num_predict')
+        if on_truncated is not None and limit and limit > 0 and stats.get('eval_count', 0) >= limit:
+            response = on_truncated(response)
+        
+        if cache_key is not None and response:
+            self.cache.put(cache_key, response)
+        return response
+        
+    def _record(self, stage: Optional[str], labels: Optional[Dict[str, Any]], start_time: float,
+                stats: Optional[Dict[str, Any]] = None, cached: bool = False, error: Optional[str] = None):
+        """
+        记录一次调用的统计信息
+        
+        Args:
+            stage: 调用所属的阶段
+            labels: 调用标签
+            start_time: 调用开始时间（time.monotonic）
+            stats: Ollama 响应中的统计字段（可选）
+            cached: 是否命中响应缓存
+            error: 调用失败时的错误信息（可选）
+        """
+        record = call_record(stage, labels, self.model_for(stage),
+                             time.monotonic() - start_time, stats, cached, error)
+        self._local.last_record = record
+        if stats:
+            logger.debug(
+                f"调用统计（{record['stage']}）：耗时{record['wall_time']:.1f}秒，"
+                f"加载{record['load_duration']:.1f}秒，"
+                f"提示词{record['prompt_eval_count']}个token（{record['prompt_eval_duration']:.1f}秒），"
+                f"生成{record['eval_count']}个token（{record['tokens_per_sec']:.1f} token/秒）"
+            )
+        if self.metrics is not None:
+            self.metrics.record(record)
             
-            # 准备请求数据
-            data = {
-                "model": self.config['ai_settings']['model'],
-                "prompt": full_prompt,
-                "stream": False,
-                "options": {
-                    "temperature": self.config['ai_settings']['temperature'],
-                    "num_ctx": self.config['ai_settings']['context_size'],
-                    "num_predict": self.config['ai_settings']['num_predict']
-                }
-            }
+    def last_call(self) -> Optional[Dict[str, Any]]:
+        """
+        获取当前线程最近一次调用的统计记录
+        
+        Returns:
+            统计记录（阶段、耗时、token数、生成速度等），尚未调用时返回None
+        """
+        return getattr(self._local, 'last_record', None)
+        
+    def _request(self, system_prompt: str, user_prompt: str,
+                 on_token: Optional[Callable[[str], None]],
+                 options: Optional[Dict[str, Any]] = None,
+                 response_format: Optional[Any] = None,
+                 stage: Optional[str] = None,
+                 on_restart: Optional[Callable[[], None]] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        向Ollama发送请求
+        
+        Args:
+            system_prompt: 系统提示词
+            user_prompt: 用户提示词
+            on_token: 流式输出回调（可选）
+            options: 覆盖默认生成选项的参数（可选）
+            response_format: 输出格式（可选）
+            stage: 调用所属的阶段（可选），用于对冲请求的等待时间
+            on_restart: 流式输出中断后从头重新生成之前的回调（可选）
             
-            # 发送请求
-            logger.debug("开始调用Ollama API...")
-            response = self.session.post(
-                f"{self.base_url}/api/generate",
-                json=data,
-                timeout=300  # 设置5分钟超时
-            )
-            response.raise_for_status()
+        Returns:
+            (API响应内容, 响应中的统计字段)
+        """
+        if on_token is not None or self.config['ai_settings'].get('stream', False):
+            attempt = 0
+            while True:
+                chunks = []
+                self._local.stream_stats = {}
+                try:
+                    for chunk in self.generate_stream(system_prompt, user_prompt, options, response_format, stage):
+                        chunks.append(chunk)
+                        if on_token is not None:
+                            on_token(chunk)
+                    return ''.join(chunks), self._local.stream_stats
+                except requests.exceptions.RequestException as e:
+                    # 已输出部分内容后中断：没有流式回调，或回调方可以丢弃已收到的文本时从头重新生成
+                    restartable = chunks and (on_token is None or on_restart is not None)
+                    if not restartable or attempt >= self.max_retries or not self._host_failure(e):
+                        raise
+                    attempt += 1
+                    logger.warning(f"流式输出中途中断（已收到{sum(len(c) for c in chunks)}字符），"
+                                   f"从头重新生成（第{attempt}/{self.max_retries}次）")
+                    if on_restart is not None:
+                        on_restart()
             
-            # 解析响应
-            result = response.json()
-            response_length = len(result.get('response', ''))
-            logger.debug(f"API调用成功，响应长度: {response_length} 字符")
-            return result.get('response', '')
+        # 准备请求数据
+        data = self._build_request(system_prompt, user_prompt, stream=False, options=options,
+                                   response_format=response_format, stage=stage)
+        timeout = self.latency.request_timeout(data['model'], f"{system_prompt}\n\n{user_prompt}",
+                                               data['options'].get('num_predict'))
+        tried = set()
+        attempt = 0
+        while True:
+            slot = self.hosts.claim(data['model'], tried)
+            tried.add(slot.host.url)
+            host, result, error = self._send(slot, data, timeout, stage, tried)
+            if error is not None:
+                if self._failover(host, error, tried):
+                    continue
+                delay = self._backoff(host, error, tried, attempt)
+                if delay is not None:
+                    attempt += 1
+                    time.sleep(delay)
+                    continue
+                if isinstance(error, requests.exceptions.Timeout):
+                    logger.error(f"调用Ollama API超时（{timeout[1]:.0f}秒）")
+                else:
+                    logger.error(f"调用Ollama API失败: {str(error)}")
+                raise error
+                
+            text = self._response_text(result)
+            logger.debug(f"API调用成功，响应长度: {len(text)} 字符")
+            return text, result
             
-        except requests.exceptions.Timeout:
-            logger.error("调用Ollama API超时（5分钟）")
-            raise
+    def _post(self, slot: Slot, data: Dict[str, Any], timeout: Tuple[float, float],
+              stage: Optional[str]) -> Dict[str, Any]:
+        """
+        向一台服务器发送非流式请求，报告成功或失败后释放 claim 占用的槽位
+        
+        Args:
+            slot: 已占用的服务器槽位
+            data: 请求数据
+            timeout: （连接超时, 读取超时）
+            stage: 调用所属的阶段（可选）
+            
+        Returns:
+            响应
+        """
+        host = slot.host
+        try:
+            logger.debug(f"开始调用Ollama API（{host.url}）...")
+            start_time = time.monotonic()
+            response = self.session.post(f"{host.url}{self.api_path}", json=data, timeout=timeout)
+            response.raise_for_status()
+            result = response.json()
+            self.hosts.report_success(slot, result, data['model'])
         except requests.exceptions.RequestException as e:
-            logger.error(f"调用Ollama API失败: {str(e)}")
-            raise 
\ No newline at end of file
+            # 释放槽位之前报告失败，试探请求失败时断路器才会重新打开
+            if self._host_failure(e):
+                self.hosts.report_failure(slot, str(e))
+            raise
+        finally:
+            self.hosts.release(slot)
+        self.latency.observe(data['model'], stage, time.monotonic() - start_time, result)
+        return result
+        
+    def _send(self, slot: Slot, data: Dict[str, Any], timeout: Tuple[float, float], stage: Optional[str],
+              tried: set) -> Tuple[Host, Optional[Dict[str, Any]], Optional[requests.exceptions.RequestException]]:
+        """
+        发送非流式请求，启用对冲请求时在耗时过长后向另一台服务器发送相同的请求
+        
+        请求耗时超过同阶段调用耗时的分位数（见 LatencyTracker.hedge_delay）时，
+        如果另一台服务器有空闲槽位，就向它发送相同的请求，使用先成功完成的结果；
+        另一个请求不会中断，完成后释放其槽位。
+        
+        Args:
+            slot: 已占用的服务器槽位
+            data: 请求数据
+            timeout: （连接超时, 读取超时）
+            stage: 调用所属的阶段（可选）
+            tried: 本次请求已尝试过的服务器地址，对冲请求使用的服务器也会加入
+            
+        Returns:
+            （服务器, 响应, 异常）：成功时为完成请求的服务器和响应，失败时为最后失败的服务器和异常
+        """
+        delay = self.latency.hedge_delay(data['model'], stage) if self._hedge_executor is not None else None
+        host = slot.host
+        if delay is None:
+            try:
+                return host, self._post(slot, data, timeout, stage), None
+            except requests.exceptions.RequestException as e:
+                return host, None, e
+                
+        futures = {self._hedge_executor.submit(self._post, slot, data, timeout, stage): host}
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            backup = self.hosts.claim(data['model'], tried, block=False)
+            if backup is not None:
+                tried.add(backup.host.url)
+                logger.info(f"{stage or '调用'}耗时超过{delay:.1f}秒，向 {backup.host.url} 发送对冲请求")
+                futures[self._hedge_executor.submit(self._post, backup, data, timeout, stage)] = backup.host
+                
+        pending = set(futures)
+        failed = host, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except requests.exceptions.RequestException as e:
+                    # 失败已由 _post 报告，另一个请求仍在进行时等待其结果
+                    failed = futures[future], e
+                    continue
+                if len(futures) > 1:
+                    self.latency.record_hedge(futures[future] is not host)
+                return futures[future], result, None
+        return failed[0], None, failed[1]
+        
+    @staticmethod
+    def _host_failure(error: requests.exceptions.RequestException) -> bool:
+        """是否为服务器本身的问题（连接失败、超时、中途断开、5xx）"""
+        response = getattr(error, 'response', None)
+        return (
+            isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                               requests.exceptions.ChunkedEncodingError))
+            or (response is not None and (response.status_code >= 500 or response.status_code == 404))
+        )
+        
+    def _failover(self, host: Host, error: requests.exceptions.RequestException, tried: set) -> bool:
+        """
+        处理请求失败：服务器本身的问题（连接失败、超时、5xx）且还有其他可用服务器时改用其他服务器。
+        失败应已在释放槽位之前通过 HostPool.report_failure 报告
+        
+        Args:
+            host: 失败的服务器
+            error: 请求异常
+            tried: 本次请求已尝试过的服务器地址
+            
+        Returns:
+            还有其他可用服务器、应改用其他服务器重试时返回True
+        """
+        if not self._host_failure(error):
+            return False
+        if self.hosts.has_alternative(tried):
+            logger.warning(f"Ollama服务器 {host.url} 请求失败，改用其他服务器重试...")
+            return True
+        return False
+        
+    def _backoff(self, host: Host, error: requests.exceptions.RequestException, tried: set,
+                 attempt: int) -> Optional[float]:
+        """
+        处理没有其他可用服务器时的请求失败：等待后重试（所有服务器都可以再次选择）
+        
+        Args:
+            host: 失败的服务器
+            error: 请求异常
+            tried: 本次请求已尝试过的服务器地址
+            attempt: 本次请求已经等待重试的次数
+            
+        Returns:
+            重试前应等待的秒数，不应重试时返回None。调用方应在释放服务器槽位之后等待
+        """
+        if not self._host_failure(error) or attempt >= self.max_retries:
+            return None
+        delay = self.retry_backoff * 2 ** attempt
+        logger.warning(f"Ollama服务器 {host.url} 请求失败（{str(error)}），{delay:.0f}秒后重试（第{attempt + 1}/{self.max_retries}次）")
+        tried.clear()
+        return delay
+        
+
+    def generate_stream(self, system_prompt: str, user_prompt: str = "",
+                        options: Optional[Dict[str, Any]] = None,
+                        response_format: Optional[Any] = None,
+                        stage: Optional[str] = None) -> Iterator[str]:
+        """
+        以流式方式调用Ollama API，逐段返回生成的文本
+        
+        读取 /api/generate（或 /api/chat）返回的NDJSON流。超时只限制两段数据之间的等待时间，
+        因此耗时很长但持续输出的生成不会被中断。输出任何内容之前失败时改用其他服务器或等待后重试；
+        已输出部分内容后中断时抛出异常，由调用方决定是否从头重新生成。
+        
+        Args:
+            system_prompt: 系统提示词
+            user_prompt: 用户提示词（可选）
+            options: 覆盖默认生成选项的参数（可选）
+            response_format: 输出格式（可选）
+            stage: 调用所属的阶段（可选）
+            
+        Yields:
+            新生成的文本片段
+        """
+        # 两次输出之间允许的最长等待时间
+        chunk_timeout = self.config['ai_settings'].get('stream_chunk_timeout', 300)
+        data = self._build_request(system_prompt, user_prompt, stream=True, options=options,
+                                   response_format=response_format, stage=stage)
+        timeout = self.latency.stream_timeout(data['model'], f"{system_prompt}\n\n{user_prompt}", chunk_timeout)
+        
+        tried = set()
+        attempt = 0
+        delay = None
+        while True:
+            if delay is not None:
+                time.sleep(delay)
+                attempt += 1
+                delay = None
+            response_length = 0
+            start_time = time.monotonic()
+            with self.hosts.acquire(data['model'], tried) as slot:
+                host = slot.host
+                tried.add(host.url)
+                try:
+                    with self.session.post(
+                        f"{host.url}{self.api_path}",
+                        json=data,
+                        stream=True,
+                        timeout=timeout
+                    ) as response:
+                        logger.debug(f"开始以流式方式调用Ollama API（{host.url}）...")
+                        response.raise_for_status()
+                        
+                        stats = {}
+                        for line in response.iter_lines():
+                            if not line:
+                                continue
+                            try:
+                                chunk = json.loads(line)
+                            except ValueError as e:
+                                raise requests.exceptions.InvalidJSONError(f"无法解析流式响应: {line[:100]!r}") from e
+                            if 'error' in chunk:
+                                raise requests.exceptions.RequestException(chunk['error'])
+                                
+                            text = self._response_text(chunk)
+                            if text:
+                                response_length += len(text)
+                                yield text
+                                
+                            if chunk.get('done'):
+                                # 最后一段包含耗时和token数等统计字段
+                                stats = chunk
+                                self._local.stream_stats = chunk
+                                break
+                        if not stats:
+                            raise requests.exceptions.ChunkedEncodingError("流式响应在完成之前中断")
+                                
+                except requests.exceptions.RequestException as e:
+                    if self._host_failure(e):
+                        self.hosts.report_failure(slot, str(e))
+                    # 已经输出了部分内容时不能改用其他服务器
+                    if response_length == 0:
+                        if self._failover(host, e, tried):
+                            continue
+                        delay = self._backoff(host, e, tried, attempt)
+                        if delay is not None:
+                            continue
+                    if isinstance(e, requests.exceptions.Timeout):
+                        logger.error(f"调用Ollama API超时（{timeout[1]:.0f}秒内未收到新内容）")
+                    else:
+                        logger.error(f"调用Ollama API失败: {str(e)}")
+                    raise
+                self.hosts.report_success(slot, stats, data['model'])
+                
+            self.latency.observe(data['model'], stage, time.monotonic() - start_time, stats)
+            logger.debug(f"流式API调用成功，响应长度: {response_length} 字符")
+            return
+
+            
+    def close(self):
+        """关闭会话及其连接池，停止健康检查"""
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+        self.hosts.close()
+        self.session.close()
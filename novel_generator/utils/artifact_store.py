@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Any, List, Optional
+from loguru import logger
+from .file_utils import ensure_dir, save_content
+
+ARTIFACT_DB_NAME = 'artifacts.db'
+
+# 各类内容导出时的文件名（不含小说标题的部分）
+_EXPORT_NAMES = {'outline': 'outline', 'characters': 'characters'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    novel INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    part INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL,
+    content BLOB NOT NULL,
+    digest TEXT NOT NULL,
+    chars INTEGER NOT NULL,
+    feedback TEXT,
+    score REAL,
+    provenance TEXT,
+    selected INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    UNIQUE (novel, kind, part, version)
+);
+CREATE INDEX IF NOT EXISTS artifacts_digest ON artifacts (novel, kind, part, digest);
+"""
+
+class ArtifactStore:
+    def __init__(self, path: str):
+        """
+        初始化运行产物库
+        
+        一次运行的所有产物保存在一个SQLite文件中：大纲、人物设定、各部分内容的每个版本（含候选版本），
+        最终重写的每一轮，以及完成的小说，连同反馈、评分和来源（阶段、轮次、候选序号、模型等）。
+        内容以zlib压缩后的BLOB保存。同一内容的版本号按 (小说, 类型, 部分) 递增，
+        分配时只需在唯一索引上取一次最大值，不必逐个检查文件是否存在。
+        每类内容被选用的版本可以随时导出为原有的markdown目录结构（见 export）。
+        
+        Args:
+            path: 数据库文件路径
+        """
+        self.path = path
+        ensure_dir(os.path.dirname(os.path.abspath(path)))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], output_dir: str) -> Optional['ArtifactStore']:
+        """
+        根据配置创建产物库
+        
+        Args:
+            config: 配置字典
+            output_dir: 输出根目录，相对路径相对于该目录
+            
+        Returns:
+            产物库，未启用 artifact_settings 时返回None
+        """
+        settings = config.get('artifact_settings', {})
+        if not settings.get('enabled', False):
+            return None
+        store = cls(os.path.join(output_dir, settings.get('path', ARTIFACT_DB_NAME)))
+        logger.info(f"运行产物库: {store.path}")
+        return store
+        
+    @staticmethod
+    def _digest(content: str) -> str:
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+        
+    def add(self, novel: int, kind: str, content: str, part: int = 0, feedback: Optional[str] = None,
+            score: Optional[float] = None, provenance: Optional[Dict[str, Any]] = None,
+            selected: bool = False) -> int:
+        """
+        保存一个新版本
+        
+        Args:
+            novel: 小说序号（从0开始）
+            kind: 内容类型，如 outline、characters、content、final、novel
+            content: 内容
+            part: 部分序号（可选），用于各部分内容
+            feedback: 反馈或分析（可选）
+            score: 评分（可选）
+            provenance: 来源信息（可选），如阶段、重写轮次、候选序号、模型
+            selected: 是否设为该类内容被选用的版本
+            
+        Returns:
+            版本的id
+        """
+        data = zlib.compress(content.encode('utf-8'))
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                version = self._conn.execute(
+                    'SELECT COALESCE(MAX(version), 0) + 1 FROM artifacts WHERE novel = ? AND kind = ? AND part = ?',
+                    (novel, kind, part)
+                ).fetchone()[0]
+                if selected:
+                    self._conn.execute('UPDATE artifacts SET selected = 0 WHERE novel = ? AND kind = ? AND part = ?',
+                                       (novel, kind, part))
+                cursor = self._conn.execute(
+                    'INSERT INTO artifacts (novel, kind, part, version, content, digest, chars, feedback, score, '
+                    'provenance, selected, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (novel, kind, part, version, data, self._digest(content), len(content), feedback, score,
+                     json.dumps(provenance or {}, ensure_ascii=False), int(selected), time.time())
+                )
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return cursor.lastrowid
+        
+    def select(self, novel: int, kind: str, content: str, part: int = 0,
+               provenance: Optional[Dict[str, Any]] = None) -> int:
+        """
+        将内容相同的最新版本设为被选用的版本，没有相同内容的版本时新增一个
+        
+        Args:
+            novel: 小说序号
+            kind: 内容类型
+            content: 被选用的内容
+            part: 部分序号（可选）
+            provenance: 需要新增版本时使用的来源信息（可选）
+            
+        Returns:
+            被选用版本的id
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id FROM artifacts WHERE novel = ? AND kind = ? AND part = ? AND digest = ? '
+                'ORDER BY version DESC LIMIT 1',
+                (novel, kind, part, self._digest(content))
+            ).fetchone()
+            if row is not None:
+                self._conn.execute('BEGIN IMMEDIATE')
+                self._conn.execute('UPDATE artifacts SET selected = (id = ?) WHERE novel = ? AND kind = ? AND part = ?',
+                                   (row['id'], novel, kind, part))
+                self._conn.execute('COMMIT')
+                return row['id']
+        return self.add(novel, kind, content, part, provenance=provenance, selected=True)
+        
+    def _row(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """将一行记录转为字典，内容解压，来源信息解析为字典"""
+        item = dict(row)
+        item['content'] = zlib.decompress(item['content']).decode('utf-8')
+        item['provenance'] = json.loads(item['provenance'] or '{}')
+        return item
+        
+    def get(self, artifact_id: int) -> Optional[Dict[str, Any]]:
+        """
+        读取一个版本
+        
+        Args:
+            artifact_id: 版本的id
+            
+        Returns:
+            版本（内容、反馈、评分、来源等），不存在时返回None
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM artifacts WHERE id = ?', (artifact_id,)).fetchone()
+        return self._row(row) if row is not None else None
+        
+    def selected(self, novel: int, kind: str, part: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        读取一类内容被选用的版本
+        
+        Args:
+            novel: 小说序号
+            kind: 内容类型
+            part: 部分序号（可选）
+            
+        Returns:
+            被选用的版本，没有时返回None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT * FROM artifacts WHERE novel = ? AND kind = ? AND part = ? AND selected = 1',
+                (novel, kind, part)
+            ).fetchone()
+        return self._row(row) if row is not None else None
+        
+    def versions(self, novel: Optional[int] = None, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        列出版本
+        
+        Args:
+            novel: 只列出该小说的版本（可选）
+            kind: 只列出该类型的版本（可选）
+            
+        Returns:
+            版本列表，按小说、类型、部分、版本号排列
+        """
+        conditions, params = [], []
+        if novel is not None:
+            conditions.append('novel = ?')
+            params.append(novel)
+        if kind is not None:
+            conditions.append('kind = ?')
+            params.append(kind)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT * FROM artifacts{where} ORDER BY novel, kind, part, version', params
+            ).fetchall()
+        return [self._row(row) for row in rows]
+        
+    def export(self, novels_dir: str, title: str, versions: bool = False) -> List[str]:
+        """
+        将被选用的版本导出为markdown目录结构
+        
+        每篇小说导出到 <novels_dir>/<标题>_<序号>/：outline.md、characters.md、<标题>.md，
+        评分最高的小说另存为 <novels_dir>/<标题>_best.md。
+        
+        Args:
+            novels_dir: 小说存放目录
+            title: 小说标题
+            versions: 为True时另将所有版本（含反馈和评分）导出到各小说目录下的 versions/ 中
+            
+        Returns:
+            导出的文件路径
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT * FROM artifacts WHERE selected = 1 AND kind IN (?, ?, ?) ORDER BY novel',
+                ('outline', 'characters', 'novel')
+            ).fetchall()
+        paths = []
+        best = None
+        for row in rows:
+            item = self._row(row)
+            novel_dir = os.path.join(novels_dir, f"{title}_{item['novel'] + 1}")
+            ensure_dir(novel_dir)
+            path = os.path.join(novel_dir, f"{_EXPORT_NAMES.get(item['kind'], title)}.md")
+            save_content(item['content'], path)
+            paths.append(path)
+            if item['kind'] == 'novel' and (best is None or (item['score'] or 0) > (best['score'] or 0)):
+                best = item
+        if best is not None:
+            path = os.path.join(novels_dir, f"{title}_best.md")
+            save_content(best['content'], path)
+            paths.append(path)
+            
+        if versions:
+            for item in self.versions():
+                directory = os.path.join(novels_dir, f"{title}_{item['novel'] + 1}", 'versions')
+                ensure_dir(directory)
+                name = item['kind'] + (f"_part{item['part']}" if item['part'] else "") + f"_v{item['version']}"
+                text = item['content']
+                if item['score'] is not None or item['feedback']:
+                    text += f"\n\n---\n\n评分：{item['score'] if item['score'] is not None else '-'}"
+                    if item['feedback']:
+                        text += f"\n\n{item['feedback']}"
+                path = os.path.join(directory, f"{name}.md")
+                save_content(text, path)
+                paths.append(path)
+        return paths
+        
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,191 @@
+import time
+import asyncio
+import contextvars
+import httpx
+from loguru import logger
+from typing import Dict, Any, Callable, Optional
+from .api_utils import OllamaAPI
+from .host_utils import Slot
+from .metrics_utils import call_record
+
+# 每个异步任务最近一次调用的统计记录（相当于 OllamaAPI 的线程局部记录）
+_last_record = contextvars.ContextVar('ollama_last_record', default=None)
+
+class AsyncOllamaAPI:
+    def __init__(self, config: Dict[str, Any], client: Optional[OllamaAPI] = None):
+        """
+        初始化异步Ollama API客户端
+        
+        请求通过 httpx.AsyncClient 的长连接池发送，连接数与总并发请求数相同，
+        同时进行的请求数由 asyncio.Semaphore 限制为 ai_settings.max_concurrency 乘以服务器数量。
+        服务器池（负载均衡、断路器）、超时、响应缓存和调用统计与同步客户端共用。
+        
+        Args:
+            config: 配置字典
+            client: 共用服务器池、缓存和统计的同步客户端（可选），不传时新建
+        """
+        self.config = config
+        self.client = client if client is not None else OllamaAPI(config)
+        self._owns_client = client is None
+        self.hosts = self.client.hosts
+        self.max_concurrency = self.client.max_concurrency
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._session = None
+        logger.debug(f"异步客户端最大并发请求数：{self.max_concurrency}")
+    
+    def _get_session(self) -> httpx.AsyncClient:
+        """获取连接池（首次使用时在事件循环中创建）"""
+        if self._session is None:
+            limits = httpx.Limits(max_connections=self.max_concurrency,
+                                  max_keepalive_connections=self.max_concurrency)
+            self._session = httpx.AsyncClient(limits=limits, timeout=None)
+        return self._session
+    
+    def model_for(self, stage: Optional[str] = None) -> str:
+        """获取一个阶段使用的模型，见 OllamaAPI.model_for"""
+        return self.client.model_for(stage)
+    
+    def last_call(self) -> Optional[Dict[str, Any]]:
+        """
+        获取当前异步任务最近一次调用的统计记录
+        
+        Returns:
+            统计记录（阶段、耗时、token数、生成速度等），尚未调用时返回None
+        """
+        return _last_record.get()
+    
+    async def generate(self, system_prompt: str, user_prompt: str = "",
+                       stage: Optional[str] = None,
+                       labels: Optional[Dict[str, Any]] = None,
+                       options: Optional[Dict[str, Any]] = None,
+                       response_format: Optional[Any] = None,
+                       on_truncated: Optional[Callable[[str], str]] = None) -> str:
+        """
+        异步调用Ollama API生成内容，参数与 OllamaAPI.generate 相同（不支持流式输出和对冲请求）
+        
+        Args:
+            system_prompt: 系统提示词
+            user_prompt: 用户提示词（可选）
+            stage: 调用所属的阶段
+            labels: 调用标签，如小说序号、重写轮次（可选）
+            options: 覆盖默认生成选项的参数（可选），如 num_ctx、num_predict
+            response_format: 输出格式（可选），"json" 或 JSON Schema
+            on_truncated: 生成达到 options 中 num_predict 上限时处理结果的函数（可选）
+        
+        Returns:
+            API响应内容
+        """
+        start_time = time.monotonic()
+        cache_key = self.client._cache_key(system_prompt, user_prompt, stage, labels, options, response_format)
+        if cache_key is not None:
+            cached = self.client.cache.get(cache_key)
+            if cached is not None:
+                logger.debug(f"命中响应缓存（{stage}），响应长度: {len(cached)} 字符")
+                self._record(stage, labels, start_time, cached=True)
+                return cached
+        
+        try:
+            async with self._semaphore:
+                result = await self._request(system_prompt, user_prompt, options, response_format, stage)
+        except Exception as e:
+            self._record(stage, labels, start_time, error=str(e))
+            raise
+        self._record(stage, labels, start_time, result)
+        response = self.client._response_text(result)
+        limit = (options or {}).get('num_predict')
+        if on_truncated is not None and limit and limit > 0 and result.get('eval_count', 0) >= limit:
+            response = on_truncated(response)
+        
+        if cache_key is not None and response:
+            self.client.cache.put(cache_key, response)
+        return response
+    
+    def _record(self, stage: Optional[str], labels: Optional[Dict[str, Any]], start_time: float,
+                stats: Optional[Dict[str, Any]] = None, cached: bool = False, error: Optional[str] = None):
+        """记录一次调用的统计信息，见 OllamaAPI._record"""
+        record = call_record(stage, labels, self.model_for(stage),
+                             time.monotonic() - start_time, stats, cached, error)
+        _last_record.set(record)
+        if self.client.metrics is not None:
+            self.client.metrics.record(record)
+    
+    async def _claim(self, model: str, tried: set) -> Slot:
+        """占用一台服务器的一个槽位，没有空闲槽位（如断路器全部打开）时等待而不阻塞事件循环"""
+        while True:
+            slot = self.hosts.claim(model, tried, block=False)
+            if slot is not None:
+                return slot
+            await asyncio.sleep(0.05)
+    
+    @staticmethod
+    def _host_failure(error: httpx.HTTPError) -> bool:
+        """是否为服务器本身的问题（连接失败、超时、中途断开、5xx）"""
+        if isinstance(error, httpx.TransportError):
+            return True
+        response = getattr(error, 'response', None)
+        return response is not None and (response.status_code >= 500 or response.status_code == 404)
+    
+    async def _request(self, system_prompt: str, user_prompt: str,
+                       options: Optional[Dict[str, Any]] = None,
+                       response_format: Optional[Any] = None,
+                       stage: Optional[str] = None) -> Dict[str, Any]:
+        """
+        向Ollama发送非流式请求，服务器失败时改用其他服务器或等待后重试
+        
+        Returns:
+            响应
+        """
+        data = self.client._build_request(system_prompt, user_prompt, stream=False, options=options,
+                                          response_format=response_format, stage=stage)
+        connect_timeout, read_timeout = self.client.latency.request_timeout(
+            data['model'], f"{system_prompt}\n\n{user_prompt}", data['options'].get('num_predict'))
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        tried = set()
+        attempt = 0
+        while True:
+            slot = await self._claim(data['model'], tried)
+            host = slot.host
+            tried.add(host.url)
+            try:
+                logger.debug(f"开始异步调用Ollama API（{host.url}）...")
+                start_time = time.monotonic()
+                response = await self._get_session().post(f"{host.url}{self.client.api_path}", json=data,
+                                                          timeout=timeout)
+                response.raise_for_status()
+                result = response.json()
+                self.hosts.report_success(slot, result, data['model'])
+            except httpx.HTTPError as e:
+                failure = self._host_failure(e)
+                if failure:
+                    self.hosts.report_failure(slot, str(e))
+                self.hosts.release(slot)
+                if failure and self.hosts.has_alternative(tried):
+                    logger.warning(f"Ollama服务器 {host.url} 请求失败，改用其他服务器重试...")
+                    continue
+                if not failure or attempt >= self.client.max_retries:
+                    logger.error(f"调用Ollama API失败: {str(e)}")
+                    raise
+                delay = self.client.retry_backoff * 2 ** attempt
+                attempt += 1
+                logger.warning(f"Ollama服务器 {host.url} 请求失败（{str(e)}），{delay:.0f}秒后重试（第{attempt}/{self.client.max_retries}次）")
+                tried.clear()
+                await asyncio.sleep(delay)
+                continue
+            self.hosts.release(slot)
+            self.client.latency.observe(data['model'], stage, time.monotonic() - start_time, result)
+            logger.debug(f"异步API调用成功，响应长度: {len(self.client._response_text(result))} 字符")
+            return result
+    
+    async def close(self):
+        """关闭连接池，客户端由本对象创建时一并关闭"""
+        if self._session is not None:
+            await self._session.aclose()
+            self._session = None
+        if self._owns_client:
+            self.client.close()
+    
+    async def __aenter__(self) -> 'AsyncOllamaAPI':
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
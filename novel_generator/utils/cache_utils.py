@@ -0,0 +1,142 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from loguru import logger
+
+class ResponseCache:
+    def __init__(self, cache_dir: str, max_size_mb: float = 512):
+        """
+        初始化基于内容寻址的响应缓存
+        
+        每条响应保存为一个文件，文件名为请求内容的哈希值。
+        总大小超过上限时按最近最少使用（LRU）的顺序淘汰。
+        
+        Args:
+            cache_dir: 缓存目录
+            max_size_mb: 缓存大小上限（MB）
+        """
+        self.cache_dir = cache_dir
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> 文件大小，按最近使用时间排列
+        self._total_size = 0
+        
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+        logger.debug(f"响应缓存目录: {cache_dir}，已有{len(self._entries)}条记录")
+        
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """
+        计算请求内容的哈希值
+        
+        Args:
+            payload: 决定响应内容的请求参数（模型、选项、提示词等）
+            
+        Returns:
+            缓存键
+        """
+        data = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+        
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+        
+    def _load_index(self):
+        """扫描缓存目录，按文件修改时间重建LRU顺序"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_size += size
+            
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存的响应
+        
+        Args:
+            key: 缓存键
+            
+        Returns:
+            缓存的响应内容，未命中时返回None
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)['response']
+            os.utime(path)
+            return value
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取缓存失败: {path}, 错误: {str(e)}")
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+                self._total_size -= self._entries.pop(key, 0)
+            return None
+            
+    def put(self, key: str, value: str):
+        """
+        写入响应并在超过大小上限时淘汰最久未使用的记录
+        
+        Args:
+            key: 缓存键
+            value: 响应内容
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({'response': value}, ensure_ascii=False).encode('utf-8')
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"写入缓存失败: {path}, 错误: {str(e)}")
+            return
+            
+        evicted = []
+        with self._lock:
+            self._total_size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._total_size > self.max_size and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._total_size -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+        if evicted:
+            logger.debug(f"缓存超过上限，已淘汰{len(evicted)}条记录")
+            
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+        
+        Returns:
+            命中数、未命中数、记录数和总大小
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'size_mb': self._total_size / 1024 / 1024
+            }
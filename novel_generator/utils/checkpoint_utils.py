@@ -0,0 +1,191 @@
+import os
+import copy
+import glob
+import json
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+from loguru import logger
+
+MANIFEST_NAME = 'run_manifest.json'
+
+# 不影响生成内容的设置（路径、数量、服务器、并发、缓存和统计），恢复运行时可以修改
+RUNTIME_SETTINGS = ('output_settings', 'request_settings', 'cache_settings', 'scheduler_settings',
+                    'metrics_settings', 'journal_settings', 'checkpoint_settings')
+RUNTIME_AI_SETTINGS = ('host', 'port', 'hosts', 'max_concurrency', 'health_check_interval',
+                       'stream', 'stream_chunk_timeout', 'async_mode')
+
+def config_hash(config: Dict[str, Any]) -> str:
+    """
+    计算配置和提示词模板的指纹，用于恢复运行时确认已完成的阶段仍然适用
+    
+    Args:
+        config: 配置字典
+        
+    Returns:
+        SHA-256 十六进制摘要
+    """
+    content = {k: v for k, v in config.items() if k not in RUNTIME_SETTINGS}
+    content['ai_settings'] = {k: v for k, v in config.get('ai_settings', {}).items()
+                              if k not in RUNTIME_AI_SETTINGS}
+    digest = hashlib.sha256(json.dumps(content, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8'))
+    prompts_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'prompts')
+    for path in sorted(glob.glob(os.path.join(prompts_dir, '*.py'))):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+class RunManifest:
+    def __init__(self, run_dir: str, config: Optional[Dict[str, Any]] = None, resume: bool = False,
+                 force: bool = False):
+        """
+        初始化运行清单
+        
+        清单记录本次运行中每篇小说已完成的阶段（大纲、人物设定、各部分内容、
+        最终重写的每一轮及其评分），进程中断后可据此从第一个未完成的阶段继续。
+        清单同时保存配置和提示词模板的指纹，恢复运行时不一致则拒绝沿用已完成的阶段；
+        新建清单时不会覆盖运行目录中未完成的运行。
+        
+        Args:
+            run_dir: 运行目录（即输出根目录）
+            config: 本次运行使用的配置，会保存到清单中以便恢复
+            resume: 为True时读取已有清单继续运行，否则新建清单
+            force: 为True时覆盖未完成的运行，或在配置与清单不一致时仍然恢复
+            
+        Raises:
+            RuntimeError: 运行目录中有未完成的运行，或恢复运行时配置与清单不一致
+        """
+        self.run_dir = run_dir
+        self.path = os.path.join(run_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        fingerprint = config_hash(config) if config is not None else None
+        
+        if resume:
+            self.data = self.read(run_dir)
+            saved = self.data.get('config_hash')
+            if fingerprint is not None and saved is not None and saved != fingerprint:
+                if not force:
+                    raise RuntimeError(f"配置或提示词模板与运行清单不一致，不能沿用已完成的阶段: {self.path}"
+                                       f"（确认无误时使用 --force 继续）")
+                logger.warning("配置或提示词模板与运行清单不一致，仍然沿用已完成的阶段")
+            logger.info(f"已加载运行清单: {self.path}")
+        else:
+            if os.path.exists(self.path) and not self.read(run_dir).get('finished_at'):
+                if not force:
+                    raise RuntimeError(f"运行目录中有未完成的运行: {self.path}"
+                                       f"（使用 --resume 继续，或使用 --force 覆盖）")
+                logger.warning(f"覆盖未完成的运行清单: {self.path}")
+            self.data = {
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'config': copy.deepcopy(config) if config is not None else {},
+                'config_hash': fingerprint,
+                'novels': {}
+            }
+            self._save()
+            
+    @staticmethod
+    def read(run_dir: str) -> Dict[str, Any]:
+        """
+        读取运行目录中的清单
+        
+        Args:
+            run_dir: 运行目录
+            
+        Returns:
+            清单内容
+        """
+        path = os.path.join(run_dir, MANIFEST_NAME)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"运行目录中没有找到运行清单: {path}")
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+            
+    def _save(self):
+        """以"写入临时文件再重命名"的方式保存清单，避免中断时留下损坏的文件"""
+        os.makedirs(self.run_dir, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+        
+    def _novel(self, novel_index: int) -> Dict[str, Any]:
+        return self.data['novels'].setdefault(str(novel_index), {'stages': {}, 'result': None})
+        
+    def get_stage(self, novel_index: int, stage: str) -> Optional[Dict[str, Any]]:
+        """
+        获取已记录的阶段结果
+        
+        Args:
+            novel_index: 小说序号
+            stage: 阶段名称
+            
+        Returns:
+            阶段结果，未记录时返回None
+        """
+        with self._lock:
+            novel = self.data['novels'].get(str(novel_index))
+            if novel is None:
+                return None
+            return copy.deepcopy(novel['stages'].get(stage))
+            
+    def record_stage(self, novel_index: int, stage: str, result: Dict[str, Any]):
+        """
+        记录阶段结果并立即写入磁盘
+        
+        Args:
+            novel_index: 小说序号
+            stage: 阶段名称
+            result: 阶段结果
+        """
+        with self._lock:
+            self._novel(novel_index)['stages'][stage] = copy.deepcopy(result)
+            self._save()
+        logger.debug(f"检查点已更新：第{novel_index+1}篇小说 {stage}")
+        
+    def get_result(self, novel_index: int) -> Optional[Dict[str, Any]]:
+        """
+        获取已完成小说的结果
+        
+        Args:
+            novel_index: 小说序号
+            
+        Returns:
+            小说结果（目录、路径、评分），未完成时返回None
+        """
+        with self._lock:
+            novel = self.data['novels'].get(str(novel_index))
+            return copy.deepcopy(novel['result']) if novel else None
+            
+    def record_result(self, novel_index: int, result: Dict[str, Any]):
+        """
+        记录小说已全部完成
+        
+        Args:
+            novel_index: 小说序号
+            result: 小说结果（目录、路径、评分）
+        """
+        with self._lock:
+            self._novel(novel_index)['result'] = copy.deepcopy(result)
+            self._save()
+            
+    def mark_finished(self, novel_count: int) -> bool:
+        """
+        所有小说都已完成或已放弃时将运行标记为完成，之后新的运行可以覆盖该运行目录
+        
+        Args:
+            novel_count: 小说总数
+            
+        Returns:
+            运行已完成时返回True
+        """
+        with self._lock:
+            novels = self.data['novels']
+            finished = all(
+                str(i) in novels and (novels[str(i)]['result'] is not None or 'dropped' in novels[str(i)]['stages'])
+                for i in range(novel_count)
+            )
+            if finished:
+                self.data['finished_at'] = datetime.now().isoformat(timespec='seconds')
+                self._save()
+            return finished
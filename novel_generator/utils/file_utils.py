@@ -1,4 +1,5 @@
 import os
+import threading
 from loguru import logger
 
 def get_unique_filename(base_path: str) -> str:
@@ -36,17 +37,40 @@ def ensure_dir(path: str):
     """
     os.makedirs(path, exist_ok=True)
     
+def write_atomic(content: str, filepath: str, fsync: bool = True):
+    """
+    原子地写入文件：先写入同目录下的临时文件，再重命名为目标文件
+    
+    进程中断时目标文件要么是旧内容，要么是完整的新内容，不会只写了一半。
+    
+    Args:
+        content: 要写入的内容
+        filepath: 文件路径
+        fsync: 重命名前是否将临时文件同步到磁盘
+    """
+    temp_path = f"{filepath}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+        
 def save_content(content: str, filepath: str):
     """
-    保存内容到文件
+    保存内容到文件（原子写入，见 write_atomic）
     
     Args:
         content: 要保存的内容
         filepath: 文件路径
     """
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
+        write_atomic(content, filepath)
         logger.success(f"内容已保存至: {filepath}")
     except Exception as e:
         logger.error(f"保存文件失败: {filepath}, 错误: {str(e)}")
@@ -0,0 +1,326 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator, Set
+import requests
+from loguru import logger
+
+class Host:
+    def __init__(self, url: str):
+        """
+        初始化一台Ollama服务器的状态
+        
+        Args:
+            url: 服务器地址，如 http://gpu1:11434
+        """
+        self.url = url.rstrip('/')
+        self.in_flight = 0              # 正在进行的请求数
+        self.healthy = True
+        self.tokens_per_sec = None      # 最近的生成速度（指数滑动平均）
+        self.loaded_models = None       # 已加载的模型（来自 /api/ps），未知时为None
+        self.failures = 0               # 连续失败次数
+        self.open_until = 0.0           # 断路器打开到的时间（time.monotonic），0 表示关闭
+        self.cooldown = 0.0             # 断路器当前的打开时长（秒）
+        self.trial = None               # 断路器半开时正在进行的试探请求（Slot），没有时为None
+        
+    def __repr__(self) -> str:
+        return self.url
+
+class Slot:
+    def __init__(self, host: Host):
+        """
+        claim 占用的一个服务器槽位，释放和报告请求结果时用于判断是否为试探请求
+        
+        Args:
+            host: 服务器
+        """
+        self.host = host
+        
+    def __repr__(self) -> str:
+        return self.host.url
+
+class HostPool:
+    def __init__(self, urls: List[str], max_concurrency: int,
+                 health_interval: float = 30, ewma_alpha: float = 0.3,
+                 breaker_threshold: int = 0, breaker_cooldown: float = 10, breaker_max_cooldown: float = 300):
+        """
+        初始化多台Ollama服务器的负载均衡池
+        
+        每次请求选择预计等待时间最短的健康服务器：按正在进行的请求数和最近的生成速度估算，
+        并优先选择已加载所需模型的服务器。请求失败的服务器暂时移出轮换，
+        由后台线程定期访问 /api/ps 检查，恢复后重新加入。
+        
+        启用断路器时，连续失败 breaker_threshold 次的服务器在冷却时间内不再接收请求（只有一台服务器时
+        请求等待冷却结束，而不是继续发往失败的服务器）；冷却结束后先放行一个试探请求，成功则恢复，
+        失败则冷却时间加倍（不超过 breaker_max_cooldown）。
+        
+        Args:
+            urls: 服务器地址列表
+            max_concurrency: 每台服务器同时进行的最大请求数
+            health_interval: 健康检查间隔（秒），只有一台服务器时不检查
+            ewma_alpha: 生成速度滑动平均的权重
+            breaker_threshold: 断路器打开前的连续失败次数，0 表示不启用断路器
+            breaker_cooldown: 断路器打开后的冷却时间（秒）
+            breaker_max_cooldown: 冷却时间的上限（秒）
+        """
+        if not urls:
+            raise ValueError("至少需要配置一台Ollama服务器")
+        self.hosts = [Host(url) for url in urls]
+        self.max_concurrency = max_concurrency
+        self.health_interval = health_interval
+        self.ewma_alpha = ewma_alpha
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.breaker_max_cooldown = breaker_max_cooldown
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._probe_thread = None
+        
+        if len(self.hosts) > 1 and health_interval > 0:
+            self._probe_thread = threading.Thread(target=self._probe_loop, name='ollama-health', daemon=True)
+            self._probe_thread.start()
+            logger.debug(f"已启用{len(self.hosts)}台Ollama服务器的负载均衡，健康检查间隔{health_interval}秒")
+            
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'HostPool':
+        """
+        根据配置创建服务器池
+        
+        配置了 ai_settings.hosts 时使用其中的全部地址，否则使用 host 和 port；
+        断路器由 request_settings 设置。
+        
+        Args:
+            config: 配置字典
+            
+        Returns:
+            服务器池
+        """
+        ai_settings = config['ai_settings']
+        request_settings = config.get('request_settings', {})
+        urls = ai_settings.get('hosts') or [f"{ai_settings['host']}:{ai_settings['port']}"]
+        return cls(
+            urls,
+            max(1, int(ai_settings.get('max_concurrency', 1))),
+            ai_settings.get('health_check_interval', 30),
+            breaker_threshold=request_settings.get('breaker_threshold', 3)
+            if request_settings.get('circuit_breaker', False) else 0,
+            breaker_cooldown=request_settings.get('breaker_cooldown', 10),
+            breaker_max_cooldown=request_settings.get('breaker_max_cooldown', 300)
+        )
+        
+    def _expected_wait(self, host: Host, model: Optional[str]) -> float:
+        """估算在该服务器上完成一个请求的相对等待时间"""
+        known = [h.tokens_per_sec for h in self.hosts if h.tokens_per_sec]
+        speed = host.tokens_per_sec or (sum(known) / len(known) if known else 1.0)
+        wait = (host.in_flight + 1) / speed
+        if model and host.loaded_models is not None and model not in host.loaded_models:
+            # 需要先加载模型
+            wait *= 2
+        return wait
+        
+    def _closed(self, host: Host, now: float) -> bool:
+        """断路器是否允许向该服务器发送请求：关闭，或半开且还没有试探请求"""
+        if not self.breaker_threshold or not host.open_until:
+            return True
+        return host.open_until <= now and host.trial is None
+        
+    def _reopen_in(self, exclude: Set[str]) -> Optional[float]:
+        """所有候选服务器的断路器都打开时，距最早结束冷却的秒数（调用方需持有锁）"""
+        now = time.monotonic()
+        candidates = [h for h in self.hosts if h.url not in exclude]
+        if not self.breaker_threshold or any(self._closed(h, now) for h in candidates):
+            return None
+        waits = [h.open_until - now for h in candidates if h.open_until > now]
+        return max(0.05, min(waits)) if waits else None
+        
+    def _pick(self, model: Optional[str], exclude: Set[str]) -> Optional[Host]:
+        """选择一台有空闲槽位的服务器（调用方需持有锁），没有时返回None"""
+        now = time.monotonic()
+        candidates = [h for h in self.hosts if h.url not in exclude and self._closed(h, now)]
+        healthy = [h for h in candidates if h.healthy]
+        # 所有服务器都不可用时仍然尝试，以便尽快发现恢复的服务器
+        pool = healthy or candidates
+        free = [h for h in pool if h.in_flight < self.max_concurrency]
+        if not free:
+            return None
+        return min(free, key=lambda h: (self._expected_wait(h, model), h.in_flight))
+        
+    def has_alternative(self, exclude: Set[str]) -> bool:
+        """
+        是否还有未尝试过的健康服务器
+        
+        Args:
+            exclude: 已尝试过的服务器地址
+            
+        Returns:
+            有可用于故障转移的服务器时返回True
+        """
+        with self._cond:
+            now = time.monotonic()
+            return any(h.healthy and h.url not in exclude and self._closed(h, now) for h in self.hosts)
+            
+    def claim(self, model: Optional[str] = None, exclude: Optional[Set[str]] = None,
+              block: bool = True) -> Optional[Slot]:
+        """
+        占用一台服务器的一个槽位，使用后需调用 release
+        
+        Args:
+            model: 本次请求使用的模型（可选），用于优先选择已加载该模型的服务器
+            exclude: 不选择的服务器地址（可选），用于故障转移和对冲请求
+            block: 没有空闲槽位时是否等待
+            
+        Returns:
+            选中服务器的槽位，不等待且没有空闲槽位时返回None
+        """
+        exclude = exclude or set()
+        with self._cond:
+            host = self._pick(model, exclude)
+            while host is None:
+                if not block:
+                    return None
+                # 断路器全部打开时等到最早的冷却结束，其余情况等待槽位释放
+                self._cond.wait(self._reopen_in(exclude))
+                host = self._pick(model, exclude)
+            host.in_flight += 1
+            slot = Slot(host)
+            if self.breaker_threshold and host.open_until:
+                host.trial = slot
+                logger.info(f"Ollama服务器冷却结束，发送试探请求：{host.url}")
+        return slot
+        
+    def release(self, slot: Slot):
+        """
+        释放 claim 占用的槽位，请求的成功或失败应在释放之前报告
+        
+        Args:
+            slot: claim 返回的槽位
+        """
+        host = slot.host
+        with self._cond:
+            host.in_flight -= 1
+            # 试探请求没有报告成功或失败（如请求本身有误）时，允许下一个请求继续试探
+            if host.trial is slot:
+                host.trial = None
+            self._cond.notify_all()
+            
+    @contextmanager
+    def acquire(self, model: Optional[str] = None, exclude: Optional[Set[str]] = None) -> Iterator[Slot]:
+        """
+        等待并占用一台服务器的一个槽位
+        
+        Args:
+            model: 本次请求使用的模型（可选），用于优先选择已加载该模型的服务器
+            exclude: 不选择的服务器地址（可选），用于故障转移
+            
+        Yields:
+            选中服务器的槽位
+        """
+        slot = self.claim(model, exclude)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+                
+    def report_success(self, slot: Slot, stats: Optional[Dict[str, Any]] = None, model: Optional[str] = None):
+        """
+        记录一次成功的请求，更新生成速度
+        
+        Args:
+            slot: 请求占用的槽位
+            stats: Ollama 响应中的统计字段（可选）
+            model: 本次请求使用的模型（可选）
+        """
+        host = slot.host
+        stats = stats or {}
+        with self._cond:
+            # 是否重新加入轮换只由健康检查决定，避免失败前发出的请求完成时误判为已恢复
+            host.failures = 0
+            if host.open_until:
+                logger.info(f"Ollama服务器试探请求成功，断路器关闭：{host.url}")
+                host.open_until = 0.0
+                host.cooldown = 0.0
+                host.trial = None
+            if model and host.loaded_models is not None:
+                host.loaded_models.add(model)
+            eval_count = stats.get('eval_count', 0)
+            eval_duration = stats.get('eval_duration', 0)
+            if eval_count and eval_duration:
+                speed = eval_count / (eval_duration / 1e9)
+                host.tokens_per_sec = speed if host.tokens_per_sec is None else (
+                    self.ewma_alpha * speed + (1 - self.ewma_alpha) * host.tokens_per_sec
+                )
+                
+    def report_failure(self, slot: Slot, error: str):
+        """
+        记录一次失败的请求，将服务器移出轮换直到健康检查通过
+        
+        Args:
+            slot: 请求占用的槽位
+            error: 错误信息
+        """
+        host = slot.host
+        with self._cond:
+            host.failures += 1
+            # 断路器打开前发出的请求随后失败时不影响正在进行的试探请求
+            trial = host.trial is slot
+            tripped = trial or (not host.open_until and host.failures >= self.breaker_threshold)
+            if self.breaker_threshold and tripped:
+                # 试探请求失败时冷却时间加倍
+                host.cooldown = (min(host.cooldown * 2, self.breaker_max_cooldown) if trial
+                                 else self.breaker_cooldown)
+                host.open_until = time.monotonic() + host.cooldown
+                host.trial = None
+                logger.warning(f"Ollama服务器连续失败{host.failures}次，断路器打开{host.cooldown:.0f}秒：{host.url}（{error}）")
+            if host.healthy and len(self.hosts) > 1:
+                logger.warning(f"Ollama服务器请求失败，暂时移出轮换：{host.url}（{error}）")
+                host.healthy = False
+            self._cond.notify_all()
+            
+    def _probe(self, host: Host):
+        """访问 /api/ps 检查服务器状态和已加载的模型"""
+        try:
+            response = requests.get(f"{host.url}/api/ps", timeout=5)
+            response.raise_for_status()
+            models = response.json().get('models', [])
+            loaded = {m.get('name') for m in models} | {m.get('model') for m in models}
+            with self._cond:
+                if not host.healthy:
+                    logger.info(f"Ollama服务器健康检查通过，重新加入轮换：{host.url}")
+                host.healthy = True
+                host.failures = 0
+                host.loaded_models = {name for name in loaded if name}
+                self._cond.notify_all()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            with self._cond:
+                if host.healthy:
+                    logger.warning(f"Ollama服务器健康检查失败，移出轮换：{host.url}（{str(e)}）")
+                host.healthy = False
+                
+    def _probe_loop(self):
+        """后台线程：定期检查所有服务器"""
+        while not self._stop.is_set():
+            for host in self.hosts:
+                self._probe(host)
+            self._stop.wait(self.health_interval)
+            
+    def status(self) -> List[Dict[str, Any]]:
+        """
+        获取各服务器的状态
+        
+        Returns:
+            每台服务器的地址、是否健康、断路器状态、正在进行的请求数、连续失败次数和最近的生成速度
+        """
+        with self._cond:
+            now = time.monotonic()
+            return [{
+                'url': h.url,
+                'healthy': h.healthy,
+                'breaker': 'closed' if not h.open_until else ('open' if h.open_until > now else 'half-open'),
+                'in_flight': h.in_flight,
+                'failures': h.failures,
+                'tokens_per_sec': h.tokens_per_sec
+            } for h in self.hosts]
+            
+    def close(self):
+        """停止健康检查线程"""
+        self._stop.set()
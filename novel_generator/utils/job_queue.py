@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator
+from loguru import logger
+
+# 任务状态
+PENDING = 'pending'    # 等待执行（包括失败后等待重试）
+RUNNING = 'running'    # 已被某个工作进程领取
+DONE = 'done'          # 已完成
+DEAD = 'dead'          # 重试次数用完，不再执行
+STATES = [PENDING, RUNNING, DONE, DEAD]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    config TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    available_at REAL NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    output_dir TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, available_at, id);
+"""
+
+class JobQueue:
+    def __init__(self, path: str, lease_seconds: float = 600, retry_delay: float = 60):
+        """
+        初始化基于SQLite的批量任务队列
+        
+        每个任务是一份完整的生成配置。多个工作进程可以同时领取任务：领取在一个写事务中完成，
+        同一任务只会被一个进程领取。领取的任务带有租约，执行期间需要定期续约；进程崩溃后租约过期，
+        任务会被其他进程重新领取。失败的任务按指数退避重试，重试次数用完后进入死信（dead）状态。
+        
+        Args:
+            path: 数据库文件路径
+            lease_seconds: 租约时长（秒）
+            retry_delay: 第一次重试前的等待时间（秒），之后每次加倍
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """打开一个连接（WAL模式，写锁冲突时等待），退出时关闭"""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            yield conn
+        finally:
+            conn.close()
+            
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """在写事务中执行（BEGIN IMMEDIATE，开始时即取得写锁）"""
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+            
+    @staticmethod
+    def make_key(config: Dict[str, Any]) -> str:
+        """
+        计算任务的唯一键（配置内容的哈希值），重复添加相同的任务时跳过
+        
+        Args:
+            config: 任务的生成配置
+            
+        Returns:
+            任务键
+        """
+        data = json.dumps(config, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+        
+    def add(self, name: str, config: Dict[str, Any], max_attempts: int = 3, key: Optional[str] = None) -> bool:
+        """
+        添加任务
+        
+        Args:
+            name: 任务名称，用于显示（如小说标题）
+            config: 任务的生成配置
+            max_attempts: 最多执行次数
+            key: 任务键（可选），默认为配置的哈希值
+            
+        Returns:
+            新添加时返回True，已有相同任务时返回False
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO jobs (key, name, config, max_attempts, output_dir, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key or self.make_key(config), name, json.dumps(config, ensure_ascii=False),
+                 max_attempts, config.get('output_settings', {}).get('output_dir'), now, now)
+            )
+            return cursor.rowcount > 0
+            
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """
+        领取一个可执行的任务：等待执行且已到重试时间的任务，或租约已过期的执行中任务
+        
+        Args:
+            worker: 工作进程的标识
+            
+        Returns:
+            任务（id、名称、配置、已执行次数等），没有可执行的任务时返回None
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            while True:
+                row = conn.execute(
+                    'SELECT * FROM jobs WHERE (state = ? AND available_at <= ?) OR (state = ? AND lease_until < ?) '
+                    'ORDER BY id LIMIT 1',
+                    (PENDING, now, RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row['state'] != RUNNING:
+                    break
+                # 执行中的进程已崩溃或失去联系，这次执行计为一次失败
+                error = f"租约过期（工作进程 {row['worker']}）"
+                if row['attempts'] < row['max_attempts']:
+                    logger.warning(f"任务 {row['name']} {error}，重新领取")
+                    break
+                logger.error(f"任务 {row['name']} {error}，重试次数已用完")
+                conn.execute('UPDATE jobs SET state = ?, error = ?, lease_until = NULL, updated_at = ? WHERE id = ?',
+                             (DEAD, error, now, row['id']))
+            conn.execute(
+                'UPDATE jobs SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? '
+                'WHERE id = ?',
+                (RUNNING, worker, now + self.lease_seconds, now, row['id'])
+            )
+        job = dict(row)
+        job['config'] = json.loads(job['config'])
+        job['attempts'] += 1
+        return job
+        
+    def heartbeat(self, job_id: int, worker: str) -> bool:
+        """
+        延长任务的租约
+        
+        Args:
+            job_id: 任务id
+            worker: 工作进程的标识
+            
+        Returns:
+            续约成功时返回True；任务已被其他进程领取时返回False
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND worker = ? AND state = ?',
+                (now + self.lease_seconds, now, job_id, worker, RUNNING)
+            )
+            return cursor.rowcount > 0
+            
+    def complete(self, job_id: int, worker: str, result: Optional[Dict[str, Any]] = None):
+        """
+        将任务标记为已完成
+        
+        Args:
+            job_id: 任务id
+            worker: 工作进程的标识
+            result: 任务结果（可选），如生成的小说数和最高评分
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE jobs SET state = ?, result = ?, error = NULL, lease_until = NULL, updated_at = ? '
+                'WHERE id = ? AND worker = ?',
+                (DONE, json.dumps(result or {}, ensure_ascii=False), time.time(), job_id, worker)
+            )
+            
+    def fail(self, job_id: int, worker: str, error: str) -> Optional[str]:
+        """
+        记录任务失败：未达到最多执行次数时等待重试，否则进入死信状态
+        
+        Args:
+            job_id: 任务id
+            worker: 工作进程的标识
+            error: 错误信息
+            
+        Returns:
+            任务的新状态（pending 或 dead）；任务已不属于该进程（租约过期后被其他进程领取）时返回None
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute('SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker = ? AND state = ?',
+                               (job_id, worker, RUNNING)).fetchone()
+            if row is None:
+                return None
+            state = PENDING if row['attempts'] < row['max_attempts'] else DEAD
+            delay = self.retry_delay * 2 ** (row['attempts'] - 1)
+            cursor = conn.execute(
+                'UPDATE jobs SET state = ?, error = ?, available_at = ?, lease_until = NULL, updated_at = ? '
+                'WHERE id = ? AND worker = ? AND state = ?',
+                (state, error, now + delay, now, job_id, worker, RUNNING)
+            )
+            if cursor.rowcount == 0:
+                return None
+        return state
+        
+    def release(self, job_id: int, worker: str):
+        """
+        放回未完成的任务（如工作进程被手动停止），不计入执行次数
+        
+        Args:
+            job_id: 任务id
+            worker: 工作进程的标识
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE jobs SET state = ?, attempts = MAX(attempts - 1, 0), available_at = ?, lease_until = NULL, '
+                'updated_at = ? WHERE id = ? AND worker = ? AND state = ?',
+                (PENDING, now, now, job_id, worker, RUNNING)
+            )
+            
+    def requeue_dead(self) -> int:
+        """
+        将死信状态的任务重新放回队列（执行次数清零）
+        
+        Returns:
+            重新放回的任务数
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'UPDATE jobs SET state = ?, attempts = 0, available_at = ?, updated_at = ? WHERE state = ?',
+                (PENDING, now, now, DEAD)
+            )
+            return cursor.rowcount
+            
+    def counts(self) -> Dict[str, int]:
+        """
+        获取各状态的任务数
+        
+        Returns:
+            状态到任务数的映射
+        """
+        with self._connect() as conn:
+            rows = conn.execute('SELECT state, COUNT(*) AS count FROM jobs GROUP BY state').fetchall()
+        counts = {state: 0 for state in STATES}
+        counts.update({row['state']: row['count'] for row in rows})
+        return counts
+        
+    def jobs(self, state: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        列出任务（不含配置）
+        
+        Args:
+            state: 只列出该状态的任务（可选）
+            
+        Returns:
+            任务列表，按添加顺序
+        """
+        query = ('SELECT id, name, state, attempts, max_attempts, worker, output_dir, result, error, updated_at '
+                 'FROM jobs')
+        with self._connect() as conn:
+            if state:
+                rows = conn.execute(f'{query} WHERE state = ? ORDER BY id', (state,)).fetchall()
+            else:
+                rows = conn.execute(f'{query} ORDER BY id').fetchall()
+        return [dict(row) for row in rows]
+        
+    def has_unfinished(self) -> bool:
+        """是否还有等待执行或执行中的任务"""
+        counts = self.counts()
+        return counts[PENDING] + counts[RUNNING] > 0
@@ -0,0 +1,257 @@
+import os
+import time
+import queue
+import atexit
+import threading
+from typing import Dict, Any, Optional, BinaryIO
+from loguru import logger
+from .file_utils import write_atomic
+
+# 操作类型
+_APPEND = 'append'
+_TRUNCATE = 'truncate'
+_WRITE = 'write'
+_DELETE = 'delete'
+_FLUSH = 'flush'
+_STOP = 'stop'
+
+class JournalWriter:
+    def __init__(self, background: bool = True, fsync: bool = True, fsync_interval: float = 2.0):
+        """
+        初始化生成中小说的追加式写入器
+        
+        生成中的临时文件只追加新内容（每个部分或流式输出的每段文本），不再每次重写已写入的全部内容；
+        被放弃的流式版本通过截断到已确定内容的长度去掉。完整内容（如最终重写的最佳版本）
+        先写入临时文件再重命名。所有操作按提交顺序执行，可以在后台线程中进行，
+        使磁盘写入不占用生成的时间；fsync 按文件合并，每个文件每隔 fsync_interval 秒最多同步一次。
+        
+        Args:
+            background: 是否在后台线程中写入
+            fsync: 是否将追加的内容同步到磁盘
+            fsync_interval: 同一文件两次同步之间的最短间隔（秒），0 表示每批写入后立即同步
+        """
+        self.background = background
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()     # 保护文件大小和提交顺序，只在内存中操作
+        self._io_lock = threading.Lock()  # 保护打开的文件，写入磁盘时持有
+        self._sizes = {}   # 路径 -> 提交的操作全部执行后的文件大小（字节）
+        self._files = {}   # 路径 -> 打开的文件
+        self._dirty = {}   # 路径 -> 是否有尚未同步的内容
+        self._synced = {}  # 路径 -> 上次同步的时间
+        self._queue = queue.Queue()
+        self._thread = None
+        self._closed = False
+        atexit.register(self.close)
+        
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'JournalWriter':
+        """
+        根据配置创建写入器
+        
+        Args:
+            config: 配置字典
+            
+        Returns:
+            写入器
+        """
+        settings = config.get('journal_settings', {})
+        return cls(settings.get('background', True), settings.get('fsync', True), settings.get('fsync_interval', 2.0))
+        
+    def size(self, path: str) -> int:
+        """
+        获取文件在已提交的操作全部执行后的大小（字节），不访问磁盘
+        
+        Args:
+            path: 文件路径
+            
+        Returns:
+            文件大小，没有通过本写入器写入过时为0
+        """
+        with self._lock:
+            return self._sizes.get(path, 0)
+            
+    def append(self, path: str, text: str):
+        """
+        在文件末尾追加内容
+        
+        Args:
+            path: 文件路径
+            text: 追加的内容
+        """
+        if text:
+            data = text.encode('utf-8')
+            self._submit(_APPEND, path, data, len(data), relative=True)
+            
+    def truncate(self, path: str, size: int):
+        """
+        将文件截断到指定大小，用于去掉被放弃的流式版本
+        
+        Args:
+            path: 文件路径
+            size: 保留的字节数，通常是之前 size() 的返回值
+        """
+        if self.size(path) != size:
+            self._submit(_TRUNCATE, path, size, size)
+            
+    def write(self, path: str, text: str):
+        """
+        用完整内容替换文件（写入临时文件后重命名）
+        
+        Args:
+            path: 文件路径
+            text: 完整内容
+        """
+        data = text.encode('utf-8')
+        self._submit(_WRITE, path, text, len(data))
+        
+    def delete(self, path: str):
+        """
+        删除文件（在之前提交的操作执行之后）
+        
+        Args:
+            path: 文件路径
+        """
+        self._submit(_DELETE, path, None, None)
+        
+    def flush(self):
+        """等待已提交的操作全部执行，并将所有文件同步到磁盘"""
+        if self.background and self._thread is not None and self._thread.is_alive():
+            done = threading.Event()
+            self._queue.put((_FLUSH, None, done))
+            done.wait()
+        else:
+            with self._io_lock:
+                self._sync(force=True)
+                
+    def close(self):
+        """执行已提交的操作，关闭所有文件并停止后台线程"""
+        if self._closed:
+            return
+        self.flush()
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put((_STOP, None, None))
+            self._thread.join()
+        with self._io_lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+            self._dirty.clear()
+        self._closed = True
+        
+    def _submit(self, op: str, path: str, data: Any, size: Optional[int], relative: bool = False):
+        """提交一个操作：先更新文件大小，再交给后台线程执行或直接执行"""
+        with self._lock:
+            if size is None:
+                self._sizes.pop(path, None)
+            elif relative:
+                self._sizes[path] = self._sizes.get(path, 0) + size
+            else:
+                self._sizes[path] = size
+            self._closed = False
+            if not self.background:
+                with self._io_lock:
+                    self._apply(op, path, data)
+                    self._sync()
+                return
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='journal-writer', daemon=True)
+                self._thread.start()
+            self._queue.put((op, path, data))
+            
+    def _handle(self, path: str) -> BinaryIO:
+        """获取以追加模式打开的文件"""
+        f = self._files.get(path)
+        if f is None:
+            f = open(path, 'ab')
+            self._files[path] = f
+        return f
+        
+    def _release(self, path: str):
+        """关闭文件（替换或删除文件之前）"""
+        f = self._files.pop(path, None)
+        if f is not None:
+            f.close()
+        self._dirty.pop(path, None)
+        
+    def _apply(self, op: str, path: str, data: Any):
+        """执行一个操作，出错时记录警告，不影响生成"""
+        try:
+            if op == _APPEND:
+                self._handle(path).write(data)
+                self._dirty[path] = True
+            elif op == _TRUNCATE:
+                f = self._handle(path)
+                f.flush()
+                f.truncate(data)
+                self._dirty[path] = True
+            elif op == _WRITE:
+                self._release(path)
+                write_atomic(data, path, self.fsync)
+            elif op == _DELETE:
+                self._release(path)
+                if os.path.exists(path):
+                    os.remove(path)
+                    logger.debug(f"已删除文件: {path}")
+        except Exception as e:
+            logger.warning(f"写入文件失败: {path}, 错误: {str(e)}")
+            
+    def _sync(self, force: bool = False):
+        """将写入的内容交给操作系统；距上次同步超过 fsync_interval 的文件同步到磁盘"""
+        now = time.monotonic()
+        for path, dirty in list(self._dirty.items()):
+            if not dirty:
+                continue
+            f = self._files[path]
+            try:
+                f.flush()
+                if self.fsync and (force or now - self._synced.get(path, 0) >= self.fsync_interval):
+                    os.fsync(f.fileno())
+                    self._synced[path] = now
+                    self._dirty[path] = False
+                elif not self.fsync:
+                    self._dirty[path] = False
+            except Exception as e:
+                logger.warning(f"同步文件失败: {path}, 错误: {str(e)}")
+                self._dirty[path] = False
+                
+    def _run(self):
+        """后台线程：成批取出操作，合并同一文件的连续追加后执行"""
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.fsync_interval or None)]
+            except queue.Empty:
+                # 没有新的操作时，同步间隔内写入的内容也要落盘
+                with self._io_lock:
+                    self._sync()
+                continue
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                    
+            stop = False
+            pending = None  # 尚未写入的连续追加：(路径, 内容列表)
+            with self._io_lock:
+                for op, path, data in batch:
+                    if op == _APPEND and pending is not None and pending[0] == path:
+                        pending[1].append(data)
+                        continue
+                    if pending is not None:
+                        self._apply(_APPEND, pending[0], b''.join(pending[1]))
+                        pending = None
+                    if op == _APPEND:
+                        pending = (path, [data])
+                    elif op == _FLUSH:
+                        self._sync(force=True)
+                        data.set()
+                    elif op == _STOP:
+                        stop = True
+                    else:
+                        self._apply(op, path, data)
+                if pending is not None:
+                    self._apply(_APPEND, pending[0], b''.join(pending[1]))
+                self._sync()
+            if stop:
+                return
@@ -0,0 +1,191 @@
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+from .token_utils import TokenEstimator
+
+class LatencyTracker:
+    def __init__(self, estimator: TokenEstimator, timeout: float = 300, connect_timeout: float = 10,
+                 adaptive: bool = False, slack: float = 2.0, min_timeout: float = 30, max_timeout: float = 1800,
+                 load_allowance: float = 60, hedge: bool = False, hedge_quantile: float = 0.95,
+                 hedge_min_samples: int = 20, hedge_min_delay: float = 1.0, window: int = 200,
+                 ewma_alpha: float = 0.3):
+        """
+        初始化请求耗时的跟踪器，用于计算请求超时和对冲请求的等待时间
+        
+        按模型记录提示词处理速度和生成速度（指数滑动平均），按（模型, 阶段）记录最近的调用耗时。
+        启用自适应超时时，非流式请求的超时为预计耗时（提示词处理 + 生成上限内的token）乘以 slack，
+        再加上模型加载的余量；流式请求的超时限制两段输出之间的等待，首段输出前需要处理提示词，
+        因此按提示词处理的预计耗时计算。还没有速度数据时使用固定的超时。
+        
+        Args:
+            estimator: token估算器，用于估算提示词的token数
+            timeout: 固定的请求超时（秒），未启用自适应超时或还没有速度数据时使用
+            connect_timeout: 连接超时（秒）
+            adaptive: 是否按预计耗时计算超时
+            slack: 预计耗时的倍数
+            min_timeout: 自适应超时的下限（秒）
+            max_timeout: 自适应超时的上限（秒）
+            load_allowance: 为模型加载预留的时间（秒）
+            hedge: 是否允许对冲请求（需要多台服务器）
+            hedge_quantile: 调用耗时超过同阶段该分位数后发出对冲请求
+            hedge_min_samples: 同阶段至少有这么多次调用记录后才发出对冲请求
+            hedge_min_delay: 对冲请求的最短等待时间（秒）
+            window: 每个阶段保留的调用耗时记录数
+            ewma_alpha: 速度滑动平均的权重
+        """
+        self.estimator = estimator
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.adaptive = adaptive
+        self.slack = slack
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.load_allowance = load_allowance
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.window = window
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+        self._eval_rates = {}     # 模型 -> 生成速度（token/秒）
+        self._prompt_rates = {}   # 模型 -> 提示词处理速度（token/秒）
+        self._latencies = {}      # (模型, 阶段) -> 最近的调用耗时
+        self.hedged = 0           # 发出的对冲请求数
+        self.hedge_wins = 0       # 对冲请求先完成的次数
+        
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'LatencyTracker':
+        """
+        根据配置创建跟踪器
+        
+        Args:
+            config: 配置字典
+            
+        Returns:
+            跟踪器
+        """
+        settings = config.get('request_settings', {})
+        return cls(
+            TokenEstimator.for_config(config),
+            timeout=settings.get('timeout', 300),
+            connect_timeout=settings.get('connect_timeout', 10),
+            adaptive=settings.get('adaptive_timeout', False),
+            slack=settings.get('timeout_slack', 2.0),
+            min_timeout=settings.get('min_timeout', 30),
+            max_timeout=settings.get('max_timeout', 1800),
+            load_allowance=settings.get('load_allowance', 60),
+            hedge=settings.get('hedge', False),
+            hedge_quantile=settings.get('hedge_quantile', 0.95),
+            hedge_min_samples=settings.get('hedge_min_samples', 20),
+            hedge_min_delay=settings.get('hedge_min_delay', 1.0)
+        )
+        
+    def _update(self, rates: Dict[str, float], model: str, count: int, duration_ns: int):
+        """更新一个速度的滑动平均（调用方需持有锁）"""
+        if count <= 0 or not duration_ns:
+            return
+        rate = count / (duration_ns / 1e9)
+        previous = rates.get(model)
+        rates[model] = rate if previous is None else self.ewma_alpha * rate + (1 - self.ewma_alpha) * previous
+        
+    def observe(self, model: str, stage: Optional[str], wall_time: float, stats: Optional[Dict[str, Any]]):
+        """
+        记录一次成功的调用
+        
+        Args:
+            model: 模型名称
+            stage: 调用所属的阶段
+            wall_time: 调用的实际耗时（秒）
+            stats: Ollama 响应中的统计字段（可选）
+        """
+        stats = stats or {}
+        with self._lock:
+            self._update(self._eval_rates, model, stats.get('eval_count', 0), stats.get('eval_duration', 0))
+            self._update(self._prompt_rates, model, stats.get('prompt_eval_count', 0),
+                         stats.get('prompt_eval_duration', 0))
+            latencies = self._latencies.get((model, stage))
+            if latencies is None:
+                latencies = self._latencies[(model, stage)] = deque(maxlen=self.window)
+            latencies.append(wall_time)
+            
+    def _prompt_time(self, model: str, prompt: str) -> Optional[float]:
+        """按提示词处理速度估算处理整个提示词的耗时（调用方需持有锁），没有速度数据时返回None"""
+        rate = self._prompt_rates.get(model)
+        if not rate:
+            return None
+        return self.estimator.estimate(prompt) / rate
+        
+    def request_timeout(self, model: str, prompt: str, num_predict: Optional[int]) -> Tuple[float, float]:
+        """
+        计算非流式请求的超时
+        
+        Args:
+            model: 模型名称
+            prompt: 完整的提示词
+            num_predict: 生成上限（token），不限制时为None或负数
+            
+        Returns:
+            （连接超时, 读取超时）
+        """
+        with self._lock:
+            rate = self._eval_rates.get(model)
+            if not self.adaptive or not rate or not num_predict or num_predict < 0:
+                return self.connect_timeout, self.timeout
+            expected = (self._prompt_time(model, prompt) or 0) + num_predict / rate
+        timeout = expected * self.slack + self.load_allowance
+        return self.connect_timeout, min(self.max_timeout, max(self.min_timeout, timeout))
+        
+    def stream_timeout(self, model: str, prompt: str, chunk_timeout: float) -> Tuple[float, float]:
+        """
+        计算流式请求的超时，读取超时限制两段输出之间的等待时间
+        
+        Args:
+            model: 模型名称
+            prompt: 完整的提示词
+            chunk_timeout: 固定的两段输出之间的最长等待时间（秒），同时作为自适应超时的上限
+            
+        Returns:
+            （连接超时, 读取超时）
+        """
+        with self._lock:
+            prompt_time = self._prompt_time(model, prompt) if self.adaptive else None
+        if prompt_time is None:
+            return self.connect_timeout, chunk_timeout
+        timeout = prompt_time * self.slack + self.load_allowance
+        return self.connect_timeout, min(chunk_timeout, max(self.min_timeout, timeout))
+        
+    def hedge_delay(self, model: str, stage: Optional[str]) -> Optional[float]:
+        """
+        对冲请求的等待时间：同阶段调用耗时的 hedge_quantile 分位数
+        
+        Args:
+            model: 模型名称
+            stage: 调用所属的阶段
+            
+        Returns:
+            等待时间（秒），未启用对冲或调用记录不足时返回None
+        """
+        if not self.hedge:
+            return None
+        with self._lock:
+            latencies = sorted(self._latencies.get((model, stage), ()))
+        if len(latencies) < self.hedge_min_samples:
+            return None
+        index = min(len(latencies) - 1, int(self.hedge_quantile * len(latencies)))
+        return max(self.hedge_min_delay, latencies[index])
+        
+    def record_hedge(self, won: bool):
+        """
+        记录一次对冲请求
+        
+        Args:
+            won: 对冲请求是否先于原请求完成
+        """
+        with self._lock:
+            self.hedged += 1
+            self.hedge_wins += int(won)
+            
+    def format_stats(self) -> str:
+        """对冲请求的统计：发出的次数和先完成的次数"""
+        return f"对冲请求{self.hedged}次，先于原请求完成{self.hedge_wins}次"
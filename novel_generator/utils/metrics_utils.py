@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from loguru import logger
+
+# Ollama 响应中的耗时字段（单位：纳秒）
+TIMING_FIELDS = ['load_duration', 'prompt_eval_duration', 'eval_duration', 'total_duration']
+# Ollama 响应中的token数字段
+COUNT_FIELDS = ['prompt_eval_count', 'eval_count']
+
+def _seconds(value: Optional[int]) -> float:
+    return (value or 0) / 1e9
+
+def _display_width(text: str) -> int:
+    """计算文本的显示宽度（中文字符占两格）"""
+    return sum(2 if ord(ch) > 0x2e80 else 1 for ch in text)
+
+def call_record(stage: Optional[str], labels: Optional[Dict[str, Any]], model: str,
+                wall_time: float, stats: Optional[Dict[str, Any]] = None,
+                cached: bool = False, error: Optional[str] = None) -> Dict[str, Any]:
+    """
+    根据一次调用的信息生成统计记录
+    
+    Args:
+        stage: 调用所属的阶段
+        labels: 调用标签，如小说序号、重写轮次、部分序号
+        model: 模型名称
+        wall_time: 调用的实际耗时（秒）
+        stats: Ollama 响应（或流式响应的最后一段）中的统计字段（可选）
+        cached: 是否命中响应缓存
+        error: 调用失败时的错误信息（可选）
+        
+    Returns:
+        统计记录
+    """
+    stats = stats or {}
+    record = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'stage': stage or 'unknown',
+        'model': model,
+        'labels': labels or {},
+        'wall_time': round(wall_time, 3),
+        'cached': cached
+    }
+    for field in COUNT_FIELDS:
+        record[field] = stats.get(field, 0)
+    for field in TIMING_FIELDS:
+        record[field] = round(_seconds(stats.get(field)), 3)
+    record['prompt_tokens_per_sec'] = (
+        round(record['prompt_eval_count'] / record['prompt_eval_duration'], 1)
+        if record['prompt_eval_duration'] > 0 else 0.0
+    )
+    record['tokens_per_sec'] = (
+        round(record['eval_count'] / record['eval_duration'], 1)
+        if record['eval_duration'] > 0 else 0.0
+    )
+    if error is not None:
+        record['error'] = error
+    return record
+
+class MetricsRecorder:
+    def __init__(self, jsonl_path: Optional[str] = None, prometheus_path: Optional[str] = None):
+        """
+        初始化调用统计记录器
+        
+        每次调用追加一行JSON到 jsonl_path；设置 prometheus_path 时同时以
+        Prometheus 文本格式输出按阶段和模型汇总的指标（可配合 node_exporter 的 textfile 采集器使用）。
+        
+        Args:
+            jsonl_path: 逐次调用记录的JSONL文件路径（可选）
+            prometheus_path: Prometheus 文本格式指标文件路径（可选）
+        """
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self._lock = threading.Lock()
+        self._totals = OrderedDict()  # (stage, model) -> 汇总数据
+        
+        for path in (jsonl_path, prometheus_path):
+            if path:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if jsonl_path:
+            logger.debug(f"调用统计文件: {jsonl_path}")
+            
+    def record(self, record: Dict[str, Any]):
+        """
+        保存一条调用记录并更新汇总
+        
+        Args:
+            record: 由 call_record 生成的统计记录
+        """
+        with self._lock:
+            totals = self._totals.setdefault((record['stage'], record['model']), {
+                'calls': 0, 'cached': 0, 'errors': 0, 'wall_time': 0.0,
+                **{field: 0 for field in COUNT_FIELDS},
+                **{field: 0.0 for field in TIMING_FIELDS}
+            })
+            totals['calls'] += 1
+            totals['cached'] += int(record['cached'])
+            totals['errors'] += int('error' in record)
+            totals['wall_time'] += record['wall_time']
+            for field in COUNT_FIELDS + TIMING_FIELDS:
+                totals[field] += record[field]
+                
+            try:
+                if self.jsonl_path:
+                    with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                if self.prometheus_path:
+                    self._write_prometheus()
+            except OSError as e:
+                logger.warning(f"写入调用统计失败: {str(e)}")
+                
+    def _write_prometheus(self):
+        """以Prometheus文本格式写出按阶段和模型汇总的指标（调用方需持有锁）"""
+        metrics = [
+            ('calls_total', 'counter', '调用次数', 'calls'),
+            ('cache_hits_total', 'counter', '命中响应缓存的调用次数', 'cached'),
+            ('errors_total', 'counter', '失败的调用次数', 'errors'),
+            ('wall_seconds_total', 'counter', '调用实际耗时', 'wall_time'),
+            ('load_seconds_total', 'counter', '模型加载耗时', 'load_duration'),
+            ('prompt_eval_seconds_total', 'counter', '提示词处理耗时', 'prompt_eval_duration'),
+            ('eval_seconds_total', 'counter', '生成耗时', 'eval_duration'),
+            ('prompt_tokens_total', 'counter', '提示词token数', 'prompt_eval_count'),
+            ('generated_tokens_total', 'counter', '生成的token数', 'eval_count'),
+        ]
+        lines = []
+        for name, kind, help_text, field in metrics:
+            lines.append(f"# HELP novel_generator_{name} {help_text}")
+            lines.append(f"# TYPE novel_generator_{name} {kind}")
+            for (stage, model), totals in self._totals.items():
+                lines.append(f'novel_generator_{name}{{stage="{stage}",model="{model}"}} {totals[field]}')
+        temp_path = f"{self.prometheus_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, self.prometheus_path)
+        
+    def summary(self, by: str = 'stage') -> Dict[str, Dict[str, Any]]:
+        """
+        获取按阶段（或模型）汇总的统计数据
+        
+        Args:
+            by: 'stage' 按阶段汇总，'model' 按模型汇总
+            
+        Returns:
+            阶段（或模型）名称到汇总数据（调用次数、各项耗时、token数、生成速度）的映射
+        """
+        with self._lock:
+            result = OrderedDict()
+            for (stage, model), totals in self._totals.items():
+                item = result.get(stage if by == 'stage' else model)
+                if item is None:
+                    result[stage if by == 'stage' else model] = dict(totals)
+                else:
+                    for field, value in totals.items():
+                        item[field] += value
+            for item in result.values():
+                item['tokens_per_sec'] = (
+                    item['eval_count'] / item['eval_duration'] if item['eval_duration'] > 0 else 0.0
+                )
+            return result
+            
+    def format_summary(self) -> str:
+        """
+        生成按阶段汇总的统计表，使用了多个模型时另附按模型汇总的统计表
+        
+        Returns:
+            统计表文本，没有记录时返回空字符串
+        """
+        summary = self.summary()
+        if not summary:
+            return ""
+        table = self._format_table('阶段', summary)
+        models = self.summary(by='model')
+        if len(models) > 1:
+            table += "\n\n" + self._format_table('模型', models)
+        return table
+        
+    @staticmethod
+    def _format_table(name: str, summary: Dict[str, Dict[str, Any]]) -> str:
+        """生成一张汇总统计表，name 为第一列的列名"""
+        header = [name, '调用', '缓存', '总耗时s', '平均s', '加载s', '提示词s', '生成s', '提示词tok', '生成tok', 'tok/s']
+        rows = []
+        for key, item in summary.items():
+            rows.append([
+                key,
+                str(item['calls']),
+                str(item['cached']),
+                f"{item['wall_time']:.1f}",
+                f"{item['wall_time'] / item['calls']:.1f}",
+                f"{item['load_duration']:.1f}",
+                f"{item['prompt_eval_duration']:.1f}",
+                f"{item['eval_duration']:.1f}",
+                str(item['prompt_eval_count']),
+                str(item['eval_count']),
+                f"{item['tokens_per_sec']:.1f}"
+            ])
+        total_wall = sum(item['wall_time'] for item in summary.values())
+        rows.append(['合计', str(sum(item['calls'] for item in summary.values())), '', f"{total_wall:.1f}",
+                     '', '', '', '', '', '', ''])
+                     
+        widths = [max(_display_width(row[i]) for row in [header] + rows) for i in range(len(header))]
+        lines = ['  '.join(' ' * (width - _display_width(cell)) + cell for cell, width in zip(row, widths)) for row in [header] + rows]
+        return '\n'.join(lines)
@@ -0,0 +1,479 @@
+import os
+import re
+import json
+import time
+import zlib
+import random
+import threading
+from typing import Dict, Any, List, Set, Tuple, Iterable, Hashable, NamedTuple, Optional
+from loguru import logger
+
+# 标点和空白，比较相似度前去掉
+_PUNCTUATION = re.compile(r'[\s\u3000-\u303f\uff00-\uff0f\uff1a-\uff20\uff3b-\uff40\uff5b-\uff65'
+                          r'\u2018\u2019\u201c\u201d\u2026\u2014\u00b7,.!?;:"\'()\[\]<>#*\-]+')
+# 句子：以句末标点结束，包括其后的引号
+_SENTENCE = re.compile(r'[^。！？!?…\n]+(?:[。！？!?…]+[”’"」』]?)?')
+# MinHash 通用哈希族 (a*h + b) mod p 的素数（2^61-1，大于32位的n-gram哈希值）
+_PRIME = (1 << 61) - 1
+# 签名的计算方式，改变时之前保存的签名不能再比较
+MINHASH_VERSION = 2
+
+def normalize(text: str) -> str:
+    """去掉标点和空白"""
+    return _PUNCTUATION.sub('', text)
+
+def shingles(text: str, n: int = 3) -> Set[int]:
+    """
+    计算字符n-gram集合（以哈希值表示）
+    
+    Args:
+        text: 已去掉标点的文本
+        n: n-gram长度，中文一般取2~4
+        
+    Returns:
+        n-gram哈希值的集合，文本短于n时整段作为一个元素
+    """
+    if len(text) <= n:
+        return {zlib.crc32(text.encode('utf-8'))} if text else set()
+    return {zlib.crc32(text[i:i + n].encode('utf-8')) for i in range(len(text) - n + 1)}
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    """两个集合的Jaccard相似度"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class MinHasher:
+    def __init__(self, num_perm: int = 32, seed: int = 1):
+        """
+        初始化MinHash签名计算器
+        
+        Args:
+            num_perm: 签名长度（哈希函数个数）
+            seed: 随机种子，相同种子的签名可以相互比较（包括保存后再读取的签名）
+        """
+        rng = random.Random(seed)
+        # 每个哈希函数一组参数：a 为随机奇数，b 为随机数
+        self.params = [(rng.randrange(1, _PRIME, 2), rng.randrange(_PRIME)) for _ in range(num_perm)]
+        
+    def signature(self, hashes: Set[int]) -> Tuple[int, ...]:
+        """
+        计算MinHash签名
+        
+        Args:
+            hashes: n-gram哈希值的集合（见 shingles）
+            
+        Returns:
+            签名，两个签名相同位置取值相同的比例约等于集合的Jaccard相似度
+        """
+        if not hashes:
+            return tuple(0 for _ in self.params)
+        return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in self.params)
+
+class LSHIndex:
+    def __init__(self, num_perm: int = 32, bands: int = 8):
+        """
+        初始化MinHash签名的局部敏感哈希索引
+        
+        签名分为 bands 段，任意一段完全相同的两个签名成为候选，
+        相似度约高于 (1/bands)^(1/每段长度) 的集合大概率会被找到。
+        
+        Args:
+            num_perm: 签名长度
+            bands: 分段数，需能整除 num_perm
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm 必须是 bands 的整数倍")
+        self.rows = num_perm // bands
+        self.buckets = [{} for _ in range(bands)]
+        
+    def _keys(self, signature: Tuple[int, ...]) -> Iterable[Tuple[int, Tuple[int, ...]]]:
+        for band in range(len(self.buckets)):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+            
+    def insert(self, key: Hashable, signature: Tuple[int, ...]):
+        """
+        加入一个签名
+        
+        Args:
+            key: 签名对应的标识
+            signature: MinHash签名
+        """
+        for band, chunk in self._keys(signature):
+            self.buckets[band].setdefault(chunk, []).append(key)
+            
+    def remove(self, key: Hashable, signature: Tuple[int, ...]):
+        """
+        移除一个签名
+        
+        Args:
+            key: 签名对应的标识
+            signature: 加入时的MinHash签名
+        """
+        for band, chunk in self._keys(signature):
+            keys = self.buckets[band].get(chunk)
+            if keys is None or key not in keys:
+                continue
+            keys.remove(key)
+            if not keys:
+                del self.buckets[band][chunk]
+                
+    def query(self, signature: Tuple[int, ...]) -> Set[Hashable]:
+        """
+        查找可能相似的签名
+        
+        Args:
+            signature: MinHash签名
+            
+        Returns:
+            候选标识（需再计算实际相似度）
+        """
+        candidates = set()
+        for band, chunk in self._keys(signature):
+            candidates.update(self.buckets[band].get(chunk, ()))
+        return candidates
+
+class Repetition(NamedTuple):
+    """一组重复的内容"""
+    kind: str              # paragraph：重复段落；sentence：重复句子；boundary：相邻段落衔接处的重复
+    text: str              # 第一次出现的内容
+    positions: List[int]   # 各次出现所在的段落序号（从1开始）
+    similarity: float      # 组内最低的相似度，1.0表示完全相同
+
+class RepetitionReport:
+    _KIND_NAMES = {'paragraph': '重复段落', 'sentence': '重复句子', 'boundary': '相邻段落衔接处重复'}
+    
+    def __init__(self, repetitions: List[Repetition], paragraphs: int, sentences: int, elapsed: float):
+        """
+        初始化重复检测结果
+        
+        Args:
+            repetitions: 检测到的重复内容
+            paragraphs: 检测的段落数
+            sentences: 检测的句子数
+            elapsed: 检测耗时（秒）
+        """
+        self.repetitions = repetitions
+        self.paragraphs = paragraphs
+        self.sentences = sentences
+        self.elapsed = elapsed
+        
+    def is_clean(self) -> bool:
+        """是否没有检测到重复"""
+        return not self.repetitions
+        
+    def summary(self) -> str:
+        """
+        获取一行摘要，用于日志
+        
+        Returns:
+            各类重复的组数和检测耗时
+        """
+        counts = {}
+        for repetition in self.repetitions:
+            counts[repetition.kind] = counts.get(repetition.kind, 0) + 1
+        found = '，'.join(f"{self._KIND_NAMES[kind]}{count}处" for kind, count in counts.items()) or '未发现重复'
+        return f"{self.paragraphs}段、{self.sentences}句，{found}（{self.elapsed * 1000:.0f}毫秒）"
+        
+    def format(self, max_items: int = 20, max_chars: int = 50) -> str:
+        """
+        生成用于提示词的重复内容列表
+        
+        Args:
+            max_items: 最多列出的组数，按出现次数从多到少
+            max_chars: 每组内容最多引用的字符数
+            
+        Returns:
+            每行一组重复内容，没有重复时返回空字符串
+        """
+        items = sorted(self.repetitions, key=lambda r: (-len(r.positions), r.positions[0]))
+        lines = []
+        for repetition in items[:max_items]:
+            text = repetition.text if len(repetition.text) <= max_chars else repetition.text[:max_chars] + '……'
+            name = self._KIND_NAMES[repetition.kind]
+            if repetition.similarity < 1.0 and repetition.kind != 'boundary':
+                name = f"近似{name}"
+            positions = '、'.join(str(p) for p in repetition.positions)
+            lines.append(f"- {name}：“{text}”出现{len(repetition.positions)}次（第{positions}段）")
+        if len(items) > max_items:
+            lines.append(f"- 另有{len(items) - max_items}处重复未列出")
+        return '\n'.join(lines)
+
+class RepetitionDetector:
+    def __init__(self, ngram: int = 3, threshold: float = 0.7, min_sentence_chars: int = 12,
+                 min_paragraph_chars: int = 40, num_perm: int = 32, bands: int = 8):
+        """
+        初始化本地重复检测器
+        
+        按字符n-gram计算MinHash签名，用LSH找出候选后再计算实际的Jaccard相似度，
+        检测重复（或近似重复）的段落和句子，以及相邻段落衔接处的重复（分部分生成时常见的拼接问题）。
+        不调用模型，数万字的文本通常在百毫秒内完成。
+        
+        Args:
+            ngram: n-gram长度
+            threshold: 判定为重复的最低相似度
+            min_sentence_chars: 参与比较的句子的最少字符数（去掉标点后），过短的句子重复很正常
+            min_paragraph_chars: 参与比较的段落的最少字符数（去掉标点后）
+            num_perm: MinHash签名长度
+            bands: LSH分段数
+        """
+        self.ngram = ngram
+        self.threshold = threshold
+        self.min_sentence_chars = min_sentence_chars
+        self.min_paragraph_chars = min_paragraph_chars
+        self.hasher = MinHasher(num_perm)
+        self.num_perm = num_perm
+        self.bands = bands
+        
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> Optional['RepetitionDetector']:
+        """
+        根据配置创建检测器
+        
+        Args:
+            config: 配置字典
+            
+        Returns:
+            检测器，未启用 repetition_settings 时返回None
+        """
+        settings = config.get('repetition_settings', {})
+        if not settings.get('enabled', False):
+            return None
+        return cls(
+            settings.get('ngram', 3),
+            settings.get('threshold', 0.7),
+            settings.get('min_sentence_chars', 12),
+            settings.get('min_paragraph_chars', 40)
+        )
+        
+    def _groups(self, items: List[str], min_chars: int) -> List[Tuple[List[int], float]]:
+        """
+        找出相似的文本组
+        
+        Args:
+            items: 文本列表
+            min_chars: 参与比较的最少字符数
+            
+        Returns:
+            (组内文本的序号列表, 组内最低相似度) 的列表，只包含两个及以上的组
+        """
+        index = LSHIndex(self.num_perm, self.bands)
+        sets = {}
+        parent = {}
+        
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+            
+        edges = []
+        for i, item in enumerate(items):
+            text = normalize(item)
+            if len(text) < min_chars:
+                continue
+            sets[i] = shingles(text, self.ngram)
+            parent[i] = i
+            signature = self.hasher.signature(sets[i])
+            for j in index.query(signature):
+                similarity = jaccard(sets[i], sets[j])
+                if similarity >= self.threshold:
+                    edges.append((i, j, similarity))
+                    parent[find(i)] = find(j)
+            index.insert(i, signature)
+            
+        members = {}
+        for i in parent:
+            members.setdefault(find(i), []).append(i)
+        lowest = {}
+        for i, j, similarity in edges:
+            root = find(i)
+            lowest[root] = min(lowest.get(root, 1.0), similarity)
+        return [(sorted(group), lowest.get(root, 1.0)) for root, group in members.items() if len(group) > 1]
+        
+    def analyze(self, text: str) -> RepetitionReport:
+        """
+        检测文本中的重复内容
+        
+        Args:
+            text: 待检测的文本
+            
+        Returns:
+            检测结果
+        """
+        start = time.monotonic()
+        paragraphs = [p.strip() for p in text.split('\n') if p.strip() and not p.strip().startswith('#')]
+        sentences = []  # (段落序号, 句子)
+        for number, paragraph in enumerate(paragraphs):
+            sentences.extend((number, s.strip()) for s in _SENTENCE.findall(paragraph) if s.strip())
+            
+        repetitions = []
+        repeated_paragraphs = set()
+        for group, similarity in self._groups(paragraphs, self.min_paragraph_chars):
+            repeated_paragraphs.update(group)
+            repetitions.append(Repetition('paragraph', paragraphs[group[0]], [i + 1 for i in group], similarity))
+            
+        for group, similarity in self._groups([s for _, s in sentences], self.min_sentence_chars):
+            numbers = [sentences[i][0] for i in group]
+            # 已作为重复段落报告的不再重复列出
+            if all(number in repeated_paragraphs for number in numbers):
+                continue
+            adjacent = any(b - a == 1 for a, b in zip(numbers, numbers[1:]))
+            repetitions.append(Repetition(
+                'boundary' if adjacent else 'sentence',
+                sentences[group[0]][1],
+                [number + 1 for number in numbers],
+                similarity
+            ))
+            
+        return RepetitionReport(repetitions, len(paragraphs), len(sentences), time.monotonic() - start)
+
+class SimilarityIndex:
+    def __init__(self, run_id: str, path: Optional[str] = None, threshold: float = 0.6,
+                 ngram: int = 3, num_perm: int = 64, bands: int = 16):
+        """
+        初始化跨小说、跨运行的相似度索引
+        
+        保存每篇小说大纲和各部分内容的MinHash签名（不保存原文），用LSH查找相似的已有内容。
+        指定 path 时签名会追加写入该文件，之后的运行会读取其中的全部记录，
+        因此多次运行共用同一个文件即可发现与之前生成过的小说雷同的内容。
+        
+        Args:
+            run_id: 本次运行的标识，恢复运行时应保持不变
+            path: 索引文件路径（JSON Lines，可选）
+            threshold: 判定为雷同的最低相似度
+            ngram: n-gram长度
+            num_perm: MinHash签名长度
+            bands: LSH分段数
+        """
+        self.run_id = run_id
+        self.path = path
+        self.threshold = threshold
+        self.ngram = ngram
+        self.hasher = MinHasher(num_perm)
+        self.num_perm = num_perm
+        self.bands = bands
+        self._lock = threading.Lock()
+        self._entries = {}   # 记录键 -> 记录
+        self._indexes = {}   # 内容类型 -> LSH索引
+        if path and os.path.exists(path):
+            self._load()
+            
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], run_id: str) -> Optional['SimilarityIndex']:
+        """
+        根据配置创建索引
+        
+        Args:
+            config: 配置字典
+            run_id: 本次运行的标识
+            
+        Returns:
+            索引，未启用 dedup_settings 时返回None
+        """
+        settings = config.get('dedup_settings', {})
+        if not settings.get('enabled', False):
+            return None
+        output_dir = config.get('output_settings', {}).get('output_dir', '.')
+        index_file = settings.get('index_file', 'similarity_index.jsonl')
+        return cls(
+            run_id,
+            os.path.join(output_dir, index_file) if index_file else None,
+            settings.get('threshold', 0.6),
+            settings.get('ngram', 3)
+        )
+        
+    @staticmethod
+    def _key(run_id: str, novel: int, kind: str, part: Optional[int]) -> str:
+        return f"{run_id}#{novel}#{kind}" + (f"#{part}" if part is not None else "")
+        
+    def _insert(self, entry: Dict[str, Any]):
+        """加入一条记录（调用方需持有锁），同一键的新记录覆盖旧记录"""
+        index = self._indexes.setdefault(entry['kind'], LSHIndex(self.num_perm, self.bands))
+        old = self._entries.get(entry['key'])
+        if old is not None:
+            # 旧签名留在分段桶中会使重写前的内容继续被当作候选
+            index.remove(old['key'], tuple(old['signature']))
+        self._entries[entry['key']] = entry
+        index.insert(entry['key'], tuple(entry['signature']))
+        
+    def _load(self):
+        """读取索引文件，跳过损坏的行和签名参数或计算方式不同的记录"""
+        loaded = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if (entry.get('ngram') != self.ngram or len(entry.get('signature', [])) != self.num_perm
+                        or entry.get('minhash') != MINHASH_VERSION):
+                    continue
+                self._insert(entry)
+                loaded += 1
+        logger.info(f"已加载相似度索引：{self.path}（{loaded}条记录）")
+        
+    def _similarity(self, a: Tuple[int, ...], b: Iterable[int]) -> float:
+        """由MinHash签名估算Jaccard相似度"""
+        return sum(1 for x, y in zip(a, b) if x == y) / self.num_perm
+        
+    def check_and_add(self, kind: str, novel: int, text: str, part: Optional[int] = None,
+                      keep_similar: bool = False) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        查找与其他小说的同类内容是否雷同，并加入索引
+        
+        查找和加入在同一个锁内完成，同时生成的多篇小说不会互相漏检。
+        
+        Args:
+            kind: 内容类型，如 outline、part
+            novel: 小说序号
+            text: 内容
+            part: 部分序号（可选）
+            keep_similar: 为True时雷同的内容也加入索引，否则只加入不雷同的内容
+            
+        Returns:
+            雷同时返回（最相似的记录, 相似度），否则返回None
+        """
+        signature = self.hasher.signature(shingles(normalize(text), self.ngram))
+        with self._lock:
+            match = None
+            index = self._indexes.get(kind)
+            for key in (index.query(signature) if index is not None else ()):
+                entry = self._entries[key]
+                if entry['run'] == self.run_id and entry['novel'] == novel:
+                    continue
+                similarity = self._similarity(signature, entry['signature'])
+                if similarity >= self.threshold and (match is None or similarity > match[1]):
+                    match = (entry, similarity)
+                    
+            if match is None or keep_similar:
+                entry = {
+                    'key': self._key(self.run_id, novel, kind, part),
+                    'run': self.run_id,
+                    'novel': novel,
+                    'kind': kind,
+                    'part': part,
+                    'ngram': self.ngram,
+                    'minhash': MINHASH_VERSION,
+                    'signature': list(signature)
+                }
+                self._insert(entry)
+                if self.path:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(entry) + '\n')
+            return match
+            
+    def describe(self, entry: Dict[str, Any]) -> str:
+        """
+        获取记录所属小说的描述，用于日志
+        
+        Args:
+            entry: 索引记录
+            
+        Returns:
+            如"第2篇小说"或"之前运行（2024-01-01T10:00:00）的第1篇小说"
+        """
+        if entry['run'] == self.run_id:
+            return f"第{entry['novel'] + 1}篇小说"
+        return f"之前运行（{entry['run']}）的第{entry['novel'] + 1}篇小说"
@@ -0,0 +1,269 @@
+import re
+from typing import Dict, Any, List, NamedTuple, Optional
+from loguru import logger
+
+# 各模型系列平均每个token对应的中文字符数，用于在本地快速估算token数。
+# 数值偏保守，可通过 ai_settings.chars_per_token 按实际模型校准。
+MODEL_CHARS_PER_TOKEN = {
+    'qwen': 1.4,
+    'glm': 1.5,
+    'chatglm': 1.5,
+    'yi': 1.3,
+    'deepseek': 1.2,
+    'internlm': 1.4,
+    'baichuan': 1.4,
+    'llama3': 0.9,
+    'llama2': 0.6,
+    'llama': 0.6,
+    'mistral': 0.7,
+    'gemma': 1.0,
+}
+DEFAULT_CHARS_PER_TOKEN = 0.8
+# 英文、数字等非中文字符平均每个token对应的字符数
+OTHER_CHARS_PER_TOKEN = 3.5
+# 可选的上下文窗口大小，按需从小到大选择
+NUM_CTX_LADDER = [2048, 4096, 8192, 16384, 32768, 65536, 131072]
+
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+class PromptBudgetError(ValueError):
+    """必需的提示词内容超出上下文窗口"""
+
+class PromptSection(NamedTuple):
+    """
+    提示词中的一段可变内容
+    
+    Attributes:
+        name: 名称，对应构建函数的参数名
+        text: 内容
+        required: 是否必须完整保留
+        weight: 超出预算时分配剩余空间的权重
+        keep: 需要截断时保留开头（head）还是结尾（tail）
+    """
+    name: str
+    text: str
+    required: bool = False
+    weight: float = 1.0
+    keep: str = 'head'
+
+class TokenEstimator:
+    def __init__(self, chars_per_token: float, other_chars_per_token: float = OTHER_CHARS_PER_TOKEN):
+        """
+        初始化token估算器
+        
+        Args:
+            chars_per_token: 平均每个token对应的中文字符数
+            other_chars_per_token: 平均每个token对应的其他字符数
+        """
+        self.chars_per_token = chars_per_token
+        self.other_chars_per_token = other_chars_per_token
+        
+    @classmethod
+    def for_config(cls, config: Dict[str, Any]) -> 'TokenEstimator':
+        """
+        根据配置中的模型创建估算器
+        
+        优先使用 ai_settings.chars_per_token，否则按模型名称匹配默认值。
+        
+        Args:
+            config: 配置字典
+            
+        Returns:
+            token估算器
+        """
+        ai_settings = config['ai_settings']
+        if 'chars_per_token' in ai_settings:
+            return cls(float(ai_settings['chars_per_token']))
+        return cls(model_chars_per_token(ai_settings['model']))
+        
+    def estimate(self, text: str) -> int:
+        """
+        估算文本的token数
+        
+        Args:
+            text: 文本
+            
+        Returns:
+            估算的token数
+        """
+        if not text:
+            return 0
+        cjk = len(_CJK_PATTERN.findall(text))
+        other = len(text) - cjk
+        return int(cjk / self.chars_per_token + other / self.other_chars_per_token) + 1
+        
+    def measure(self, text: str, tokens: int) -> Optional[float]:
+        """
+        根据一段文本的实际token数计算每token对应的中文字符数
+        
+        Args:
+            text: 文本
+            tokens: 模型报告的实际token数（如生成时的 eval_count）
+            
+        Returns:
+            每token中文字符数，文本中中文太少或token数不足以扣除其他字符时返回None
+        """
+        cjk = len(_CJK_PATTERN.findall(text))
+        cjk_tokens = tokens - (len(text) - cjk) / self.other_chars_per_token
+        if cjk < len(text) / 2 or cjk_tokens <= 0:
+            return None
+        return cjk / cjk_tokens
+        
+    def truncate(self, text: str, max_tokens: int, keep: str = 'head') -> str:
+        """
+        将文本截断到指定token数以内
+        
+        Args:
+            text: 文本
+            max_tokens: token上限
+            keep: 保留开头（head）还是结尾（tail）
+            
+        Returns:
+            截断后的文本，被省略的一侧以省略号标记
+        """
+        if self.estimate(text) <= max_tokens:
+            return text
+        if max_tokens <= 2:
+            return ""
+            
+        # 二分查找能放入预算的最大字符数
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            part = text[:mid] if keep == 'head' else text[-mid:]
+            if self.estimate(part) + 2 <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        if low == 0:
+            return ""
+        return text[:low] + "\n……" if keep == 'head' else "……\n" + text[-low:]
+
+def model_chars_per_token(model: str) -> float:
+    """
+    按模型名称获取默认的每token中文字符数
+    
+    Args:
+        model: 模型名称，如 qwen2.5:14b
+        
+    Returns:
+        每token中文字符数
+    """
+    name = model.lower()
+    for family in sorted(MODEL_CHARS_PER_TOKEN, key=len, reverse=True):
+        if name.startswith(family):
+            return MODEL_CHARS_PER_TOKEN[family]
+    return DEFAULT_CHARS_PER_TOKEN
+
+class PromptAssembler:
+    def __init__(self, config: Dict[str, Any], estimator: TokenEstimator = None):
+        """
+        初始化按token预算组装提示词的工具
+        
+        Args:
+            config: 配置字典
+            estimator: token估算器（可选），不传时按配置中的模型创建
+        """
+        budget_settings = config.get('prompt_budget', {})
+        self.context_size = config['ai_settings']['context_size']
+        self.estimator = estimator or TokenEstimator.for_config(config)
+        self.safety_margin = budget_settings.get('safety_margin', 0.05)
+        self.strict = budget_settings.get('strict', False)
+        self.adaptive_num_ctx = budget_settings.get('adaptive_num_ctx', False)
+        
+    def prompt_budget(self, num_predict: int) -> int:
+        """
+        计算提示词可用的token数（预留生成所需的空间和估算误差）
+        
+        Args:
+            num_predict: 生成的最大token数
+            
+        Returns:
+            提示词可用的token数
+        """
+        return int(self.context_size * (1 - self.safety_margin)) - num_predict
+        
+    def fit(self, sections: List[PromptSection], overhead: str, num_predict: int, stage: str = "",
+            estimator: Optional[TokenEstimator] = None) -> Dict[str, str]:
+        """
+        在预算内分配各段内容的长度
+        
+        必需内容完整保留，其余内容先放入较短的，剩余空间按权重分给较长的并截断；
+        没有必需内容时即使预算不足也不报错，可选内容全部省略。
+        
+        Args:
+            sections: 可变内容列表
+            overhead: 去掉可变内容后的提示词（模板文字）
+            num_predict: 生成的最大token数
+            stage: 调用所属的阶段，用于日志
+            estimator: 该阶段所用模型的token估算器（可选），不传时使用初始化时的估算器
+            
+        Returns:
+            名称到（可能被截断的）内容的映射
+            
+        Raises:
+            PromptBudgetError: 必需内容超出预算，或 strict 模式下需要截断
+        """
+        estimator = estimator or self.estimator
+        budget = self.prompt_budget(num_predict) - estimator.estimate(overhead)
+        needs = {s.name: estimator.estimate(s.text) for s in sections}
+        if sum(needs.values()) <= budget:
+            return {s.name: s.text for s in sections}
+            
+        required = sum(needs[s.name] for s in sections if s.required)
+        available = budget - required
+        if available < 0 and not required:
+            # 模板和生成上限已占满预算时没有必需内容可保留，省略全部可选内容
+            available = 0
+        if available < 0:
+            raise PromptBudgetError(
+                f"{stage}提示词的必需内容约{required}个token，超出可用预算{budget}个token"
+                f"（context_size={self.context_size}，num_predict={num_predict}）"
+            )
+            
+        # 先满足需求小于其份额的内容，剩余空间在其他内容间按权重分配
+        allocation = {}
+        remaining = [s for s in sections if not s.required]
+        while remaining:
+            total_weight = sum(s.weight for s in remaining) or 1.0
+            fits = [s for s in remaining if needs[s.name] <= available * s.weight / total_weight]
+            if not fits:
+                for s in remaining:
+                    allocation[s.name] = int(available * s.weight / total_weight)
+                break
+            for s in fits:
+                allocation[s.name] = needs[s.name]
+                available -= needs[s.name]
+                remaining.remove(s)
+                
+        dropped = {
+            s.name: needs[s.name] - allocation[s.name]
+            for s in sections if not s.required and allocation[s.name] < needs[s.name]
+        }
+        summary = "，".join(f"{name}约{tokens}个token" for name, tokens in dropped.items())
+        if self.strict:
+            raise PromptBudgetError(f"{stage}提示词超出预算，需要截断：{summary}")
+        logger.warning(f"{stage}提示词超出预算（可用{budget}个token），已截断：{summary}")
+        
+        return {
+            s.name: s.text if s.name not in dropped else estimator.truncate(s.text, allocation[s.name], s.keep)
+            for s in sections
+        }
+        
+    def pick_num_ctx(self, prompt: str, num_predict: int, estimator: Optional[TokenEstimator] = None) -> int:
+        """
+        选择能容纳提示词和生成内容的最小上下文窗口
+        
+        Args:
+            prompt: 完整提示词
+            num_predict: 生成的最大token数
+            estimator: 该调用所用模型的token估算器（可选），不传时使用初始化时的估算器
+            
+        Returns:
+            上下文窗口大小，不超过 ai_settings.context_size
+        """
+        needed = int(((estimator or self.estimator).estimate(prompt) + num_predict) / (1 - self.safety_margin))
+        for size in NUM_CTX_LADDER:
+            if size >= needed:
+                return min(size, self.context_size)
+        return self.context_size
@@ -0,0 +1,39 @@
+import os
+import sys
+import pytest
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')
+sys.path.insert(0, BENCHMARK_DIR)
+
+from mock_ollama import MockOllama
+from run_benchmark import load_benchmark_config
+
+# 测试用的模拟服务器参数：足够快，不模拟模型加载
+FAST_PROFILE = {'prompt_eval_rate': 1000000, 'eval_rate': 100000, 'load_time': 0, 'response_tokens': 200}
+
+@pytest.fixture
+def mock_ollama():
+    """在后台线程中运行的模拟Ollama服务器，测试结束后停止"""
+    mock = MockOllama(FAST_PROFILE).start()
+    yield mock
+    mock.stop()
+
+def mock_config(mock, tmp_path, name='base'):
+    """
+    读取基准配置并指向模拟服务器和临时输出目录
+    
+    Args:
+        mock: 模拟服务器
+        tmp_path: 临时目录
+        name: 基准配置名称
+        
+    Returns:
+        配置字典（不含 mock 部分）
+    """
+    config = load_benchmark_config(name)
+    config.pop('mock', None)
+    host, port = mock.server.server_address[:2]
+    config['ai_settings'].update({'host': f"http://{host}", 'port': port})
+    config['output_settings'].update({'output_dir': str(tmp_path), 'save_path': str(tmp_path)})
+    config['journal_settings'] = {'background': False}
+    return config
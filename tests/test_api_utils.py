@@ -0,0 +1,198 @@
+import json
+import threading
+import pytest
+import requests
+from novel_generator.utils.api_utils import OllamaAPI
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+        
+    def raise_for_status(self):
+        pass
+        
+    def json(self):
+        return self.data
+
+def make_api(tmp_path, monkeypatch):
+    api = OllamaAPI({
+        'ai_settings': {'host': 'http://gpu1', 'port': 11434, 'model': 'qwen2.5', 'temperature': 0.7,
+                        'context_size': 4096, 'num_predict': 256},
+        'cache_settings': {'enabled': True, 'cache_dir': str(tmp_path / 'cache')}
+    })
+    calls = []
+    def post(url, json, timeout):
+        calls.append(json)
+        return FakeResponse({'response': '他推开门。屋里没有人，只有', 'done': True,
+                             'eval_count': 10})
+    monkeypatch.setattr(api.session, 'post', post)
+    return api, calls
+
+def test_truncated_response_is_cached_after_processing(tmp_path, monkeypatch):
+    api, calls = make_api(tmp_path, monkeypatch)
+    trim = lambda text: text[:text.rindex('。') + 1]
+    
+    first = api.generate("系统提示词", "用户提示词", stage='content', options={'num_predict': 10}, on_truncated=trim)
+    cached = api.generate("系统提示词", "用户提示词", stage='content', options={'num_predict': 10}, on_truncated=trim)
+    
+    assert first == cached == '他推开门。'
+    assert len(calls) == 1
+    api.close()
+
+def test_response_within_limit_is_not_processed(tmp_path, monkeypatch):
+    api, _ = make_api(tmp_path, monkeypatch)
+    
+    text = api.generate("系统提示词", "用户提示词", stage='content', options={'num_predict': 100},
+                        on_truncated=lambda text: '')
+                        
+    assert text == '他推开门。屋里没有人，只有'
+    api.close()
+
+def test_stage_models_and_options_apply_per_stage():
+    api = OllamaAPI({
+        'ai_settings': {'host': 'http://gpu1', 'port': 11434, 'model': 'qwen2.5:14b', 'temperature': 0.7,
+                        'context_size': 4096, 'num_predict': 256,
+                        'stage_models': {'rating': 'qwen2.5:7b'},
+                        'stage_options': {'rating': {'temperature': 0.2, 'num_predict': 128}}}
+    })
+    
+    rating = api._build_request("系统提示词", "用户提示词", stream=False, stage='rating')
+    content = api._build_request("系统提示词", "用户提示词", stream=False, stage='content')
+    override = api._build_request("系统提示词", "用户提示词", stream=False, stage='rating',
+                                  options={'num_predict': 64})
+    
+    assert api.model_for('rating') == rating['model'] == 'qwen2.5:7b'
+    assert api.model_for('content') == content['model'] == 'qwen2.5:14b'
+    assert rating['options'] == {'temperature': 0.2, 'num_ctx': 4096, 'num_predict': 128}
+    assert content['options'] == {'temperature': 0.7, 'num_ctx': 4096, 'num_predict': 256}
+    # 调用时传入的选项优先于阶段设置
+    assert override['options'] == {'temperature': 0.2, 'num_ctx': 4096, 'num_predict': 64}
+    api.close()
+
+def make_pool_api(**request_settings):
+    return OllamaAPI({
+        'ai_settings': {'hosts': ['http://gpu1:11434', 'http://gpu2:11434'], 'model': 'qwen2.5',
+                        'temperature': 0.7, 'context_size': 4096, 'num_predict': 256, 'health_check_interval': 0},
+        'request_settings': request_settings
+    })
+
+def test_connection_pool_does_not_retry():
+    api = make_pool_api()
+    
+    # 重试只由请求循环处理，连接池再重试会使重试次数翻倍
+    assert api.session.get_adapter('http://gpu1:11434').max_retries.total == 0
+    api.close()
+
+def test_hedged_request_uses_first_response(monkeypatch):
+    api = make_pool_api(hedge=True, hedge_min_samples=1, hedge_min_delay=0.05)
+    api.latency.observe('qwen2.5', 'rating', 0.05, None)
+    slow_host_done = threading.Event()
+    hosts = []
+    
+    def post(url, json, timeout):
+        hosts.append(url)
+        if len(hosts) == 1:
+            # 第一台服务器很慢，对冲请求完成后才返回
+            slow_host_done.wait(5)
+            return FakeResponse({'response': '慢', 'done': True})
+        return FakeResponse({'response': '快', 'done': True})
+        
+    monkeypatch.setattr(api.session, 'post', post)
+    text = api.generate("系统提示词", "用户提示词", stage='rating')
+    slow_host_done.set()
+    
+    assert text == '快'
+    assert len({url.split('/api/')[0] for url in hosts}) == 2
+    assert (api.latency.hedged, api.latency.hedge_wins) == (1, 1)
+    api.close()
+
+def test_fast_request_is_not_hedged(monkeypatch):
+    api = make_pool_api(hedge=True, hedge_min_samples=1, hedge_min_delay=1)
+    api.latency.observe('qwen2.5', 'rating', 1, None)
+    hosts = []
+    
+    def post(url, json, timeout):
+        hosts.append(url)
+        return FakeResponse({'response': '结果', 'done': True})
+        
+    monkeypatch.setattr(api.session, 'post', post)
+    
+    assert api.generate("系统提示词", "用户提示词", stage='rating') == '结果'
+    assert len(hosts) == 1 and api.latency.hedged == 0
+    api.close()
+
+class FakeStream(FakeResponse):
+    def __init__(self, lines):
+        super().__init__(None)
+        self.lines = lines
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, *args):
+        pass
+        
+    def iter_lines(self):
+        for line in self.lines:
+            if isinstance(line, Exception):
+                raise line
+            yield line
+
+def make_stream_api(monkeypatch, *streams):
+    """流式调用依次返回给定的NDJSON行"""
+    api = OllamaAPI({
+        'ai_settings': {'host': 'http://gpu1', 'port': 11434, 'model': 'qwen2.5', 'temperature': 0.7,
+                        'context_size': 4096, 'num_predict': 256, 'stream': True},
+        'request_settings': {'retry_backoff': 0}
+    })
+    streams = list(streams)
+    monkeypatch.setattr(api.session, 'post', lambda *args, **kwargs: FakeStream(streams.pop(0)))
+    return api
+
+def chunk(text, done=False, **stats):
+    return json.dumps({'response': text, 'done': done, **stats}, ensure_ascii=False).encode('utf-8')
+
+def test_stream_yields_text_and_stats(monkeypatch):
+    api = make_stream_api(monkeypatch, [chunk('他推开门'), b'', chunk('。'), chunk('', done=True, eval_count=3)])
+    tokens = []
+    
+    text = api.generate("系统提示词", "用户提示词", stage='content', on_token=tokens.append)
+    
+    assert tokens == ['他推开门', '。'] and text == '他推开门。'
+    assert api.last_call()['eval_count'] == 3
+    assert api.hosts.hosts[0].in_flight == 0
+    api.close()
+
+def test_interrupted_stream_restarts(monkeypatch):
+    cut = requests.exceptions.ChunkedEncodingError("connection closed")
+    api = make_stream_api(monkeypatch, [chunk('他推开门'), cut], [chunk('她回头'), chunk('', done=True)])
+    tokens = []
+    restarts = []
+    
+    def restart():
+        # 丢弃已收到的文本
+        restarts.append(''.join(tokens))
+        tokens.clear()
+        
+    text = api.generate("系统提示词", "用户提示词", stage='content', on_token=tokens.append, on_restart=restart)
+    
+    assert restarts == ['他推开门']
+    assert text == ''.join(tokens) == '她回头'
+    api.close()
+
+def test_interrupted_stream_without_restart_fails(monkeypatch):
+    api = make_stream_api(monkeypatch, [chunk('他推开门')])
+    
+    # 完成之前结束，已输出的文本无法撤回时不重新生成
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        api.generate("系统提示词", "用户提示词", stage='content', on_token=lambda text: None)
+    assert api.hosts.hosts[0].in_flight == 0
+    api.close()
+
+def test_malformed_stream_line_fails(monkeypatch):
+    api = make_stream_api(monkeypatch, [chunk('他'), '{"response": "推'.encode('utf-8')])
+    
+    with pytest.raises(requests.exceptions.InvalidJSONError):
+        api.generate("系统提示词", "用户提示词")
+    assert api.hosts.hosts[0].in_flight == 0
+    api.close()
@@ -0,0 +1,57 @@
+import os
+from novel_generator.utils.artifact_store import ArtifactStore
+
+def selected_ids(store, novel, kind, part=0):
+    return [v['id'] for v in store.versions(novel, kind) if v['part'] == part and v['selected']]
+
+def test_versions_are_numbered_per_novel_kind_and_part(tmp_path):
+    store = ArtifactStore(str(tmp_path / 'artifacts.db'))
+    store.add(0, 'outline', '大纲一')
+    store.add(0, 'outline', '大纲二')
+    store.add(1, 'outline', '另一篇的大纲')
+    store.add(0, 'content', '开篇', part=1)
+    store.add(0, 'content', '发展', part=2)
+    store.add(0, 'content', '开篇重写', part=1, feedback='## 优点\n- 好', score=0.6, provenance={'iteration': 1})
+    
+    assert [v['version'] for v in store.versions(0, 'outline')] == [1, 2]
+    assert [v['version'] for v in store.versions(1, 'outline')] == [1]
+    assert [(v['part'], v['version']) for v in store.versions(0, 'content')] == [(1, 1), (1, 2), (2, 1)]
+    rewritten = store.versions(0, 'content')[1]
+    assert (rewritten['content'], rewritten['score'], rewritten['provenance']) == ('开篇重写', 0.6, {'iteration': 1})
+    store.close()
+
+def test_exactly_one_version_is_selected(tmp_path):
+    store = ArtifactStore(str(tmp_path / 'artifacts.db'))
+    first = store.add(0, 'outline', '大纲一')
+    second = store.add(0, 'outline', '大纲二')
+    other = store.add(0, 'content', '开篇', part=1, selected=True)
+    
+    assert store.select(0, 'outline', '大纲一') == first
+    assert selected_ids(store, 0, 'outline') == [first]
+    assert store.select(0, 'outline', '大纲二') == second
+    assert selected_ids(store, 0, 'outline') == [second]
+    
+    # 没有相同内容的版本时新增一个并选用
+    added = store.add(0, 'outline', '大纲三', selected=True)
+    assert selected_ids(store, 0, 'outline') == [added]
+    assert store.select(0, 'outline', '合并后的大纲') not in (first, second, added)
+    assert len(selected_ids(store, 0, 'outline')) == 1
+    assert store.selected(0, 'outline')['content'] == '合并后的大纲'
+    assert selected_ids(store, 0, 'content', part=1) == [other]
+    store.close()
+
+def test_export_writes_selected_versions(tmp_path):
+    store = ArtifactStore(str(tmp_path / 'artifacts.db'))
+    store.add(0, 'outline', '大纲一')
+    store.select(0, 'outline', '大纲一')
+    store.add(0, 'novel', '第一篇', score=70, selected=True)
+    store.add(1, 'novel', '第二篇', score=85, selected=True)
+    
+    store.export(str(tmp_path / 'novels'), '标题')
+    
+    novels = tmp_path / 'novels'
+    assert (novels / '标题_1' / 'outline.md').read_text(encoding='utf-8') == '大纲一'
+    assert (novels / '标题_2' / '标题.md').read_text(encoding='utf-8') == '第二篇'
+    assert (novels / '标题_best.md').read_text(encoding='utf-8') == '第二篇'
+    assert not os.path.exists(novels / '标题_1' / 'characters.md')
+    store.close()
@@ -0,0 +1,145 @@
+import asyncio
+import httpx
+from novel_generator.core.writer import NovelWriter
+from novel_generator.utils.api_utils import OllamaAPI
+from novel_generator.utils.async_api_utils import AsyncOllamaAPI
+
+def make_config(tmp_path, max_concurrency=1):
+    return {
+        'ai_settings': {'host': 'http://gpu1', 'port': 11434, 'model': 'qwen2.5', 'temperature': 0.7,
+                        'context_size': 4096, 'num_predict': 256, 'max_concurrency': max_concurrency},
+        'novel_settings': {'title': '测试', 'genre': '科幻', 'theme': '人工智能', 'word_count': 3000},
+        'output_settings': {'output_dir': str(tmp_path), 'save_path': str(tmp_path)},
+        'rewrite_settings': {'outline_rewrites': 1},
+        'journal_settings': {'background': False}
+    }
+
+def make_async_api(config, handler):
+    api = AsyncOllamaAPI(config)
+    api._session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return api
+
+def test_concurrent_requests_are_bounded(tmp_path):
+    in_flight = []
+    peak = []
+    
+    async def handler(request):
+        in_flight.append(request)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(request)
+        return httpx.Response(200, json={'response': '结果', 'done': True, 'eval_count': 5})
+        
+    async def run():
+        async with make_async_api(make_config(tmp_path, max_concurrency=2), handler) as api:
+            return await asyncio.gather(*(api.generate("系统提示词", str(i)) for i in range(6)))
+            
+    assert asyncio.run(run()) == ['结果'] * 6
+    assert max(peak) == 2
+
+def test_server_error_is_retried(tmp_path):
+    calls = []
+    
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, json={'response': '结果', 'done': True})
+        
+    async def run():
+        config = make_config(tmp_path)
+        config['request_settings'] = {'retry_backoff': 0}
+        async with make_async_api(config, handler) as api:
+            text = await api.generate("系统提示词", stage='outline')
+            return text, api.last_call()
+            
+    text, record = asyncio.run(run())
+    assert text == '结果'
+    assert len(calls) == 2
+    assert record['stage'] == 'outline'
+
+def test_agenerate_outline_rewrites_with_feedback(tmp_path):
+    prompts = []
+    
+    def handler(request):
+        prompt = request.read().decode('utf-8')
+        prompts.append(prompt)
+        return httpx.Response(200, json={'response': f'第{len(prompts)}次的结果', 'done': True})
+        
+    async def run():
+        config = make_config(tmp_path)
+        async with make_async_api(config, handler) as api:
+            writer = NovelWriter(config, api.client, async_api_client=api)
+            return await writer.agenerate_outline()
+            
+    # 初始版本 → 反馈 → 重写（最后一版不获取反馈）
+    assert asyncio.run(run()) == '第3次的结果'
+    assert len(prompts) == 3
+    assert (tmp_path / 'outline.md').read_text(encoding='utf-8') == '第3次的结果'
+
+def test_failed_call_is_raised_inside_stage_logic(tmp_path, monkeypatch):
+    config = make_config(tmp_path)
+    calls = []
+    
+    def respond():
+        calls.append(None)
+        # 获取反馈失败时沿用初始版本，按空反馈重写
+        return len(calls) != 2
+        
+    def generate(system_prompt, user_prompt="", **kwargs):
+        if not respond():
+            raise ConnectionError("connection refused")
+        return f"第{len(calls)}次的结果"
+        
+    def handler(request):
+        if not respond():
+            return httpx.Response(400)
+        return httpx.Response(200, json={'response': f"第{len(calls)}次的结果", 'done': True})
+        
+    async def run():
+        async with make_async_api(config, handler) as api:
+            writer = NovelWriter(config, api.client, async_api_client=api)
+            return await writer.agenerate_outline()
+            
+    assert asyncio.run(run()) == '第3次的结果'
+    
+    # 同一段阶段逻辑在线程中执行时结果相同
+    calls.clear()
+    writer = NovelWriter(config, OllamaAPI(config))
+    monkeypatch.setattr(writer.api_client, 'generate', generate)
+    assert writer.generate_outline() == '第3次的结果'
+
+def test_chat_mode_reads_message_content(tmp_path):
+    def handler(request):
+        assert request.url.path == '/api/chat'
+        return httpx.Response(200, json={'message': {'role': 'assistant', 'content': '结果'}, 'done': True})
+        
+    async def run():
+        config = make_config(tmp_path)
+        config['ai_settings']['api_mode'] = 'chat'
+        async with make_async_api(config, handler) as api:
+            return await api.generate("系统提示词", "用户提示词")
+            
+    assert asyncio.run(run()) == '结果'
+
+def test_failed_host_fails_over_to_another(tmp_path):
+    hosts = []
+    
+    def handler(request):
+        hosts.append(request.url.host)
+        if request.url.host == 'gpu1':
+            return httpx.Response(503, json={'error': '服务器繁忙'})
+        return httpx.Response(200, json={'response': '结果', 'done': True})
+        
+    async def run():
+        config = make_config(tmp_path)
+        config['ai_settings']['hosts'] = ['http://gpu1:11434', 'http://gpu2:11434']
+        config['ai_settings']['health_check_interval'] = 0
+        async with make_async_api(config, handler) as api:
+            first = await api.generate("系统提示词", "1")
+            second = await api.generate("系统提示词", "2")
+            return first, second, api.hosts.hosts[0].healthy
+            
+    # 失败的服务器移出轮换，之后的请求不再发往它
+    assert asyncio.run(run()) == ('结果', '结果', False)
+    assert hosts.count('gpu2') == 2 and hosts.count('gpu1') <= 1
@@ -0,0 +1,57 @@
+from novel_generator.core.budget import RewriteBudget
+
+def make_budget(**settings):
+    return RewriteBudget({'rewrite_settings': settings})
+
+def test_plateau_stops_after_patience():
+    budget = make_budget(patience=2)
+    
+    assert budget.stop_reason([0.5, 0.6], 0) is None
+    assert budget.stop_reason([0.5, 0.6, 0.6], 0) is None
+    assert budget.stop_reason([0.5, 0.6, 0.6, 0.55], 0) == "连续2次重写没有提升"
+    # 新的最佳评分重新计数
+    assert budget.stop_reason([0.5, 0.6, 0.6, 0.7], 0) is None
+    # 没有超过之前的最佳评分也算没有提升
+    assert budget.stop_reason([0.5, 0.55], 0, baseline=0.6) == "连续2次重写没有提升"
+
+def test_target_score_stops_early():
+    budget = make_budget()
+    
+    assert budget.stop_reason([70, 85], 80) == "评分85.00已达到目标80"
+    assert budget.stop_reason([70, 75], 80) is None
+    assert budget.stop_reason([70, 70, 70, 70], 0) is None
+
+def test_unused_rewrites_carry_over():
+    budget = make_budget(carry_over=True, max_carry_over=2)
+    
+    assert budget.allowance(3, '大纲') == 3
+    budget.refund(2, '大纲')
+    budget.refund(1, '人物设定')
+    
+    # 每个阶段最多多用 max_carry_over 次，剩下的留给后面的阶段
+    assert budget.allowance(1, '第1部分') == 3
+    assert budget.allowance(1, '第2部分') == 2
+    assert budget.allowance(1, '第3部分') == 1
+    # 配置为不重写的阶段不使用转来的次数
+    budget.refund(1, '第3部分')
+    assert budget.allowance(0, '最终重写') == 0
+    assert budget.allowance(1, '最终重写') == 2
+
+def test_no_carry_over_by_default():
+    budget = make_budget()
+    budget.refund(2, '大纲')
+    
+    assert budget.allowance(1, '人物设定') == 1
+
+def test_exhausted_budget_stops_rewrites():
+    budget = make_budget(novel_token_budget=100, carry_over=True)
+    budget.add_tokens(60)
+    assert budget.exhausted() is None
+    
+    budget.add_tokens(40)
+    assert budget.exhausted() == "已生成100个token，超出单篇预算100个"
+    assert budget.allowance(3, '最终重写') == 0
+    assert budget.stop_reason([0.5], 0) == budget.exhausted()
+    # 预算用完后不再转出重写次数
+    budget.refund(2, '第1部分')
+    assert budget._carried == 0
@@ -0,0 +1,90 @@
+import json
+from novel_generator.utils.api_utils import OllamaAPI
+from novel_generator.utils.cache_utils import ResponseCache
+
+# 缓存上限能容纳两条记录
+ENTRY_SIZE = len(json.dumps({'response': '响应0'}, ensure_ascii=False).encode('utf-8'))
+MAX_SIZE_MB = ENTRY_SIZE * 2.5 / 1024 / 1024
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path), MAX_SIZE_MB)
+    cache.put('a' * 64, '响应0')
+    cache.put('b' * 64, '响应1')
+    assert cache.get('a' * 64) == '响应0'
+    
+    # 超过上限时淘汰最久未使用的记录（b），刚读取过的 a 保留
+    cache.put('c' * 64, '响应2')
+    
+    assert cache.get('b' * 64) is None
+    assert cache.get('a' * 64) == '响应0' and cache.get('c' * 64) == '响应2'
+    assert cache.stats()['entries'] == 2
+    assert not (tmp_path / 'bb' / f"{'b' * 64}.json").exists()
+
+def test_hits_and_misses_are_counted(tmp_path):
+    cache = ResponseCache(str(tmp_path), MAX_SIZE_MB)
+    assert cache.get('a' * 64) is None
+    cache.put('a' * 64, '响应0')
+    assert cache.get('a' * 64) == '响应0'
+    assert cache.get('a' * 64) == '响应0'
+    
+    # 重新打开时从缓存目录恢复记录，统计重新开始
+    reopened = ResponseCache(str(tmp_path), MAX_SIZE_MB)
+    assert reopened.get('a' * 64) == '响应0'
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 1
+    assert reopened.stats()['hits'] == 1 and reopened.stats()['misses'] == 0
+
+def test_corrupt_entry_counts_as_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path), MAX_SIZE_MB)
+    cache.put('a' * 64, '响应0')
+    (tmp_path / 'aa' / f"{'a' * 64}.json").write_text('{', encoding='utf-8')
+    
+    assert cache.get('a' * 64) is None
+    assert cache.stats() == {'hits': 0, 'misses': 1, 'entries': 0, 'size_mb': 0}
+
+def make_api(tmp_path, monkeypatch, disabled_stages=()):
+    api = OllamaAPI({
+        'ai_settings': {'host': 'http://gpu1', 'port': 11434, 'model': 'qwen2.5', 'temperature': 0.7,
+                        'context_size': 4096, 'num_predict': 256},
+        'cache_settings': {'enabled': True, 'cache_dir': str(tmp_path), 'disabled_stages': list(disabled_stages)}
+    })
+    calls = []
+    
+    class Response:
+        def raise_for_status(self):
+            pass
+            
+        def json(self):
+            return {'response': f"响应{len(calls)}", 'done': True}
+            
+    def post(url, json=None, **kwargs):
+        calls.append(json)
+        return Response()
+        
+    monkeypatch.setattr(api.session, 'post', post)
+    return api, calls
+
+def test_labels_are_part_of_the_key(tmp_path, monkeypatch):
+    api, calls = make_api(tmp_path, monkeypatch)
+    
+    first = api.generate("系统提示词", "用户提示词", stage='outline', labels={'novel': 0})
+    again = api.generate("系统提示词", "用户提示词", stage='outline', labels={'novel': 0})
+    other = api.generate("系统提示词", "用户提示词", stage='outline', labels={'novel': 1})
+    
+    # 提示词相同而标签不同的调用需要不同的结果
+    assert first == again != other
+    assert len(calls) == 2
+    assert api.cache.stats()['hits'] == 1
+    api.close()
+
+def test_disabled_stages_skip_the_cache(tmp_path, monkeypatch):
+    api, calls = make_api(tmp_path, monkeypatch, disabled_stages=['rating'])
+    
+    for _ in range(2):
+        api.generate("系统提示词", "用户提示词", stage='rating')
+        api.generate("系统提示词", "用户提示词", stage='feedback')
+        
+    # 评分每次都请求服务器，也不计入缓存统计
+    assert len(calls) == 3
+    stats = api.cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+    api.close()
@@ -0,0 +1,81 @@
+import os
+import copy
+import pytest
+from novel_generator.core.generator import NovelGenerator
+from novel_generator.utils.checkpoint_utils import RunManifest, MANIFEST_NAME, config_hash
+
+CONFIG = {
+    'ai_settings': {'host': 'http://gpu1', 'port': 11434, 'model': 'qwen2.5'},
+    'novel_settings': {'title': '测试', 'word_count': 3000},
+    'output_settings': {'output_dir': './output', 'novel_count': 1}
+}
+
+def test_new_run_refuses_to_overwrite_unfinished_run(tmp_path):
+    manifest = RunManifest(str(tmp_path), CONFIG)
+    manifest.record_stage(0, 'outline', {'content': '大纲'})
+    
+    with pytest.raises(RuntimeError):
+        RunManifest(str(tmp_path), CONFIG)
+    assert RunManifest.read(str(tmp_path))['novels']['0']['stages']['outline'] == {'content': '大纲'}
+    
+    RunManifest(str(tmp_path), CONFIG, force=True)
+    assert RunManifest.read(str(tmp_path))['novels'] == {}
+
+def test_new_run_overwrites_finished_run(tmp_path):
+    manifest = RunManifest(str(tmp_path), CONFIG)
+    manifest.record_result(0, {'path': 'novel.md', 'score': 80})
+    assert manifest.mark_finished(1)
+    
+    RunManifest(str(tmp_path), CONFIG)
+    assert RunManifest.read(str(tmp_path))['novels'] == {}
+
+def test_resume_checks_config(tmp_path):
+    RunManifest(str(tmp_path), CONFIG).record_stage(0, 'outline', {'content': '大纲'})
+    
+    # 运行设置（输出目录、服务器地址）不影响恢复
+    moved = copy.deepcopy(CONFIG)
+    moved['output_settings']['output_dir'] = str(tmp_path)
+    moved['ai_settings']['host'] = 'http://gpu2'
+    assert RunManifest(str(tmp_path), moved, resume=True).get_stage(0, 'outline') == {'content': '大纲'}
+    
+    changed = copy.deepcopy(CONFIG)
+    changed['novel_settings']['word_count'] = 5000
+    with pytest.raises(RuntimeError):
+        RunManifest(str(tmp_path), changed, resume=True)
+    assert RunManifest(str(tmp_path), changed, resume=True, force=True).get_stage(0, 'outline') is not None
+
+def make_generator_config(tmp_path, **checkpoint_settings):
+    config = copy.deepcopy(CONFIG)
+    config['ai_settings'].update({'temperature': 0.7, 'context_size': 4096, 'num_predict': 256})
+    config['output_settings']['output_dir'] = str(tmp_path)
+    if checkpoint_settings:
+        config['checkpoint_settings'] = checkpoint_settings
+    return config
+
+def test_generator_without_checkpoint_can_rerun(tmp_path):
+    config = make_generator_config(tmp_path)
+    
+    first = NovelGenerator(copy.deepcopy(config))
+    second = NovelGenerator(copy.deepcopy(config))
+    
+    assert first.checkpoint is None and second.checkpoint is None
+    assert not os.path.exists(os.path.join(str(tmp_path), MANIFEST_NAME))
+    assert config_hash(config) == config_hash({**config, 'checkpoint_settings': {'enabled': True}})
+
+def test_generator_with_unfinished_manifest(tmp_path):
+    config = make_generator_config(tmp_path, enabled=True)
+    NovelGenerator(copy.deepcopy(config)).checkpoint.record_stage(0, 'outline', {'content': '大纲'})
+    
+    # 中断后直接重新运行不会覆盖未完成的运行
+    with pytest.raises(RuntimeError):
+        NovelGenerator(copy.deepcopy(config))
+        
+    resumed = NovelGenerator(copy.deepcopy(config), resume=True)
+    assert resumed.checkpoint.get_stage(0, 'outline') == {'content': '大纲'}
+    
+    # 不记录运行清单的运行不受已有清单影响，也不修改它
+    assert NovelGenerator(make_generator_config(tmp_path)).checkpoint is None
+    assert RunManifest.read(str(tmp_path))['novels']['0']['stages']['outline'] == {'content': '大纲'}
+    
+    NovelGenerator(copy.deepcopy(config), force=True)
+    assert RunManifest.read(str(tmp_path))['novels'] == {}
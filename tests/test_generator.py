@@ -0,0 +1,67 @@
+import os
+import threading
+import yaml
+from novel_generator import NovelGenerator
+from novel_generator.utils.async_api_utils import AsyncOllamaAPI
+
+TEST_CONFIG = os.path.join(os.path.dirname(__file__), '..', 'test_config.yaml')
+
+def make_config(tmp_path, **settings):
+    with open(TEST_CONFIG, encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['output_settings']['output_dir'] = str(tmp_path)
+    config['journal_settings'] = {'background': False}
+    for section, values in settings.items():
+        config.setdefault(section, {}).update(values)
+    return config
+
+def respond(stage):
+    """按阶段返回固定的响应"""
+    if stage == 'rating':
+        return "总分：75/100"
+    return f"{stage}：他推开门，屋里没有人。"
+
+def novel_path(config, index):
+    title = config['novel_settings']['title']
+    return os.path.join(config['output_settings']['output_dir'], 'novels', f'{title}_{index + 1}', f'{title}.md')
+
+def test_async_mode_generates_each_novel(tmp_path, monkeypatch):
+    config = make_config(tmp_path, ai_settings={'async_mode': True, 'max_concurrency': 2},
+                         output_settings={'novel_count': 2, 'parallel_novels': 2})
+    calls = []
+    
+    async def generate(self, system_prompt, user_prompt="", stage=None, labels=None, **kwargs):
+        calls.append((stage, labels['novel']))
+        return respond(stage)
+        
+    monkeypatch.setattr(AsyncOllamaAPI, 'generate', generate)
+    generator = NovelGenerator(config)
+    generator.generate()
+    generator.api_client.close()
+    
+    assert all(os.path.exists(novel_path(config, index)) for index in range(2))
+    assert {novel for _, novel in calls} == {0, 1}
+
+def test_parallel_novels_are_independent(tmp_path, monkeypatch):
+    config = make_config(tmp_path, ai_settings={'max_concurrency': 2},
+                         output_settings={'novel_count': 2, 'parallel_novels': 2})
+    generator = NovelGenerator(config)
+    # 两篇小说都开始生成大纲后才继续，确认它们同时进行
+    started = threading.Barrier(2, timeout=5)
+    
+    def generate(system_prompt, user_prompt="", stage=None, labels=None, **kwargs):
+        if stage == 'outline' and labels.get('iteration', 0) == 0:
+            started.wait()
+        if stage == 'rating':
+            return "总分：75/100"
+        return f"第{labels['novel'] + 1}篇{stage}：他推开门，屋里没有人。"
+        
+    monkeypatch.setattr(generator.api_client, 'generate', generate)
+    generator.generate()
+    generator.api_client.close()
+    
+    for index in range(2):
+        with open(novel_path(config, index), encoding='utf-8') as f:
+            content = f.read()
+        other = 2 - index
+        assert f"第{index + 1}篇content" in content and f"第{other}篇" not in content
@@ -0,0 +1,113 @@
+import time
+import pytest
+import requests
+from novel_generator.utils.api_utils import OllamaAPI
+from novel_generator.utils.host_utils import HostPool
+
+COOLDOWN = 0.05
+
+def open_breaker(pool: HostPool):
+    """连续失败到断路器打开"""
+    for _ in range(pool.breaker_threshold):
+        slot = pool.claim()
+        pool.report_failure(slot, "connection refused")
+        pool.release(slot)
+    assert pool.status()[0]['breaker'] == 'open'
+
+def test_failed_trial_reopens_breaker_with_doubled_cooldown():
+    pool = HostPool(['http://gpu1:11434'], 2, breaker_threshold=2, breaker_cooldown=COOLDOWN)
+    open_breaker(pool)
+    time.sleep(COOLDOWN * 2)
+    
+    trial = pool.claim()
+    pool.report_failure(trial, "connection refused")
+    pool.release(trial)
+    
+    assert pool.status()[0]['breaker'] == 'open'
+    assert pool.hosts[0].cooldown == pytest.approx(COOLDOWN * 2)
+    assert pool.claim(block=False) is None
+
+def test_releasing_other_request_keeps_trial():
+    pool = HostPool(['http://gpu1:11434'], 2, breaker_threshold=2, breaker_cooldown=COOLDOWN)
+    earlier = pool.claim()
+    open_breaker(pool)
+    time.sleep(COOLDOWN * 2)
+    
+    trial = pool.claim()
+    # 断路器打开前发出的请求随后结束，不应放行第二个试探请求
+    pool.release(earlier)
+    assert pool.claim(block=False) is None
+    
+    pool.report_failure(trial, "connection refused")
+    pool.release(trial)
+    assert pool.status()[0]['breaker'] == 'open'
+    assert pool.hosts[0].cooldown == pytest.approx(COOLDOWN * 2)
+
+def test_failed_trial_reopens_breaker_for_non_streaming_request(monkeypatch):
+    api = OllamaAPI({
+        'ai_settings': {'host': 'http://gpu1', 'port': 11434, 'model': 'qwen2.5', 'temperature': 0.7,
+                        'context_size': 4096, 'num_predict': 256},
+        'request_settings': {'circuit_breaker': True, 'breaker_threshold': 1, 'breaker_cooldown': COOLDOWN,
+                             'max_retries': 0}
+    })
+    
+    def refuse(*args, **kwargs):
+        raise requests.exceptions.ConnectionError("connection refused")
+    monkeypatch.setattr(api.session, 'post', refuse)
+    
+    with pytest.raises(requests.exceptions.ConnectionError):
+        api.generate("系统提示词", "用户提示词")
+    assert api.hosts.status()[0]['breaker'] == 'open'
+    time.sleep(COOLDOWN * 2)
+    
+    with pytest.raises(requests.exceptions.ConnectionError):
+        api.generate("系统提示词", "用户提示词")
+    assert api.hosts.status()[0]['breaker'] == 'open'
+    assert api.hosts.hosts[0].cooldown == pytest.approx(COOLDOWN * 2)
+    api.close()
+
+def test_claim_picks_least_loaded_host():
+    pool = HostPool(['http://gpu1:11434', 'http://gpu2:11434', 'http://gpu3:11434'], 2, health_interval=0)
+    
+    slots = [pool.claim() for _ in range(3)]
+    assert sorted(slot.host.url for slot in slots) == [host.url for host in pool.hosts]
+    
+    # 相同负载时选择生成速度更快的服务器
+    pool.report_success(slots[1], {'eval_count': 200, 'eval_duration': 1e9})
+    pool.report_success(slots[2], {'eval_count': 50, 'eval_duration': 1e9})
+    assert pool.claim().host is slots[1].host
+    
+    # 已满的服务器不再选择，全部占满时不等待则返回None
+    assert pool.claim().host is not slots[1].host
+    assert pool.claim() is not None
+    assert pool.claim(block=False) is None
+    pool.release(slots[0])
+    assert pool.claim(block=False).host is slots[0].host
+
+def test_claim_prefers_host_with_model_loaded():
+    pool = HostPool(['http://gpu1:11434', 'http://gpu2:11434'], 2, health_interval=0)
+    pool.hosts[0].loaded_models = {'llama3'}
+    pool.hosts[1].loaded_models = {'qwen2.5'}
+    
+    assert pool.claim('qwen2.5').host is pool.hosts[1]
+    assert pool.claim('llama3').host is pool.hosts[0]
+
+def test_failed_host_returns_after_probe(mock_ollama):
+    pool = HostPool([mock_ollama.url, 'http://127.0.0.1:9'], 2, health_interval=0)
+    live, dead = pool.hosts
+    
+    slot = pool.claim(exclude={dead.url})
+    pool.report_failure(slot, "connection refused")
+    pool.release(slot)
+    assert not live.healthy
+    
+    # 不健康的服务器移出轮换，故障转移时也不再作为候选
+    assert pool.claim().host is dead
+    assert not pool.has_alternative({dead.url})
+    
+    pool._probe(live)
+    pool._probe(dead)
+    assert live.healthy and not dead.healthy
+    assert live.loaded_models is not None
+    assert pool.claim().host is live
+    assert pool.has_alternative({dead.url})
@@ -0,0 +1,113 @@
+import pytest
+from novel_generator.utils import job_queue
+from novel_generator.utils.job_queue import JobQueue, PENDING, RUNNING, DEAD
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+        
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(job_queue.time, 'time', clock)
+    return clock
+
+def make_queue(tmp_path, **kwargs):
+    return JobQueue(str(tmp_path / 'queue.db'), lease_seconds=10, retry_delay=60, **kwargs)
+
+def state_of(queue, job_id):
+    return next(job for job in queue.jobs() if job['id'] == job_id)
+
+def test_each_job_is_claimed_once(tmp_path, clock):
+    queue = make_queue(tmp_path)
+    assert queue.add('甲', {'title': '甲'})
+    assert queue.add('乙', {'title': '乙'})
+    assert not queue.add('甲', {'title': '甲'})
+    
+    first = queue.claim('w1')
+    second = queue.claim('w2')
+    
+    assert (first['name'], second['name']) == ('甲', '乙')
+    assert first['attempts'] == 1
+    assert queue.claim('w3') is None
+
+def test_expired_lease_is_reclaimed(tmp_path, clock):
+    queue = make_queue(tmp_path)
+    queue.add('甲', {'title': '甲'})
+    job = queue.claim('w1')
+    
+    clock.now += 5
+    assert queue.heartbeat(job['id'], 'w1')
+    clock.now += 9
+    assert queue.claim('w2') is None
+    
+    clock.now += 2
+    reclaimed = queue.claim('w2')
+    assert reclaimed['id'] == job['id']
+    assert reclaimed['attempts'] == 2
+    
+    # 原来的进程已失去任务：不能续约，失败也不改变任务状态
+    assert not queue.heartbeat(job['id'], 'w1')
+    assert queue.fail(job['id'], 'w1', '错误') is None
+    assert state_of(queue, job['id'])['state'] == RUNNING
+    assert state_of(queue, job['id'])['worker'] == 'w2'
+
+def test_failed_job_backs_off_exponentially(tmp_path, clock):
+    queue = make_queue(tmp_path)
+    queue.add('甲', {'title': '甲'})
+    job = queue.claim('w1')
+    assert queue.fail(job['id'], 'w1', '错误') == PENDING
+    
+    clock.now += 59
+    assert queue.claim('w1') is None
+    clock.now += 2
+    job = queue.claim('w1')
+    assert job['attempts'] == 2
+    assert queue.fail(job['id'], 'w1', '错误') == PENDING
+    
+    # 第二次失败后等待 2 × retry_delay
+    clock.now += 119
+    assert queue.claim('w1') is None
+    clock.now += 2
+    assert queue.claim('w1')['attempts'] == 3
+
+def test_job_is_dead_after_max_attempts(tmp_path, clock):
+    queue = make_queue(tmp_path)
+    queue.add('甲', {'title': '甲'}, max_attempts=2)
+    job = queue.claim('w1')
+    queue.fail(job['id'], 'w1', '错误')
+    clock.now += 61
+    job = queue.claim('w1')
+    
+    assert queue.fail(job['id'], 'w1', '最后的错误') == DEAD
+    clock.now += 1000
+    assert queue.claim('w1') is None
+    assert not queue.has_unfinished()
+    assert state_of(queue, job['id'])['error'] == '最后的错误'
+    
+    assert queue.requeue_dead() == 1
+    assert queue.claim('w1')['attempts'] == 1
+
+def test_expired_lease_on_last_attempt_is_dead(tmp_path, clock):
+    queue = make_queue(tmp_path)
+    queue.add('甲', {'title': '甲'}, max_attempts=1)
+    job = queue.claim('w1')
+    
+    clock.now += 11
+    assert queue.claim('w2') is None
+    assert state_of(queue, job['id'])['state'] == DEAD
+
+def test_released_job_does_not_count_as_attempt(tmp_path, clock):
+    queue = make_queue(tmp_path)
+    queue.add('甲', {'title': '甲'})
+    job = queue.claim('w1')
+    
+    queue.release(job['id'], 'w2')
+    assert state_of(queue, job['id'])['state'] == RUNNING
+    
+    queue.release(job['id'], 'w1')
+    assert state_of(queue, job['id'])['state'] == PENDING
+    assert queue.claim('w2')['attempts'] == 1
@@ -0,0 +1,89 @@
+import pytest
+from novel_generator.utils.journal import JournalWriter
+
+@pytest.fixture(params=[True, False], ids=['background', 'foreground'])
+def journal(request):
+    journal = JournalWriter(background=request.param, fsync=False)
+    yield journal
+    journal.close()
+
+def read(path):
+    return path.read_text(encoding='utf-8') if path.exists() else None
+
+def test_truncate_drops_abandoned_stream(tmp_path, journal):
+    path = tmp_path / 'novel_temp.md'
+    journal.write(str(path), '开篇\n\n')
+    committed = journal.size(str(path))
+    
+    journal.append(str(path), '被放弃的')
+    journal.append(str(path), '版本')
+    journal.truncate(str(path), committed)
+    journal.append(str(path), '发展\n\n')
+    journal.flush()
+    
+    assert read(path) == '开篇\n\n发展\n\n'
+    assert journal.size(str(path)) == len('开篇\n\n发展\n\n'.encode('utf-8'))
+
+def test_write_replaces_earlier_appends(tmp_path, journal):
+    path = tmp_path / 'novel_temp.md'
+    journal.append(str(path), '旧内容')
+    journal.write(str(path), '新内容')
+    journal.append(str(path), '，续写')
+    journal.flush()
+    
+    assert read(path) == '新内容，续写'
+
+def test_delete_runs_after_earlier_operations(tmp_path, journal):
+    path = tmp_path / 'novel_temp.md'
+    journal.append(str(path), '内容')
+    journal.delete(str(path))
+    journal.flush()
+    assert read(path) is None
+    assert journal.size(str(path)) == 0
+    
+    journal.append(str(path), '重新开始')
+    journal.flush()
+    assert read(path) == '重新开始'
+
+def test_interleaved_files_keep_their_order(tmp_path, journal):
+    first, second = tmp_path / 'a.md', tmp_path / 'b.md'
+    for i in range(20):
+        journal.append(str(first), f'{i},')
+        journal.append(str(second), f'{i};')
+        if i == 9:
+            journal.truncate(str(first), 0)
+    journal.flush()
+    
+    assert read(first) == ''.join(f'{i},' for i in range(10, 20))
+    assert read(second) == ''.join(f'{i};' for i in range(20))
+
+def test_consecutive_appends_are_coalesced(tmp_path):
+    journal = JournalWriter(background=True, fsync=False)
+    path = str(tmp_path / 'novel_temp.md')
+    applied = []
+    apply = journal._apply
+    journal._apply = lambda op, path, data: (applied.append(op), apply(op, path, data))
+    
+    # 写入线程等待期间提交的追加在下一批中合并为一次写入
+    with journal._io_lock:
+        for i in range(50):
+            journal.append(path, f'{i}\n')
+    journal.close()
+    
+    assert open(path, encoding='utf-8').read() == ''.join(f'{i}\n' for i in range(50))
+    assert applied.count('append') <= 2
+
+def test_close_writes_everything_and_allows_reuse(tmp_path):
+    journal = JournalWriter(background=True, fsync=True, fsync_interval=60)
+    path = tmp_path / 'novel_temp.md'
+    for i in range(100):
+        journal.append(str(path), '字')
+    journal.close()
+    
+    assert read(path) == '字' * 100
+    assert not journal._thread.is_alive()
+    
+    journal.append(str(path), '续')
+    journal.flush()
+    assert read(path) == '字' * 100 + '续'
+    journal.close()
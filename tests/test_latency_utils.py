@@ -0,0 +1,53 @@
+import pytest
+from novel_generator.utils.latency_utils import LatencyTracker
+from novel_generator.utils.token_utils import TokenEstimator
+
+# 1秒生成100个token，1秒处理1000个提示词token
+STATS = {'eval_count': 100, 'eval_duration': 1e9, 'prompt_eval_count': 1000, 'prompt_eval_duration': 1e9}
+
+def make_tracker(**kwargs):
+    return LatencyTracker(TokenEstimator(1.0), timeout=300, connect_timeout=5, adaptive=True, slack=2.0,
+                          min_timeout=30, max_timeout=600, load_allowance=20, **kwargs)
+
+def test_adaptive_timeout_follows_measured_rates():
+    tracker = make_tracker()
+    prompt = '字' * 1000
+    
+    # 还没有速度数据时使用固定超时
+    assert tracker.request_timeout('qwen2.5', prompt, 500) == (5, 300)
+    
+    tracker.observe('qwen2.5', 'content', 2.0, STATS)
+    prompt_time = tracker.estimator.estimate(prompt) / 1000
+    assert tracker.request_timeout('qwen2.5', prompt, 500) == (5, pytest.approx((prompt_time + 5) * 2 + 20))
+    assert tracker.request_timeout('qwen2.5', prompt, 100000)[1] == 600
+    # 不低于下限
+    assert tracker.request_timeout('qwen2.5', '', 1)[1] == 30
+    # 不限制生成长度或其他模型没有速度数据时使用固定超时
+    assert tracker.request_timeout('qwen2.5', prompt, -1) == (5, 300)
+    assert tracker.request_timeout('llama3', prompt, 500) == (5, 300)
+
+def test_stream_timeout_covers_prompt_processing():
+    tracker = make_tracker()
+    prompt = '字' * 20000
+    assert tracker.stream_timeout('qwen2.5', prompt, 120) == (5, 120)
+    
+    tracker.observe('qwen2.5', 'content', 2.0, STATS)
+    # 按提示词处理的预计耗时计算，不超过两段输出之间的固定等待时间
+    prompt_time = tracker.estimator.estimate(prompt) / 1000
+    assert tracker.stream_timeout('qwen2.5', prompt, 120) == (5, pytest.approx(prompt_time * 2 + 20))
+    assert tracker.stream_timeout('qwen2.5', prompt, 45) == (5, 45)
+
+def test_fixed_timeout_when_not_adaptive():
+    tracker = LatencyTracker(TokenEstimator(1.0), timeout=300, connect_timeout=5)
+    tracker.observe('qwen2.5', 'content', 2.0, STATS)
+    assert tracker.request_timeout('qwen2.5', '提示词', 500) == (5, 300)
+
+def test_hedge_delay_needs_enough_samples():
+    tracker = make_tracker(hedge=True, hedge_quantile=0.5, hedge_min_samples=4, hedge_min_delay=0.5)
+    for wall_time in (1.0, 2.0, 3.0):
+        tracker.observe('qwen2.5', 'rating', wall_time, None)
+    assert tracker.hedge_delay('qwen2.5', 'rating') is None
+    
+    tracker.observe('qwen2.5', 'rating', 4.0, None)
+    assert tracker.hedge_delay('qwen2.5', 'rating') == 3.0
+    assert tracker.hedge_delay('qwen2.5', 'content') is None
@@ -0,0 +1,56 @@
+from novel_generator.core.length import LengthPlanner, trim_incomplete
+
+CONFIG = {
+    'ai_settings': {'model': 'qwen2.5:14b'},
+    'novel_settings': {'word_count': 10000},
+    'length_settings': {'enabled': True, 'headroom': 1.0, 'min_calibration_tokens': 10}
+}
+
+def test_calibration_is_kept_per_model():
+    planner = LengthPlanner.from_config(CONFIG)
+    
+    # 小模型每token只对应0.5个字，只校准该模型
+    planner.observe('content', '字' * 500, 1000, model='llama3:8b')
+    
+    assert planner.estimator_for('llama3:8b').chars_per_token == 0.5
+    assert planner.estimator.chars_per_token == 1.4
+    assert planner.num_predict('content', 700) == 501
+    assert planner.num_predict('content', 700, model='llama3:8b') == 1401
+    assert planner.num_predict('content', 700, model='qwen2.5:14b') == 501
+    
+def test_unknown_model_uses_name_default_and_summary_lists_models():
+    planner = LengthPlanner.from_config(CONFIG)
+    planner.observe('content', '字' * 1400, 1000)
+    planner.observe('fix', '字' * 500, 1000, model='llama3:8b')
+    planner.observe('rating', '字' * 500, 1000, model='gemma2')
+    planner.record('开篇', 2000, '字' * 2000)
+    
+    summary = planner.format_summary()
+    
+    assert planner.estimator_for('gemma2').chars_per_token == 1.0
+    assert '每token字数（qwen2.5:14b）：1.40 → 1.40（校准1次）' in summary
+    assert '每token字数（llama3:8b）：0.90 → 0.50（校准1次）' in summary
+    assert 'gemma2' not in summary
+
+def test_word_count_is_split_across_parts():
+    planner = LengthPlanner.from_config(CONFIG)
+    
+    targets = [planner.part_target(name) for name in ('开篇', '发展', '高潮', '结局')]
+    
+    assert targets == [2000, 3000, 3000, 2000]
+    assert planner.part_target('尾声') == 0
+    
+def test_custom_part_weights_are_normalized():
+    config = dict(CONFIG, length_settings={'enabled': True, 'part_weights': {'开篇': 1, '发展': 2, '高潮': 2, '结局': 1}})
+    planner = LengthPlanner.from_config(config)
+    
+    assert planner.part_target('开篇') == 1666 and planner.part_target('发展') == 3333
+    assert LengthPlanner.from_config(dict(CONFIG, novel_settings={})).part_target('开篇') == 0
+    
+def test_trim_incomplete_cuts_after_last_sentence():
+    assert trim_incomplete('他推开门。屋里没有人，只有') == '他推开门。'
+    # 句末标点之后的引号一并保留
+    assert trim_incomplete('“你来了？”她问。“我……”他张了张嘴') == '“你来了？”她问。“我……”'
+    assert trim_incomplete('他说：“走吧！”然后') == '他说：“走吧！”'
+    # 找不到句末标点时返回原文
+    assert trim_incomplete('屋里没有人，只有') == '屋里没有人，只有'
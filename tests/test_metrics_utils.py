@@ -0,0 +1,46 @@
+import json
+from novel_generator.utils.metrics_utils import MetricsRecorder, call_record
+
+def stats(eval_count, eval_seconds, prompt_count=100):
+    return {'eval_count': eval_count, 'eval_duration': int(eval_seconds * 1e9),
+            'prompt_eval_count': prompt_count, 'prompt_eval_duration': int(0.5e9), 'load_duration': int(1e9)}
+
+def make_recorder(tmp_path):
+    recorder = MetricsRecorder(str(tmp_path / 'metrics.jsonl'), str(tmp_path / 'metrics.prom'))
+    recorder.record(call_record('content', {'novel': 0}, 'large', 12.0, stats(400, 10)))
+    recorder.record(call_record('content', {'novel': 1}, 'large', 6.0, stats(200, 5)))
+    recorder.record(call_record('rating', {'novel': 0}, 'small', 2.0, stats(90, 1)))
+    recorder.record(call_record('rating', {'novel': 1}, 'small', 0.1, cached=True))
+    recorder.record(call_record('feedback', {'novel': 0}, 'small', 1.0, error='超时'))
+    return recorder
+
+def test_summary_by_stage(tmp_path):
+    summary = make_recorder(tmp_path).summary()
+    
+    assert list(summary) == ['content', 'rating', 'feedback']
+    content = summary['content']
+    assert content['calls'] == 2
+    assert content['eval_count'] == 600
+    assert content['wall_time'] == 18.0
+    assert content['load_duration'] == 2.0
+    assert content['tokens_per_sec'] == 40.0
+    assert summary['rating']['cached'] == 1
+    assert summary['rating']['tokens_per_sec'] == 90.0
+    assert summary['feedback']['errors'] == 1
+    assert summary['feedback']['tokens_per_sec'] == 0.0
+
+def test_summary_by_model(tmp_path):
+    summary = make_recorder(tmp_path).summary(by='model')
+    
+    assert summary['large']['calls'] == 2
+    assert summary['small']['calls'] == 3
+    assert summary['small']['eval_count'] == 90
+
+def test_records_are_written(tmp_path):
+    recorder = make_recorder(tmp_path)
+    
+    lines = (tmp_path / 'metrics.jsonl').read_text(encoding='utf-8').splitlines()
+    assert len(lines) == 5
+    assert json.loads(lines[-1])['error'] == '超时'
+    assert 'novel_generator_calls_total{stage="content",model="large"} 2' in (tmp_path / 'metrics.prom').read_text(encoding='utf-8')
+    assert '合计' in recorder.format_summary()
@@ -0,0 +1,78 @@
+import pytest
+import requests
+from novel_generator.core.generator import NovelGenerator
+from novel_generator.utils.api_utils import OllamaAPI
+from novel_generator.utils.checkpoint_utils import RunManifest
+from .conftest import mock_config
+
+def make_api(mock, stream=True):
+    host, port = mock.server.server_address[:2]
+    return OllamaAPI({
+        'ai_settings': {'host': f"http://{host}", 'port': port, 'model': 'mock', 'temperature': 0.7,
+                        'context_size': 4096, 'num_predict': 256, 'stream': stream},
+        'request_settings': {'retry_backoff': 0}
+    })
+
+def test_stream_matches_non_streaming_format(mock_ollama):
+    api = make_api(mock_ollama)
+    tokens = []
+    
+    text = api.generate("系统提示词", "请写一段正文", stage='content', on_token=tokens.append)
+    
+    assert text and len(tokens) > 1 and ''.join(tokens) == text
+    assert api.last_call()['eval_count'] > 0
+    assert api.hosts.hosts[0].in_flight == 0
+    api.close()
+    
+    api = make_api(mock_ollama, stream=False)
+    assert api.generate("系统提示词", "请写一段正文", stage='content')
+    assert mock_ollama.stats()['requests'] == 2
+    api.close()
+
+def test_base_config_completes_against_mock(mock_ollama, tmp_path):
+    config = mock_config(mock_ollama, tmp_path)
+    config['checkpoint_settings'] = {'enabled': True}
+    
+    generator = NovelGenerator(config)
+    generator.generate()
+    generator.api_client.close()
+    
+    # 两篇小说都完成了最终重写的分析、修改和评分
+    manifest = RunManifest.read(str(tmp_path))
+    assert manifest['finished_at']
+    assert all(novel['result']['score'] > 0 for novel in manifest['novels'].values())
+
+def test_dropped_stream_restarts(mock_ollama):
+    api = make_api(mock_ollama)
+    mock_ollama.profile['drop_rate'] = 1.0
+    tokens = []
+    
+    def restart():
+        # 丢弃已收到的文本，之后的请求不再中断
+        tokens.clear()
+        mock_ollama.profile['drop_rate'] = 0.0
+        
+    text = api.generate("系统提示词", "请写一段正文", stage='content', on_token=tokens.append, on_restart=restart)
+    
+    assert mock_ollama.stats()['drops'] == 1
+    assert ''.join(tokens) == text
+    api.close()
+
+def test_dropped_stream_without_restart_fails(mock_ollama):
+    api = make_api(mock_ollama)
+    mock_ollama.profile['drop_rate'] = 1.0
+    
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        api.generate("系统提示词", "请写一段正文", stage='content', on_token=lambda text: None)
+    assert mock_ollama.stats()['drops'] == 1
+    api.close()
+
+def test_injected_faults_are_retried(mock_ollama):
+    api = make_api(mock_ollama, stream=False)
+    mock_ollama.profile['fault_rate'] = 1.0
+    
+    with pytest.raises(requests.exceptions.HTTPError):
+        api.generate("系统提示词", "请写一段正文", stage='content')
+    # 首次请求和 request_settings.max_retries 次重试
+    assert mock_ollama.stats()['faults'] == 4
+    api.close()
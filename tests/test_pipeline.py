@@ -0,0 +1,19 @@
+from novel_generator.core.pipeline import Speculator
+
+def test_key_ignores_calibrated_options():
+    drafted = Speculator.make_key('content', '系统', '用户', {'num_predict': 900, 'num_ctx': 8192, 'temperature': 0.7})
+    actual = Speculator.make_key('content', '系统', '用户', {'num_predict': 950, 'num_ctx': 16384, 'temperature': 0.7})
+    
+    assert drafted == actual
+    assert drafted != Speculator.make_key('content', '系统', '用户', {'num_predict': 950, 'temperature': 0.9})
+
+def test_rejected_draft_counts_as_discarded():
+    speculator = Speculator()
+    key = Speculator.make_key('content', '系统', '用户', None)
+    speculator.launch('0:content:2', key, lambda: '草稿')
+    
+    assert speculator.take(key).result() == '草稿'
+    speculator.reject()
+    
+    assert (speculator.adopted, speculator.discarded) == (0, 1)
+    speculator.close()
@@ -0,0 +1,60 @@
+from novel_generator.core.scheduler import Job, JobSkipped, StageScheduler
+
+def test_jobs_with_more_descendants_run_first():
+    scheduler = StageScheduler(max_in_flight=1)
+    order = []
+    
+    def job(name):
+        return lambda: order.append(name)
+        
+    leaf = scheduler.add('leaf', job('leaf'), novel=0)
+    root = scheduler.add('root', job('root'), novel=1)
+    scheduler.add('child', job('child'), deps=[root], novel=1)
+    first = scheduler.add('first', job('first'), novel=0)
+    second = scheduler.add('second', job('second'), novel=2)
+    scheduler.add('after_first', job('after_first'), deps=[first], novel=0)
+    scheduler.add('after_second', job('after_second'), deps=[second], novel=2)
+    scheduler.run()
+    
+    # 下游任务数相同时小说序号小的先执行，没有下游任务的最后执行
+    assert order[:3] == ['first', 'root', 'second']
+    assert order.index('leaf') > order.index('second')
+    assert order.index('child') > order.index('root')
+    assert leaf.state == Job.DONE
+
+def test_skipped_job_skips_all_descendants():
+    scheduler = StageScheduler(max_in_flight=2)
+    
+    def skip():
+        raise JobSkipped("大纲雷同")
+        
+    outline = scheduler.add('outline', skip)
+    characters = scheduler.add('characters', lambda: '人物', deps=[outline])
+    content = scheduler.add('content', lambda: '内容', deps=[characters])
+    other = scheduler.add('other', lambda: '其他')
+    scheduler.run()
+    
+    assert [outline.state, characters.state, content.state] == [Job.SKIPPED] * 3
+    assert other.state == Job.DONE and other.result == '其他'
+    assert scheduler.counts()['skipped'] == 3
+
+def test_failed_job_skips_descendants_and_keeps_error():
+    scheduler = StageScheduler(max_in_flight=1)
+    
+    def fail():
+        raise ValueError("生成失败")
+        
+    failed = scheduler.add('failed', fail)
+    child = scheduler.add('child', lambda: None, deps=[failed])
+    scheduler.run()
+    
+    assert failed.state == Job.FAILED and isinstance(failed.error, ValueError)
+    assert child.state == Job.SKIPPED
+
+def test_dependency_results_are_available():
+    scheduler = StageScheduler(max_in_flight=4)
+    outline = scheduler.add('outline', lambda: '大纲')
+    characters = scheduler.add('characters', lambda: outline.result + '→人物', deps=[outline])
+    scheduler.run()
+    
+    assert characters.result == '大纲→人物'
@@ -0,0 +1,47 @@
+from novel_generator.core import scoring
+
+RATING = """## 情节发展（16/20分）
+## 人物性格一致性（8/10分）
+## 人物行为合理性（8/10分）
+## 人物对话特色（4/5分）
+## 人物成长体现（4/5分）
+## 主题表达（15/20分）
+## 写作技巧（20/30分）
+总分：80/100分"""
+
+def test_text_rating_uses_model_total():
+    rating = scoring.parse_rating_text(RATING)
+    
+    assert rating.total == 80
+    assert rating.dimensions['情节发展'] == 16
+
+def test_text_rating_without_total_fails():
+    assert scoring.parse_rating_text(RATING.replace('总分：80/100分', '')) is None
+
+def test_json_rating_sums_dimensions():
+    rating = scoring.parse_rating_json('{"情节发展": 16, "人物性格一致性": 8, "人物行为合理性": 8, "人物对话特色": 4, '
+                                       '"人物成长体现": 4, "主题表达": 15, "写作技巧": 20, "总分": 80}')
+                                       
+    assert rating.total == 75
+
+FEEDBACK = """## 内容评价
+整体流畅
+## 优点
+- 对话自然
+- 节奏紧凑
+## 需要改进
+- 结尾仓促
+# 补充
+- 人物动机不足
+## 修改建议
+- 扩写结尾"""
+
+def test_text_feedback_sections_run_to_next_double_hash():
+    sections = scoring.parse_feedback_text(FEEDBACK)
+    
+    assert sections == {
+        '优点': ['- 对话自然', '- 节奏紧凑'],
+        '需要改进': ['- 结尾仓促', '# 补充', '- 人物动机不足'],
+        '修改建议': ['- 扩写结尾']
+    }
+    assert abs(scoring.feedback_score(sections) - 0.36) < 1e-9
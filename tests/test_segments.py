@@ -0,0 +1,46 @@
+from novel_generator.core import segments
+from novel_generator.core.segments import Segment
+from novel_generator.utils.text_similarity import RepetitionDetector
+
+TEXT = "# 开篇\n\n第一段。\n\n第二段。\n\n第三段。\n\n# 发展\n\n第四段。\n\n第五段。"
+
+def test_parse_located_segments():
+    json_text = '{"片段": [{"开始段落": 2, "结束段落": 3, "问题": "节奏拖沓"}, {"开始段落": 9, "结束段落": 9, "问题": "越界"}]}'
+    assert segments.parse_segments_json(json_text, 5) == [Segment(1, 3, ['节奏拖沓'])]
+    assert segments.parse_segments_text("第1段：对话生硬\n第4-9段：结尾仓促\n其他说明", 5) == [
+        Segment(0, 1, ['对话生硬']), Segment(3, 5, ['结尾仓促'])
+    ]
+    assert segments.parse_segments_text("没有问题", 5) is None
+
+def test_merge_does_not_cross_headings():
+    spans = segments.paragraph_spans(TEXT)
+    merged = segments.merge_segments(TEXT, spans, [
+        Segment(0, 1, ['甲']), Segment(1, 2, ['乙']), Segment(2, 4, ['丙'])
+    ])
+    
+    # 前两个片段相邻合并；跨越"# 发展"的片段在标题处拆开，标题两侧不合并
+    assert merged == [Segment(0, 3, ['甲', '乙', '丙']), Segment(3, 4, ['丙'])]
+
+def test_splice_keeps_untouched_text_verbatim():
+    spans = segments.paragraph_spans(TEXT)
+    rewritten = segments.anchor_rewrite(['第二段。', '第三段。'], "第一段。\n\n第二段！\n\n改写的第三段。",
+                                        before=['第一段。'])
+    
+    result = segments.splice(TEXT, spans, [(Segment(1, 3, []), rewritten), (Segment(4, 5, []), [])])
+    
+    # 照抄的上下文去掉，只差标点的段落使用原文
+    assert result == "# 开篇\n\n第一段。\n\n第二段。\n\n改写的第三段。\n\n# 发展\n\n第四段。"
+
+def test_repetition_segments_keep_first_occurrence():
+    repeated = "雨下了一整夜，她坐在窗前翻看那些旧信，信纸已经泛黄，字迹却依然清晰。"
+    text = '\n\n'.join(["# 开篇", repeated, "第二天清晨，他们在车站告别，谁也没有多说一句话。", repeated, repeated])
+    report = RepetitionDetector(min_paragraph_chars=20).analyze(text)
+    
+    found = segments.repetition_segments(report)
+    
+    # 第一次出现的段落保留，之后的每一处单独改写
+    assert [(s.start, s.end) for s in found] == [(2, 3), (3, 4)]
+    assert found[0].issues == ["本段与第1段重复，请删除或改写为推进情节的新内容"]
+    # 相邻的片段合并，相同的问题只列一次
+    spans = segments.paragraph_spans(text)
+    assert segments.merge_segments(text, spans, found) == [Segment(2, 4, found[0].issues)]
@@ -0,0 +1,96 @@
+import pytest
+from novel_generator.utils.text_similarity import MinHasher, RepetitionDetector, SimilarityIndex, jaccard
+
+def test_minhash_estimates_jaccard():
+    hasher = MinHasher(num_perm=256)
+    # 连续的哈希值只在低位不同，各位置的哈希函数需要相互独立
+    a = set(range(1000, 1300))
+    b = set(range(1100, 1400))
+    
+    estimate = sum(x == y for x, y in zip(hasher.signature(a), hasher.signature(b))) / 256
+    
+    assert estimate == pytest.approx(jaccard(a, b), abs=0.1)
+
+def test_index_skips_signatures_from_older_versions(tmp_path):
+    path = str(tmp_path / 'index.jsonl')
+    index = SimilarityIndex('run1', path)
+    assert index.check_and_add('outline', 0, '主角在雨夜回到故乡，发现老宅里藏着父亲的日记。') is None
+    with open(path, 'r', encoding='utf-8') as f:
+        line = f.read()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line.replace('"minhash": 2, ', '').replace('run1', 'run0'))
+        
+    assert len(SimilarityIndex('run2', path)._entries) == 1
+
+OUTLINE = ("林夏在雨季转学到海边小城，在图书馆遇到总是借同一本诗集的周远。两人因为一张夹在书里的旧照片开始通信，"
+           "照片背后藏着周远母亲年轻时的秘密。期末前周远突然休学，林夏循着信中的线索找到了海边的灯塔，"
+           "在那里读到了最后一封没有寄出的信，终于明白了他一直没有说出口的告别。")
+OTHER = ("退役的宇航员老陈在火星基地当起了温室管理员，他发现培育的番茄会在夜里发出微弱的光。"
+         "基地的人工智能对此三缄其口，直到一场沙尘暴切断了与地球的通信，老陈才在控制室的日志里找到真相。")
+
+def test_near_duplicate_outline_of_another_novel_is_detected(tmp_path):
+    index = SimilarityIndex('run1', str(tmp_path / 'index.jsonl'))
+    assert index.check_and_add('outline', 0, OUTLINE) is None
+    
+    # 同一篇小说重新生成的大纲不与自己比较，内容不同的大纲不算雷同
+    assert index.check_and_add('outline', 0, OUTLINE.replace('林夏', '苏晴')) is None
+    assert index.check_and_add('outline', 1, OTHER) is None
+    
+    match = index.check_and_add('outline', 2, OUTLINE.replace('雨季', '秋天'))
+    assert match is not None
+    assert match[0]['novel'] == 0 and match[1] >= 0.6
+    assert index.describe(match[0]) == '第1篇小说'
+    # 雷同的大纲没有加入索引
+    assert 'run1#2#outline' not in index._entries
+
+def test_regenerated_outline_replaces_old_signature(tmp_path):
+    index = SimilarityIndex('run1', str(tmp_path / 'index.jsonl'))
+    index.check_and_add('outline', 0, OUTLINE)
+    old = tuple(index._entries['run1#0#outline']['signature'])
+    
+    # 重新生成后旧大纲不再留在分段桶中，也不再与其他小说的大纲比较
+    assert index.check_and_add('outline', 0, OTHER) is None
+    assert index._indexes['outline'].query(old) == set()
+    assert index.check_and_add('outline', 1, OUTLINE) is None
+
+def test_duplicates_of_earlier_runs_are_detected(tmp_path):
+    path = str(tmp_path / 'index.jsonl')
+    SimilarityIndex('run1', path).check_and_add('outline', 0, OUTLINE)
+    
+    match = SimilarityIndex('run2', path).check_and_add('outline', 0, OUTLINE)
+    
+    assert match is not None
+    assert match[0]['run'] == 'run1'
+    assert SimilarityIndex('run2', path).check_and_add('part', 0, OUTLINE) is None
+
+REPEATED = "雨下了一整夜，她坐在窗前翻看那些旧信，信纸已经泛黄，字迹却依然清晰，仿佛写信的人昨天才离开。"
+TEXT = '\n\n'.join([
+    "# 第一章",
+    REPEATED,
+    "第二天清晨，他们在车站告别。站台上人来人往，谁也没有多说一句话，只是看着列车慢慢开走。",
+    REPEATED,
+    "她回到家里，把信重新收进抽屉。那个夏天发生的一切，就像从来没有存在过一样。",
+    "那个夏天发生的一切，就像从来没有存在过一样。多年以后她才明白这句话的意思。"
+])
+
+def test_repetition_detector_finds_repeated_paragraphs_and_phrases():
+    report = RepetitionDetector(min_sentence_chars=10, min_paragraph_chars=20).analyze(TEXT)
+    kinds = {repetition.kind: repetition for repetition in report.repetitions}
+    
+    assert (report.paragraphs, len(report.repetitions)) == (5, 2)
+    assert kinds['paragraph'].positions == [1, 3] and kinds['paragraph'].similarity == 1.0
+    # 重复段落中的句子不再单独报告；相邻段落中重复的句子按衔接处重复报告
+    assert kinds['boundary'].positions == [4, 5]
+    assert '那个夏天发生的一切' in kinds['boundary'].text
+    assert '出现2次（第1、3段）' in report.format()
+
+def test_repetition_detector_reports_repeated_sentences():
+    detector = RepetitionDetector(min_sentence_chars=10, min_paragraph_chars=20)
+    sentence = "风从走廊尽头吹过来，带着雨后泥土的味道。"
+    text = '\n\n'.join([f"他推开教室的门。{sentence}", "她没有回头，只是低声说了一句再见。", f"{sentence}他忽然想起了那个下午。"])
+    
+    report = detector.analyze(text)
+    
+    assert [(r.kind, r.positions) for r in report.repetitions] == [('sentence', [1, 3])]
+    # 过短的句子和段落不参与比较
+    assert detector.analyze("他笑了。\n\n他笑了。\n\n她也笑了。").repetitions == []
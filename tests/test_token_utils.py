@@ -0,0 +1,23 @@
+import pytest
+from novel_generator.utils.token_utils import PromptAssembler, PromptBudgetError, PromptSection, TokenEstimator
+
+def make_assembler(context_size: int = 1000) -> PromptAssembler:
+    config = {'ai_settings': {'model': 'qwen2.5', 'context_size': context_size},
+              'prompt_budget': {'enabled': True, 'safety_margin': 0}}
+    return PromptAssembler(config, TokenEstimator(1.0))
+
+def test_fit_truncates_optional_sections():
+    texts = make_assembler().fit([PromptSection('context', '字' * 2000, keep='tail')], '', 500)
+    
+    assert texts['context'].startswith('……')
+    assert len(texts['context']) < 600
+
+def test_fit_without_required_sections_drops_optional_content():
+    # 模板和生成上限已超出上下文窗口
+    texts = make_assembler().fit([PromptSection('context', '字' * 2000)], '模' * 600, 500)
+    
+    assert texts == {'context': ''}
+
+def test_fit_raises_when_required_content_does_not_fit():
+    with pytest.raises(PromptBudgetError):
+        make_assembler().fit([PromptSection('part', '字' * 800, required=True)], '', 500)
@@ -0,0 +1,156 @@
+import os
+import asyncio
+import yaml
+import pytest
+from novel_generator import NovelWriter, OllamaAPI
+from novel_generator.prompts.summary import get_compact_context
+from novel_generator.utils.token_utils import PromptSection
+
+TEST_CONFIG = os.path.join(os.path.dirname(__file__), '..', 'test_config.yaml')
+
+def make_writer(tmp_path, **settings):
+    with open(TEST_CONFIG, encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['output_settings'].update({'output_dir': str(tmp_path), 'save_path': str(tmp_path)})
+    for section, values in settings.items():
+        config.setdefault(section, {}).update(values)
+    return NovelWriter(config, OllamaAPI(config))
+
+def test_breadth_mode_selects_highest_scoring_candidate(tmp_path, monkeypatch):
+    writer = make_writer(tmp_path, rewrite_settings={'breadth_mode': True, 'breadth_candidates': 3,
+                                                     'breadth_refine': True})
+    scores = {'0-0': 0.3, '0-1': 0.9, '0-2': 0.5, '1-0': 0.6, '1-1': 0.4, '1-2': 0.95}
+    prompts = []
+    def generate(system_prompt, user_prompt="", stage=None, labels=None, **kwargs):
+        version = f"{labels['wave']}-{labels['candidate']}"
+        if stage == 'feedback':
+            return f"反馈{version}"
+        prompts.append((version, system_prompt + user_prompt))
+        return f"大纲{version}"
+    monkeypatch.setattr(writer.api_client, 'generate', generate)
+    monkeypatch.setattr(writer, '_evaluate_feedback', lambda feedback: scores[feedback[2:]])
+    
+    assert writer.generate_outline() == '大纲1-2'
+    # 改进轮参考第一轮最佳版本的反馈
+    assert sorted(version for version, _ in prompts) == sorted(scores)
+    assert all(('反馈0-1' in prompt) == version.startswith('1-') for version, prompt in prompts)
+
+def test_breadth_mode_keeps_first_wave_when_refinement_is_worse(tmp_path, monkeypatch):
+    writer = make_writer(tmp_path, rewrite_settings={'breadth_mode': True, 'breadth_candidates': 2,
+                                                     'breadth_refine': True})
+    scores = {'0-0': 0.7, '0-1': 0.8, '1-0': 0.6, '1-1': 0.8}
+    
+    class AsyncClient:
+        async def generate(self, system_prompt, user_prompt="", stage=None, labels=None, **kwargs):
+            version = f"{labels['wave']}-{labels['candidate']}"
+            return f"反馈{version}" if stage == 'feedback' else f"大纲{version}"
+            
+        def last_call(self):
+            return None
+            
+    # 在事件循环中执行时候选版本由 asyncio.gather 并发生成
+    writer.async_api_client = AsyncClient()
+    monkeypatch.setattr(writer, '_evaluate_feedback', lambda feedback: scores[feedback[2:]])
+    
+    assert asyncio.run(writer.agenerate_outline()) == '大纲0-1'
+
+def test_chat_mode_keeps_content_system_prompt_stable(tmp_path, monkeypatch):
+    writer = make_writer(tmp_path, ai_settings={'api_mode': 'chat'}, rewrite_settings={'content_rewrites': 1})
+    calls = []
+    def generate(system_prompt, user_prompt="", stage=None, labels=None, **kwargs):
+        if stage == 'feedback':
+            return "## 修改建议\n加强冲突"
+        calls.append((labels, system_prompt, user_prompt))
+        return f"第{labels['part']}部分"
+    monkeypatch.setattr(writer.api_client, 'generate', generate)
+    
+    writer.generate_content('大纲', '人物')
+    
+    # 各部分和各次重写共用系统提示词，前文、当前任务和修改建议都在用户提示词中
+    assert len({system_prompt for _, system_prompt, _ in calls}) == 1
+    rewrites = [user_prompt for labels, _, user_prompt in calls if labels['iteration'] == 1]
+    assert len(rewrites) == 4 and all('加强冲突' in user_prompt for user_prompt in rewrites)
+    assert '第1部分' in calls[-1][2] and '第1部分' not in calls[-1][1]
+
+def test_chat_mode_sends_separate_messages(tmp_path):
+    writer = make_writer(tmp_path, ai_settings={'api_mode': 'chat'})
+    data = writer.api_client._build_request('系统', '用户', stream=False)
+    
+    assert data['messages'] == [{'role': 'system', 'content': '系统'}, {'role': 'user', 'content': '用户'}]
+    assert 'prompt' not in data
+    
+def test_generate_mode_appends_feedback_to_system_prompt(tmp_path):
+    writer = make_writer(tmp_path)
+    
+    system_prompt, user_prompt = writer._with_feedback('系统', '', '加强冲突')
+    
+    assert user_prompt == ''
+    assert system_prompt == '系统\n\n参考以下修改建议：\n加强冲突'
+    
+def test_compact_context_lists_summaries_state_and_recent_text():
+    context = get_compact_context([('开篇', '相遇'), ('发展', '误会')], '', '最后一段')
+    
+    assert context == "【前文摘要】\n开篇：相遇\n\n发展：误会\n\n【人物当前状态】\n（暂无）\n\n【前文结尾原文】\n最后一段"
+
+def test_summary_mode_replaces_full_context(tmp_path, monkeypatch):
+    writer = make_writer(tmp_path, context_settings={'mode': 'summary', 'recent_paragraphs': 2})
+    prompts = {}
+    def generate(system_prompt, user_prompt="", stage=None, labels=None, **kwargs):
+        if stage in ('summary', 'state'):
+            return '相遇' if stage == 'summary' else '小林：犹豫'
+        prompts[labels['part']] = system_prompt
+        return '\n\n'.join(f"第{labels['part']}部分第{i}段" for i in range(1, 4))
+    monkeypatch.setattr(writer.api_client, 'generate', generate)
+    
+    writer.generate_content('大纲', '人物')
+    
+    assert '开篇：相遇' in prompts[2] and '小林：犹豫' in prompts[2]
+    assert '第1部分第2段\n\n第1部分第3段' in prompts[2] and '第1部分第1段' not in prompts[2]
+
+def test_full_mode_keeps_full_context(tmp_path, monkeypatch):
+    writer = make_writer(tmp_path)
+    prompts = {}
+    def generate(system_prompt, user_prompt="", stage=None, labels=None, **kwargs):
+        assert stage == 'content'
+        prompts[labels['part']] = system_prompt
+        return f"第{labels['part']}部分"
+    monkeypatch.setattr(writer.api_client, 'generate', generate)
+    
+    writer.generate_content('大纲', '人物')
+    
+    assert '第1部分\n\n第2部分\n\n第3部分' in prompts[4]
+
+def test_final_rewrite_rates_truncated_content_when_over_budget(tmp_path, monkeypatch):
+    writer = make_writer(tmp_path, ai_settings={'context_size': 4096, 'num_predict': 1024},
+                         prompt_budget={'enabled': True}, rewrite_settings={'final_rewrites': 1})
+    prompts = []
+    def generate(system_prompt, user_prompt="", stage=None, **kwargs):
+        prompts.append((stage, user_prompt))
+        return "总分：72/100"
+    monkeypatch.setattr(writer.api_client, 'generate', generate)
+    content = '他推开门，屋里没有人。' * 2000
+    
+    result, score = writer.final_rewrite('大纲', '人物', content)
+    
+    # 分析提示词放不下原文，直接对截断后的原文评分，而不是评分再次失败后记为0分
+    assert result == content and score == 72
+    assert [stage for stage, _ in prompts] == ['rating']
+    assert len(prompts[0][1]) < len(content)
+
+def test_prompt_budget_uses_the_stage_model_estimator(tmp_path):
+    writer = make_writer(tmp_path, ai_settings={'model': 'qwen2.5:14b', 'context_size': 2048, 'num_predict': 256,
+                                                'stage_models': {'rating': 'llama3:8b'}},
+                         length_settings={'enabled': True}, prompt_budget={'enabled': True, 'adaptive_num_ctx': True})
+    sections = [PromptSection('content', '他推开门，屋里没有人。' * 500)]
+    builder = lambda content: ('系统提示词', content)
+    
+    _, content_prompt, content_options = writer._assemble('content', builder, sections, num_predict=256)
+    _, rating_prompt, rating_options = writer._assemble('rating', builder, sections, num_predict=256)
+    
+    # llama3 每token对应的中文字符较少，同样的预算放得下的原文更短
+    qwen = writer.length_planner.estimator_for('qwen2.5:14b')
+    llama = writer.length_planner.estimator_for('llama3:8b')
+    assert llama.chars_per_token < qwen.chars_per_token
+    assert len(rating_prompt) < len(content_prompt)
+    assert llama.estimate(rating_prompt) == pytest.approx(qwen.estimate(content_prompt), rel=0.05)
+    assert rating_options['num_ctx'] == content_options['num_ctx'] == 2048